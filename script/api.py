@@ -2,33 +2,64 @@
 Main Entry Point for RDMS AI SQL Agent API Server
 """
 
+import asyncio
+import json
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from importlib import import_module
+from types import SimpleNamespace
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from pydantic import BaseModel
 
-# Enable LangSmith tracing for LangChain components
-from langsmith_config import setup_langsmith
+from logging_config import setup_logging
+from cache import SingleFlight, single_flight_stats
+import jobs
+import llm_dispatch
+import metrics
+import profiling
+import subsystems
+import tracing
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+# Heavy subsystems load on first use or in the background warm-up after startup
+def _load_sql_agent():
+    from sql_generator.ai_helpers import format_results_for_api
+    from sql_generator.ai_sql import AISQLRunner
+    from sql_generator.graph import run_sql_agent
+
+    return SimpleNamespace(
+        AISQLRunner=AISQLRunner,
+        run_sql_agent=run_sql_agent,
+        format_results_for_api=format_results_for_api,
+    )
 
-from sql_generator.ai_sql import AISQLRunner
-from sql_generator.graph import run_sql_agent
-from sql_generator.ai_helpers import format_results_for_api
-from chatbot.customer_chatbot import chatbot
 
-# Initialize LangSmith tracing
-setup_langsmith()
+subsystems.register("sql_agent", _load_sql_agent, "LangGraph SQL agent and OpenAI clients")
+subsystems.register("chatbot", lambda: import_module("chatbot.customer_chatbot"), "Customer service chatbot")
+subsystems.register("rag", lambda: import_module("rag.embedding"), "Policy document retrieval (vector store, BM25)")
+subsystems.register("reports", lambda: import_module("sql_generator.report_catalog"), "Named report catalog")
+subsystems.register("kpi_cube", lambda: import_module("kpi_cube"), "In-memory KPI cube")
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "test")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Users allowed to request profiling (X-Profile header / ?profile=) and read stored profiles
+ADMIN_USERS = {user.strip() for user in os.getenv("ADMIN_USERS", "").split(",") if user.strip()}
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 plain_password = "test_pass"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -49,6 +80,7 @@ class QueryResponse(BaseModel):
     total_results: Optional[int] = None
     error: Optional[str] = None
     message: Optional[str] = None
+    profile: Optional[dict] = None
 
 
 class HealthResponse(BaseModel):
@@ -74,6 +106,20 @@ class ChatResponse(BaseModel):
     answer: str
     status: str = "success"
     error: Optional[str] = None
+    profile: Optional[dict] = None
+
+
+class ReportResponse(BaseModel):
+    file: str
+    name: str
+    title: str
+    columns: list
+    data: list
+    total_results: int
+    duration_ms: float
+    refreshed_at: float
+    age_seconds: float
+    stale: bool
 
 
 fake_db = None
@@ -140,6 +186,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Scrapes and probes are timed but never traced
+UNTRACED_PATHS = {"/metrics", "/health"}
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Observe every request in http_request_duration_seconds, labelled by route template.
+
+    Each request is also the root span of a trace; send "X-Trace: 1" to keep it
+    regardless of TRACE_SAMPLE_RATE.
+    """
+    start = time.perf_counter()
+    status_code = 500
+    metrics.HTTP_REQUESTS_IN_PROGRESS.inc()
+    trace = (
+        tracing.start_trace("http", force=request.headers.get("x-trace") == "1")
+        if request.url.path not in UNTRACED_PATHS
+        else nullcontext()
+    )
+    with trace as root:
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            metrics.HTTP_REQUESTS_IN_PROGRESS.dec()
+            route = request.scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            if root is not None:
+                root.rename(f"{request.method} {endpoint}")
+                root.set(status=status_code)
+                if status_code >= 500:
+                    root.fail(f"HTTP {status_code}")
+            _record_request(request.method, endpoint, status_code, time.perf_counter() - start)
+
+
+def _record_request(method: str, endpoint: str, status_code: int, seconds: float):
+    metrics.HTTP_REQUEST_DURATION.observe(seconds, method=method, endpoint=endpoint, status=status_code)
+    if endpoint in ("/analyze", "/chat"):
+        span = tracing.current_span()
+        logger.info(
+            "%s %s %d", method, endpoint, status_code,
+            extra={"endpoint": endpoint, "status": status_code, "ms": round(seconds * 1000, 2),
+                   "trace_id": span.trace.trace_id if span is not None else None},
+        )
+
+
 static_dir = os.path.join(os.path.dirname(__file__), "..", "static")
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
@@ -152,17 +246,105 @@ def get_ai_runner():
     global _ai_runner
     if _ai_runner is None:
         try:
-            _ai_runner = AISQLRunner()
-            print("✓ AISQLRunner initialized successfully")
-        except Exception as e:
-            print(f"✗ Failed to initialize AISQLRunner: {e}")
-            import traceback
-
-            traceback.print_exc()
+            _ai_runner = subsystems.get("sql_agent").AISQLRunner()
+            logger.info("AISQLRunner initialized successfully")
+        except Exception:
+            logger.exception("Failed to initialize AISQLRunner")
             raise  # Re-raise so the endpoint can handle it
     return _ai_runner
 
 
+# Report catalog is parsed once; results are refreshed in the background
+_report_catalog = None
+
+
+def get_report_catalog():
+    global _report_catalog
+    if _report_catalog is None:
+        _report_catalog = subsystems.get("reports").ReportCatalog()
+    return _report_catalog
+
+
+@app.on_event("startup")
+def start_tracing():
+    tracing.setup_tracing()
+
+
+@app.on_event("shutdown")
+def stop_tracing():
+    tracing.shutdown_tracing()
+
+
+@app.on_event("startup")
+def warm_up_subsystems():
+    """Load SUBSYSTEM_WARMUP (comma separated; "none" to skip) in the background after startup."""
+    names = os.getenv("SUBSYSTEM_WARMUP", "sql_agent,chatbot,rag")
+    if names.strip().lower() == "none":
+        return
+    subsystems.warm_up(
+        [name.strip() for name in names.split(",") if name.strip()],
+        delay=float(os.getenv("SUBSYSTEM_WARMUP_DELAY", "1.0")),
+    )
+
+
+@app.on_event("startup")
+def start_report_refresh():
+    if os.getenv("REPORTS_BACKGROUND_REFRESH", "1") != "0":
+        threading.Thread(target=_start_report_refresh, name="report-catalog-load", daemon=True).start()
+
+
+def _start_report_refresh():
+    try:
+        get_report_catalog().start_background_refresh()
+    except Exception as e:
+        logger.warning("Report catalog failed to load (will retry on first request): %s", e)
+
+
+@app.on_event("shutdown")
+def stop_report_refresh():
+    if _report_catalog is not None:
+        _report_catalog.stop()
+
+
+# KPI cube is built from the database once, then appended to in the background
+_kpi_cube = None
+_kpi_cube_lock = threading.Lock()
+
+
+def get_kpi_cube():
+    global _kpi_cube
+    with _kpi_cube_lock:
+        if _kpi_cube is None:
+            cube = subsystems.get("kpi_cube").KPICube.from_db()
+            cube.start_background_refresh(float(os.getenv("KPI_CUBE_REFRESH_SECONDS", "60")))
+            _kpi_cube = cube
+            logger.info("KPI cube built", extra=cube.stats())
+    return _kpi_cube
+
+
+@app.on_event("startup")
+def warm_kpi_cube():
+    if os.getenv("KPI_CUBE_ENABLED", "1") != "0":
+        threading.Thread(target=_warm_kpi_cube, name="kpi-cube-build", daemon=True).start()
+
+
+def _warm_kpi_cube():
+    try:
+        get_kpi_cube()
+    except Exception as e:
+        logger.warning("KPI cube build failed (will retry on first request): %s", e)
+
+
+@app.exception_handler(llm_dispatch.Overloaded)
+async def llm_overloaded(request: Request, exc: llm_dispatch.Overloaded):
+    """Shed load with 503 when LLM calls can't get capacity in time (see llm_dispatch)."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 # Endpoints
 @app.post("/token", response_model=TokenResponse, tags=["Authentication"])
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -177,9 +359,75 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     )
 
 
+def require_admin(current_user: str = Depends(get_current_user)) -> str:
+    if current_user not in ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+
+def _profile_mode(raw_request: Request, current_user: str) -> Optional[str]:
+    """Profiling mode requested via X-Profile or ?profile=, or None; admins only."""
+    requested = raw_request.headers.get("X-Profile") or raw_request.query_params.get("profile")
+    if not requested:
+        return None
+    if current_user not in ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Profiling is restricted to admin users")
+    try:
+        return profiling.resolve_mode(requested)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@contextmanager
+def _profiled(endpoint: str, mode: Optional[str]):
+    try:
+        with profiling.profile_request(endpoint, mode) as profile:
+            yield profile
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
 @app.post("/analyze", response_model=QueryResponse, tags=["Analysis"])
-def analyze_query(request: QueryRequest, current_user: str = Depends(get_current_user)):
+def analyze_query(
+    request: QueryRequest, raw_request: Request, current_user: str = Depends(get_current_user)
+):
     """Process a natural language query and return SQL analysis results."""
+    with _profiled("/analyze", _profile_mode(raw_request, current_user)) as profile:
+        if profile is None:
+            response = _analyze_flight.do(_prompt_key(request.prompt), _admitted_analyze_query, request)
+            response.prompt = request.prompt
+        else:
+            response = _admitted_analyze_query(request)
+    if profile is not None:
+        response.profile = profile.report()
+    metrics.API_RESULTS.inc(
+        endpoint="/analyze", question_type=response.question_type or "unknown", status=response.status
+    )
+    span = tracing.current_span()
+    if span is not None:
+        span.set(question_type=response.question_type)
+        if response.status == "error":
+            span.fail(response.error or response.message)
+    return response
+
+
+# The same question asked concurrently (dashboard tiles, a team) runs the agent once.
+# Answers don't depend on the caller, so the key is just the normalized prompt.
+_analyze_flight = SingleFlight("analyze", share=lambda response: response.model_copy(deep=True))
+
+
+def _prompt_key(prompt: str) -> str:
+    """Case, surrounding whitespace and trailing punctuation don't change the question."""
+    return " ".join(prompt.lower().split()).rstrip("?.! ")
+
+
+def _admitted_analyze_query(request: QueryRequest) -> QueryResponse:
+    with llm_dispatch.request("analysis"):
+        return _analyze_query(request)
+
+
+def _analyze_query(request: QueryRequest, progress=None) -> QueryResponse:
+    """progress, if given, is called with node=<graph node> as the SQL agent advances."""
     question_type = None
     try:
         # Get AI runner (lazy initialization, like chatbot)
@@ -200,7 +448,7 @@ def analyze_query(request: QueryRequest, current_user: str = Depends(get_current
         except Exception as e:
             # If classification fails, default to SQL (safer for data queries)
             question_type = "sql"
-            print(f"Classification failed, defaulting to SQL: {e}")
+            logger.warning("Classification failed, defaulting to SQL: %s", e)
 
         if question_type == "conversational":
             response = ai_runner.get_conversational_response(request.prompt)
@@ -214,7 +462,8 @@ def analyze_query(request: QueryRequest, current_user: str = Depends(get_current
             )
 
         # Handle SQL queries (default path if classification is not "conversational")
-        result = run_sql_agent(request.prompt, ai_runner, max_retries=2)
+        sql_agent = subsystems.get("sql_agent")
+        result = sql_agent.run_sql_agent(request.prompt, ai_runner, max_retries=2, progress=progress)
 
         final_response = result.get("final_response")
         sql_query = result.get("sql_query")
@@ -223,20 +472,18 @@ def analyze_query(request: QueryRequest, current_user: str = Depends(get_current
         # Format data for API
         formatted_data = None
         if sql_results:
-            formatted_data = format_results_for_api(sql_results)
+            formatted_data = sql_agent.format_results_for_api(sql_results)
 
         # If no final_response but we have SQL results, generate AI analysis
         if not final_response and sql_results:
-            print(
-                "Warning: Graph didn't return final_response, generating analysis from results"
-            )
+            logger.warning("Graph didn't return final_response, generating analysis from results")
             try:
                 # Pass SQL query so AI can see what was executed
                 final_response = ai_runner.analyze_sql_results(
                     request.prompt, sql_results, sql_query=sql_query
                 )
             except Exception as e:
-                print(f"Error generating fallback analysis: {e}")
+                logger.warning("Error generating fallback analysis: %s", e)
                 # Last resort: create a simple response
                 final_response = f"I've retrieved the data for your question: '{request.prompt}'. The query executed successfully and returned {len(formatted_data) if formatted_data else 0} results."
 
@@ -263,17 +510,15 @@ def analyze_query(request: QueryRequest, current_user: str = Depends(get_current
             total_results=len(formatted_data) if formatted_data else 0,
         )
 
+    except llm_dispatch.Overloaded:
+        raise
     except Exception as e:
         # Ensure question_type is set even in error cases
         # If it was SQL-related, preserve that, otherwise assume SQL (safer default)
         error_question_type = question_type if question_type else "sql"
 
         # Log the full error for debugging (like chatbot does)
-        import traceback
-
-        error_trace = traceback.format_exc()
-        print(f"Error in analyze_query: {str(e)}")
-        print(f"Traceback: {error_trace}")
+        logger.exception("Error in analyze_query: %s", e)
 
         # Return user-friendly error message (consistent with chatbot pattern)
         error_message = str(e)
@@ -295,18 +540,207 @@ def analyze_query(request: QueryRequest, current_user: str = Depends(get_current
         )
 
 
+# Background jobs: analyses queued on a bounded worker pool, separate from request threads
+_job_queue = None
+_job_queue_lock = threading.Lock()
+JOB_EVENTS_POLL_SECONDS = 0.5
+
+
+def _run_analyze_job(payload: dict, progress) -> dict:
+    with llm_dispatch.request("batch"):
+        response = _analyze_query(QueryRequest(**payload), progress=progress)
+    metrics.API_RESULTS.inc(
+        endpoint="/jobs/analyze", question_type=response.question_type or "unknown", status=response.status
+    )
+    return response.model_dump(exclude={"profile"})
+
+
+def get_job_queue() -> jobs.JobQueue:
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            queue = jobs.JobQueue(jobs.JobStore(), {"analyze": _run_analyze_job})
+            queue.start()
+            _job_queue = queue
+    return _job_queue
+
+
+@app.on_event("startup")
+def start_job_queue():
+    """Start the workers at boot so jobs queued before a restart resume immediately."""
+    if os.getenv("JOBS_ENABLED", "1") != "0":
+        get_job_queue()
+
+
+@app.on_event("shutdown")
+def stop_job_queue():
+    if _job_queue is not None:
+        _job_queue.stop()
+
+
+def _get_job(job_id: str, current_user: str) -> dict:
+    """The job, if it exists and belongs to the caller (admins see all jobs)."""
+    job = get_job_queue().store.get(job_id)
+    if job is None or (job["user"] != current_user and current_user not in ADMIN_USERS):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@app.post("/jobs/analyze", status_code=status.HTTP_202_ACCEPTED, tags=["Analysis"])
+def submit_analyze_job(request: QueryRequest, current_user: str = Depends(get_current_user)):
+    """Queue a natural language query; poll GET /jobs/{job_id} for the result."""
+    queue = get_job_queue()
+    try:
+        job = queue.submit(current_user, "analyze", request.model_dump())
+    except jobs.QueueFull as e:
+        if e.per_user:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": os.getenv("JOB_RETRY_AFTER_SECONDS", "30")},
+        )
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "queue_position": job["queue_position"],
+        "status_url": f"/jobs/{job['id']}",
+        "events_url": f"/jobs/{job['id']}/events",
+    }
+
+
+@app.get("/jobs", tags=["Analysis"])
+def list_jobs(limit: int = Query(50, ge=1, le=200), current_user: str = Depends(get_current_user)):
+    """The caller's recent jobs, newest first, without results."""
+    queue = get_job_queue()
+    return {"jobs": queue.store.list(current_user, limit=limit), "queue": queue.stats()}
+
+
+@app.get("/jobs/{job_id}", tags=["Analysis"])
+def get_job(job_id: str, current_user: str = Depends(get_current_user)):
+    """Job status and progress; includes the QueryResponse once it has finished."""
+    job = _get_job(job_id, current_user)
+    if job["status"] == "running":
+        job["events"] = get_job_queue().events(job_id)
+    return job
+
+
+@app.get("/jobs/{job_id}/events", tags=["Analysis"])
+async def stream_job_events(job_id: str, current_user: str = Depends(get_current_user)):
+    """Server-sent events: one "progress" event per agent step, then "done" with the final job."""
+    # The job store is blocking I/O: keep it off the event loop
+    await asyncio.to_thread(_get_job, job_id, current_user)
+    queue = get_job_queue()
+
+    async def events():
+        sent = 0
+        while True:
+            job = await asyncio.to_thread(queue.store.get, job_id)
+            if job is None:
+                return
+            if job["status"] == "running":
+                progress = await asyncio.to_thread(queue.events, job_id)
+            else:
+                progress = job["events"]
+            for event in progress[sent:]:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            sent = max(sent, len(progress))
+            if job["status"] in jobs.TERMINAL_STATUSES:
+                yield f"event: done\ndata: {json.dumps(job, default=str)}\n\n"
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.delete("/jobs/{job_id}", tags=["Analysis"])
+def cancel_job(job_id: str, current_user: str = Depends(get_current_user)):
+    """Cancel a job that is still queued; running jobs finish normally."""
+    _get_job(job_id, current_user)
+    if not get_job_queue().cancel(job_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Only queued jobs can be cancelled")
+    return {"job_id": job_id, "status": "cancelled"}
+
+
+@app.get("/reports", tags=["Reports"])
+def list_reports(current_user: str = Depends(get_current_user)):
+    """List the named analysis queries available as report endpoints."""
+    catalog = get_report_catalog()
+    return {"reports": catalog.list(), "cache": catalog.cache.stats()}
+
+
+@app.get("/reports/{file}/{query}", response_model=ReportResponse, tags=["Reports"])
+def get_report(file: str, query: str, current_user: str = Depends(get_current_user)):
+    """Return a cached analysis query result (refreshed in the background)."""
+    try:
+        return get_report_catalog().fetch(file, query)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Report unavailable: {str(e)}",
+        )
+
+
+@app.get("/cube", tags=["Reports"])
+def query_kpi_cube(
+    request: Request,
+    group_by: str = "",
+    order_by: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    rollup: bool = False,
+    current_user: str = Depends(get_current_user),
+):
+    """
+    Aggregate revenue, orders and quantity from the in-memory KPI cube.
+
+    Slice with dimension query parameters, e.g.
+    /cube?group_by=year,month&category=Smartphones,Laptops&order_by=revenue&limit=5
+    """
+    try:
+        cube = get_kpi_cube()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"KPI cube unavailable: {str(e)}",
+        )
+
+    dims = [dim for dim in group_by.split(",") if dim]
+    try:
+        filters = {
+            dim: cube.coerce(dim, request.query_params[dim].split(","))
+            for dim in subsystems.get("kpi_cube").DIMENSIONS
+            if dim in request.query_params
+        }
+        if rollup:
+            data = cube.rollup(dims, filters)
+        else:
+            data = cube.query(dims, filters, order_by=order_by, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"data": data, "total_results": len(data), "cube": cube.stats()}
+
+
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 def health_check():
     """Health check endpoint."""
     return HealthResponse(status="healthy", message="API is running")
 
 
+@app.get("/metrics", tags=["Health"])
+def prometheus_metrics():
+    """Prometheus text-format metrics for scraping."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/diagnostics", tags=["Health"])
 def diagnostics():
     """Diagnostic endpoint to check configuration and connections."""
     diagnostics_info = {
         "api_status": "running",
         "environment_variables": {
+            "DB_BACKEND": os.getenv("DB_BACKEND", "postgres"),
             "DB_HOST": "✓" if os.getenv("DB_HOST") else "✗ Missing",
             "DB_PORT": os.getenv("DB_PORT", "✗ Missing"),
             "DB_NAME": "✓" if os.getenv("DB_NAME") else "✗ Missing",
@@ -317,6 +751,9 @@ def diagnostics():
         },
         "database_connection": "unknown",
         "openai_connection": "unknown",
+        "subsystems": subsystems.status(),
+        "llm_dispatch": llm_dispatch.get_dispatcher().stats(),
+        "single_flight": single_flight_stats(),
     }
 
     # Test database connection
@@ -359,20 +796,67 @@ async def read_root():
 
 
 @app.post("/chat", response_model=ChatResponse, tags=["Chatbot"])
-def chat_endpoint(request: ChatRequest, current_user: str = Depends(get_current_user)):
+def chat_endpoint(
+    request: ChatRequest, raw_request: Request, current_user: str = Depends(get_current_user)
+):
     """Chat with the customer service chatbot."""
+    with _profiled("/chat", _profile_mode(raw_request, current_user)) as profile, \
+            llm_dispatch.request("interactive"):
+        response = _chat(request)
+    if profile is not None:
+        response.profile = profile.report()
+    return response
+
+
+def _chat(request: ChatRequest) -> ChatResponse:
     try:
+        chatbot = subsystems.get("chatbot").chatbot
         answer, chat_response, response = chatbot(
             request.prompt, max_attempts=request.max_attempts
         )
+        metrics.API_RESULTS.inc(endpoint="/chat", question_type="chat", status="success")
         return ChatResponse(
             answer=answer or "I apologize, but I couldn't generate a response.",
             status="success",
         )
+    except llm_dispatch.Overloaded:
+        raise
     except Exception as e:
+        metrics.API_RESULTS.inc(endpoint="/chat", question_type="chat", status="error")
+        if tracing.current_span() is not None:
+            tracing.current_span().fail(e)
+        logger.exception("Error in chat_endpoint: %s", e)
         return ChatResponse(answer="", status="error", error=str(e))
 
 
+@app.get("/profiles", tags=["Health"])
+def list_profiles(current_user: str = Depends(require_admin)):
+    """Stored request/workload profiles, newest first."""
+    return {"profiles": profiling.list_profiles()}
+
+
+@app.get("/profiles/{profile_id}", tags=["Health"])
+def get_profile(profile_id: str, current_user: str = Depends(require_admin)):
+    """A stored profile report: stage breakdown, top functions and allocation sites."""
+    try:
+        return profiling.load_profile(profile_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+
+
+@app.get("/profiles/{profile_id}/download", tags=["Health"])
+def download_profile(profile_id: str, current_user: str = Depends(require_admin)):
+    """The raw profile: folded stacks (sampling) or a pstats dump (cprofile)."""
+    try:
+        files = profiling.load_profile(profile_id).get("files", {})
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    path = files.get("folded") or files.get("pstats")
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile data not found")
+    return FileResponse(path, filename=os.path.basename(path))
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,205 @@
+"""
+Benchmark the in-memory KPI cube against the equivalent SQL aggregates.
+
+Tables come from the synthetic data generator at --scale. By default the
+SQL side runs on an in-memory SQLite copy of the base tables so the
+benchmark works without a server; --postgres runs the SQL against the
+configured database instead (load it with data_loader.py first).
+
+Usage:
+    python benchmarks/cube_bench.py --scale 100 --repeat 50
+    python benchmarks/cube_bench.py --postgres --repeat 20
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from data_generator import Profile, SyntheticDataset
+from kpi_cube import KPICube, fact_frame
+
+FACT_TABLES = ["order_header", "product", "customer", "shipping", "payment"]
+
+# (name, group_by, filters, order_by, limit)
+QUERIES = [
+    ("grand_total", [], {}, None, None),
+    ("monthly_revenue", ["year", "month"], {}, None, None),
+    ("category_slice", ["month"], {"category": ["Smartphones", "Laptops"]}, None, None),
+    ("top_sellers", ["seller"], {}, "revenue", 10),
+    ("state_by_carrier", ["state", "carrier"], {"year": [2024]}, None, None),
+    ("top_states_for_category", ["state"], {"category": ["Kitchen"]}, "orders", 5),
+]
+
+DIMENSION_SQL = {
+    "postgres": {
+        "year": "EXTRACT(YEAR FROM h.order_date)::INTEGER",
+        "month": "EXTRACT(MONTH FROM h.order_date)::INTEGER",
+    },
+    "sqlite": {
+        "year": "CAST(strftime('%Y', h.order_date) AS INTEGER)",
+        "month": "CAST(strftime('%m', h.order_date) AS INTEGER)",
+    },
+}
+COMMON_DIMENSIONS = {
+    "category": "p.category",
+    "state": "c.state",
+    "seller": "p.seller_id",
+    "carrier": "s.carrier",
+}
+
+
+def build_sql(backend, group_by, filters, order_by, limit):
+    """Equivalent aggregate over the base tables."""
+    expressions = {**COMMON_DIMENSIONS, **DIMENSION_SQL[backend]}
+    select = [f"{expressions[dim]} AS {dim}" for dim in group_by]
+    select += ["SUM(COALESCE(pay.amount, 0)) AS revenue", "COUNT(*) AS orders", "SUM(h.quantity) AS quantity"]
+    where, params = [], []
+    placeholder = "%s" if backend == "postgres" else "?"
+    for dim, values in filters.items():
+        where.append(f"{expressions[dim]} IN ({', '.join(placeholder for _ in values)})")
+        params.extend(values)
+    sql = (
+        f"SELECT {', '.join(select)} "
+        "FROM order_header AS h "
+        "JOIN product AS p ON h.product_id = p.product_id "
+        "JOIN customer AS c ON h.customer_id = c.customer_id "
+        "LEFT JOIN shipping AS s ON h.shipping_id = s.shipping_id "
+        "LEFT JOIN payment AS pay ON pay.order_id = h.order_id"
+    )
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if group_by:
+        sql += f" GROUP BY {', '.join(expressions[dim] for dim in group_by)}"
+    # Same order as KPICube.query: measure first, then dimensions with NULLs last
+    order = [f"{order_by} DESC"] if order_by else []
+    order += [f"{dim} IS NULL, {dim}" for dim in group_by]
+    if order:
+        sql += f" ORDER BY {', '.join(order)}"
+    if limit:
+        sql += f" LIMIT {limit}"
+    return sql, params
+
+
+def rows_match(group_by, cube_rows, sql_rows) -> bool:
+    """Both sides are ordered the same way, so rows are compared position by position."""
+    if len(cube_rows) != len(sql_rows):
+        return False
+    for cube_row, sql_row in zip(cube_rows, sql_rows):
+        dims, (revenue, orders, quantity) = sql_row[: len(group_by)], sql_row[len(group_by):]
+        if [cube_row[dim] for dim in group_by] != list(dims):
+            return False
+        if cube_row["orders"] != orders or cube_row["quantity"] != (quantity or 0):
+            return False
+        if abs(cube_row["revenue"] - float(revenue or 0)) >= 0.01:
+            return False
+    return True
+
+
+def _p50(samples):
+    return float(np.percentile(samples, 50))
+
+
+def synthetic_tables(scale: float, seed: int) -> dict:
+    dataset = SyntheticDataset(Profile(), scale=scale, seed=seed)
+    tables = {}
+    for name in FACT_TABLES:
+        frame = pd.concat(list(dataset.iter_chunks(name, chunk_size=1_000_000)), ignore_index=True)
+        frame.columns = [column.lower() for column in frame.columns]
+        tables[name] = frame
+    return tables
+
+
+def sqlite_connection(tables: dict):
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    for name, frame in tables.items():
+        frame = frame.copy()
+        for column in frame.columns:
+            if pd.api.types.is_datetime64_any_dtype(frame[column]):
+                frame[column] = frame[column].dt.strftime("%Y-%m-%d %H:%M:%S")
+        frame.to_sql(name, conn, index=False)
+    # Same key indexes the PostgreSQL schema has
+    for statement in (
+        "CREATE INDEX idx_product ON product (product_id)",
+        "CREATE INDEX idx_customer ON customer (customer_id)",
+        "CREATE INDEX idx_shipping ON shipping (shipping_id)",
+        "CREATE INDEX idx_payment ON payment (order_id)",
+    ):
+        conn.execute(statement)
+    return conn
+
+
+def run(scale: float, repeat: int, seed: int, postgres: bool) -> list:
+    if postgres:
+        start = time.perf_counter()
+        cube = KPICube.from_db()
+        build_seconds = time.perf_counter() - start
+        from sql_generator.sql_via_python import query_executor
+
+        db = query_executor("")
+        db.connect_to_db()
+        cursor, backend = db.cur, "postgres"
+    else:
+        tables = synthetic_tables(scale, seed)
+        start = time.perf_counter()
+        cube = KPICube.from_frame(fact_frame(tables))
+        build_seconds = time.perf_counter() - start
+        cursor, backend = sqlite_connection(tables).cursor(), "sqlite"
+
+    stats = cube.stats()
+    print(
+        f"Cube: {stats['orders']:,} orders -> {stats['cells']:,} cells, "
+        f"built in {build_seconds:.2f}s; SQL backend: {backend}"
+    )
+
+    report = []
+    for name, group_by, filters, order_by, limit in QUERIES:
+        cube_samples, sql_samples = [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            cube_rows = cube.query(group_by, filters, order_by=order_by, limit=limit)
+            cube_samples.append((time.perf_counter() - t0) * 1e6)
+
+            sql, params = build_sql(backend, group_by, filters, order_by, limit)
+            t0 = time.perf_counter()
+            cursor.execute(sql, params)
+            sql_rows = cursor.fetchall()
+            sql_samples.append((time.perf_counter() - t0) * 1e6)
+
+        row = {
+            "query": name,
+            "groups": len(cube_rows),
+            "cube_p50_us": round(_p50(cube_samples), 1),
+            "sql_p50_us": round(_p50(sql_samples), 1),
+            "speedup": round(_p50(sql_samples) / max(_p50(cube_samples), 1e-9), 1),
+            "match": rows_match(group_by, cube_rows, sql_rows),
+        }
+        report.append(row)
+        print(
+            f"  {name:<26} groups={row['groups']:>6}  cube p50={row['cube_p50_us']:>10.1f}us  "
+            f"sql p50={row['sql_p50_us']:>12.1f}us  x{row['speedup']:<8} match={row['match']}"
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KPI cube vs SQL benchmark")
+    parser.add_argument("--scale", type=float, default=100.0, help="Synthetic data scale factor")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--postgres", action="store_true", help="Run SQL against the configured database")
+    parser.add_argument("--output", help="Optional path to write the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.scale, args.repeat, args.seed, args.postgres)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
@@ -0,0 +1,371 @@
+"""
+In-process load test for the API: throughput, latency percentiles and error rates.
+
+Requests go through the real FastAPI app over httpx's ASGI transport
+(auth, middleware, SQL agent graph, chatbot tools and database), while the
+LLM is the in-process fake from llm_backend with --fake-llm-latency /
+--fake-llm-jitter seconds per call. Queries hit the configured database, so
+point DB_* at a local Postgres, or use DB_BACKEND=duckdb to run offline.
+
+Arrivals are open-loop Poisson at --rate requests/s, with at most
+--concurrency in flight. Latency is measured from the scheduled arrival, so
+time spent waiting for a free slot counts. With --rate 0 the test is
+closed-loop: --concurrency clients send back to back.
+
+Every request is traced, so the report also has p50/p95/p99 per graph node
+and per LLM/database span, plus the share of /analyze runs, generated
+queries and embeddings that joined an identical in-flight call.
+
+Usage:
+    DB_BACKEND=duckdb python benchmarks/load_test.py --duration 30 --rate 10 --concurrency 16
+    python benchmarks/load_test.py --mix analyze=6,chat=3,token=1 --output ../result/load_baseline.json
+    python benchmarks/load_test.py --baseline ../result/load_baseline.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+ENDPOINTS = {
+    "token": "/token",
+    "analyze": "/analyze",
+    "chat": "/chat",
+}
+USERNAME, PASSWORD = "ken", "test_pass"
+
+
+class SpanCollector:
+    """Trace exporter that keeps spans in memory for the report."""
+
+    name = "load_test"
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans: list):
+        self.spans.extend(spans)
+
+    def clear(self):
+        self.spans = []
+
+    def close(self):
+        pass
+
+
+def parse_mix(mix: str) -> dict:
+    """"analyze=6,chat=3,token=1" -> relative weights per endpoint."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def summarize_latencies(latencies_ms: list) -> dict:
+    if not latencies_ms:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    values = np.asarray(latencies_ms)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+class LoadTest:
+    def __init__(self, app, weights: dict, prompts: dict, concurrency: int, rate: float,
+                 duration: float, timeout: float, seed: int):
+        self.app = app
+        self.weights = weights
+        self.prompts = prompts
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.results = []
+        self.token = None
+
+    async def request(self, client, endpoint: str) -> tuple:
+        """(ok, status code) for one request to endpoint."""
+        if endpoint == "token":
+            response = await client.post("/token", data={"username": USERNAME, "password": PASSWORD})
+            return response.status_code == 200, response.status_code
+        prompt = self.rng.choice(self.prompts[endpoint])
+        response = await client.post(
+            ENDPOINTS[endpoint],
+            json={"prompt": prompt},
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+        ok = response.status_code == 200 and response.json().get("status") == "success"
+        return ok, response.status_code
+
+    async def timed(self, client, semaphore, scheduled: float):
+        endpoint = self.rng.choices(list(self.weights), weights=list(self.weights.values()))[0]
+        async with semaphore:
+            try:
+                ok, status_code = await asyncio.wait_for(self.request(client, endpoint), self.timeout)
+                error = None if ok else f"status {status_code}"
+            except asyncio.TimeoutError:
+                ok, status_code, error = False, None, "timeout"
+            except Exception as e:
+                ok, status_code, error = False, None, type(e).__name__
+        self.results.append({
+            "endpoint": ENDPOINTS[endpoint],
+            "latency_ms": (time.perf_counter() - scheduled) * 1000,
+            "ok": ok,
+            "status_code": status_code,
+            "error": error,
+        })
+
+    async def run(self) -> float:
+        import httpx
+
+        transport = httpx.ASGITransport(app=self.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            response = await client.post("/token", data={"username": USERNAME, "password": PASSWORD})
+            response.raise_for_status()
+            self.token = response.json()["access_token"]
+
+            # One of each first so subsystem imports are not measured
+            for endpoint in self.weights:
+                await self.request(client, endpoint)
+            self.on_warm()
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+            start = time.perf_counter()
+            deadline = start + self.duration
+            if self.rate > 0:
+                tasks, scheduled = [], start
+                while scheduled < deadline:
+                    await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                    tasks.append(asyncio.create_task(self.timed(client, semaphore, scheduled)))
+                    scheduled += self.rng.expovariate(self.rate)
+                await asyncio.gather(*tasks)
+            else:
+                async def client_loop():
+                    while time.perf_counter() < deadline:
+                        await self.timed(client, semaphore, time.perf_counter())
+
+                await asyncio.gather(*(client_loop() for _ in range(self.concurrency)))
+            return time.perf_counter() - start
+
+    def on_warm(self):
+        """Hook called after warm-up requests, before measurement starts."""
+
+
+def single_flight_delta(before: list, after: list) -> dict:
+    """Coalescing counts between two cache.single_flight_stats() snapshots."""
+    start = {stats["name"]: stats for stats in before}
+    groups = {}
+    for stats in after:
+        executed = stats["executed"] - start.get(stats["name"], {}).get("executed", 0)
+        shared = stats["shared"] - start.get(stats["name"], {}).get("shared", 0)
+        if executed + shared:
+            groups[stats["name"]] = {
+                "calls": executed + shared,
+                "shared": shared,
+                "suppression_rate": round(shared / (executed + shared), 4),
+            }
+    return groups
+
+
+def build_report(results: list, spans: list, elapsed: float, config: dict,
+                 single_flight: dict = None) -> dict:
+    by_endpoint = defaultdict(list)
+    for result in results:
+        by_endpoint[result["endpoint"]].append(result)
+
+    endpoints = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        errors = [row for row in rows if not row["ok"]]
+        error_kinds = defaultdict(int)
+        for row in errors:
+            error_kinds[row["error"]] += 1
+        endpoints[endpoint] = {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 2),
+            "errors": len(errors),
+            "error_rate": round(len(errors) / len(rows), 4),
+            "error_kinds": dict(error_kinds),
+            **summarize_latencies([row["latency_ms"] for row in rows if row["ok"]]),
+        }
+
+    by_name = defaultdict(list)
+    span_errors = defaultdict(int)
+    for span in spans:
+        if span["parent_id"] is None or span["duration_ms"] is None:
+            continue
+        by_name[span["name"]].append(span["duration_ms"])
+        span_errors[span["name"]] += span["status"] == "error"
+    stages = {
+        name: {"count": len(durations), "errors": span_errors[name], **summarize_latencies(durations)}
+        for name, durations in sorted(by_name.items())
+    }
+
+    total_errors = sum(row["errors"] for row in endpoints.values())
+    return {
+        "config": config,
+        "python": sys.version.split()[0],
+        "duration_s": round(elapsed, 2),
+        "requests": len(results),
+        "throughput_rps": round(len(results) / elapsed, 2),
+        "error_rate": round(total_errors / len(results), 4) if results else 0.0,
+        "endpoints": endpoints,
+        "stages": stages,
+        "single_flight": single_flight or {},
+    }
+
+
+def compare(report: dict, baseline: dict, max_regression: float, min_delta_ms: float = 5.0) -> list:
+    """
+    Regressions versus a baseline report.
+
+    A latency regression needs both the relative increase (max_regression)
+    and an absolute one (min_delta_ms), so fast endpoints do not flap.
+    """
+    problems = []
+
+    def check_latency(label: str, before: dict, after: dict):
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            old, new = before.get(key), after.get(key)
+            if old and new and new > old * (1 + max_regression) and new - old >= min_delta_ms:
+                problems.append(f"{label} {key[:-3]}: {old:.1f} ms -> {new:.1f} ms (+{(new / old - 1) * 100:.0f}%)")
+
+    for endpoint, before in baseline.get("endpoints", {}).items():
+        after = report["endpoints"].get(endpoint)
+        if after is None:
+            problems.append(f"{endpoint}: no requests in this run")
+            continue
+        check_latency(endpoint, before, after)
+        if after["throughput_rps"] < before["throughput_rps"] * (1 - max_regression):
+            problems.append(f"{endpoint} throughput: {before['throughput_rps']:.2f} -> "
+                            f"{after['throughput_rps']:.2f} req/s")
+        if after["error_rate"] > before["error_rate"] + 0.01:
+            problems.append(f"{endpoint} error rate: {before['error_rate']:.2%} -> {after['error_rate']:.2%}")
+
+    for name, before in baseline.get("stages", {}).items():
+        if name.startswith("node.") and name in report["stages"]:
+            check_latency(name, before, report["stages"][name])
+    return problems
+
+
+def print_report(report: dict):
+    config = report["config"]
+    print(f"{report['requests']} requests in {report['duration_s']:.1f}s "
+          f"({report['throughput_rps']:.2f} req/s, {report['error_rate']:.2%} errors), "
+          f"rate={config['rate'] or 'closed-loop'} concurrency={config['concurrency']} "
+          f"fake LLM {config['fake_llm_latency']}s+{config['fake_llm_jitter']}s")
+    print(f"\n{'endpoint':<12} {'requests':>8} {'req/s':>7} {'errors':>7} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<12} {row['requests']:>8} {row['throughput_rps']:>7.2f} {row['error_rate']:>6.1%} "
+              f"{row['p50_ms'] or 0:>9.1f} {row['p95_ms'] or 0:>9.1f} {row['p99_ms'] or 0:>9.1f}")
+    print(f"\n{'span':<32} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in report["stages"].items():
+        print(f"{name:<32} {row['count']:>6} {row['errors']:>6} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    if report.get("single_flight"):
+        print(f"\n{'coalesced':<32} {'calls':>6} {'shared':>6} {'suppressed':>10}")
+        for name, row in report["single_flight"].items():
+            print(f"{name:<32} {row['calls']:>6} {row['shared']:>6} {row['suppression_rate']:>10.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-process API load test with a fake LLM")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds (default 30)")
+    parser.add_argument("--rate", type=float, default=5.0,
+                        help="Poisson arrivals per second; 0 for closed-loop (default 5)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max requests in flight (default 8)")
+    parser.add_argument("--mix", default="analyze=6,chat=3,token=1",
+                        help="Relative endpoint weights (default analyze=6,chat=3,token=1)")
+    parser.add_argument("--fake-llm-latency", type=float, default=0.3, help="Seconds per LLM call (default 0.3)")
+    parser.add_argument("--fake-llm-jitter", type=float, default=0.2, help="Extra random seconds (default 0.2)")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the report as JSON (use as a baseline later)")
+    parser.add_argument("--baseline", help="Report to compare against; exits 1 on regression")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative latency increase / throughput drop (default 0.2)")
+    args = parser.parse_args()
+
+    # Select the fake LLM before the SQL agent and chatbot are imported
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.fake_llm_latency)
+    os.environ["FAKE_LLM_JITTER"] = str(args.fake_llm_jitter)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Canned queries would otherwise flood the index advisor's workload log
+    os.environ.setdefault("SQL_HISTORY_PATH", os.devnull)
+
+    import api
+    import tracing
+    from cache import single_flight_stats
+    from profiling import DEFAULT_WORKLOAD
+
+    collector = SpanCollector()
+    tracing.EXPORTERS[SpanCollector.name] = lambda: collector
+    tracer = tracing.setup_tracing(SpanCollector.name, sample_rate=1.0, slow_ms=float("inf"))
+
+    prompts = defaultdict(list)
+    for item in DEFAULT_WORKLOAD:
+        prompts[item["endpoint"]].append(item["prompt"])
+
+    test = LoadTest(api.app, parse_mix(args.mix), prompts, args.concurrency, args.rate,
+                    args.duration, args.timeout, args.seed)
+
+    coalescing_start = []
+
+    def discard_warm_up_spans():
+        tracer.flush()
+        collector.clear()
+        coalescing_start[:] = single_flight_stats()
+
+    test.on_warm = discard_warm_up_spans
+    elapsed = asyncio.run(test.run())
+    tracer.flush()
+
+    config = {
+        "rate": args.rate,
+        "concurrency": args.concurrency,
+        "mix": test.weights,
+        "duration": args.duration,
+        "fake_llm_latency": args.fake_llm_latency,
+        "fake_llm_jitter": args.fake_llm_jitter,
+        "db_backend": os.getenv("DB_BACKEND", "postgres"),
+        "dropped_traces": tracer.dropped,
+    }
+    report = build_report(test.results, collector.spans, elapsed, config,
+                          single_flight_delta(coalescing_start, single_flight_stats()))
+    tracing.shutdown_tracing()
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+        print("No regressions against the baseline")
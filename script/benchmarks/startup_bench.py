@@ -0,0 +1,197 @@
+"""
+Benchmark API cold start: import cost per module and lazy subsystem load times.
+
+Each run imports api.py in a fresh interpreter with -X importtime, so module
+caches from earlier runs do not hide regressions. The report lists the wall
+time to import api, the modules with the largest cumulative import time and,
+with --subsystems, how long each lazy subsystem takes to load on first use.
+
+Compare against a saved report to catch modules creeping back into the
+startup path:
+
+Usage:
+    python benchmarks/startup_bench.py --repeat 5 --subsystems
+    python benchmarks/startup_bench.py --output ../result/startup_bench.json
+    python benchmarks/startup_bench.py --baseline ../result/startup_bench.json --max-regression 0.25
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.parent
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+SUBSYSTEM_PROBE = """
+import json, time
+import api, subsystems
+timings = {}
+for name in subsystems.REGISTRY.names():
+    start = time.perf_counter()
+    try:
+        subsystems.get(name)
+        timings[name] = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        timings[name] = str(e)
+print(json.dumps(timings))
+"""
+
+
+def _environment() -> dict:
+    env = dict(os.environ)
+    # Importing must not need real credentials or reach the network
+    env.setdefault("OPENAI_API_KEY", "sk-startup-bench")
+    env.setdefault("TRACE_EXPORTERS", "none")
+    return env
+
+
+def parse_importtime(stderr: str) -> dict:
+    """{module: {"self_ms", "cumulative_ms", "depth"}} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        modules[module] = {
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(indent) - 1) // 2,
+        }
+    return modules
+
+
+def import_api() -> tuple:
+    """(wall seconds, per-module import times) for one cold import of api."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api"],
+        cwd=SCRIPT_DIR, env=_environment(), capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import api failed:\n{result.stderr[-2000:]}")
+    return wall, parse_importtime(result.stderr)
+
+
+def load_subsystems() -> dict:
+    """Seconds to load each registered subsystem, in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-c", SUBSYSTEM_PROBE],
+        cwd=SCRIPT_DIR, env=_environment(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"subsystem probe failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(repeat: int = 5, top: int = 15, with_subsystems: bool = False) -> dict:
+    walls, runs = [], []
+    for _ in range(repeat):
+        wall, modules = import_api()
+        walls.append(wall)
+        runs.append(modules)
+
+    # Median per module across runs smooths out disk cache and scheduler noise
+    names = set().union(*runs)
+    modules = {}
+    for name in names:
+        samples = [run_modules[name] for run_modules in runs if name in run_modules]
+        modules[name] = {
+            "self_ms": round(statistics.median(s["self_ms"] for s in samples), 2),
+            "cumulative_ms": round(statistics.median(s["cumulative_ms"] for s in samples), 2),
+            "depth": samples[0]["depth"],
+        }
+
+    packages = {}
+    for name, entry in modules.items():
+        package = name.split(".")[0]
+        packages[package] = round(packages.get(package, 0.0) + entry["self_ms"], 2)
+
+    report = {
+        "python": sys.version.split()[0],
+        "repeat": repeat,
+        "wall_ms": {
+            "median": round(statistics.median(walls) * 1000, 1),
+            "min": round(min(walls) * 1000, 1),
+            "max": round(max(walls) * 1000, 1),
+        },
+        "api_import_ms": modules.get("api", {}).get("cumulative_ms"),
+        "module_count": len(modules),
+        "top_modules": sorted(
+            ({"module": name, **entry} for name, entry in modules.items()),
+            key=lambda row: -row["cumulative_ms"],
+        )[:top],
+        "packages_self_ms": dict(sorted(packages.items(), key=lambda item: -item[1])[:top]),
+        "modules": {name: entry["cumulative_ms"] for name, entry in modules.items()},
+    }
+    if with_subsystems:
+        report["subsystems_s"] = load_subsystems()
+    return report
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list:
+    """Regressions of api import time and newly imported heavy modules versus baseline."""
+    problems = []
+    before, after = baseline.get("api_import_ms"), report.get("api_import_ms")
+    if before and after and after > before * (1 + max_regression):
+        problems.append(f"import api: {before:.1f} ms -> {after:.1f} ms (+{(after / before - 1) * 100:.0f}%)")
+
+    for name, cumulative in report["modules"].items():
+        if name not in baseline.get("modules", {}) and "." not in name and cumulative >= 20:
+            problems.append(f"new module on the startup path: {name} ({cumulative:.1f} ms)")
+    return problems
+
+
+def print_report(report: dict):
+    wall = report["wall_ms"]
+    print(f"import api: {report['api_import_ms']:.1f} ms "
+          f"(process wall median {wall['median']:.1f} ms, {report['module_count']} modules)")
+    print(f"\n{'module':<45} {'cumulative ms':>14} {'self ms':>9}")
+    for row in report["top_modules"]:
+        name = "  " * row["depth"] + row["module"]
+        print(f"{name:<45} {row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}")
+    print(f"\n{'package':<25} {'self ms':>9}")
+    for package, self_ms in report["packages_self_ms"].items():
+        print(f"{package:<25} {self_ms:>9.1f}")
+    if "subsystems_s" in report:
+        print(f"\n{'subsystem':<15} {'first load':>12}")
+        for name, seconds in report["subsystems_s"].items():
+            value = f"{seconds:>10.2f} s" if isinstance(seconds, (int, float)) else f"  failed: {seconds}"
+            print(f"{name:<15} {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API cold start benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Modules/packages to list")
+    parser.add_argument("--subsystems", action="store_true", help="Also time each lazy subsystem load")
+    parser.add_argument("--output", help="Optional path to write the report as JSON")
+    parser.add_argument("--baseline", help="Report to compare against; exits 1 on regression")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed relative increase of api import time (default 0.25)")
+    args = parser.parse_args()
+
+    report = run(args.repeat, args.top, args.subsystems)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+        print("No startup regressions against the baseline")
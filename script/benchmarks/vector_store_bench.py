@@ -0,0 +1,162 @@
+"""
+Benchmark vector store backends: cold start, query latency and RSS.
+
+Each backend is measured in a fresh subprocess so import cost, index load
+and peak memory are not shared between runs. Synthetic unit vectors stand in
+for real embeddings, so no OpenAI calls are made.
+
+Usage:
+    python benchmarks/vector_store_bench.py --rows 5000 --dim 1536 --queries 200
+"""
+
+import argparse
+import json
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+BACKENDS = [
+    ("chroma", None),
+    ("numpy", None),
+    ("numpy", "int8"),
+]
+
+
+def _synthetic_vectors(rows: int, dim: int, seed: int):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(backend: str, quantize, path: Path, rows: int, dim: int):
+    """Populate a store with synthetic vectors (not part of the timed run)."""
+    from rag.vector_store import create_vector_store
+
+    store = create_vector_store(
+        backend, path, collection_name="bench", quantize=quantize
+    )
+    vectors = _synthetic_vectors(rows, dim, seed=0)
+    ids = [f"chunk_{i}" for i in range(rows)]
+    documents = [f"synthetic chunk {i}" for i in range(rows)]
+    metadatas = [{"source": "bench", "page": i // 10 + 1, "chunk": i} for i in range(rows)]
+    store.upsert(ids, documents, metadatas, vectors.tolist())
+
+
+def measure(backend: str, quantize, path: Path, dim: int, queries: int, k: int):
+    """Child process: time import + open + first query, then steady-state queries."""
+    start = time.perf_counter()
+    from rag.vector_store import create_vector_store
+
+    store = create_vector_store(
+        backend, path, collection_name="bench", quantize=quantize
+    )
+    query_vectors = _synthetic_vectors(queries, dim, seed=1)
+    store.query(query_vectors[0].tolist(), n_results=k)
+    cold_start_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for vector in query_vectors:
+        vector = vector.tolist()
+        t0 = time.perf_counter()
+        store.query(vector, n_results=k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+
+    # ru_maxrss is KB on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+    return {
+        "cold_start_ms": round(cold_start_ms, 2),
+        "query_p50_ms": round(latencies[len(latencies) // 2], 3),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "max_rss_mb": round(rss_mb, 1),
+    }
+
+
+def run(rows: int, dim: int, queries: int, k: int):
+    results = []
+    work_dir = Path(tempfile.mkdtemp(prefix="vector_bench_"))
+    try:
+        for backend, quantize in BACKENDS:
+            label = backend + (f"-{quantize}" if quantize else "")
+            path = work_dir / label
+            try:
+                build(backend, quantize, path, rows, dim)
+            except ImportError as e:
+                print(f"Skipping {label}: {e}")
+                continue
+
+            child = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--child",
+                    backend,
+                    "--quantize",
+                    quantize or "",
+                    "--path",
+                    str(path),
+                    "--dim",
+                    str(dim),
+                    "--queries",
+                    str(queries),
+                    "-k",
+                    str(k),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            result["backend"] = label
+            results.append(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nrows={rows} dim={dim} queries={queries} k={k}")
+    print(
+        f"{'backend':<12}{'cold start ms':>15}{'p50 ms':>10}{'p95 ms':>10}{'max RSS MB':>12}"
+    )
+    for r in results:
+        print(
+            f"{r['backend']:<12}{r['cold_start_ms']:>15}{r['query_p50_ms']:>10}"
+            f"{r['query_p95_ms']:>10}{r['max_rss_mb']:>12}"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--quantize", default="", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(
+            json.dumps(
+                measure(
+                    args.child,
+                    args.quantize or None,
+                    Path(args.path),
+                    args.dim,
+                    args.queries,
+                    args.k,
+                )
+            )
+        )
+    else:
+        run(args.rows, args.dim, args.queries, args.k)
@@ -0,0 +1,282 @@
+"""
+In-process caching utilities shared by the API, chatbot tools and SQL layer.
+"""
+
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import tracing
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Every live cache and single-flight group, for the cache_* and singleflight_* metrics
+_caches = weakref.WeakSet()
+_flights = weakref.WeakSet()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after ttl seconds.
+
+    Tracks hits and misses so callers can report hit rates.
+    """
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 1024, name: str = "cache"):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches.add(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory, ttl: float = None):
+        """Return the cached value, or call factory() and cache its result."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.set(key, value, ttl=ttl)
+        return value
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only those whose key satisfies predicate(key)."""
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+                return
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache that keeps serving an expired entry while it reloads in the background.
+
+    Entries are fresh for ttl seconds and may be served stale for another
+    stale_ttl seconds while a background reload runs. Concurrent loads of
+    the same key share one in-flight call, and a failed background reload
+    keeps the previous value.
+    """
+
+    def __init__(self, ttl: float = 300.0, stale_ttl: float = 3600.0,
+                 name: str = "swr", max_workers: int = 2):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self._entries = {}  # key -> (monotonic load time, wall-clock load time, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+        _caches.add(self)
+
+    def _load(self, key, loader):
+        """Run loader() and store its result; returns the stored (monotonic, wall-clock, value) entry."""
+        try:
+            entry = (time.monotonic(), time.time(), loader())
+            with self._lock:
+                self._entries[key] = entry
+                self.refreshes += 1
+            return entry
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.warning("[%s] refresh of %r failed: %s", self.name, key, e,
+                           extra={"cache": self.name})
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def refresh(self, key, loader):
+        """Start (or join) a background load of key; returns a Future of its (monotonic, wall-clock, value) entry."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._load, key, loader)
+                self._inflight[key] = future
+            return future
+
+    def get(self, key, loader):
+        """
+        Return (value, meta) for key.
+
+        meta holds "loaded_at" (epoch seconds), "age" and "stale". Only a
+        missing or fully expired entry blocks on loader().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            age = now - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                return entry[2], {"loaded_at": entry[1], "age": round(age, 3), "stale": False}
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self.refresh(key, loader)
+                return entry[2], {"loaded_at": entry[1], "age": round(age, 3), "stale": True}
+
+        self.misses += 1
+        # Use the loaded entry itself: an invalidate() may already have dropped it from the dict
+        _, loaded_at, value = self.refresh(key, loader).result()
+        return value, {"loaded_at": loaded_at, "age": 0.0, "stale": False}
+
+    def invalidate(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution.
+
+    The first caller (the leader) runs func; callers arriving while it is in
+    flight wait and get its result, or its exception. Nothing is kept after
+    the call finishes, so unlike a cache a later call runs again. share(value)
+    gives each follower its own copy of the result when callers may mutate it.
+    """
+
+    def __init__(self, name: str, share=None):
+        self.name = name
+        self.share = share
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        _flights.add(self)
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.leaders += 1
+            else:
+                self.shared += 1
+        if not leader:
+            with tracing.span(f"singleflight.{self.name}"):
+                value = future.result()
+            return self.share(value) if self.share else value
+        try:
+            value = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        total = self.leaders + self.shared
+        return {
+            "name": self.name,
+            "calls": total,
+            "executed": self.leaders,
+            "shared": self.shared,
+            "in_flight": len(self._inflight),
+            "suppression_rate": round(self.shared / total, 4) if total else 0.0,
+        }
+
+
+def single_flight_stats() -> list:
+    return [flight.stats() for flight in list(_flights)]
+
+
+def _cache_metrics():
+    """Scrape-time hit/miss counts and sizes of every live cache."""
+    requests, entries, hit_rates = [], [], []
+    for cache in list(_caches):
+        stats = cache.stats()
+        for field, result in (("hits", "hit"), ("stale_hits", "stale_hit"), ("misses", "miss")):
+            if field in stats:
+                requests.append(({"cache": cache.name, "result": result}, stats[field]))
+        entries.append(({"cache": cache.name}, stats["size"]))
+        hit_rates.append(({"cache": cache.name}, stats["hit_rate"]))
+    calls, suppression = [], []
+    for stats in single_flight_stats():
+        calls.append(({"group": stats["name"], "result": "executed"}, stats["executed"]))
+        calls.append(({"group": stats["name"], "result": "shared"}, stats["shared"]))
+        suppression.append(({"group": stats["name"]}, stats["suppression_rate"]))
+    return [
+        ("cache_requests_total", "counter", "Cache lookups by cache and result (hit, stale_hit, miss).",
+         requests),
+        ("cache_entries", "gauge", "Entries currently held by each cache.", entries),
+        ("cache_hit_ratio", "gauge", "Hits (including stale hits) over all lookups since start.",
+         hit_rates),
+        ("singleflight_calls_total", "counter",
+         "Coalesced calls by group and result (executed, or shared an in-flight execution).", calls),
+        ("singleflight_suppression_ratio", "gauge",
+         "Share of calls that joined an in-flight duplicate instead of executing.", suppression),
+    ]
+
+
+REGISTRY.register_collector(_cache_metrics)
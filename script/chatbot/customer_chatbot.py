@@ -1,26 +1,26 @@
 from dotenv import load_dotenv
-import os
 import json
+import logging
 import sys
 from pathlib import Path
+from typing import Optional
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import StructuredTool
 
-# Import LangSmith configuration to enable tracing
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from langsmith_config import setup_langsmith
+import llm_backend
+import tracing
+from metrics import CHATBOT_ITERATIONS, TOOL_CALLS, invoke_llm
 
 from chatbot.tools import call_functions
 
 load_dotenv()
-setup_langsmith()
 
-# Use LangChain ChatOpenAI for tracing
-llm = ChatOpenAI(
-    model="gpt-4o-mini", temperature=0, openai_api_key=os.environ.get("OPENAI_API_KEY")
-)
+logger = logging.getLogger(__name__)
+
+# ChatOpenAI, or the in-process fake with LLM_BACKEND=fake
+llm = llm_backend.chat_model("gpt-4o-mini", temperature=0)
 
 
 class OrderResponse(BaseModel):
@@ -38,12 +38,24 @@ class FAQInput(BaseModel):
 
 class GetOrdersInput(BaseModel):
     customer_id: int = Field(description="The customer's ID")
-    limit: int = Field(default=10, description="The number of orders to return")
+    limit: int = Field(
+        default=10, description="The number of orders to return per page (max 50)"
+    )
+    cursor: Optional[str] = Field(
+        default=None,
+        description="The next_cursor from a previous call, to fetch the next (older) page",
+    )
 
 
 class GetReviewsInput(BaseModel):
     product_id: int = Field(description="The product's ID")
-    limit: int = Field(default=10, description="The number of reviews to return")
+    limit: int = Field(
+        default=10, description="The number of reviews to return per page (max 50)"
+    )
+    cursor: Optional[str] = Field(
+        default=None,
+        description="The next_cursor from a previous call, to fetch the next page",
+    )
 
 
 class QueryPoliciesInput(BaseModel):
@@ -62,18 +74,23 @@ def faq_wrapper(question: str) -> str:
     return json.dumps(result) if isinstance(result, (dict, list)) else str(result)
 
 
-def get_my_orders_wrapper(customer_id: int, limit: int = 10) -> str:
+def get_my_orders_wrapper(
+    customer_id: int, limit: int = 10, cursor: Optional[str] = None
+) -> str:
     """Get the customer's orders"""
     result = call_functions(
-        "get_my_orders", {"customer_id": customer_id, "limit": limit}
+        "get_my_orders", {"customer_id": customer_id, "limit": limit, "cursor": cursor}
     )
     return json.dumps(result) if isinstance(result, (dict, list)) else str(result)
 
 
-def get_product_reviews_wrapper(product_id: int, limit: int = 10) -> str:
+def get_product_reviews_wrapper(
+    product_id: int, limit: int = 10, cursor: Optional[str] = None
+) -> str:
     """Get the product reviews"""
     result = call_functions(
-        "get_product_reviews", {"product_id": product_id, "limit": limit}
+        "get_product_reviews",
+        {"product_id": product_id, "limit": limit, "cursor": cursor},
     )
     return json.dumps(result) if isinstance(result, (dict, list)) else str(result)
 
@@ -96,13 +113,13 @@ tools = [
     StructuredTool.from_function(
         func=get_my_orders_wrapper,
         name="get_my_orders",
-        description="Get the customer's orders",
+        description="Get the customer's orders, newest first. Returns next_cursor when older orders exist",
         args_schema=GetOrdersInput,
     ),
     StructuredTool.from_function(
         func=get_product_reviews_wrapper,
         name="get_product_reviews",
-        description="Get the product reviews",
+        description="Get the product reviews, newest first. Returns next_cursor when more reviews exist",
         args_schema=GetReviewsInput,
     ),
     StructuredTool.from_function(
@@ -143,23 +160,29 @@ def chatbot(prompt, max_attempts=5, conversation_messages=None):
 
     iteration = 0
     while iteration < max_attempts:
-        # Call LLM with tools (this will be traced by LangSmith)
-        response = llm_with_tools.invoke(messages)
+        # Call LLM with tools (recorded in metrics and the current trace)
+        response = invoke_llm(llm_with_tools, messages, "chatbot")
         messages.append(response)
 
         # Check if there are tool calls
         if response.tool_calls:
-            print(f"--- Iteration {iteration + 1} ---")
+            logger.debug("Chatbot iteration %d", iteration + 1)
 
             # Execute all tool calls
             for tool_call in response.tool_calls:
                 name = tool_call["name"]
                 args = tool_call["args"]
-                print(f"Tool Call: {name} with args: {args}")
+                logger.debug("Tool call: %s", name, extra={"tool": name, "args": args})
 
                 # Execute tool
-                tool_result = call_functions(name, args)
-                print(f"Tool Result: {json.dumps(tool_result, indent=2)[:200]}...")
+                with tracing.span(f"tool.{name}") as tool_span:
+                    tool_result = call_functions(name, args)
+                    failed = isinstance(tool_result, dict) and "error" in tool_result
+                    if failed and tool_span is not None:
+                        tool_span.fail(tool_result["error"])
+                TOOL_CALLS.inc(tool=name, status="error" if failed else "ok")
+                logger.debug("Tool result: %s", json.dumps(tool_result, default=str)[:200],
+                             extra={"tool": name})
 
                 # Add tool result to messages
                 messages.append(
@@ -174,11 +197,12 @@ def chatbot(prompt, max_attempts=5, conversation_messages=None):
             iteration += 1
         else:
             # No more tool calls, we have the final answer
-            print("No more tool calls - final answer received")
+            CHATBOT_ITERATIONS.observe(iteration + 1)
             answer = response.content if hasattr(response, "content") else str(response)
             return answer, response, response
 
     # If we hit max attempts, return what we have
-    print(f"Max attempts ({max_attempts}) reached")
+    CHATBOT_ITERATIONS.observe(iteration)
+    logger.warning("Chatbot reached max attempts (%d) without a final answer", max_attempts)
     answer = response.content if hasattr(response, "content") else str(response)
     return answer, response, response
@@ -1,17 +1,22 @@
 from dotenv import load_dotenv
 from openai import OpenAI
+import base64
+import logging
 import os
 import json
 from pathlib import Path
 from datetime import datetime, date
 from decimal import Decimal
 
-from rag.embedding import query_policies_docs
-from sql_generator.sql_via_python import query_executor
+from cache import TTLCache
+from metrics import observe_query
+from sql_generator.sql_via_python import execute_prepared, pooled_connection
 
 load_dotenv()
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
+logger = logging.getLogger(__name__)
+
 
 def convert_to_json_serializable(obj):
     """Recursively convert non-JSON serializable objects to serializable types"""
@@ -64,21 +69,8 @@ def faq(question):
         return json.load(f)
 
 
-def get_my_orders(customer_id, limit=10):
-    """Get customer's orders"""
-    try:
-        customer_id = int(customer_id)
-        limit = int(limit)
-        if limit <= 0:
-            limit = 10
-        if limit > 50:
-            limit = 50
-    except (ValueError, TypeError):
-        return {"error": "Invalid customer_id or limit parameter", "data": []}
-
-    # Build query with parameterized values (using psycopg2's %s placeholder)
-    query = """
-    SELECT 
+ORDERS_PAGE_SQL = """
+    SELECT
         oh.order_id,
         oh.order_date,
         oh.quantity,
@@ -92,96 +84,161 @@ def get_my_orders(customer_id, limit=10):
     JOIN product p ON oh.product_id = p.product_id
     LEFT JOIN payment pay ON oh.order_id = pay.order_id
     LEFT JOIN shipping s ON oh.shipping_id = s.shipping_id
-    WHERE oh.customer_id = %s
-    ORDER BY oh.order_date DESC
-    LIMIT %s
+    WHERE oh.customer_id = $1
+    {keyset}
+    ORDER BY oh.order_date DESC, oh.order_id DESC
+    LIMIT ${limit_param}
+"""
+
+REVIEWS_PAGE_SQL = """
+    SELECT
+        cr.review_id,
+        cr.customer_id,
+        cr.rating,
+        cr.description,
+        p.product_id,
+        p.product_name
+    FROM customer_review cr
+    JOIN product p ON cr.product_id = p.product_id
+    WHERE cr.product_id = $1
+    {keyset}
+    ORDER BY cr.review_id DESC
+    LIMIT ${limit_param}
+"""
+
+MAX_PAGE_SIZE = 50
+
+# Repeat questions within a conversation are answered from memory
+_orders_cache = TTLCache(
+    ttl=float(os.environ.get("CHATBOT_CACHE_TTL", 60)), maxsize=2048, name="orders"
+)
+_reviews_cache = TTLCache(
+    ttl=float(os.environ.get("CHATBOT_CACHE_TTL", 60)), maxsize=2048, name="reviews"
+)
+
+
+def encode_cursor(*values) -> str:
+    """Opaque pagination cursor for the last row of a page."""
+    payload = json.dumps(convert_to_json_serializable(list(values)))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> list:
+    return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+
+
+def _page_size(limit) -> int:
+    limit = int(limit)
+    if limit <= 0:
+        return 10
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _fetch_page(statement_name: str, query: str, params: tuple, limit: int):
+    """Run a prepared keyset query on a pooled connection; fetches limit + 1 rows."""
+    with pooled_connection() as conn:
+        with conn.cursor() as cur, observe_query(statement_name) as outcome:
+            execute_prepared(cur, statement_name, query, params + (limit + 1,))
+            rows = cur.fetchall()
+            outcome["rows"] = len(rows)
+            columns = [desc[0] for desc in cur.description] if cur.description else []
+
+    formatted_results = [
+        {col: convert_to_json_serializable(val) for col, val in zip(columns, row)}
+        for row in rows[:limit]
+    ]
+    return formatted_results, len(rows) > limit
+
+
+def get_my_orders(customer_id, limit=10, cursor=None):
     """
+    Get one page of the customer's orders, newest first.
+
+    Pass the returned next_cursor back as cursor to fetch the following page.
+    """
+    try:
+        customer_id = int(customer_id)
+        limit = _page_size(limit)
+        after = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return {"error": "Invalid customer_id, limit or cursor parameter", "data": []}
+
+    cache_key = (customer_id, limit, cursor)
+    cached = _orders_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-    db = None
     try:
-        # Create executor with placeholder query, we'll execute manually with parameters
-        db = query_executor("")
-        if not db.connect_to_db():
-            return {"error": "Failed to connect to database", "data": []}
-
-        # Execute with parameterized query (prevents SQL injection)
-        db.cur.execute(query, (customer_id, limit))
-        results = db.cur.fetchall()
-
-        # Get column names for better data structure
-        columns = [desc[0] for desc in db.cur.description] if db.cur.description else []
-
-        # Format results as list of dictionaries, converting non-JSON types
-        formatted_results = []
-        if results and columns:
-            for row in results:
-                row_dict = {}
-                for col, val in zip(columns, row):
-                    # Use helper function to ensure JSON serializability
-                    row_dict[col] = convert_to_json_serializable(val)
-                formatted_results.append(row_dict)
-
-        # Ensure the return dictionary is also JSON serializable
-        result = {"data": formatted_results, "count": len(formatted_results)}
-        return convert_to_json_serializable(result)
+        if after:
+            # Keyset: continue strictly after the (order_date, order_id) of the last row
+            query = ORDERS_PAGE_SQL.format(
+                keyset="AND (oh.order_date, oh.order_id) < ($2::timestamp, $3)",
+                limit_param=4,
+            )
+            data, has_more = _fetch_page(
+                "get_my_orders_next", query, (customer_id, after[0], after[1]), limit
+            )
+        else:
+            query = ORDERS_PAGE_SQL.format(keyset="", limit_param=2)
+            data, has_more = _fetch_page(
+                "get_my_orders_first", query, (customer_id,), limit
+            )
+
+        next_cursor = (
+            encode_cursor(data[-1]["order_date"], data[-1]["order_id"])
+            if has_more
+            else None
+        )
+        result = {"data": data, "count": len(data), "next_cursor": next_cursor}
+        _orders_cache.set(cache_key, result)
+        return result
 
     except Exception as e:
-        print(f"-- Error in get_my_orders: {e} --")
+        logger.warning("Error in get_my_orders: %s", e, extra={"customer_id": customer_id})
         return {"error": str(e), "data": []}
 
-    finally:
-        if db:
-            db.close()
-
 
-def get_product_reviews(product_id, limit=10):
-    product_id = int(product_id)
+def get_product_reviews(product_id, limit=10, cursor=None):
+    """
+    Get one page of a product's reviews, newest first.
 
-    query = """
-    select 
-    from product as p
-    join customer_review as cr on p.product_id = cr.product_id
-    where p.product_id = %s
-    order by cr.review_date desc
-    limit 10;
+    Pass the returned next_cursor back as cursor to fetch the following page.
     """
+    try:
+        product_id = int(product_id)
+        limit = _page_size(limit)
+        after = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return {"error": "Invalid product_id, limit or cursor parameter", "data": []}
+
+    cache_key = (product_id, limit, cursor)
+    cached = _reviews_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-    db = None
     try:
-        # Create executor with placeholder query, we'll execute manually with parameters
-        db = query_executor("")
-        if not db.connect_to_db():
-            return {"error": "Failed to connect to database", "data": []}
-
-        # Execute with parameterized query (prevents SQL injection)
-        db.cur.execute(query, (product_id, limit))
-        results = db.cur.fetchall()
-
-        # Get column names for better data structure
-        columns = [desc[0] for desc in db.cur.description] if db.cur.description else []
-
-        # Format results as list of dictionaries, converting non-JSON types
-        formatted_results = []
-        if results and columns:
-            for row in results:
-                row_dict = {}
-                for col, val in zip(columns, row):
-                    # Use helper function to ensure JSON serializability
-                    row_dict[col] = convert_to_json_serializable(val)
-                formatted_results.append(row_dict)
-
-        # Ensure the return dictionary is also JSON serializable
-        result = {"data": formatted_results, "count": len(formatted_results)}
-        return convert_to_json_serializable(result)
+        if after:
+            query = REVIEWS_PAGE_SQL.format(
+                keyset="AND cr.review_id < $2", limit_param=3
+            )
+            data, has_more = _fetch_page(
+                "get_product_reviews_next", query, (product_id, after[0]), limit
+            )
+        else:
+            query = REVIEWS_PAGE_SQL.format(keyset="", limit_param=2)
+            data, has_more = _fetch_page(
+                "get_product_reviews_first", query, (product_id,), limit
+            )
+
+        next_cursor = encode_cursor(data[-1]["review_id"]) if has_more else None
+        result = {"data": data, "count": len(data), "next_cursor": next_cursor}
+        _reviews_cache.set(cache_key, result)
+        return result
 
     except Exception as e:
-        print(f"-- Error in get_my_orders: {e} --")
+        logger.warning("Error in get_product_reviews: %s", e, extra={"product_id": product_id})
         return {"error": str(e), "data": []}
 
-    finally:
-        if db:
-            db.close()
-
 
 def call_functions(name, args):
     """Execute the appropriate function based on name"""
@@ -190,6 +247,9 @@ def call_functions(name, args):
     elif name == "get_my_orders":
         return get_my_orders(**args)
     elif name == "query_policies_docs":
+        # Imported on first use: opening the vector store is the slowest part of chatbot startup
+        from rag.embedding import query_policies_docs
+
         result = query_policies_docs(**args)
         # If result is empty, return a helpful message instead
         if not result or (isinstance(result, list) and len(result) == 0):
@@ -0,0 +1,466 @@
+"""
+Synthetic marketplace data generator for load testing.
+
+Learns distributions from the sample CSVs in data/ (customers per state,
+bids per product, bid-to-price ratios, order dates, carrier mix, rating
+histogram, service descriptions, shipping/delivery lags) and emits a
+referentially valid dataset at any scale factor.
+
+Every column value is a pure function of (seed, column, row index) computed
+with a vectorized counter-based hash, so:
+  - output is deterministic for a seed, independent of chunk size
+  - foreign keys are resolved by recomputing the parent row's values
+    (an order re-derives its bid's customer, product and price) instead of
+    holding parent tables in memory
+  - memory is bounded by the chunk size plus one int64 per product
+
+Usage:
+    python data_generator.py --scale 100 --format csv --seed 42
+    python data_generator.py --scale 10000 --format parquet --chunk-size 2000000
+"""
+
+import argparse
+import json
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from schema import dependency_waves, normalize_column_name, parse_schema
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+OUTPUT_DIR = Path(__file__).parent.parent / "result" / "synthetic"
+
+# Tables whose row counts do not grow with the scale factor
+FIXED_TABLES = {"department"}
+
+_MASK = (1 << 64) - 1
+
+
+def _mix64(value: int) -> int:
+    """splitmix64 finalizer on a Python int."""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & _MASK
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & _MASK
+    return value ^ (value >> 31)
+
+
+def uniform(seed: int, stream: str, idx: np.ndarray) -> np.ndarray:
+    """Deterministic U[0, 1) draws for row indices idx in a named stream."""
+    key = np.uint64(_mix64((seed * 0x9E3779B97F4A7C15 + zlib.crc32(stream.encode())) & _MASK))
+    with np.errstate(over="ignore"):
+        z = idx.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + key
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def _pick(u: np.ndarray, n: int) -> np.ndarray:
+    """Map uniforms to 0-based indices in [0, n)."""
+    return np.minimum((u * n).astype(np.int64), n - 1)
+
+
+def _quantile(u: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """Inverse empirical CDF: interpolate between observed values."""
+    positions = u * (len(sorted_values) - 1)
+    return np.interp(positions, np.arange(len(sorted_values)), sorted_values)
+
+
+def _days(values) -> np.ndarray:
+    return np.sort(pd.to_datetime(values).values.astype("datetime64[D]").astype(np.int64))
+
+
+class Profile:
+    """Distributions learned from the sample CSVs."""
+
+    def __init__(self, data_dir=DATA_DIR):
+        schema = parse_schema()
+        self.templates = {}
+        self.headers = {}
+        for name in schema:
+            frame = pd.read_csv(Path(data_dir) / f"{name}.csv")
+            self.headers[name] = list(frame.columns)
+            frame.columns = [normalize_column_name(c) for c in frame.columns]
+            self.templates[name] = frame
+
+        t = self.templates
+        self.base_counts = {name: len(frame) for name, frame in t.items()}
+
+        # Bids per product, including products that never received a bid
+        bids = t["bid"].groupby("product_id").size()
+        self.bids_per_product = (
+            bids.reindex(t["product"]["product_id"], fill_value=0).to_numpy()
+        )
+        priced = t["bid"].merge(t["product"], on="product_id")
+        self.bid_ratio = np.sort((priced["bid_amount"] / priced["product_price"]).to_numpy())
+        self.bid_days = _days(t["bid"]["bid_date"])
+
+        orders = t["order_header"].merge(t["bid"], on="bid_id", suffixes=("", "_bid"))
+        order_ts = pd.to_datetime(orders["order_date"])
+        self.order_lag_hours = np.sort(
+            ((order_ts - pd.to_datetime(orders["bid_date"])) / pd.Timedelta(hours=1)).to_numpy()
+        )
+        self.quantities = t["order_header"]["quantity"].to_numpy()
+
+        shipped = t["order_header"].merge(t["shipping"], on="shipping_id")
+        self.ship_lag_days = np.sort(
+            (pd.to_datetime(shipped["shipping_date"]) - pd.to_datetime(shipped["order_date"]).dt.floor("D")).dt.days.to_numpy()
+        )
+        for name, column, attr in (
+            ("import_distribution", "received_date", "import_lag_days"),
+            ("export_distribution", "delivered_date", "export_lag_days"),
+        ):
+            lagged = t[name].merge(t["shipping"], on="shipping_id")
+            setattr(
+                self,
+                attr,
+                np.sort((pd.to_datetime(lagged[column]) - pd.to_datetime(lagged["shipping_date"])).dt.days.to_numpy()),
+            )
+
+        self.register_days = _days(t["app_user"]["registed_date"])
+        self.customer_service_days = _days(t["customer_service"]["service_date"])
+        self.seller_service_days = _days(t["seller_service"]["service_date"])
+
+
+class SyntheticDataset:
+    """Referentially valid marketplace tables at scale x the sample size."""
+
+    def __init__(self, profile: Profile, scale: float = 1.0, seed: int = 42):
+        self.profile = profile
+        self.scale = scale
+        self.seed = seed
+
+        base = profile.base_counts
+        self.counts = {
+            name: count if name in FIXED_TABLES else max(1, int(round(count * scale)))
+            for name, count in base.items()
+        }
+        products = np.arange(self.counts["product"])
+        per_product = profile.bids_per_product[
+            _pick(self._u("product.bids", products), len(profile.bids_per_product))
+        ]
+        self._bid_offsets = np.cumsum(per_product)
+        self.counts["bid"] = int(self._bid_offsets[-1]) if len(products) else 0
+        self.counts["app_user"] = self.counts["customer"] + self.counts["seller"]
+        for name in ("shipping", "payment", "order_history", "import_distribution", "export_distribution"):
+            self.counts[name] = self.counts["order_header"]
+
+    # ------------------------------------------------------------------
+    # Sampling helpers
+    # ------------------------------------------------------------------
+
+    def _u(self, stream: str, idx: np.ndarray) -> np.ndarray:
+        return uniform(self.seed, stream, idx)
+
+    def _template(self, table: str, stream: str, idx: np.ndarray) -> pd.DataFrame:
+        """Sample whole template rows so attributes keep their joint distribution."""
+        frame = self.profile.templates[table]
+        rows = _pick(self._u(stream, idx), len(frame))
+        return frame.iloc[rows].reset_index(drop=True)
+
+    def _fk(self, stream: str, idx: np.ndarray, parent: str) -> np.ndarray:
+        """Uniform 1-based foreign key into parent."""
+        return _pick(self._u(stream, idx), self.counts[parent]) + 1
+
+    def _date(self, stream: str, idx: np.ndarray, sorted_days: np.ndarray) -> np.ndarray:
+        days = np.floor(_quantile(self._u(stream, idx), sorted_days)).astype(np.int64)
+        return days.astype("datetime64[D]")
+
+    # ------------------------------------------------------------------
+    # Derived values shared between tables
+    # ------------------------------------------------------------------
+
+    def customer_names(self, idx):
+        names = self.profile.templates["customer"]
+        first = names["first_name"].to_numpy()[_pick(self._u("customer.first_name", idx), len(names))]
+        last = names["last_name"].to_numpy()[_pick(self._u("customer.last_name", idx), len(names))]
+        return first, last
+
+    def product_price(self, product_idx):
+        prices = self.profile.templates["product"]["product_price"].to_numpy()
+        return prices[_pick(self._u("product.template", product_idx), len(prices))]
+
+    def bid_product(self, bid_idx):
+        return np.searchsorted(self._bid_offsets, bid_idx, side="right")
+
+    def bid_customer(self, bid_idx):
+        return self._fk("bid.customer", bid_idx, "customer")
+
+    def bid_day(self, bid_idx):
+        return self._date("bid.date", bid_idx, self.profile.bid_days)
+
+    def order_bid(self, order_idx):
+        return _pick(self._u("order.bid", order_idx), max(self.counts["bid"], 1))
+
+    def order_quantity(self, order_idx):
+        quantities = self.profile.quantities
+        return quantities[_pick(self._u("order.quantity", order_idx), len(quantities))]
+
+    def order_date(self, order_idx):
+        bid_idx = self.order_bid(order_idx)
+        lag = np.round(_quantile(self._u("order.lag", order_idx), self.profile.order_lag_hours))
+        return self.bid_day(bid_idx).astype("datetime64[h]") + lag.astype("timedelta64[h]")
+
+    def shipping_date(self, order_idx):
+        lag = np.round(_quantile(self._u("shipping.lag", order_idx), self.profile.ship_lag_days))
+        return self.order_date(order_idx).astype("datetime64[D]") + lag.astype("timedelta64[D]")
+
+    # ------------------------------------------------------------------
+    # Tables: each takes 0-based row indices and returns a DataFrame
+    # ------------------------------------------------------------------
+
+    def department(self, idx):
+        return self.profile.templates["department"].iloc[idx].reset_index(drop=True)
+
+    def staff(self, idx):
+        rows = self._template("staff", "staff.template", idx)
+        return pd.DataFrame({
+            "staff_id": idx + 1,
+            "department_id": rows["department_id"],
+            "last_name": rows["last_name"],
+            "first_name": rows["first_name"],
+        })
+
+    def seller(self, idx):
+        rows = self._template("seller", "seller.template", idx)
+        return pd.DataFrame({
+            "seller_id": idx + 1,
+            "description": rows["description"],
+            "address": rows["address"],
+            "state_province": rows["state_province"],
+        })
+
+    def customer(self, idx):
+        rows = self._template("customer", "customer.template", idx)
+        first, last = self.customer_names(idx)
+        return pd.DataFrame({
+            "customer_id": idx + 1,
+            "first_name": first,
+            "last_name": last,
+            "email": [f"customer{i}@email.com" for i in idx + 1],
+            "address": rows["address"],
+            "state": rows["state"],
+        })
+
+    def app_user(self, idx):
+        n_customers = self.counts["customer"]
+        is_customer = idx < n_customers
+        customer_idx = np.where(is_customer, idx, 0)
+        seller_idx = np.where(is_customer, 0, idx - n_customers)
+
+        first, last = self.customer_names(customer_idx)
+        seller_names = self.profile.templates["seller"]["description"].str.split().str[0].to_numpy()
+        seller_first = seller_names[_pick(self._u("seller.template", seller_idx), len(seller_names))]
+        return pd.DataFrame({
+            "user_id": idx + 1,
+            "customer_id": pd.Series(customer_idx + 1, dtype="Int64").where(is_customer),
+            "seller_id": pd.Series(seller_idx + 1, dtype="Int64").where(~is_customer),
+            "first_name": np.where(is_customer, first, seller_first),
+            "last_name": np.where(is_customer, last, "Seller"),
+            "password": [f"hashed_password_{i}" for i in idx + 1],
+            "email": np.where(
+                is_customer,
+                [f"customer{i}@email.com" for i in customer_idx + 1],
+                [f"seller{i}@marketplace.com" for i in seller_idx + 1],
+            ),
+            "registed_date": self._date("app_user.registered", idx, self.profile.register_days),
+        })
+
+    def product(self, idx):
+        rows = self._template("product", "product.template", idx)
+        return pd.DataFrame({
+            "product_id": idx + 1,
+            "seller_id": self._fk("product.seller", idx, "seller"),
+            "description": rows["description"],
+            "category": rows["category"],
+            "product_price": rows["product_price"],
+            "product_name": rows["product_name"],
+        })
+
+    def bid(self, idx):
+        product_idx = self.bid_product(idx)
+        ratio = _quantile(self._u("bid.ratio", idx), self.profile.bid_ratio)
+        return pd.DataFrame({
+            "bid_id": idx + 1,
+            "product_id": product_idx + 1,
+            "customer_id": self.bid_customer(idx),
+            "bid_amount": np.maximum(np.round(self.product_price(product_idx) * ratio, 2), 0.01),
+            "bid_date": self.bid_day(idx),
+        })
+
+    def shipping(self, idx):
+        rows = self._template("shipping", "shipping.template", idx)
+        return pd.DataFrame({
+            "shipping_id": idx + 1,
+            "carrier": rows["carrier"],
+            "shipping_date": self.shipping_date(idx),
+        })
+
+    def order_header(self, idx):
+        bid_idx = self.order_bid(idx)
+        return pd.DataFrame({
+            "order_id": idx + 1,
+            "customer_id": self.bid_customer(bid_idx),
+            "bid_id": bid_idx + 1,
+            "product_id": self.bid_product(bid_idx) + 1,
+            "shipping_id": idx + 1,
+            "quantity": self.order_quantity(idx),
+            "order_date": self.order_date(idx),
+        })
+
+    def payment(self, idx):
+        price = self.product_price(self.bid_product(self.order_bid(idx)))
+        return pd.DataFrame({
+            "payment_id": idx + 1,
+            "order_id": idx + 1,
+            "amount": np.round(price * self.order_quantity(idx), 2),
+        })
+
+    def order_history(self, idx):
+        return pd.DataFrame({
+            "history_id": idx + 1,
+            "customer_id": self.bid_customer(self.order_bid(idx)),
+            "order_id": idx + 1,
+        })
+
+    def _distribution(self, idx, id_column, date_column, stream, lags):
+        lag = np.round(_quantile(self._u(stream, idx), lags)).astype("timedelta64[D]")
+        return pd.DataFrame({
+            id_column: idx + 1,
+            "shipping_id": idx + 1,
+            date_column: self.shipping_date(idx) + lag,
+        })
+
+    def import_distribution(self, idx):
+        return self._distribution(idx, "import_id", "received_date", "import.lag", self.profile.import_lag_days)
+
+    def export_distribution(self, idx):
+        return self._distribution(idx, "export_id", "delivered_date", "export.lag", self.profile.export_lag_days)
+
+    def customer_service(self, idx):
+        rows = self._template("customer_service", "customer_service.template", idx)
+        return pd.DataFrame({
+            "cservice_id": idx + 1,
+            "staff_id": self._fk("customer_service.staff", idx, "staff"),
+            "customer_id": self._fk("customer_service.customer", idx, "customer"),
+            "duration_hours": rows["duration_hours"],
+            "service_date": self._date("customer_service.date", idx, self.profile.customer_service_days),
+            "description": rows["description"],
+        })
+
+    def seller_service(self, idx):
+        rows = self._template("seller_service", "seller_service.template", idx)
+        return pd.DataFrame({
+            "sservice_id": idx + 1,
+            "seller_id": self._fk("seller_service.seller", idx, "seller"),
+            "staff_id": self._fk("seller_service.staff", idx, "staff"),
+            "duration_hours": rows["duration_hours"],
+            "service_date": self._date("seller_service.date", idx, self.profile.seller_service_days),
+            "description": rows["description"],
+        })
+
+    def customer_review(self, idx):
+        rows = self._template("customer_review", "customer_review.template", idx)
+        return pd.DataFrame({
+            "review_id": idx + 1,
+            "customer_id": self._fk("customer_review.customer", idx, "customer"),
+            "product_id": self._fk("customer_review.product", idx, "product"),
+            "description": rows["description"],
+            "rating": rows["rating"],
+        })
+
+    def seller_review(self, idx):
+        rows = self._template("seller_review", "seller_review.template", idx)
+        return pd.DataFrame({
+            "sreview_id": idx + 1,
+            "seller_id": self._fk("seller_review.seller", idx, "seller"),
+            "description": rows["description"],
+        })
+
+    def iter_chunks(self, table: str, chunk_size: int = 1_000_000):
+        """Yield DataFrames of at most chunk_size rows, with the sample CSV headers."""
+        build = getattr(self, table)
+        headers = self.profile.headers[table]
+        for start in range(0, self.counts[table], chunk_size):
+            idx = np.arange(start, min(start + chunk_size, self.counts[table]), dtype=np.int64)
+            frame = build(idx)
+            frame.columns = headers
+            yield frame
+
+
+def write_dataset(dataset: SyntheticDataset, output_dir: Path, fmt: str = "csv",
+                  chunk_size: int = 1_000_000, tables=None) -> dict:
+    """
+    Stream every table to output_dir/<table>.csv (or .parquet) chunk by chunk.
+
+    Returns:
+        Manifest dict with row counts and generation throughput
+    """
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "seed": dataset.seed,
+        "scale": dataset.scale,
+        "format": fmt,
+        "tables": {},
+    }
+
+    order = [name for wave in dependency_waves(parse_schema()) for name in wave]
+    for table in order:
+        if tables and table not in tables:
+            continue
+        path = output_dir / f"{table}.{fmt}"
+        start = time.perf_counter()
+        rows = 0
+        writer = None
+        try:
+            for number, frame in enumerate(dataset.iter_chunks(table, chunk_size)):
+                if fmt == "csv":
+                    frame.to_csv(path, mode="w" if number == 0 else "a", header=number == 0, index=False)
+                else:
+                    batch = pa.Table.from_pandas(frame, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, batch.schema, compression="zstd")
+                    writer.write_table(batch)
+                rows += len(frame)
+        finally:
+            if writer is not None:
+                writer.close()
+        elapsed = time.perf_counter() - start
+        manifest["tables"][table] = {
+            "rows": rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(rows / elapsed) if elapsed > 0 else None,
+        }
+        print(f"  {table:<22} {rows:>12,} rows  {elapsed:8.2f}s")
+
+    with open(output_dir / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic marketplace data")
+    parser.add_argument("--scale", type=float, default=10.0, help="Scale factor (1 to 10000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--data-dir", default=str(DATA_DIR), help="Sample CSVs to learn from")
+    parser.add_argument("--output", help="Output directory (default result/synthetic/scale_<n>)")
+    parser.add_argument("--tables", nargs="+", help="Subset of tables to write")
+    args = parser.parse_args()
+
+    output = Path(args.output) if args.output else OUTPUT_DIR / f"scale_{args.scale:g}"
+    dataset = SyntheticDataset(Profile(args.data_dir), scale=args.scale, seed=args.seed)
+    print(f"Generating scale {args.scale:g} (seed {args.seed}) into {output}")
+    write_dataset(dataset, output, fmt=args.format, chunk_size=args.chunk_size, tables=args.tables)
+    print(f"Manifest written to {output / 'manifest.json'}")
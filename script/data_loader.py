@@ -0,0 +1,292 @@
+"""
+Bulk loader for the marketplace CSVs in data/.
+
+Streams each file into PostgreSQL with COPY FROM STDIN, so memory use stays
+flat regardless of file size. Tables are loaded in waves derived from the
+foreign keys in sql/0.tables.sql: every table in a wave only references
+tables from earlier waves, so the tables within a wave load in parallel on
+separate connections.
+
+Secondary indexes (those not backing a PRIMARY KEY/UNIQUE constraint) are
+dropped before the load and rebuilt afterwards, then every table is ANALYZEd.
+
+Usage:
+    python data_loader.py --data-dir ../data --workers 4 [--truncate] [--validate]
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from schema import dependency_waves, dependents, normalize_column_name, parse_schema
+from sql_generator.sql_via_python import query_executor
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+REPORT_PATH = Path(__file__).parent.parent / "result" / "load_report.json"
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+class _CountingReader(io.RawIOBase):
+    """File wrapper that counts bytes as COPY pulls them through."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.raw.readline(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def _open_data_file(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    return open(path, "rb", buffering=COPY_BUFFER_SIZE)
+
+
+def find_data_file(data_dir: Path, table: str):
+    """Return data/<table>.csv or data/<table>.csv.gz, or None."""
+    for name in (f"{table}.csv", f"{table}.csv.gz"):
+        path = Path(data_dir) / name
+        if path.exists():
+            return path
+    return None
+
+
+def read_header(path: Path, table) -> list:
+    """Read and normalize a CSV header, checking every column exists in the schema."""
+    with _open_data_file(path) as f:
+        header = f.readline().decode("utf-8-sig").strip()
+    columns = [normalize_column_name(column) for column in next(csv.reader([header]))]
+    unknown = [column for column in columns if column not in table.columns]
+    if unknown:
+        raise ValueError(f"{path.name}: columns not in table {table.name}: {unknown}")
+    return columns
+
+
+def _connect():
+    db = query_executor("")
+    db.connect_to_db()
+    return db
+
+
+def copy_table(table, path: Path) -> dict:
+    """COPY one CSV into its table on a dedicated connection."""
+    columns = read_header(path, table)
+    sql = (
+        f"COPY {table.name} ({', '.join(columns)}) "
+        f"FROM STDIN WITH (FORMAT csv, HEADER true)"
+    )
+
+    db = _connect()
+    try:
+        db.cur.execute("SET synchronous_commit = off")
+        start = time.perf_counter()
+        with _open_data_file(path) as raw:
+            reader = _CountingReader(raw)
+            db.cur.copy_expert(sql, reader, size=COPY_BUFFER_SIZE)
+        db.conn.commit()
+        elapsed = time.perf_counter() - start
+        rows = db.cur.rowcount
+    except Exception:
+        db.conn.rollback()
+        raise
+    finally:
+        db.close()
+
+    result = {
+        "table": table.name,
+        "rows": rows,
+        "bytes": reader.bytes_read,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed) if elapsed > 0 else None,
+        "mb_per_sec": round(reader.bytes_read / 1e6 / elapsed, 2) if elapsed > 0 else None,
+    }
+    print(
+        f"  {table.name:<22} {rows:>12,} rows  {elapsed:8.2f}s  "
+        f"{result['rows_per_sec'] or 0:>12,} rows/s"
+    )
+    return result
+
+
+def secondary_indexes(cur, tables) -> list:
+    """(table, index name, CREATE INDEX statement) for indexes not backing a constraint."""
+    cur.execute(
+        """
+        SELECT t.relname, i.relname, pg_get_indexdef(ix.indexrelid)
+        FROM pg_index ix
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = 'public'
+          AND t.relname = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = ix.indexrelid)
+        ORDER BY t.relname, i.relname
+        """,
+        (list(tables),),
+    )
+    return cur.fetchall()
+
+
+def _create_index(definition: str) -> float:
+    db = _connect()
+    try:
+        db.conn.autocommit = True
+        start = time.perf_counter()
+        db.cur.execute(definition)
+        return time.perf_counter() - start
+    finally:
+        db.close()
+
+
+def load_all(data_dir=DATA_DIR, workers: int = 4, truncate: bool = False,
+             defer_indexes: bool = True, tables=None) -> dict:
+    """
+    Load every data/<table>.csv in foreign-key wave order.
+
+    Args:
+        data_dir: Directory holding <table>.csv or <table>.csv.gz files
+        workers: Parallel COPY connections per wave
+        truncate: TRUNCATE the target tables before loading; every table referencing
+            them must be loaded too
+        defer_indexes: Drop secondary indexes during the load and rebuild them after
+        tables: Optional subset of table names to load
+
+    Returns:
+        Report dict with per-table results and phase timings
+    """
+    schema = parse_schema()
+    if tables:
+        unknown = set(tables) - set(schema)
+        if unknown:
+            raise ValueError(f"Unknown tables: {sorted(unknown)}")
+
+    files = {}
+    for name in schema:
+        if tables and name not in tables:
+            continue
+        path = find_data_file(data_dir, name)
+        if path is None:
+            print(f"No data file for {name}, skipping")
+            continue
+        files[name] = path
+
+    if truncate:
+        # TRUNCATE only the loaded tables; refuse rather than leave referencing rows dangling
+        outside = dependents(schema, files)
+        if outside:
+            raise ValueError(
+                f"--truncate would leave rows in {', '.join(sorted(outside))} referencing "
+                f"emptied tables; load them too (with data files) or drop --truncate"
+            )
+
+    report = {"tables": [], "indexes": [], "phases": {}}
+    total_start = time.perf_counter()
+
+    db = _connect()
+    try:
+        if truncate:
+            db.cur.execute(f"TRUNCATE {', '.join(files)}")
+        deferred = secondary_indexes(db.cur, files) if defer_indexes else []
+        for _, index, _ in deferred:
+            db.cur.execute(f"DROP INDEX IF EXISTS {index}")
+        db.conn.commit()
+    finally:
+        db.close()
+    if deferred:
+        print(f"Deferred {len(deferred)} secondary indexes until after the load")
+
+    load_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for number, wave in enumerate(dependency_waves(schema), start=1):
+                wave = [name for name in wave if name in files]
+                if not wave:
+                    continue
+                print(f"Wave {number}: {', '.join(wave)}")
+                futures = [
+                    executor.submit(copy_table, schema[name], files[name]) for name in wave
+                ]
+                # A failed wave aborts the load: later waves reference these tables
+                report["tables"].extend(future.result() for future in futures)
+    finally:
+        report["phases"]["copy_seconds"] = round(time.perf_counter() - load_start, 3)
+
+        # Rebuild deferred indexes even when a COPY failed, so the schema is left intact
+        index_start = time.perf_counter()
+        if deferred:
+            print(f"Rebuilding {len(deferred)} indexes")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                timings = executor.map(_create_index, [d for _, _, d in deferred])
+                for (table, index, _), seconds in zip(deferred, timings):
+                    report["indexes"].append(
+                        {"table": table, "index": index, "seconds": round(seconds, 3)}
+                    )
+        report["phases"]["index_seconds"] = round(time.perf_counter() - index_start, 3)
+
+    analyze_start = time.perf_counter()
+    db = _connect()
+    try:
+        db.conn.autocommit = True
+        for name in files:
+            db.cur.execute(f"ANALYZE {name}")
+    finally:
+        db.close()
+    report["phases"]["analyze_seconds"] = round(time.perf_counter() - analyze_start, 3)
+
+    total = time.perf_counter() - total_start
+    total_rows = sum(result["rows"] for result in report["tables"])
+    report["phases"]["total_seconds"] = round(total, 3)
+    report["total_rows"] = total_rows
+    report["rows_per_sec"] = round(total_rows / total) if total > 0 else None
+    print(f"Loaded {total_rows:,} rows in {total:.2f}s ({report['rows_per_sec']:,} rows/s)")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load data/*.csv with COPY")
+    parser.add_argument("--data-dir", default=str(DATA_DIR))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--truncate", action="store_true", help="Empty tables first")
+    parser.add_argument("--keep-indexes", action="store_true", help="Do not defer secondary indexes")
+    parser.add_argument("--tables", nargs="+", help="Subset of tables to load")
+    parser.add_argument("--report", default=str(REPORT_PATH))
+    parser.add_argument("--validate", action="store_true",
+                        help="Run preload_validation.py first and abort on failing checks")
+    args = parser.parse_args()
+
+    if args.validate:
+        from preload_validation import validate
+
+        validation = validate(Path(args.data_dir), tables=args.tables)
+        if validation["summary"]["checks_failed"]:
+            sys.exit("Validation failed, nothing loaded (see the validation report)")
+
+    report = load_all(
+        data_dir=Path(args.data_dir),
+        workers=args.workers,
+        truncate=args.truncate,
+        defer_indexes=not args.keep_indexes,
+        tables=args.tables,
+    )
+
+    Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report exported: {args.report}")
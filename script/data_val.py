@@ -1,24 +1,83 @@
-import os
-from sql_generator.sql_via_python import query_executor
-import pandas as pd
+"""
+Data quality checks over the loaded database.
+
+Every sql/validation/*.sql file is a check returning a single count of
+issues. Checks run concurrently on pooled connections. A check can opt into
+incremental mode with a header comment naming an increasing id column:
+
+    -- incremental: order_header.order_id
+    ... where oh.order_id > %(low)s and oh.order_id <= %(high)s
+
+Full runs scan (0, max id]; --incremental only scans rows above the id the
+previous run stopped at. Watermarks and per-check duration history are kept
+in result/validation_state.json so slow checks stand out.
+
+Usage:
+    python data_val.py --workers 4
+    python data_val.py --incremental
+"""
+
+import argparse
+import json
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import sys
+from pathlib import Path
+
+import pandas as pd
+
+from sql_generator.sql_via_python import pooled_connection
+
+VALIDATION_DIR = Path(__file__).parent.parent / "sql" / "validation"
+RESULT_DIR = Path(__file__).parent.parent / "result"
+STATE_PATH = RESULT_DIR / "validation_state.json"
+HISTORY_LENGTH = 50
+SLOW_FACTOR = 2.0
+
+_INCREMENTAL = re.compile(r"--\s*incremental:\s*(\w+)\.(\w+)", re.IGNORECASE)
 
 
 class DataValRunner:
-    """Run SQL analysis files and display results."""
+    """Run SQL validation checks and summarize the results."""
 
-    def __init__(self):
+    def __init__(self, validation_dir=VALIDATION_DIR, state_path=STATE_PATH):
+        self.validation_dir = Path(validation_dir)
+        self.state_path = Path(state_path)
         self.result = {}
         self.quality_issues = []
         self.quality_issues_count = 0
         self.total_checks = 0
         self.passed_checks = 0
         self.failed_checks = 0
+        self.durations = {}
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+
+    def _load_state(self) -> dict:
+        if self.state_path.exists():
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        else:
+            state = {}
+        state.setdefault("watermarks", {})
+        state.setdefault("history", {})
+        return state
+
+    def save_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+
+    def discover_checks(self) -> list:
+        """Names of every validation file, in file name order."""
+        return sorted(path.stem for path in self.validation_dir.glob("*.sql"))
 
     def read_sql_file(self, filename):
         """Read SQL file and extract queries."""
-        filepath = f"../sql/validation/{filename}.sql"
+        filepath = self.validation_dir / f"{filename}.sql"
 
         with open(filepath, "r") as f:
             content = f.read()
@@ -27,64 +86,122 @@ class DataValRunner:
         queries = [q.strip() for q in content.split(";") if q.strip()]
         return queries
 
-    def run_analysis_file(self, filename, check_name, csv_export=None, file_name=None):
-        self.total_checks += 1
+    def parse_check(self, filename) -> dict:
+        """First query of a validation file with comments removed, plus its watermark column."""
+        queries = self.read_sql_file(filename)
+        query = queries[0] if queries else ""
+        incremental = _INCREMENTAL.search(query)
+        sql_lines = [line for line in query.split("\n") if not line.strip().startswith("--")]
+        return {
+            "sql": "\n".join(sql_lines).strip(),
+            "watermark": incremental.groups() if incremental else None,
+        }
+
+    def _execute(self, check_name: str, check: dict, incremental: bool):
+        """Run one check on a pooled connection; returns (DataFrame or None, new watermark)."""
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("SET TRANSACTION READ ONLY")
+                params, high = None, None
+                if check["watermark"]:
+                    table, column = check["watermark"]
+                    cur.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+                    high = cur.fetchone()[0]
+                    low = self.state["watermarks"].get(check_name, 0) if incremental else 0
+                    if high <= low:
+                        return None, high
+                    params = {"low": low, "high": high}
+                cur.execute(check["sql"], params)
+                columns = [desc[0] for desc in cur.description] if cur.description else []
+                results = cur.fetchall()
+            finally:
+                cur.close()
+        df = pd.DataFrame(results, columns=columns) if results else pd.DataFrame()
+        return df, high
+
+    def run_analysis_file(self, filename, check_name=None, csv_export=None, file_name=None,
+                          incremental=False):
+        check_name = check_name or filename
+        start = time.perf_counter()
+        with self._lock:
+            self.total_checks += 1
 
         try:
-            queries = self.read_sql_file(filename)
-            query = queries[0] if queries else ""
-            sql_lines = [
-                line for line in query.split("\n") if not line.strip().startswith("--")
-            ]
-            clean_query = "\n".join(sql_lines).strip()
-
-            db = query_executor(clean_query)
-            db.connect_to_db()
-            results = db.execute()
-
-            if results:
-                columns = [desc[0] for desc in db.cur.description]
-                df = pd.DataFrame(results, columns=columns)
-                self.result[check_name] = df
-
-                if not df.empty:
-                    count = df.iloc[0, 0] if len(df.columns) > 0 else 0
-
-                    if count > 0:
-                        self.failed_checks += 1
-                        issue = {
-                            "check_name": check_name,
-                            "count": count,
-                            "description": f"Found {count:,} {check_name.replace('_', ' ')} issues",
-                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        }
-                        self.quality_issues.append(issue)
-                        self.quality_issues_count += count
-                        print(f"FAIL: {check_name} - {count:,} issues found")
-                    else:
-                        self.passed_checks += 1
-                        print(f"PASS: {check_name} - No issues found")
+            check = self.parse_check(filename)
+            df, high = self._execute(check_name, check, incremental)
+            count = df.iloc[0, 0] if df is not None and not df.empty and len(df.columns) > 0 else 0
+
+            with self._lock:
+                if df is not None:
+                    self.result[check_name] = df
+                if count > 0:
+                    self.failed_checks += 1
+                    issue = {
+                        "check_name": check_name,
+                        "count": count,
+                        "description": f"Found {count:,} {check_name.replace('_', ' ')} issues",
+                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    }
+                    self.quality_issues.append(issue)
+                    self.quality_issues_count += count
+                    print(f"FAIL: {check_name} - {count:,} issues found")
                 else:
                     self.passed_checks += 1
-                    print(f"PASS: {check_name} - No data returned")
-
-                if csv_export and not df.empty:
-                    csv_path = f"../result/{file_name}.csv"
-                    df.to_csv(csv_path, index=False)
-                    print(f"Exported: {csv_path}")
-
-            else:
-                self.passed_checks += 1
-                print(f"PASS: {check_name} - No results returned")
+                    if df is None:
+                        print(f"PASS: {check_name} - No new rows since the last run")
+                    else:
+                        print(f"PASS: {check_name} - No issues found")
+                if high is not None:
+                    self.state["watermarks"][check_name] = int(high)
 
-            db.close()
+            if csv_export and df is not None and not df.empty:
+                csv_path = RESULT_DIR / f"{file_name or check_name}.csv"
+                df.to_csv(csv_path, index=False)
+                print(f"Exported: {csv_path}")
 
         except Exception as e:
-            self.failed_checks += 1
+            with self._lock:
+                self.failed_checks += 1
             print(f"ERROR: {check_name} - {str(e)}")
+        finally:
+            self._record_duration(check_name, time.perf_counter() - start, incremental)
+
+        return self.result
 
+    def _record_duration(self, check_name: str, seconds: float, incremental: bool):
+        with self._lock:
+            self.durations[check_name] = seconds
+            history = self.state["history"].setdefault(check_name, [])
+            history.append({
+                "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "ms": round(seconds * 1000, 2),
+                "mode": "incremental" if incremental else "full",
+            })
+            del history[:-HISTORY_LENGTH]
+
+    def run_all(self, checks=None, workers: int = 4, incremental: bool = False):
+        """Run every discovered check (or the given names) concurrently."""
+        names = checks or self.discover_checks()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(
+                lambda name: self.run_analysis_file(name, name, incremental=incremental), names
+            ))
+        self.save_state()
         return self.result
 
+    def slow_checks(self, factor: float = SLOW_FACTOR) -> list:
+        """Checks whose latest run took more than factor x their median over earlier runs."""
+        slow = []
+        for name, seconds in self.durations.items():
+            previous = [entry["ms"] for entry in self.state["history"].get(name, [])[:-1]]
+            if len(previous) < 3:
+                continue
+            median = statistics.median(previous)
+            if median > 0 and seconds * 1000 > factor * median:
+                slow.append({"check": name, "ms": round(seconds * 1000, 2), "median_ms": median})
+        return slow
+
     def print_summary(self):
         """Print a concise summary of all data validation results."""
         print("== SUMMARY ==")
@@ -104,11 +221,18 @@ class DataValRunner:
         else:
             print("\nNo data quality issues found")
 
+        if self.durations:
+            print("\nDurations:")
+            for name, seconds in sorted(self.durations.items(), key=lambda item: -item[1]):
+                print(f"  {name}: {seconds * 1000:.1f} ms")
+        for slow in self.slow_checks():
+            print(f"  SLOW: {slow['check']} took {slow['ms']:.1f} ms (median {slow['median_ms']:.1f} ms)")
+
         print(f"\nCompleted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     def export_summary_report(self, filename="data_validation_report.txt"):
         """Export a text summary report to file."""
-        report_path = f"../result/{filename}"
+        report_path = RESULT_DIR / filename
 
         with open(report_path, "w") as f:
             f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
@@ -132,18 +256,30 @@ class DataValRunner:
                     f.write(f"  Description: {issue['description']}\n")
                     f.write(f"  Timestamp: {issue['timestamp']}\n\n")
 
+            if self.durations:
+                f.write("DURATIONS\n")
+                f.write("-" * 9 + "\n")
+                slow = {s["check"] for s in self.slow_checks()}
+                for name, seconds in sorted(self.durations.items(), key=lambda item: -item[1]):
+                    flag = "  (slow)" if name in slow else ""
+                    f.write(f"• {name}: {seconds * 1000:.1f} ms{flag}\n")
+
         print(f"Report exported: {report_path}")
         return report_path
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run sql/validation checks")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only scan rows past each check's stored watermark")
+    parser.add_argument("--checks", nargs="+", help="Run only these checks")
+    args = parser.parse_args()
+
     runner = DataValRunner()
     print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    runner.run_analysis_file("product_without_seller", "product_without_seller")
-    runner.run_analysis_file("missing_email", "missing_email")
-    runner.run_analysis_file("price_val", "price_val")
-    runner.run_analysis_file("orders_without_payment", "orders_without_payment")
+    runner.run_all(args.checks, workers=args.workers, incremental=args.incremental)
 
     runner.print_summary()
     runner.export_summary_report()
@@ -0,0 +1,306 @@
+"""
+Background job queue for long-running API work.
+
+POST /jobs/analyze enqueues an analysis and returns a job id at once.
+Clients poll GET /jobs/{id} or follow GET /jobs/{id}/events (SSE) for
+progress. Jobs run on their own small worker pool, so they never hold
+FastAPI's request threads.
+
+- Jobs persist in SQLite (JOBS_DB_PATH, default result/jobs.db).
+- Finished jobs are deleted after JOB_RETENTION_HOURS (default 24).
+- On startup, jobs left queued by a previous process are queued again.
+  Jobs left running are marked failed.
+
+Scheduling:
+
+- JOB_WORKERS threads (default 2) run jobs.
+- JOB_QUEUE_MAX (default 100) caps queued jobs across all users.
+- JOB_MAX_PER_USER (default 10) caps queued jobs per user.
+- Workers take jobs round-robin across users. One user's backlog delays
+  others by at most one job per worker.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+
+import tracing
+from metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent / "result" / "jobs.db"
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+MAX_EVENTS = 200
+
+JOBS_FINISHED = Counter("jobs_finished_total", "Background jobs by kind and final status.", ["kind", "status"])
+
+
+class QueueFull(Exception):
+    """The global queue or the user's share of it is full."""
+
+    def __init__(self, message: str, per_user: bool):
+        super().__init__(message)
+        self.per_user = per_user
+
+
+class JobStore:
+    """Jobs table in SQLite; all access goes through one lock-protected connection."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("JOBS_DB_PATH", DEFAULT_DB_PATH))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                events TEXT NOT NULL DEFAULT '[]',
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, finished_at);
+        """)
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+            self.conn.commit()
+            return cursor
+
+    def create(self, user: str, kind: str, payload: dict) -> dict:
+        job = {"id": uuid.uuid4().hex, "user": user, "kind": kind, "status": "queued",
+               "payload": payload, "created_at": time.time()}
+        self._execute(
+            "INSERT INTO jobs (id, user, kind, status, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job["id"], user, kind, "queued", json.dumps(payload), job["created_at"]),
+        )
+        return job
+
+    def update(self, job_id: str, **fields):
+        for key in ("result", "events"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], default=str)
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, user: str = None, limit: int = 50) -> list:
+        with self._lock:
+            if user is None:
+                rows = self.conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+            else:
+                rows = self.conn.execute(
+                    "SELECT * FROM jobs WHERE user = ? ORDER BY created_at DESC LIMIT ?", (user, limit)
+                )
+            rows = rows.fetchall()
+        return [self._to_dict(row, with_result=False) for row in rows]
+
+    def recover(self) -> list:
+        """Fail jobs interrupted mid-run and return jobs still queued, oldest first."""
+        self._execute(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by a server restart', finished_at = ? "
+            "WHERE status = 'running'",
+            (time.time(),),
+        )
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def purge(self, older_than_seconds: float) -> int:
+        cursor = self._execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(TERMINAL_STATUSES))}) AND finished_at < ?",
+            (*TERMINAL_STATUSES, time.time() - older_than_seconds),
+        )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    @staticmethod
+    def _to_dict(row, with_result: bool = True) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["events"] = json.loads(job["events"])
+        job["result"] = json.loads(job["result"]) if with_result and job["result"] else None
+        return job
+
+
+class JobQueue:
+    """Per-user FIFO queues served round-robin by a fixed pool of worker threads."""
+
+    def __init__(self, store: JobStore, handlers: dict, workers: int = None, max_queued: int = None,
+                 max_per_user: int = None, retention_hours: float = None):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers or int(os.getenv("JOB_WORKERS", 2))
+        self.max_queued = max_queued or int(os.getenv("JOB_QUEUE_MAX", 100))
+        self.max_per_user = max_per_user or int(os.getenv("JOB_MAX_PER_USER", 10))
+        self.retention = 3600 * float(
+            retention_hours if retention_hours is not None else os.getenv("JOB_RETENTION_HOURS", 24)
+        )
+        # user -> deque of job ids; OrderedDict order is the round-robin order
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._events = {}
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._threads = []
+        REGISTRY.register_collector(self._metrics)
+
+    def start(self):
+        for job in self.store.recover():
+            self._push(job["user"], job["id"])
+        self.store.purge(self.retention)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Job queue started", extra={"workers": self.workers, "recovered": self._queued})
+
+    def stop(self, timeout: float = 5.0):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def _push(self, user: str, job_id: str):
+        self._queues.setdefault(user, deque()).append(job_id)
+        self._queued += 1
+
+    def submit(self, user: str, kind: str, payload: dict) -> dict:
+        """Persist and enqueue a job; raises QueueFull when a limit is reached."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with self._condition:
+            if self._queued >= self.max_queued:
+                raise QueueFull("Job queue is full; try again later", per_user=False)
+            if len(self._queues.get(user, ())) >= self.max_per_user:
+                raise QueueFull(f"At most {self.max_per_user} queued jobs per user", per_user=True)
+            job = self.store.create(user, kind, payload)
+            self._push(user, job["id"])
+            job["queue_position"] = self._queued
+            self._condition.notify()
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet."""
+        with self._condition:
+            for user, queue in self._queues.items():
+                if job_id in queue:
+                    queue.remove(job_id)
+                    self._queued -= 1
+                    if not queue:
+                        del self._queues[user]
+                    break
+            else:
+                return False
+        self.store.update(job_id, status="cancelled", finished_at=time.time())
+        return True
+
+    def _next(self):
+        """Pop the head of the next user's queue and rotate that user to the back."""
+        user, queue = next(iter(self._queues.items()))
+        job_id = queue.popleft()
+        del self._queues[user]
+        if queue:
+            self._queues[user] = queue
+        self._queued -= 1
+        return job_id
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queues and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                job_id = self._next()
+                self._running += 1
+            try:
+                self._run(job_id)
+            finally:
+                with self._condition:
+                    self._running -= 1
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        self.store.update(job_id, status="running", started_at=time.time())
+        events = self._events[job_id] = []
+
+        def progress(**event):
+            event["at"] = time.time()
+            if len(events) < MAX_EVENTS:
+                events.append(event)
+                self.store.update(job_id, events=events)
+
+        status, result, error = "failed", None, None
+        with tracing.start_trace(f"job.{job['kind']}", job_id=job_id, user=job["user"]) as root:
+            try:
+                result = self.handlers[job["kind"]](job["payload"], progress)
+                if isinstance(result, dict) and result.get("status") == "error":
+                    error = result.get("error") or result.get("message")
+                else:
+                    status = "succeeded"
+            except Exception as e:
+                logger.exception("Job %s failed: %s", job_id, e)
+                error = str(e)
+            if root is not None and status == "failed":
+                root.fail(error)
+        self.store.update(job_id, status=status, result=result, error=error, finished_at=time.time())
+        self._events.pop(job_id, None)
+        JOBS_FINISHED.inc(kind=job["kind"], status=status)
+        if self.retention:
+            self.store.purge(self.retention)
+
+    def events(self, job_id: str) -> list:
+        """Progress events of a running job (from memory), else from the store."""
+        if job_id in self._events:
+            return list(self._events[job_id])
+        job = self.store.get(job_id)
+        return job["events"] if job else []
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "queued": self._queued,
+                "running": self._running,
+                "users_waiting": len(self._queues),
+                "max_queued": self.max_queued,
+                "max_per_user": self.max_per_user,
+            }
+
+    def _metrics(self):
+        stats = self.stats()
+        return [
+            ("jobs_in_queue", "gauge", "Background jobs by state.",
+             [({"state": "queued"}, stats["queued"]), ({"state": "running"}, stats["running"])]),
+            ("jobs_workers", "gauge", "Background job worker threads (JOB_WORKERS).",
+             [({}, stats["workers"])]),
+        ]
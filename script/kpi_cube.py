@@ -0,0 +1,485 @@
+"""
+In-memory OLAP cube for marketplace KPIs.
+
+Orders are pre-aggregated into cells at the finest grain of the dimensions
+(year, month, category, state, seller, carrier). Dimension values are
+dictionary-encoded into int32 codes and measures (revenue, orders,
+quantity) are stored as float64 columns, so group-by, rollup and top-N are
+a few vectorized NumPy passes over the cells instead of a DB round trip.
+
+New orders are folded in incrementally: append_from_db() only reads orders
+with an order_id above the cube's watermark. Payments have their own
+watermark, so a payment that arrives after its order was folded in adds its
+amount to that order's cell. from_snapshot() builds the cube from a Parquet
+snapshot (snapshot_export.py) without touching the database.
+
+Usage:
+    cube = KPICube.from_db()
+    cube.query(group_by=["year", "month"], filters={"category": "Smartphones"})
+    cube.query(group_by=["seller"], order_by="revenue", limit=5)
+    cube.rollup(["year", "month"])
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ("year", "month", "category", "state", "seller", "carrier")
+MEASURES = ("revenue", "orders", "quantity")
+
+logger = logging.getLogger(__name__)
+
+# One row per order; revenue counts payments up to the payment watermark and is
+# 0 for orders without a payment yet
+FACT_SQL = """
+SELECT
+    h.order_id,
+    EXTRACT(YEAR FROM h.order_date)::INTEGER AS year,
+    EXTRACT(MONTH FROM h.order_date)::INTEGER AS month,
+    p.category,
+    c.state,
+    p.seller_id AS seller,
+    s.carrier,
+    h.quantity,
+    COALESCE(pay.amount, 0) AS revenue
+FROM order_header AS h
+JOIN product AS p ON h.product_id = p.product_id
+JOIN customer AS c ON h.customer_id = c.customer_id
+LEFT JOIN shipping AS s ON h.shipping_id = s.shipping_id
+LEFT JOIN (
+    SELECT order_id, SUM(amount) AS amount
+    FROM payment
+    WHERE order_id > %(orders_after)s AND payment_id <= %(payments_upto)s
+    GROUP BY order_id
+) AS pay ON pay.order_id = h.order_id
+WHERE h.order_id > %(orders_after)s
+ORDER BY h.order_id
+"""
+
+# Payments that arrived after their order was folded in: revenue only, no order or quantity
+LATE_PAYMENT_SQL = """
+SELECT
+    EXTRACT(YEAR FROM h.order_date)::INTEGER AS year,
+    EXTRACT(MONTH FROM h.order_date)::INTEGER AS month,
+    p.category,
+    c.state,
+    p.seller_id AS seller,
+    s.carrier,
+    0 AS quantity,
+    0 AS orders,
+    pay.amount AS revenue
+FROM payment AS pay
+JOIN order_header AS h ON pay.order_id = h.order_id
+JOIN product AS p ON h.product_id = p.product_id
+JOIN customer AS c ON h.customer_id = c.customer_id
+LEFT JOIN shipping AS s ON h.shipping_id = s.shipping_id
+WHERE pay.payment_id > %(payments_after)s AND pay.payment_id <= %(payments_upto)s
+  AND h.order_id <= %(orders_upto)s
+"""
+
+# Above this many possible groups, group ids come from np.unique instead of bincount
+_DENSE_GROUP_LIMIT = 1 << 22
+
+
+def fact_frame(tables: dict) -> pd.DataFrame:
+    """
+    Build the cube's fact rows from base tables held as DataFrames.
+
+    Args:
+        tables: {table name: DataFrame} with schema column names for
+            order_header, product, customer, shipping and payment
+
+    Returns:
+        DataFrame with order_id, the dimensions, quantity and revenue
+    """
+    orders = tables["order_header"]
+    frame = (
+        orders[["order_id", "customer_id", "product_id", "shipping_id", "quantity", "order_date"]]
+        .merge(tables["product"][["product_id", "category", "seller_id"]], on="product_id")
+        .merge(tables["customer"][["customer_id", "state"]], on="customer_id")
+        .merge(tables["shipping"][["shipping_id", "carrier"]], on="shipping_id", how="left")
+        .merge(tables["payment"][["order_id", "amount"]], on="order_id", how="left")
+    )
+    order_date = pd.to_datetime(frame["order_date"])
+    return pd.DataFrame({
+        "order_id": frame["order_id"].to_numpy(),
+        "year": order_date.dt.year.to_numpy(),
+        "month": order_date.dt.month.to_numpy(),
+        "category": frame["category"].to_numpy(),
+        "state": frame["state"].to_numpy(),
+        "seller": frame["seller_id"].to_numpy(),
+        "carrier": frame["carrier"].to_numpy(),
+        "quantity": frame["quantity"].to_numpy(),
+        "revenue": frame["amount"].fillna(0).astype(float).to_numpy(),
+    })
+
+
+class KPICube:
+    """Dictionary-encoded, pre-aggregated cube over orders."""
+
+    def __init__(self, dimensions=DIMENSIONS):
+        self.dimensions = tuple(dimensions)
+        self._dims = {dim: i for i, dim in enumerate(self.dimensions)}
+        self._values = {dim: [] for dim in self.dimensions}  # code -> value
+        self._codes = {dim: {} for dim in self.dimensions}  # value -> code
+        self._cells = np.zeros((0, len(self.dimensions)), dtype=np.int32)
+        self._measures = np.zeros((0, len(MEASURES)), dtype=np.float64)
+        self._cell_index = {}
+        self._cuboids = {}  # dims tuple -> (group codes, measures)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.watermark = 0  # highest order_id folded into the cube
+        self.payment_watermark = 0  # highest payment_id folded into the cube
+        self.refreshed_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, dimensions=DIMENSIONS):
+        cube = cls(dimensions)
+        cube.append(frame)
+        return cube
+
+    @classmethod
+    def from_db(cls, dimensions=DIMENSIONS):
+        cube = cls(dimensions)
+        cube.append_from_db()
+        return cube
+
+    @classmethod
+    def from_snapshot(cls, snapshot_dir, dimensions=DIMENSIONS):
+        """Build from a Parquet snapshot written by snapshot_export.py."""
+        snapshot_dir = Path(snapshot_dir)
+        tables = {}
+        for name in ("order_header", "product", "customer", "shipping", "payment"):
+            path = snapshot_dir / f"{name}.parquet"
+            tables[name] = pd.read_parquet(path if path.exists() else snapshot_dir / name)
+        cube = cls.from_frame(fact_frame(tables), dimensions)
+        if len(tables["payment"]) and "payment_id" in tables["payment"]:
+            cube.payment_watermark = int(tables["payment"]["payment_id"].max())
+        return cube
+
+    def _encode(self, dim: str, values: np.ndarray) -> np.ndarray:
+        """Map raw values to codes, assigning new codes to unseen values."""
+        values = pd.Series(values).where(pd.notna(values), None).to_numpy(dtype=object)
+        inverse, uniques = pd.factorize(values, use_na_sentinel=False)
+        lookup = self._codes[dim]
+        mapped = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            value = value.item() if isinstance(value, np.generic) else value
+            if value is not None and pd.isna(value):
+                value = None  # factorize turns None into NaN
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(self._values[dim])
+                self._values[dim].append(value)
+            mapped[i] = code
+        return mapped[inverse]
+
+    def _grow(self, needed: int):
+        capacity = len(self._cells)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        cells = np.zeros((capacity, len(self.dimensions)), dtype=np.int32)
+        measures = np.zeros((capacity, len(MEASURES)), dtype=np.float64)
+        cells[: self._size] = self._cells[: self._size]
+        measures[: self._size] = self._measures[: self._size]
+        self._cells, self._measures = cells, measures
+
+    def append(self, frame: pd.DataFrame) -> int:
+        """
+        Fold fact rows (one per order) into the cube.
+
+        An optional "orders" column overrides the per-row order count, so
+        revenue-only rows (late payments) can be folded in with orders = 0.
+
+        Returns:
+            Number of fact rows added
+        """
+        if frame.empty:
+            return 0
+        with self._lock:
+            codes = np.column_stack([self._encode(dim, frame[dim].to_numpy()) for dim in self.dimensions])
+            values = np.column_stack([
+                frame["revenue"].to_numpy(dtype=np.float64),
+                frame["orders"].to_numpy(dtype=np.float64) if "orders" in frame else np.ones(len(frame)),
+                frame["quantity"].to_numpy(dtype=np.float64),
+            ])
+
+            # Aggregate the batch to cells first, then merge cell by cell
+            batch_cells, inverse = np.unique(codes, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            batch_measures = np.column_stack([
+                np.bincount(inverse, weights=values[:, m], minlength=len(batch_cells))
+                for m in range(len(MEASURES))
+            ])
+
+            self._grow(self._size + len(batch_cells))
+            for cell, measures in zip(map(tuple, batch_cells.tolist()), batch_measures):
+                row = self._cell_index.get(cell)
+                if row is None:
+                    row = self._cell_index[cell] = self._size
+                    self._cells[row] = cell
+                    self._size += 1
+                self._measures[row] += measures
+
+            self._cuboids.clear()
+            if "order_id" in frame:
+                self.watermark = max(self.watermark, int(frame["order_id"].max()))
+            self.refreshed_at = time.time()
+        return len(frame)
+
+    def append_from_db(self) -> int:
+        """
+        Append orders newer than the watermark from the database, plus the
+        revenue of payments newer than the payment watermark for orders
+        already in the cube.
+
+        Both reads are bounded by the payment_id high-water mark taken first,
+        so a payment is counted either with its order or as a late payment,
+        never twice. A payment committed with an id below the payment
+        watermark is missed until the cube is rebuilt.
+
+        Returns:
+            Number of new orders added
+        """
+        from sql_generator.sql_via_python import query_executor
+
+        db = query_executor("")
+        db.connect_to_db()
+        try:
+            db.cur.execute("SELECT COALESCE(MAX(payment_id), 0) FROM payment")
+            payments_upto = max(int(db.cur.fetchone()[0]), self.payment_watermark)
+            db.cur.execute(FACT_SQL, {"orders_after": self.watermark, "payments_upto": payments_upto})
+            columns = [desc[0] for desc in db.cur.description]
+            frame = pd.DataFrame(db.cur.fetchall(), columns=columns)
+            late = None
+            if self.watermark and payments_upto > self.payment_watermark:
+                db.cur.execute(LATE_PAYMENT_SQL, {
+                    "payments_after": self.payment_watermark,
+                    "payments_upto": payments_upto,
+                    "orders_upto": self.watermark,
+                })
+                columns = [desc[0] for desc in db.cur.description]
+                late = pd.DataFrame(db.cur.fetchall(), columns=columns)
+        finally:
+            db.close()
+        added = self.append(frame)
+        if late is not None and not late.empty:
+            self.append(late)
+            logger.info("KPI cube: folded in %d late payments", len(late))
+        self.payment_watermark = payments_upto
+        return added
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+
+    def _aggregate(self, keys: np.ndarray, measures: np.ndarray, dims) -> tuple:
+        """Sum measures per distinct key row; returns (group codes, measures)."""
+        if not dims:
+            return np.zeros((1, 0), dtype=np.int32), measures.sum(axis=0, keepdims=True)
+        shape = tuple(max(len(self._values[dim]), 1) for dim in dims)
+        if np.prod(shape, dtype=np.float64) <= _DENSE_GROUP_LIMIT:
+            flat = np.ravel_multi_index(keys.T, shape) if len(keys) else np.zeros(0, dtype=np.int64)
+            size = int(np.prod(shape))
+            counts = np.bincount(flat, minlength=size)
+            present = np.flatnonzero(counts)
+            sums = np.column_stack([
+                np.bincount(flat, weights=measures[:, m], minlength=size)[present]
+                for m in range(len(MEASURES))
+            ])
+            if len(present):
+                groups = np.column_stack(np.unravel_index(present, shape)).astype(np.int32)
+            else:
+                groups = np.zeros((0, len(dims)), dtype=np.int32)
+        else:
+            groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            sums = np.column_stack([
+                np.bincount(inverse, weights=measures[:, m], minlength=len(groups))
+                for m in range(len(MEASURES))
+            ])
+        return groups, sums
+
+    def _cuboid(self, dims: tuple) -> tuple:
+        """
+        The cube projected onto dims, built on first use and cached until the next append.
+
+        Fine-grained cells are close to one per order once seller and state are in
+        the key, so queries run against the smallest cuboid covering their group-by
+        and filter dimensions instead.
+        """
+        cuboid = self._cuboids.get(dims)
+        if cuboid is None:
+            columns = [self._dims[dim] for dim in dims]
+            keys = self._cells[: self._size][:, columns]
+            cuboid = self._cuboids[dims] = self._aggregate(keys, self._measures[: self._size], dims)
+        return cuboid
+
+    def _mask(self, dims: tuple, keys: np.ndarray, filters: dict) -> np.ndarray:
+        mask = np.ones(len(keys), dtype=bool)
+        for dim, wanted in filters.items():
+            if not isinstance(wanted, (list, tuple, set)):
+                wanted = [wanted]
+            lookup = self._codes[dim]
+            codes = [lookup[v] for v in wanted if v in lookup]
+            column = keys[:, dims.index(dim)]
+            mask &= np.isin(column, codes) if len(codes) != 1 else column == codes[0]
+        return mask
+
+    def _group(self, group_by, filters: dict):
+        """Aggregate the cells matching filters by group_by; returns (group codes, measures)."""
+        filters = filters or {}
+        for dim in filters:
+            if dim not in self._dims:
+                raise ValueError(f"Unknown dimension: {dim}")
+        used = set(group_by) | set(filters)
+        dims = tuple(dim for dim in self.dimensions if dim in used)
+        keys, measures = self._cuboid(dims)
+        if filters:
+            mask = self._mask(dims, keys, filters)
+            keys, measures = keys[mask], measures[mask]
+        if list(dims) == list(group_by):
+            return keys, measures
+        columns = [dims.index(dim) for dim in group_by]
+        return self._aggregate(keys[:, columns], measures, group_by)
+
+    def _ranks(self, dim: str) -> np.ndarray:
+        """Code -> position of its value in sorted order (None last)."""
+        values = self._values[dim]
+        ranks = np.empty(len(values), dtype=np.int64)
+        ranks[sorted(range(len(values)), key=lambda code: _sort_key(values[code]))] = np.arange(len(values))
+        return ranks
+
+    def _rows(self, group_by, groups, sums, order):
+        rows = []
+        for i in order:
+            row = {dim: self._values[dim][groups[i, j]] for j, dim in enumerate(group_by)}
+            row["revenue"] = round(float(sums[i, 0]), 2)
+            row["orders"] = int(sums[i, 1])
+            row["quantity"] = int(sums[i, 2])
+            rows.append(row)
+        return rows
+
+    def query(self, group_by=(), filters: dict = None, order_by: str = None,
+              limit: int = None, ascending: bool = False) -> list:
+        """
+        Aggregate revenue, orders and quantity.
+
+        Args:
+            group_by: Dimensions to group by (empty for a grand total)
+            filters: {dimension: value or list of values} slice
+            order_by: A measure to sort by (default: group_by dimensions)
+            limit: Keep only the top N groups by order_by
+            ascending: Sort ascending instead of descending
+
+        Returns:
+            List of {dimension..., "revenue", "orders", "quantity"} dicts
+        """
+        group_by = list(group_by or [])
+        for dim in group_by:
+            if dim not in self._dims:
+                raise ValueError(f"Unknown dimension: {dim}")
+        with self._lock:
+            groups, sums = self._group(group_by, filters)
+            if order_by is not None:
+                if order_by not in MEASURES:
+                    raise ValueError(f"Unknown measure: {order_by}")
+                column = sums[:, MEASURES.index(order_by)]
+                column = column if ascending else -column
+                candidates = np.arange(len(column))
+                if limit is not None and limit < len(column):
+                    # Keep every group tied with the Nth so ties are broken below, not arbitrarily
+                    cutoff = np.partition(column, limit - 1)[limit - 1]
+                    candidates = np.flatnonzero(column <= cutoff)
+                # Like ORDER BY measure, dimensions...: ties go to the smaller dimension values
+                keys = [self._ranks(dim)[groups[candidates, j]] for j, dim in reversed(list(enumerate(group_by)))]
+                order = candidates[np.lexsort(keys + [column[candidates]])][:limit]
+            else:
+                # Sort by decoded dimension values so output is stable and readable
+                order = sorted(
+                    range(len(groups)),
+                    key=lambda i: tuple(
+                        _sort_key(self._values[dim][groups[i, j]]) for j, dim in enumerate(group_by)
+                    ),
+                )[:limit]
+            return self._rows(group_by, groups, sums, order)
+
+    def rollup(self, group_by, filters: dict = None) -> list:
+        """
+        SQL-style ROLLUP: subtotals for every prefix of group_by plus the grand total.
+
+        Rolled-up dimensions are None in the returned rows.
+        """
+        rows = []
+        for level in range(len(group_by), -1, -1):
+            for row in self.query(group_by[:level], filters):
+                rows.append({
+                    **{dim: row.get(dim) for dim in group_by},
+                    **{measure: row[measure] for measure in MEASURES},
+                })
+        return rows
+
+    def coerce(self, dim: str, raw_values) -> list:
+        """Convert string filter values (e.g. from a query string) to the dimension's type."""
+        sample = next((v for v in self._values[dim] if v is not None), None)
+        if isinstance(sample, int):
+            return [int(v) for v in raw_values]
+        if isinstance(sample, float):
+            return [float(v) for v in raw_values]
+        return list(raw_values)
+
+    def members(self, dim: str) -> list:
+        """Distinct values of a dimension."""
+        return sorted(self._values[dim], key=_sort_key)
+
+    def stats(self) -> dict:
+        return {
+            "cells": self._size,
+            "cuboids": len(self._cuboids),
+            "orders": int(self._measures[: self._size, 1].sum()),
+            "watermark": self.watermark,
+            "payment_watermark": self.payment_watermark,
+            "refreshed_at": self.refreshed_at,
+            "dimensions": {dim: len(self._values[dim]) for dim in self.dimensions},
+        }
+
+    # ------------------------------------------------------------------
+    # Background refresh
+    # ------------------------------------------------------------------
+
+    def start_background_refresh(self, interval: float = 60.0):
+        """Append new orders from the database every interval seconds."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    added = self.append_from_db()
+                    if added:
+                        logger.info("KPI cube: appended %d orders (watermark %s)", added, self.watermark)
+                except Exception as e:
+                    logger.warning("KPI cube refresh failed: %s", e)
+
+        self._thread = threading.Thread(target=loop, name="kpi-cube-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def _sort_key(value):
+    """Sort None last; values within one dimension share a type."""
+    return (value is None, value)
@@ -1,46 +1,45 @@
 """
-LangSmith Configuration and Setup
-Enables tracing and monitoring for LangChain components.
+LangSmith Configuration
+Settings for the optional LangSmith trace exporter (see tracing.py).
+
+Set these in your .env file:
+- TRACE_EXPORTERS=langsmith (or e.g. jsonl,langsmith)
+- LANGCHAIN_API_KEY=your_langsmith_api_key
+- LANGCHAIN_PROJECT=rdms (optional, defaults to 'rdms')
+
+Only sampled, failed and slow traces are sent. LangChain's own per-call
+tracing (LANGCHAIN_TRACING_V2=true) is left to the environment and is no
+longer switched on here.
 """
 
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 def setup_langsmith():
     """
-    Configure LangSmith tracing environment variables.
-    Set these in your .env file:
-    - LANGCHAIN_TRACING_V2=true
-    - LANGCHAIN_API_KEY=your_langsmith_api_key
-    - LANGCHAIN_PROJECT=rdms (optional, defaults to 'rdms')
-    """
-    # Enable LangSmith tracing
-    if os.environ.get("LANGCHAIN_TRACING_V2") != "true":
-        os.environ["LANGCHAIN_TRACING_V2"] = "true"
+    Set the LangSmith project name and check for an API key.
 
+    Returns True when LANGCHAIN_API_KEY is available.
+    """
     # Set project name if not already set
     if not os.environ.get("LANGCHAIN_PROJECT"):
-        os.environ["LANGCHAIN_PROJECT"] = os.environ.get("LANGCHAIN_PROJECT", "rdms")
+        os.environ["LANGCHAIN_PROJECT"] = "rdms"
 
     # Check if API key is set
     api_key = os.environ.get("LANGCHAIN_API_KEY")
     if not api_key:
-        print(
-            "Warning: LANGCHAIN_API_KEY not found in environment variables. "
-            "LangSmith tracing will not work without an API key. "
+        logger.warning(
+            "LANGCHAIN_API_KEY not found in environment variables. "
+            "LangSmith export will not work without an API key. "
             "Get your API key from https://smith.langchain.com/"
         )
         return False
 
-    print(
-        f"LangSmith tracing enabled for project: {os.environ.get('LANGCHAIN_PROJECT')}"
-    )
+    logger.info("LangSmith export enabled for project: %s", os.environ.get("LANGCHAIN_PROJECT"))
     return True
-
-
-# Auto-setup when module is imported
-if __name__ != "__main__":
-    setup_langsmith()
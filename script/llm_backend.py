@@ -0,0 +1,158 @@
+"""
+Chat and embedding model factory.
+
+LLM_BACKEND selects the backend:
+
+- openai (default): ChatOpenAI / OpenAIEmbeddings
+- fake: in-process models with canned, schema-valid answers and a
+  configurable delay (FAKE_LLM_LATENCY seconds, default 0.05, plus up to
+  FAKE_LLM_JITTER seconds). No API key is needed and nothing leaves the
+  process, so profiling and load tests measure our own code paths.
+
+The fake chat model follows the prompts in ai_helpers/ai_sql:
+
+- it answers classification with SQL
+- it answers SQL generation with a query picked by keyword
+- it answers judging with YES
+- it calls one chatbot tool when the question mentions orders, reviews or
+  return/shipping policy
+"""
+
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage
+
+load_dotenv()
+
+EMBEDDING_SIZE = 1536
+
+# First matching keyword wins; queries run on PostgreSQL and the embedded backend
+CANNED_SQL = [
+    ("revenue", """SELECT EXTRACT(YEAR FROM oh.order_date) AS year, EXTRACT(MONTH FROM oh.order_date) AS month,
+       SUM(oh.quantity * p.product_price) AS revenue
+FROM order_header oh JOIN product p ON p.product_id = oh.product_id
+GROUP BY 1, 2 ORDER BY 1, 2"""),
+    ("customer", """SELECT c.customer_id, c.first_name, c.last_name, COUNT(*) AS orders,
+       SUM(oh.quantity * p.product_price) AS spent
+FROM order_header oh
+JOIN customer c ON c.customer_id = oh.customer_id
+JOIN product p ON p.product_id = oh.product_id
+GROUP BY c.customer_id, c.first_name, c.last_name ORDER BY spent DESC LIMIT 10"""),
+    ("state", """SELECT c.state, COUNT(*) AS orders FROM order_header oh
+JOIN customer c ON c.customer_id = oh.customer_id GROUP BY c.state ORDER BY orders DESC"""),
+    ("carrier", """SELECT s.carrier, COUNT(*) AS shipments FROM order_header oh
+JOIN shipping s ON s.shipping_id = oh.shipping_id GROUP BY s.carrier ORDER BY shipments DESC"""),
+    ("", """SELECT p.category, SUM(oh.quantity) AS units, SUM(oh.quantity * p.product_price) AS revenue
+FROM order_header oh JOIN product p ON p.product_id = oh.product_id
+GROUP BY p.category ORDER BY revenue DESC"""),
+]
+
+_TOOL_KEYWORDS = [
+    ("order", "get_my_orders", {"customer_id": 1, "limit": 5}),
+    ("review", "get_product_reviews", {"product_id": 1, "limit": 5}),
+    ("return", "query_policies_docs", {"query_text": "return policy", "limit": 3}),
+    ("shipping", "query_policies_docs", {"query_text": "shipping policy", "limit": 3}),
+]
+
+
+def backend() -> str:
+    return os.getenv("LLM_BACKEND", "openai").lower()
+
+
+def is_fake() -> bool:
+    return backend() == "fake"
+
+
+class FakeChatModel:
+    """Drop-in for the ChatOpenAI methods this repo uses: invoke() and bind_tools()."""
+
+    def __init__(self, model: str = "gpt-4o-mini", latency: float = None, jitter: float = None,
+                 tools=None):
+        self.model_name = f"fake-{model}"
+        self.latency = float(os.getenv("FAKE_LLM_LATENCY", 0.05)) if latency is None else latency
+        self.jitter = float(os.getenv("FAKE_LLM_JITTER", 0.0)) if jitter is None else jitter
+        self.tools = tools
+        self.calls = 0
+
+    def bind_tools(self, tools):
+        return FakeChatModel(self.model_name[len("fake-"):], self.latency, self.jitter, tools=tools)
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        messages = messages if isinstance(messages, list) else [messages]
+        prompt = _content(messages[-1]) if messages else ""
+        tool_calls = self._tool_calls(messages, prompt)
+        content = "" if tool_calls else self._answer(prompt)
+        prompt_tokens = sum(len(_content(message)) for message in messages) // 4
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": max(1, len(content) // 4),
+                "total_tokens": prompt_tokens + max(1, len(content) // 4),
+            },
+        )
+
+    def _answer(self, prompt: str) -> str:
+        if "SQL or CONVERSATIONAL" in prompt:
+            question = _quoted_after(prompt, "Question:")
+            return "CONVERSATIONAL" if any(w in question for w in ("advice", "suggest", "opinion")) else "SQL"
+        if "Generate the PostgreSQL query now" in prompt:
+            question = _quoted_after(prompt, "USER QUESTION:")
+            for keyword, sql in CANNED_SQL:
+                if keyword in question:
+                    return sql
+        if "YES or NO" in prompt:
+            return "YES"
+        return f"Fake analysis of {len(prompt)} characters of context: totals look consistent."
+
+    def _tool_calls(self, messages: list, prompt: str) -> list:
+        if not self.tools or any(getattr(message, "type", "") == "tool" for message in messages):
+            return []
+        question = prompt.lower()
+        for keyword, name, args in _TOOL_KEYWORDS:
+            if keyword in question:
+                return [{"name": name, "args": dict(args), "id": f"call_{self.calls}", "type": "tool_call"}]
+        return []
+
+
+def _quoted_after(prompt: str, marker: str) -> str:
+    """The quoted user question that follows marker in a prompt template, lowercased."""
+    tail = prompt.split(marker, 1)[-1]
+    parts = tail.split('"')
+    return (parts[1] if len(parts) > 2 else tail).lower()
+
+
+def _content(message) -> str:
+    content = getattr(message, "content", message)
+    return content if isinstance(content, str) else str(content)
+
+
+def chat_model(model: str = "gpt-4o-mini", temperature: float = 0.7):
+    """ChatOpenAI, or FakeChatModel with LLM_BACKEND=fake."""
+    if is_fake():
+        return FakeChatModel(model)
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        openai_api_key=os.environ.get("OPENAI_API_KEY"),
+    )
+
+
+def embedding_model(model: str = "text-embedding-3-small"):
+    """OpenAIEmbeddings, or deterministic hash embeddings with LLM_BACKEND=fake."""
+    if is_fake():
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+
+        return DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=model, openai_api_key=os.environ.get("OPENAI_API_KEY"))
@@ -0,0 +1,391 @@
+"""
+Central LLM dispatcher: admission control, concurrency limits and rate limiting.
+
+Every chat call (metrics.invoke_llm) and query embedding goes through
+call(). A call waits for:
+
+- a global slot (LLM_MAX_CONCURRENCY, default 16)
+- a per-model slot (LLM_MODEL_CONCURRENCY, e.g. "gpt-4o=4,gpt-4o-mini=12")
+- the requests/tokens per minute buckets (LLM_RPM / LLM_TPM, 0 = unlimited)
+
+Waiting calls are served in priority order: interactive (chat), then
+analysis (/analyze), then batch (jobs, batch_runner). Within a class they
+are served first come, first served.
+
+Calls wait at most LLM_MAX_WAIT seconds per class (default
+"interactive=10,analysis=30,batch=0"; 0 waits indefinitely). After that the
+call raises Overloaded. Overloaded carries a Retry-After estimate and the API
+turns it into 503. Inside request(), later calls of the same request fail at
+once, so agent retries do not add load.
+
+request() also refuses new work when LLM_MAX_QUEUED (default 64) calls of
+the same or higher priority are already waiting.
+
+Upstream 429s pause every caller with jittered exponential backoff, or for
+the server's Retry-After. The call is then retried, up to LLM_MAX_RETRIES
+times (default 3).
+"""
+
+import bisect
+import contextvars
+import itertools
+import logging
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+from metrics import REGISTRY, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"interactive": 0, "analysis": 1, "batch": 2}
+DEFAULT_PRIORITY = "analysis"
+
+LLM_DISPATCH_WAIT = Histogram(
+    "llm_dispatch_wait_seconds", "Time LLM calls waited for a slot and rate-limit budget.", ["priority"]
+)
+LLM_DISPATCH_REJECTED = Counter(
+    "llm_dispatch_rejected_total", "Requests and LLM calls shed with 503.", ["priority", "reason"]
+)
+LLM_RATE_LIMITED = Counter("llm_rate_limited_total", "Upstream 429 responses by model.", ["model"])
+
+
+class Overloaded(Exception):
+    """The LLM backend is saturated; retry after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return (
+        type(error).__name__ == "RateLimitError"
+        or getattr(error, "status_code", None) == 429
+        or "429" in str(error)[:200]
+    )
+
+
+def _retry_after_header(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_limits(raw: str, cast=float) -> dict:
+    limits = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            limits[name.strip()] = cast(value)
+    return limits
+
+
+# ============================================================================
+# RATE LIMITING
+# ============================================================================
+
+
+class RateLimiter:
+    """
+    Requests and tokens per minute as two token buckets shared by all callers.
+
+    Token cost is estimated from the running average of completed calls.
+    After a 429 every caller waits out the backoff.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, initial_tokens_per_call: int = 5000):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = rpm
+        self.tokens = tpm
+        self.tokens_per_call = initial_tokens_per_call
+        self.paused_until = 0.0
+        self.waited = 0.0
+        self.rate_limited = 0
+        self._updated = time.monotonic()
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def try_acquire(self) -> float:
+        """Take budget for one call and return 0, or return the seconds until it would fit."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            cost = min(self.tokens_per_call, self.tpm) if self.tpm else 0
+            if now >= self.paused_until and (not self.rpm or self.requests >= 1) and \
+                    (not self.tpm or self.tokens >= cost):
+                if self.rpm:
+                    self.requests -= 1
+                if self.tpm:
+                    self.tokens -= cost
+                return 0.0
+            return max(
+                self.paused_until - now,
+                (1 - self.requests) * 60 / self.rpm if self.rpm and self.requests < 1 else 0,
+                (cost - self.tokens) * 60 / self.tpm if self.tpm and self.tokens < cost else 0,
+                0.01,
+            )
+
+    def acquire(self):
+        """Block until one more call fits under both limits."""
+        start = time.monotonic()
+        while wait := self.try_acquire():
+            time.sleep(min(wait, 1.0))
+        with self._lock:
+            self.waited += time.monotonic() - start
+
+    def record(self, tokens: int):
+        """Update the per-call token estimate with a completed call."""
+        with self._lock:
+            self._calls += 1
+            self.tokens_per_call += (tokens - self.tokens_per_call) / min(self._calls, 20)
+
+    def backoff(self, attempt: int, base: float = 2.0, cap: float = 60.0, delay: float = None) -> float:
+        """Pause every caller after a 429; returns the chosen delay."""
+        if delay is None:
+            delay = random.uniform(0.5, 1.0) * min(cap, base * 2 ** attempt)
+        with self._lock:
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+
+# ============================================================================
+# DISPATCHER
+# ============================================================================
+
+# Per-request state set by request(): priority, and the Overloaded error once one is raised
+_request_state = contextvars.ContextVar("llm_request", default=None)
+
+
+class _Waiter:
+    __slots__ = ("key", "model", "priority")
+
+    def __init__(self, key: tuple, model: str, priority: str):
+        self.key = key
+        self.model = model
+        self.priority = priority
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class Dispatcher:
+    """Priority-ordered admission to global and per-model concurrency slots under a RateLimiter."""
+
+    def __init__(self, max_concurrency: int = 16, model_concurrency: dict = None, rpm: float = 0,
+                 tpm: float = 0, max_queued: int = 64, max_wait: dict = None, max_retries: int = 3):
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency or {}
+        self.limiter = RateLimiter(rpm, tpm)
+        self.max_queued = max_queued
+        self.max_wait = {"interactive": 10.0, "analysis": 30.0, "batch": 0.0, **(max_wait or {})}
+        self.max_retries = max_retries
+        self._waiting = []  # sorted _Waiters
+        self._active = 0
+        self._active_by_model = {}
+        self._latency = 1.0  # moving average of call seconds, for Retry-After estimates
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_env(cls) -> "Dispatcher":
+        return cls(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 16)),
+            model_concurrency=_parse_limits(os.getenv("LLM_MODEL_CONCURRENCY", ""), int),
+            rpm=float(os.getenv("LLM_RPM", 0)),
+            tpm=float(os.getenv("LLM_TPM", 0)),
+            max_queued=int(os.getenv("LLM_MAX_QUEUED", 64)),
+            max_wait=_parse_limits(os.getenv("LLM_MAX_WAIT", "")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 3)),
+        )
+
+    def set_rate_limits(self, rpm: float = 0, tpm: float = 0):
+        """Replace the requests/tokens per minute limits (e.g. from a CLI's --rpm/--tpm)."""
+        with self._condition:
+            self.limiter = RateLimiter(rpm, tpm)
+            self._condition.notify_all()
+
+    def _model_limit(self, model: str):
+        # The fake backend names models "fake-<model>"; they share the real model's limit
+        return self.model_concurrency.get(model) or self.model_concurrency.get(model.removeprefix("fake-"))
+
+    def _runnable(self):
+        """The first waiter, in priority order, whose model has a free slot."""
+        if self._active >= self.max_concurrency:
+            return None
+        for waiter in self._waiting:
+            limit = self._model_limit(waiter.model)
+            if not limit or self._active_by_model.get(waiter.model, 0) < limit:
+                return waiter
+        return None
+
+    def retry_after(self, priority: str = DEFAULT_PRIORITY) -> int:
+        """Seconds until the calls now waiting at this priority or above should have drained."""
+        rank = PRIORITIES[priority]
+        ahead = sum(1 for waiter in self._waiting if PRIORITIES[waiter.priority] <= rank)
+        return max(1, math.ceil((ahead + 1) * self._latency / self.max_concurrency))
+
+    def admit(self, priority: str):
+        """Refuse new work when too many calls of this priority or above are already waiting."""
+        if not self.max_wait.get(priority):
+            return
+        rank = PRIORITIES[priority]
+        with self._condition:
+            waiting = sum(1 for waiter in self._waiting if PRIORITIES[waiter.priority] <= rank)
+            if waiting >= self.max_queued:
+                LLM_DISPATCH_REJECTED.inc(priority=priority, reason="queue_full")
+                raise Overloaded(f"{waiting} LLM calls are waiting; try again later",
+                                 self.retry_after(priority))
+
+    def _acquire(self, model: str, priority: str):
+        waiter = _Waiter((PRIORITIES[priority], next(self._sequence)), model, priority)
+        max_wait = self.max_wait.get(priority)
+        start = time.monotonic()
+        deadline = start + max_wait if max_wait else None
+        with self._condition:
+            bisect.insort(self._waiting, waiter)
+            try:
+                while True:
+                    wait = 1.0
+                    if self._runnable() is waiter:
+                        wait = self.limiter.try_acquire()
+                        if not wait:
+                            self._active += 1
+                            self._active_by_model[model] = self._active_by_model.get(model, 0) + 1
+                            break
+                    if deadline is not None and time.monotonic() >= deadline:
+                        LLM_DISPATCH_REJECTED.inc(priority=priority, reason="timeout")
+                        raise Overloaded(
+                            f"LLM call waited more than {max_wait:g}s for capacity", self.retry_after(priority)
+                        )
+                    if deadline is not None:
+                        wait = min(wait, deadline - time.monotonic())
+                    self._condition.wait(timeout=max(0.005, min(wait, 1.0)))
+            finally:
+                self._waiting.remove(waiter)
+                self._condition.notify_all()
+        waited = time.monotonic() - start
+        LLM_DISPATCH_WAIT.observe(waited, priority=priority)
+        return waited
+
+    def _release(self, model: str, seconds: float):
+        with self._condition:
+            self._active -= 1
+            self._active_by_model[model] -= 1
+            self._latency += (seconds - self._latency) * 0.1
+            self._condition.notify_all()
+
+    def call(self, model: str, func, *args, tokens=None, **kwargs):
+        """
+        func(*args, **kwargs) once a slot and rate budget are free; retries 429s.
+
+        tokens, if given, maps the result to the tokens it used, which refines
+        the TPM estimate.
+        """
+        state = _request_state.get()
+        priority = state["priority"] if state else DEFAULT_PRIORITY
+        if state and state["overloaded"] is not None:
+            shed = state["overloaded"]
+            raise Overloaded(str(shed), shed.retry_after)
+        for attempt in range(self.max_retries + 1):
+            try:
+                waited = self._acquire(model, priority)
+            except Overloaded as e:
+                if state is not None:
+                    state["overloaded"] = e
+                raise
+            span = tracing.current_span()
+            if span is not None and waited >= 0.001:
+                span.set(queued_ms=round(waited * 1000, 3))
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                LLM_RATE_LIMITED.inc(model=model)
+                delay = self.limiter.backoff(attempt, delay=_retry_after_header(e))
+                logger.warning("LLM rate limited (%s); all callers paused %.1fs (attempt %d)",
+                               model, delay, attempt + 1)
+                continue
+            finally:
+                self._release(model, time.monotonic() - start)
+            if tokens is not None and (used := tokens(result)):
+                self.limiter.record(used)
+            return result
+
+    def stats(self) -> dict:
+        with self._condition:
+            waiting = {name: 0 for name in PRIORITIES}
+            for waiter in self._waiting:
+                waiting[waiter.priority] += 1
+            return {
+                "active": self._active,
+                "active_by_model": {model: n for model, n in self._active_by_model.items() if n},
+                "waiting": waiting,
+                "max_concurrency": self.max_concurrency,
+                "avg_call_seconds": round(self._latency, 3),
+                "rate_limited": self.limiter.rate_limited,
+            }
+
+    def _metrics(self):
+        stats = self.stats()
+        return [
+            ("llm_dispatch_in_flight", "gauge", "LLM calls holding a dispatcher slot.",
+             [({"model": model}, n) for model, n in stats["active_by_model"].items()] or [({"model": ""}, 0)]),
+            ("llm_dispatch_waiting", "gauge", "LLM calls waiting for a dispatcher slot.",
+             [({"priority": name}, n) for name, n in stats["waiting"].items()]),
+        ]
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> Dispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher.from_env()
+            REGISTRY.register_collector(lambda: _dispatcher._metrics())
+    return _dispatcher
+
+
+def call(model: str, func, *args, **kwargs):
+    """Dispatch func through the process-wide Dispatcher (see Dispatcher.call)."""
+    return get_dispatcher().call(model, func, *args, **kwargs)
+
+
+@contextmanager
+def request(priority: str):
+    """
+    Run a unit of work (an API request, a job) at a priority.
+
+    Raises Overloaded on entry when the queue is full, and on exit if any
+    LLM call inside was shed, even if the caller caught the error.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority {priority!r}; expected one of {', '.join(PRIORITIES)}")
+    get_dispatcher().admit(priority)
+    state = {"priority": priority, "overloaded": None}
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+    if state["overloaded"] is not None:
+        raise state["overloaded"]
@@ -0,0 +1,89 @@
+"""
+Logging Configuration
+Structured, level-controlled logging for the API and the modules it imports.
+
+Set these in your .env file:
+- LOG_LEVEL=INFO (DEBUG, INFO, WARNING, ERROR)
+- LOG_FORMAT=text (or json for one JSON object per line)
+
+Modules log through logging.getLogger(__name__); fields passed with
+extra={...} become keys of the JSON record.
+"""
+
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as one JSON line including its extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text with extra fields appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = [
+            f"{key}={value}"
+            for key, value in vars(record).items()
+            if key not in _RESERVED and not key.startswith("_")
+        ]
+        return f"{line} [{' '.join(extras)}]" if extras else line
+
+
+def setup_logging(level: str = None, fmt: str = None, force: bool = False) -> logging.Logger:
+    """
+    Configure the root logger once (LOG_LEVEL / LOG_FORMAT unless given).
+
+    Returns the root logger. Later calls are no-ops unless force=True.
+    """
+    global _configured
+    root = logging.getLogger()
+    if _configured and not force:
+        return root
+
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.environ.get("LOG_FORMAT", "text")).lower()
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+
+    # Third-party clients are chatty at INFO
+    for noisy in ("httpx", "httpcore", "openai", "urllib3", "chromadb"):
+        logging.getLogger(noisy).setLevel(max(root.level, logging.WARNING))
+
+    _configured = True
+    return root
@@ -0,0 +1,425 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Counters, gauges and histograms are registered once at import time and
+updated from the API, the SQL agent graph, LLM call sites and the database
+layer. GET /metrics renders every series; scrape it with Prometheus or read
+it directly:
+
+    curl localhost:8011/metrics
+
+Values that already live elsewhere (cache hit counts, pool occupancy) are
+read at scrape time through collectors instead of being mirrored on every
+update.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import tracing
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Registry:
+    """Holds metrics and scrape-time collectors; render() produces the exposition text."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector):
+        """
+        Add a callable returning [(name, type, help, [(labels, value), ...]), ...].
+
+        Collectors run on every scrape; one that raises is skipped for that scrape.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.extend(metric.expose())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception:
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def expose(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def expose(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS,
+                 registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the with-block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def total(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def expose(self) -> list:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+def timed(histogram: Histogram, **labels):
+    """Decorator observing each call's duration in histogram."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ============================================================================
+# Metric definitions
+# ============================================================================
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template, method and status code.",
+    ["method", "endpoint", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests currently being served.")
+API_RESULTS = Counter(
+    "api_results_total",
+    "Outcome reported in the response body of /analyze and /chat (success or error).",
+    ["endpoint", "question_type", "status"],
+)
+
+GRAPH_NODE_DURATION = Histogram(
+    "sql_agent_node_duration_seconds",
+    "Time spent in each SQL agent graph node.",
+    ["node", "status"],
+)
+GRAPH_RETRIES = Counter(
+    "sql_agent_retries_total",
+    "SQL regeneration attempts triggered by the error handler, by error type.",
+    ["error_type"],
+)
+GRAPH_OUTCOMES = Counter(
+    "sql_agent_errors_total",
+    "Errors routed to the error handler, by error type and final decision.",
+    ["error_type", "decision"],
+)
+
+LLM_DURATION = Histogram(
+    "llm_request_duration_seconds",
+    "LLM call latency by call site and model.",
+    ["call_site", "model", "status"],
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens consumed by LLM calls, by call site, model and kind (prompt or completion).",
+    ["call_site", "model", "kind"],
+)
+LLM_CALL_TOKENS = Histogram(
+    "llm_request_tokens",
+    "Total tokens per LLM call.",
+    ["call_site", "model"],
+    buckets=TOKEN_BUCKETS,
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Database statement latency by caller and outcome.",
+    ["operation", "status"],
+)
+DB_QUERY_ROWS = Histogram(
+    "db_query_rows",
+    "Rows returned per database statement.",
+    ["operation"],
+    buckets=ROW_BUCKETS,
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting to borrow a pooled connection.",
+    [],
+)
+
+RETRIEVAL_DURATION = Histogram(
+    "rag_retrieval_duration_seconds", "Policy document retrieval latency by mode.", ["mode"]
+)
+
+TOOL_CALLS = Counter(
+    "chatbot_tool_calls_total", "Chatbot tool invocations by tool and outcome.", ["tool", "status"]
+)
+CHATBOT_ITERATIONS = Histogram(
+    "chatbot_iterations",
+    "LLM round trips per chatbot answer.",
+    [],
+    buckets=(1, 2, 3, 4, 5, 8, 13),
+)
+
+
+def observe_llm_response(call_site: str, model: str, seconds: float, response=None,
+                         status: str = "ok"):
+    """
+    Record one LLM call.
+
+    response may be a LangChain message (usage_metadata) or an OpenAI
+    response/usage object (prompt_tokens, completion_tokens); missing usage
+    only records latency.
+    """
+    LLM_DURATION.observe(seconds, call_site=call_site, model=model, status=status)
+    prompt_tokens, completion_tokens = _token_usage(response)
+    if prompt_tokens is None and completion_tokens is None:
+        return
+    prompt_tokens = prompt_tokens or 0
+    completion_tokens = completion_tokens or 0
+    LLM_TOKENS.inc(prompt_tokens, call_site=call_site, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, call_site=call_site, model=model, kind="completion")
+    LLM_CALL_TOKENS.observe(prompt_tokens + completion_tokens, call_site=call_site, model=model)
+
+
+def _total_tokens(response) -> int:
+    prompt_tokens, completion_tokens = _token_usage(response)
+    return (prompt_tokens or 0) + (completion_tokens or 0)
+
+
+def _token_usage(response):
+    if response is None:
+        return None, None
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata:
+        return metadata.get("input_tokens"), metadata.get("output_tokens")
+    usage = getattr(response, "usage", None) or response
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+
+
+def invoke_llm(llm, messages, call_site: str):
+    """
+    llm.invoke(messages) through the LLM dispatcher, recording latency and token usage under call_site.
+
+    The recorded latency includes time spent waiting for a dispatcher slot.
+    """
+    # llm_dispatch imports this module for its metric types
+    import llm_dispatch
+
+    # bind_tools() wraps the chat model in a RunnableBinding
+    target = getattr(llm, "bound", llm)
+    model = getattr(target, "model_name", None) or getattr(target, "model", None) or "unknown"
+    with tracing.span(f"llm.{call_site}", model=model) as span:
+        start = time.perf_counter()
+        try:
+            response = llm_dispatch.call(model, llm.invoke, messages, tokens=_total_tokens)
+        except Exception:
+            observe_llm_response(call_site, model, time.perf_counter() - start, status="error")
+            raise
+        observe_llm_response(call_site, model, time.perf_counter() - start, response)
+        if span is not None:
+            prompt_tokens, completion_tokens = _token_usage(response)
+            span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return response
+
+
+@contextmanager
+def observe_query(operation: str):
+    """
+    Time a database statement under operation.
+
+    Yields a dict; set its "rows" key to record the result size.
+    """
+    outcome = {"rows": None}
+    with tracing.span(f"db.{operation}") as span:
+        start = time.perf_counter()
+        try:
+            yield outcome
+        except Exception:
+            DB_QUERY_DURATION.observe(time.perf_counter() - start, operation=operation, status="error")
+            raise
+        DB_QUERY_DURATION.observe(time.perf_counter() - start, operation=operation, status="ok")
+        if outcome["rows"] is not None:
+            DB_QUERY_ROWS.observe(outcome["rows"], operation=operation)
+            if span is not None:
+                span.set(rows=outcome["rows"])
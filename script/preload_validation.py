@@ -0,0 +1,624 @@
+"""
+Columnar pre-load validation of the marketplace CSV/Parquet files.
+
+Checks the files in data/ (or a snapshot/synthetic directory) against
+sql/0.tables.sql before they are loaded, so bad rows are reported with
+their row numbers instead of failing a COPY halfway through:
+
+- not_null / type / length: NOT NULL columns, values that do not parse as
+  the column type, VARCHAR(n) overflow
+- primary_key / unique: duplicate keys across the whole file
+- foreign_key: child values missing from the parent's key hash set
+- check: every CHECK constraint (quantity > 0, rating BETWEEN 1 AND 5,
+  chk_user_type exclusivity, ...) parsed and evaluated as vectorized masks
+- the data quality rules from sql/5.data_quality.sql: duplicate app_user
+  emails, orders without payment, payment amount != quantity * price.
+  Duplicate emails and unpaid orders are reported as warnings; the
+  database accepts them, so they do not fail the validation.
+
+Files are read in chunks, so memory is bounded by the key columns rather
+than file size. Tables are processed in foreign-key order so every
+parent's keys are known before its children are checked.
+
+Usage:
+    python preload_validation.py
+    python preload_validation.py --data-dir ../result/snapshots --chunk-size 1000000
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from schema import dependency_waves, normalize_column_name, parse_schema
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+REPORT_PATH = Path(__file__).parent.parent / "result" / "preload_validation_report.json"
+PAYMENT_TOLERANCE = 0.005
+# Data quality rules the schema does not enforce: reported, but never fail the validation
+WARNING_CHECKS = {"duplicate_email", "orders_without_payment"}
+
+
+def find_source(data_dir: Path, table: str) -> list:
+    """Files holding a table: <table>.csv[.gz], <table>.parquet or <table>/*.parquet."""
+    data_dir = Path(data_dir)
+    for name in (f"{table}.parquet", f"{table}.csv", f"{table}.csv.gz"):
+        if (data_dir / name).exists():
+            return [data_dir / name]
+    directory = data_dir / table
+    if directory.is_dir():
+        return sorted(directory.glob("*.parquet"))
+    return []
+
+
+def iter_chunks(paths: list, chunk_size: int):
+    """Yield DataFrames of at most chunk_size rows with normalized column names."""
+    for path in paths:
+        if path.suffix == ".parquet":
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+                frame = batch.to_pandas()
+                frame.columns = [normalize_column_name(c) for c in frame.columns]
+                yield frame
+        else:
+            for frame in pd.read_csv(
+                path, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=[""]
+            ):
+                frame.columns = [normalize_column_name(c) for c in frame.columns]
+                yield frame
+
+
+def convert(raw: pd.Series, sql_type: str) -> tuple:
+    """
+    Convert a raw column to its schema type.
+
+    Returns:
+        (converted Series, mask of non-null values that failed to convert)
+    """
+    sql_type = sql_type.upper()
+    base = sql_type.split("(")[0]
+    present = raw.notna()
+    if base in ("INTEGER", "INT", "SMALLINT", "BIGINT", "SERIAL"):
+        values = pd.to_numeric(raw, errors="coerce")
+        bad = present & (values.isna() | (values % 1 != 0))
+        return values, bad
+    if base in ("DECIMAL", "NUMERIC", "REAL", "FLOAT", "DOUBLE"):
+        values = pd.to_numeric(raw, errors="coerce")
+        bad = present & values.isna()
+        precision = re.match(r"\w+\((\d+),(\d+)\)", sql_type)
+        if precision:
+            limit = 10 ** (int(precision.group(1)) - int(precision.group(2)))
+            bad |= values.abs() >= limit
+        return values, bad
+    if base in ("TIMESTAMP", "DATE"):
+        values = pd.to_datetime(raw, errors="coerce", format="ISO8601")
+        return values, present & values.isna()
+    return raw, pd.Series(False, index=raw.index)
+
+
+_CHECK_TOKEN = re.compile(
+    r"\s*(?:(-?\d+(?:\.\d+)?)|'((?:[^']|'')*)'|(>=|<=|<>|!=|=|>|<)|([(),])|(\w+))"
+)
+_CHECK_OPS = {
+    "=": np.equal, "<>": np.not_equal, "!=": np.not_equal,
+    ">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal,
+}
+
+
+def _check_tokens(expression: str) -> list:
+    """Split a CHECK expression into (kind, value) tokens."""
+    tokens, position = [], 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _CHECK_TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Unsupported CHECK expression: {expression!r}")
+        number, string, op, punct, word = match.groups()
+        if number is not None:
+            tokens.append(("literal", float(number) if "." in number else int(number)))
+        elif string is not None:
+            tokens.append(("literal", string.replace("''", "'")))
+        elif op is not None:
+            tokens.append(("op", op))
+        elif punct is not None:
+            tokens.append((punct, punct))
+        elif word.upper() in ("AND", "OR", "NOT", "BETWEEN", "IS", "NULL", "IN"):
+            tokens.append((word.upper(), word))
+        else:
+            tokens.append(("column", word))
+        position = match.end()
+    return tokens
+
+
+class _CheckParser:
+    """Recursive descent parser for the boolean CHECK subset used in the schema."""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = _check_tokens(expression)
+        self.position = 0
+        self.compared = set()
+
+    def parse(self) -> tuple:
+        node = self._or()
+        if self.position != len(self.tokens):
+            self._fail()
+        return node
+
+    def _fail(self):
+        raise ValueError(f"Unsupported CHECK expression: {self.expression!r}")
+
+    def _peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def _take(self, kind: str):
+        if self._peek() != kind:
+            self._fail()
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def _or(self) -> tuple:
+        node = self._and()
+        while self._peek() == "OR":
+            self.position += 1
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self) -> tuple:
+        node = self._not()
+        while self._peek() == "AND":
+            self.position += 1
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self) -> tuple:
+        if self._peek() == "NOT":
+            self.position += 1
+            return ("not", self._not())
+        if self._peek() == "(":
+            self.position += 1
+            node = self._or()
+            self._take(")")
+            return node
+        return self._predicate()
+
+    def _predicate(self) -> tuple:
+        column = self._take("column")
+        kind = self._peek()
+        if kind == "IS":
+            self.position += 1
+            negated = self._peek() == "NOT"
+            if negated:
+                self.position += 1
+            self._take("NULL")
+            node = ("is_null", column)
+            return ("not", node) if negated else node
+        self.compared.add(column)
+        if kind == "op":
+            op = self._take("op")
+            return ("compare", column, op, self._take("literal"))
+        negated = kind == "NOT"
+        if negated:
+            self.position += 1
+        if self._peek() == "BETWEEN":
+            self.position += 1
+            low = self._take("literal")
+            self._take("AND")
+            node = ("and", ("compare", column, ">=", low), ("compare", column, "<=", self._take("literal")))
+        else:
+            self._take("IN")
+            self._take("(")
+            values = [self._take("literal")]
+            while self._peek() == ",":
+                self.position += 1
+                values.append(self._take("literal"))
+            self._take(")")
+            node = ("in", column, tuple(values))
+        return ("not", node) if negated else node
+
+
+def check_expression(expression: str) -> tuple:
+    """
+    Parse a CHECK expression into a predicate tree.
+
+    Only column/literal comparisons, BETWEEN, IN, IS [NOT] NULL and
+    AND/OR/NOT are accepted; anything else raises ValueError.
+
+    Returns:
+        (predicate tree for check_violations, columns compared by value)
+    """
+    parser = _CheckParser(expression)
+    return parser.parse(), parser.compared
+
+
+def _check_truth(node: tuple, columns) -> tuple:
+    """(is_true, is_false) masks of a predicate under SQL three-valued logic."""
+    kind = node[0]
+    if kind == "and":
+        left_true, left_false = _check_truth(node[1], columns)
+        right_true, right_false = _check_truth(node[2], columns)
+        return left_true & right_true, left_false | right_false
+    if kind == "or":
+        left_true, left_false = _check_truth(node[1], columns)
+        right_true, right_false = _check_truth(node[2], columns)
+        return left_true | right_true, left_false & right_false
+    if kind == "not":
+        is_true, is_false = _check_truth(node[1], columns)
+        return is_false, is_true
+    values = columns[node[1]]
+    if kind == "is_null":
+        missing = values.isna().to_numpy()
+        return missing, ~missing
+    known = values.notna().to_numpy()
+    result = np.zeros(len(known), dtype=bool)
+    present = values[known]
+    if kind == "compare":
+        result[known] = _CHECK_OPS[node[2]](present.to_numpy(), node[3])
+    else:
+        result[known] = present.isin(node[2]).to_numpy()
+    return result, known & ~result
+
+
+def check_violations(node: tuple, columns) -> np.ndarray:
+    """Boolean mask of rows where the CHECK is false (NULL makes it unknown, which passes)."""
+    return _check_truth(node, columns)[1]
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NA:
+        return None
+    return value
+
+
+class PreloadValidator:
+    """Chunked, vectorized validation of table files against the schema."""
+
+    def __init__(self, data_dir=DATA_DIR, chunk_size: int = 500_000, samples: int = 5):
+        self.data_dir = Path(data_dir)
+        self.chunk_size = chunk_size
+        self.samples = samples
+        self.schema = parse_schema()
+        self.checks = {}  # (kind, table, column) -> result dict
+        self.tables = {}
+        self._keys = {}  # (table, column) -> [key arrays], [row arrays]
+        self._parents = {}  # (table, column) -> pd.Index of unique keys
+        self._lookups = {}  # order/product columns for the payment rule
+        self._payment_orders = None  # pd.Index of payment.order_id
+
+    # ------------------------------------------------------------------
+    # Bookkeeping
+    # ------------------------------------------------------------------
+
+    def _record(self, kind: str, table: str, column, rows: np.ndarray = None,
+                values=None, count: int = None, detail: str = None):
+        result = self.checks.setdefault((kind, table, column), {
+            "check": kind,
+            "table": table,
+            "column": column,
+            "violations": 0,
+            "samples": [],
+        })
+        if detail:
+            result["detail"] = detail
+        if rows is None:
+            result["violations"] += count or 0
+            return
+        result["violations"] += len(rows) if count is None else count
+        room = self.samples - len(result["samples"])
+        for i in range(min(room, len(rows))):
+            sample = {"row": int(rows[i])}
+            if values is not None:
+                sample["value"] = _json_value(values[i])
+            result["samples"].append(sample)
+
+    def _tracked_keys(self, table) -> list:
+        """Columns whose values are kept: keys, unique columns and referenced columns."""
+        columns = list(table.primary_key) if len(table.primary_key) == 1 else []
+        columns += sorted(table.unique)
+        for other in self.schema.values():
+            for fk in other.foreign_keys:
+                if fk.ref_table == table.name and fk.ref_column not in columns:
+                    columns.append(fk.ref_column)
+        if table.name == "app_user" and "email" not in columns:
+            columns.append("email")  # duplicate-email rule from 5.data_quality.sql
+        return columns
+
+    def _keep(self, table: str, column: str, keys: np.ndarray, rows: np.ndarray):
+        arrays, row_arrays = self._keys.setdefault((table, column), ([], []))
+        arrays.append(keys)
+        row_arrays.append(rows)
+
+    # ------------------------------------------------------------------
+    # Per-chunk checks
+    # ------------------------------------------------------------------
+
+    def _check_chunk(self, table, frame: pd.DataFrame, first_row: int, tracked: list,
+                     compiled_checks: list):
+        rows = np.arange(first_row, first_row + len(frame))
+        typed = {}
+        for column, sql_type in table.columns.items():
+            if column not in frame:
+                typed[column] = pd.Series(np.nan, index=frame.index)
+                continue
+            raw = frame[column]
+            values, bad = convert(raw, sql_type)
+            if bad.any():
+                self._record("type", table.name, column, rows[bad.to_numpy()], raw[bad].to_numpy(),
+                             detail=f"not a valid {sql_type}")
+            length = re.match(r"VARCHAR\((\d+)\)", sql_type.upper())
+            if length:
+                too_long = (raw.str.len() > int(length.group(1))).fillna(False).to_numpy(dtype=bool)
+                if too_long.any():
+                    self._record("length", table.name, column, rows[too_long], raw[too_long].to_numpy(),
+                                 detail=f"longer than {length.group(1)} characters")
+            typed[column] = values.where(~bad)
+
+        for column in table.not_null:
+            missing = typed[column].isna().to_numpy() & (
+                frame[column].isna().to_numpy() if column in frame else True
+            )
+            if missing.any():
+                self._record("not_null", table.name, column, rows[missing])
+
+        for fk in table.foreign_keys:
+            parent = self._parents.get((fk.ref_table, fk.ref_column))
+            if parent is None:
+                continue
+            values = typed[fk.column]
+            present = values.notna().to_numpy()
+            keys = values[present].to_numpy(dtype=np.int64)
+            orphan = parent.get_indexer(keys) == -1
+            if orphan.any():
+                self._record("foreign_key", table.name, fk.column, rows[present][orphan], keys[orphan],
+                             detail=f"references {fk.ref_table}.{fk.ref_column}")
+
+        for expression, predicate, compared in compiled_checks:
+            failed = check_violations(predicate, typed)
+            if failed.any():
+                sample_column = next(iter(sorted(compared)), None)
+                self._record(
+                    "check", table.name, expression, rows[failed],
+                    typed[sample_column][failed].to_numpy() if sample_column else None,
+                )
+
+        for column in tracked:
+            values = typed[column]
+            present = values.notna().to_numpy()
+            if table.columns[column].upper().startswith(("INTEGER", "INT", "BIGINT", "SMALLINT", "SERIAL")):
+                keys = values[present].to_numpy(dtype=np.int64)
+            else:
+                # Strings are compared by 64-bit hash, exactly like the UNIQUE constraint;
+                # only the duplicate-email rule ignores case
+                strings = values[present].astype(str)
+                if table.name == "app_user" and column == "email":
+                    strings = strings.str.lower()
+                keys = pd.util.hash_array(strings.to_numpy(dtype=object))
+            self._keep(table.name, column, keys, rows[present])
+
+        if table.name == "order_header":
+            self._collect("order_header", typed, ["order_id", "quantity", "product_id"])
+        elif table.name == "product":
+            self._collect("product", typed, ["product_id", "product_price"])
+        elif table.name == "payment":
+            self._check_payment_amounts(typed, rows)
+
+    def _collect(self, table: str, typed: dict, columns: list):
+        frame = pd.DataFrame({column: typed[column] for column in columns}).dropna()
+        self._lookups.setdefault(table, []).append(frame)
+
+    def _lookup(self, table: str, key: str):
+        """(Index on key, DataFrame) for a collected table, first row per key."""
+        if table not in self._lookups:
+            return None
+        frame = self._lookups[table]
+        if isinstance(frame, list):
+            frame = pd.concat(frame, ignore_index=True).drop_duplicates(key)
+            self._lookups[table] = frame
+        return pd.Index(frame[key].to_numpy(dtype=np.int64)), frame
+
+    def _check_payment_amounts(self, typed: dict, rows: np.ndarray):
+        orders = self._lookup("order_header", "order_id")
+        products = self._lookup("product", "product_id")
+        if orders is None or products is None:
+            return
+        order_index, order_frame = orders
+        product_index, product_frame = products
+        amount = typed["amount"].to_numpy(dtype=float, na_value=np.nan)
+        order_ids = typed["order_id"].to_numpy(dtype=float, na_value=np.nan)
+        known = ~np.isnan(order_ids) & ~np.isnan(amount)
+        position = np.full(len(amount), -1)
+        position[known] = order_index.get_indexer(order_ids[known].astype(np.int64))
+        known &= position >= 0
+        product_ids = order_frame["product_id"].to_numpy(dtype=np.int64)[position[known]]
+        product_position = product_index.get_indexer(product_ids)
+        matched = np.flatnonzero(known)[product_position >= 0]
+        product_position = product_position[product_position >= 0]
+        expected = (
+            order_frame["quantity"].to_numpy(dtype=float)[position[matched]]
+            * product_frame["product_price"].to_numpy(dtype=float)[product_position]
+        )
+        mismatch = np.abs(amount[matched] - expected) > PAYMENT_TOLERANCE
+        self._record("payment_mismatch", "payment", "amount", rows[matched][mismatch],
+                     amount[matched][mismatch], detail="amount != quantity * product_price")
+
+    # ------------------------------------------------------------------
+    # Whole-table checks
+    # ------------------------------------------------------------------
+
+    def _finish_table(self, table, tracked: list):
+        for column in tracked:
+            arrays, row_arrays = self._keys.pop((table.name, column), ([], []))
+            keys = np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+            rows = np.concatenate(row_arrays) if row_arrays else np.zeros(0, dtype=np.int64)
+            order = np.argsort(keys, kind="stable")
+            keys, rows = keys[order], rows[order]
+            same = keys[1:] == keys[:-1]
+            # Rows after the first of each duplicate group are the ones a load would reject
+            duplicate_rows = rows[1:][same]
+            is_integer = keys.dtype.kind == "i"
+
+            if column in table.primary_key:
+                kind = "primary_key"
+            elif column in table.unique:
+                kind = "unique"
+            elif table.name == "app_user" and column == "email":
+                kind = "duplicate_email"
+            else:
+                kind = None
+            if kind:
+                self._record(kind, table.name, column, np.sort(duplicate_rows),
+                             keys[1:][same][np.argsort(duplicate_rows)] if is_integer else None)
+
+            referenced = any(
+                fk.ref_table == table.name and fk.ref_column == column
+                for other in self.schema.values() for fk in other.foreign_keys
+            )
+            if referenced and is_integer:
+                # Hash set of parent keys, reused by every child chunk
+                self._parents[(table.name, column)] = pd.Index(np.unique(keys))
+                if table.name == "payment" and column == "order_id":
+                    self._payment_orders = self._parents[(table.name, column)]
+            elif table.name == "payment" and column == "order_id":
+                self._payment_orders = pd.Index(np.unique(keys))
+
+    def _orders_without_payment(self):
+        orders = self._lookup("order_header", "order_id")
+        payments = self._payment_orders
+        if orders is None or payments is None:
+            return
+        order_ids = orders[0].to_numpy()
+        unpaid = payments.get_indexer(order_ids) == -1
+        self._record("orders_without_payment", "order_header", "order_id", count=int(unpaid.sum()),
+                     detail="no payment row for the order")
+        result = self.checks[("orders_without_payment", "order_header", "order_id")]
+        result["samples"] = [{"value": int(v)} for v in order_ids[unpaid][: self.samples]]
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+
+    def validate_table(self, table):
+        paths = find_source(self.data_dir, table.name)
+        if not paths:
+            print(f"No data file for {table.name}, skipping")
+            return
+        start = time.perf_counter()
+        tracked = self._tracked_keys(table)
+        compiled_checks = []
+        for expression in table.checks:
+            predicate, compared = check_expression(expression)
+            compiled_checks.append((" ".join(expression.split()), predicate, compared))
+
+        # Register every check up front so passing checks are listed in the report too
+        for column in table.not_null:
+            self._record("not_null", table.name, column, count=0)
+        for fk in table.foreign_keys:
+            if (fk.ref_table, fk.ref_column) in self._parents:
+                self._record("foreign_key", table.name, fk.column, count=0,
+                             detail=f"references {fk.ref_table}.{fk.ref_column}")
+        for expression, _, _ in compiled_checks:
+            self._record("check", table.name, expression, count=0)
+
+        rows, chunks = 0, 0
+        for frame in iter_chunks(paths, self.chunk_size):
+            unknown = [c for c in frame.columns if c not in table.columns]
+            if unknown and chunks == 0:
+                self._record("columns", table.name, None, count=len(unknown),
+                             detail=f"columns not in schema: {unknown}")
+            self._check_chunk(table, frame.reset_index(drop=True), rows + 1, tracked, compiled_checks)
+            rows += len(frame)
+            chunks += 1
+        self._finish_table(table, tracked)
+
+        seconds = time.perf_counter() - start
+        self.tables[table.name] = {
+            "files": [str(p) for p in paths],
+            "rows": rows,
+            "chunks": chunks,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+        }
+
+    def run(self, tables: list = None) -> dict:
+        """Validate every table (or a subset) and return the structured report."""
+        started = datetime.now()
+        start = time.perf_counter()
+        for wave in dependency_waves(self.schema):
+            for name in wave:
+                if tables and name not in tables:
+                    continue
+                self.validate_table(self.schema[name])
+        self._orders_without_payment()
+
+        checks = sorted(
+            self.checks.values(), key=lambda c: (c["violations"] == 0, c["table"], c["check"])
+        )
+        for check in checks:
+            if not check["violations"]:
+                check["status"] = "pass"
+            else:
+                check["status"] = "warn" if check["check"] in WARNING_CHECKS else "fail"
+        failed = [c for c in checks if c["status"] == "fail"]
+        warned = [c for c in checks if c["status"] == "warn"]
+        return {
+            "generated": started.strftime("%Y-%m-%d %H:%M:%S"),
+            "data_dir": str(self.data_dir),
+            "chunk_size": self.chunk_size,
+            "seconds": round(time.perf_counter() - start, 3),
+            "summary": {
+                "tables": len(self.tables),
+                "rows": sum(t["rows"] for t in self.tables.values()),
+                "checks_failed": len(failed),
+                "violations": sum(c["violations"] for c in failed),
+                "checks_warned": len(warned),
+                "warnings": sum(c["violations"] for c in warned),
+            },
+            "tables": self.tables,
+            "checks": checks,
+        }
+
+
+def validate(data_dir=DATA_DIR, chunk_size: int = 500_000, tables: list = None,
+             report_path=REPORT_PATH) -> dict:
+    """Run the validator, print a summary and write the JSON report."""
+    report = PreloadValidator(data_dir, chunk_size).run(tables)
+    for check in report["checks"]:
+        if check["violations"]:
+            column = f".{check['column']}" if check["column"] else ""
+            detail = f" ({check['detail']})" if check.get("detail") else ""
+            print(f"{check['status'].upper()}: {check['check']} {check['table']}{column} - {check['violations']:,} rows{detail}")
+    summary = report["summary"]
+    print(
+        f"Validated {summary['rows']:,} rows in {summary['tables']} tables in {report['seconds']:.2f}s: "
+        f"{summary['checks_failed']} failing checks, {summary['violations']:,} violations, "
+        f"{summary['checks_warned']} warnings"
+    )
+    if report_path:
+        Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report exported: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate CSV/Parquet files before loading")
+    parser.add_argument("--data-dir", default=str(DATA_DIR))
+    parser.add_argument("--chunk-size", type=int, default=500_000)
+    parser.add_argument("--tables", nargs="+", help="Subset of tables to validate")
+    parser.add_argument("--report", default=str(REPORT_PATH))
+    args = parser.parse_args()
+
+    report = validate(args.data_dir, args.chunk_size, args.tables, args.report)
+    sys.exit(1 if report["summary"]["checks_failed"] else 0)
@@ -0,0 +1,476 @@
+"""
+Opt-in profiling of single API requests and scripted workloads.
+
+A profiled block records three things:
+
+- per-stage timings from the tracing spans opened inside it (graph nodes,
+  LLM calls, database statements, result formatting, retrieval, tools).
+  Both tracing on and off work.
+- top functions, from one of two profilers:
+  - cprofile: deterministic; exact call counts, but higher overhead
+  - sampling: a background thread samples the request thread's stack every
+    PROFILE_SAMPLE_INTERVAL seconds (default 0.005) and writes folded
+    stacks for flamegraph.pl / speedscope
+- top allocation sites (tracemalloc) and peak traced memory
+
+cProfile and tracemalloc are process-wide, so profiled blocks run one at a
+time. Reports are stored under result/profiles/ (the newest PROFILE_RETENTION,
+default 200, are kept) next to the raw .pstats or .folded file.
+
+The API profiles /analyze and /chat for admin users (ADMIN_USERS) when the
+request carries X-Profile: <mode> or ?profile=<mode>.
+
+Batch mode runs a scripted workload against the fake LLM backend, so the
+profile shows our own code rather than OpenAI latency:
+
+Usage:
+    DB_BACKEND=duckdb python profiling.py --mode sampling
+    python profiling.py --workload workload.jsonl --mode cprofile --fake-llm-latency 0.2
+    python profiling.py --list
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+import tracing
+
+load_dotenv()
+
+MODES = ("cprofile", "sampling")
+DEFAULT_MODE = os.getenv("PROFILE_DEFAULT_MODE", "cprofile")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", Path(__file__).parent.parent / "result" / "profiles"))
+PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", 200))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+LOCK_TIMEOUT = float(os.getenv("PROFILE_LOCK_TIMEOUT", 30))
+TRACEMALLOC_FRAMES = 10
+TOP_N = 20
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{12}$")
+_SCRIPT_ROOT = str(Path(__file__).parent.parent)
+_lock = threading.Lock()
+
+DEFAULT_WORKLOAD = [
+    {"endpoint": "analyze", "prompt": "What is the monthly revenue trend?"},
+    {"endpoint": "analyze", "prompt": "Who are the top 10 customers by spend?"},
+    {"endpoint": "analyze", "prompt": "How many orders came from each state?"},
+    {"endpoint": "analyze", "prompt": "Which carrier shipped the most orders?"},
+    {"endpoint": "analyze", "prompt": "Show revenue by product category"},
+    {"endpoint": "chat", "prompt": "Where are my recent orders?"},
+    {"endpoint": "chat", "prompt": "What do reviews say about my product?"},
+]
+
+
+class ProfilerBusy(RuntimeError):
+    """Another profiled block did not finish within PROFILE_LOCK_TIMEOUT."""
+
+
+def resolve_mode(requested: str) -> str:
+    """Map a header/query value to a mode; "1"/"true" select PROFILE_DEFAULT_MODE."""
+    value = requested.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return DEFAULT_MODE
+    if value not in MODES:
+        raise ValueError(f"Unknown profile mode '{requested}'. Use one of: {', '.join(MODES)}")
+    return value
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_SCRIPT_ROOT):
+        return filename[len(_SCRIPT_ROOT) + 1:]
+    for marker in ("site-packages/", "lib/python"):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return filename
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a daemon thread into folded-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, top: int = TOP_N) -> list:
+        """Functions by samples on top of the stack (self) and anywhere on it (total)."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        ms = self.interval * 1000
+        rows = [
+            {
+                "function": function,
+                "self_ms": round(own[function] * ms, 1),
+                "cumulative_ms": round(count * ms, 1),
+                "samples": count,
+            }
+            for function, count in total.items()
+        ]
+        rows.sort(key=lambda row: (-row["self_ms"], -row["cumulative_ms"]))
+        return rows[:top]
+
+
+def stage_breakdown(spans: list, wall_ms: float) -> dict:
+    """
+    Per-span-name and per-category timings.
+
+    Category is the span name prefix (node, llm, db, format, retrieval,
+    tool). Category times are exclusive of child spans, so they add up to
+    the wall time together with "other" (untraced work).
+    """
+    by_id = {span.span_id: span for span in spans}
+    child_ms = defaultdict(float)
+    for span in spans:
+        if span.parent_id in by_id and span.duration_ms is not None:
+            child_ms[span.parent_id] += span.duration_ms
+
+    stages, categories = {}, defaultdict(float)
+    for span in spans:
+        if span.duration_ms is None:
+            continue
+        self_ms = max(0.0, span.duration_ms - child_ms[span.span_id])
+        stage = stages.setdefault(span.name, {"count": 0, "total_ms": 0.0, "self_ms": 0.0, "errors": 0})
+        stage["count"] += 1
+        stage["total_ms"] += span.duration_ms
+        stage["self_ms"] += self_ms
+        stage["errors"] += span.status == "error"
+        categories[span.name.split(".", 1)[0]] += self_ms
+
+    categories["other"] = max(0.0, wall_ms - sum(categories.values()))
+    return {
+        "stages": {
+            name: {**stage, "total_ms": round(stage["total_ms"], 2), "self_ms": round(stage["self_ms"], 2)}
+            for name, stage in sorted(stages.items(), key=lambda item: -item[1]["total_ms"])
+        },
+        "categories": {
+            name: {"ms": round(ms, 2), "share": round(ms / wall_ms, 3) if wall_ms else 0.0}
+            for name, ms in sorted(categories.items(), key=lambda item: -item[1])
+        },
+    }
+
+
+def _cprofile_top(profiler: cProfile.Profile, top: int) -> list:
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in pstats.Stats(profiler).stats.items():
+        rows.append({
+            "function": f"{name} ({_short_path(filename)}:{line})",
+            "calls": calls,
+            "self_ms": round(own * 1000, 2),
+            "cumulative_ms": round(cumulative * 1000, 2),
+        })
+    rows.sort(key=lambda row: -row["cumulative_ms"])
+    return rows[:top]
+
+
+def _allocation_top(snapshot: tracemalloc.Snapshot, top: int) -> list:
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ])
+    return [
+        {
+            "site": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:top]
+    ]
+
+
+class Profile:
+    """One profiled block; use profile_request() rather than driving it directly."""
+
+    def __init__(self, label: str, mode: str, top: int = TOP_N):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.mode = mode
+        self.top = top
+        self.created_at = time.time()
+        self.wall_ms = None
+        self.profiler = None
+        self.sampler = None
+        self.data = None
+        self.paths = {}
+        self._started_tracemalloc = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._start_memory = tracemalloc.get_traced_memory()[0]
+        if self.mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = StackSampler(threading.get_ident())
+            self.sampler.start()
+        self._start = time.perf_counter()
+
+    def stop(self):
+        self.wall_ms = round((time.perf_counter() - self._start) * 1000, 2)
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        current, peak = tracemalloc.get_traced_memory()
+        self._memory = {
+            "allocated_kb": round((current - self._start_memory) / 1024, 1),
+            "peak_kb": round((peak - self._start_memory) / 1024, 1),
+        }
+        self._snapshot = tracemalloc.take_snapshot()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def finish(self, spans: list):
+        """Build the report from the captured spans and profiler state."""
+        if self.profiler is not None:
+            functions = _cprofile_top(self.profiler, self.top)
+        else:
+            functions = self.sampler.top_functions(self.top)
+        self.data = {
+            "id": self.profile_id,
+            "label": self.label,
+            "mode": self.mode,
+            "created_at": self.created_at,
+            "wall_ms": self.wall_ms,
+            **stage_breakdown(spans, self.wall_ms),
+            "top_functions": functions,
+            "memory": self._memory,
+            "top_allocations": _allocation_top(self._snapshot, self.top),
+        }
+        if self.sampler is not None:
+            self.data["samples"] = self.sampler.samples
+        self._snapshot = None
+
+    def save(self, directory=None) -> dict:
+        """Write the report as JSON plus the raw .pstats or .folded file."""
+        directory = Path(directory or PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = directory / self.profile_id
+        if self.profiler is not None:
+            self.paths["pstats"] = str(stem.with_suffix(".pstats"))
+            self.profiler.dump_stats(self.paths["pstats"])
+        if self.sampler is not None:
+            self.paths["folded"] = str(stem.with_suffix(".folded"))
+            Path(self.paths["folded"]).write_text(self.sampler.folded())
+        self.paths["report"] = str(stem.with_suffix(".json"))
+        self.data["files"] = self.paths
+        with open(self.paths["report"], "w") as f:
+            json.dump(self.data, f, indent=2)
+        _prune(directory)
+        return self.paths
+
+    def report(self) -> dict:
+        return self.data
+
+
+def _prune(directory: Path):
+    reports = sorted(directory.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for report in reports[PROFILE_RETENTION:]:
+        for path in directory.glob(f"{report.stem}.*"):
+            path.unlink(missing_ok=True)
+
+
+@contextmanager
+def profile_request(label: str, mode: str = None, save: bool = True):
+    """
+    Profile the enclosed block when mode is set; yields the Profile or None.
+
+    The report is available from profile.report() after the block exits.
+    Raises ProfilerBusy if another profiled block holds the profiler too long.
+    """
+    if mode is None:
+        yield None
+        return
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode '{mode}'")
+    if not _lock.acquire(timeout=LOCK_TIMEOUT):
+        raise ProfilerBusy("Another request is being profiled; try again shortly")
+    try:
+        profile = Profile(label, mode)
+        with tracing.capture("profile") as spans:
+            profile.start()
+            try:
+                yield profile
+            finally:
+                profile.stop()
+        profile.finish(spans)
+        if save:
+            profile.save()
+    finally:
+        _lock.release()
+
+
+def list_profiles(directory=None) -> list:
+    """Summaries of stored profiles, newest first."""
+    directory = Path(directory or PROFILE_DIR)
+    summaries = []
+    for path in sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        summaries.append({key: data.get(key) for key in ("id", "label", "mode", "created_at", "wall_ms")})
+    return summaries
+
+
+def load_profile(profile_id: str, directory=None) -> dict:
+    """A stored report by id; raises FileNotFoundError for unknown or malformed ids."""
+    if not _PROFILE_ID.match(profile_id):
+        raise FileNotFoundError(profile_id)
+    path = Path(directory or PROFILE_DIR) / f"{profile_id}.json"
+    with open(path) as f:
+        return json.load(f)
+
+
+# ============================================================================
+# Batch mode
+# ============================================================================
+
+
+def load_workload(path: str = None) -> list:
+    """Workload items from a JSONL file ({"endpoint": "analyze"|"chat", "prompt": ...}) or plain text lines."""
+    if path is None:
+        return list(DEFAULT_WORKLOAD)
+    items = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            items.append(json.loads(line) if line.startswith("{") else {"endpoint": "analyze", "prompt": line})
+    return items
+
+
+def run_workload(items: list, mode: str = "sampling", repeat: int = 1, warmup: bool = True):
+    """Run the workload through the API handlers in-process under one profile."""
+    import api
+
+    def run_item(item):
+        if item.get("endpoint", "analyze") == "chat":
+            chatbot = api.subsystems.get("chatbot").chatbot
+            chatbot(item["prompt"], max_attempts=item.get("max_attempts", 5))
+            return "success"
+        return api._analyze_query(api.QueryRequest(prompt=item["prompt"])).status
+
+    if warmup:
+        # First calls import subsystems and fill caches; keep that out of the profile
+        for endpoint in {item.get("endpoint", "analyze") for item in items}:
+            run_item(next(item for item in items if item.get("endpoint", "analyze") == endpoint))
+
+    timings = []
+    with profile_request("workload", mode) as profile:
+        for _ in range(repeat):
+            for item in items:
+                start = time.perf_counter()
+                try:
+                    outcome = run_item(item)
+                except Exception as e:
+                    outcome = f"error: {e}"
+                timings.append({
+                    "endpoint": item.get("endpoint", "analyze"),
+                    "prompt": item["prompt"],
+                    "ms": round((time.perf_counter() - start) * 1000, 1),
+                    "outcome": outcome,
+                })
+    profile.data["workload"] = timings
+    profile.save()
+    return profile
+
+
+def print_report(report: dict, timings: list = None):
+    print(f"Profile {report['id']} ({report['mode']}): {report['wall_ms']:.1f} ms wall")
+    if timings:
+        print(f"\n{'endpoint':<8} {'ms':>9}  {'outcome':<10} prompt")
+        for row in timings:
+            print(f"{row['endpoint']:<8} {row['ms']:>9.1f}  {row['outcome'][:10]:<10} {row['prompt'][:60]}")
+    print(f"\n{'category':<12} {'ms':>10} {'share':>7}")
+    for name, row in report["categories"].items():
+        print(f"{name:<12} {row['ms']:>10.1f} {row['share'] * 100:>6.1f}%")
+    print(f"\n{'stage':<30} {'count':>6} {'total ms':>10} {'self ms':>10}")
+    for name, row in report["stages"].items():
+        print(f"{name:<30} {row['count']:>6} {row['total_ms']:>10.1f} {row['self_ms']:>10.1f}")
+    print(f"\n{'function':<70} {'self ms':>9} {'cum ms':>9}")
+    for row in report["top_functions"]:
+        print(f"{row['function'][:70]:<70} {row['self_ms']:>9.1f} {row['cumulative_ms']:>9.1f}")
+    memory = report["memory"]
+    print(f"\nMemory: {memory['allocated_kb']:.1f} KB retained, {memory['peak_kb']:.1f} KB peak")
+    print(f"{'allocation site':<60} {'KB':>9} {'count':>7}")
+    for row in report["top_allocations"]:
+        print(f"{row['site'][:60]:<60} {row['size_kb']:>9.1f} {row['count']:>7}")
+    for kind, path in report.get("files", {}).items():
+        print(f"{kind}: {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile a scripted workload against the fake LLM")
+    parser.add_argument("--workload", help="JSONL ({endpoint, prompt}) or text file, one prompt per line")
+    parser.add_argument("--mode", choices=MODES, default="sampling")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the workload")
+    parser.add_argument("--fake-llm-latency", type=float, default=0.0,
+                        help="Seconds each fake LLM call sleeps (default 0: CPU only)")
+    parser.add_argument("--no-warmup", action="store_true", help="Include first-call imports in the profile")
+    parser.add_argument("--list", action="store_true", help="List stored profiles and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for summary in list_profiles():
+            print(f"{summary['id']}  {summary['label']:<12} {summary['mode']:<9} {summary['wall_ms']:>10.1f} ms")
+        sys.exit(0)
+
+    # The fake backend must be selected before the SQL agent and chatbot import
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.fake_llm_latency)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ.setdefault("TRACE_EXPORTERS", "none")
+    # Canned queries would otherwise flood the index advisor's workload log
+    os.environ.setdefault("SQL_HISTORY_PATH", os.devnull)
+
+    profile = run_workload(load_workload(args.workload), args.mode, args.repeat, not args.no_warmup)
+    print_report(profile.report(), profile.data["workload"])
@@ -1,81 +1,298 @@
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
 import os
-import chromadb
+import time
 from pathlib import Path
 
-# Import LangSmith configuration to enable tracing
 import sys
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from langsmith_config import setup_langsmith
+import llm_backend
+import llm_dispatch
+import tracing
+from cache import SingleFlight
+from metrics import RETRIEVAL_DURATION, observe_llm_response
+from rag.vector_store import create_vector_store
+from rag.hybrid import BM25Index, HybridRetriever
 
 load_dotenv()
-setup_langsmith()
+
+logger = logging.getLogger(__name__)
 
 # Hardcoded paths
 _script_dir = Path(__file__).parent
 _project_root = _script_dir.parent.parent
 _chroma_db_path = _project_root / "result" / "chroma_db"
-_chroma_db_path.mkdir(parents=True, exist_ok=True)
+_numpy_index_path = _project_root / "result" / "vector_index"
 
 RETURN_POLICY_PDF = _project_root / "documents" / "return_policy.pdf"
 SHIPPING_POLICY_PDF = _project_root / "documents" / "shipping_policy.pdf"
 COLLECTION_NAME = "policy_docs"
+EMBEDDING_MODEL = "text-embedding-3-small"
 
-# Initialize Chroma client
-chroma_client = chromadb.PersistentClient(path=str(_chroma_db_path))
+# Vector store backend: "chroma" (default) or "numpy" (embedded memmap index)
+VECTOR_STORE_BACKEND = os.environ.get("VECTOR_STORE_BACKEND", "chroma")
+# Optional int8 quantization for the numpy backend
+VECTOR_STORE_QUANTIZE = os.environ.get("VECTOR_STORE_QUANTIZE") or None
 
-embedding_model = OpenAIEmbeddings(
-    model="text-embedding-3-small", openai_api_key=os.environ.get("OPENAI_API_KEY")
+vector_store = create_vector_store(
+    VECTOR_STORE_BACKEND,
+    _numpy_index_path if VECTOR_STORE_BACKEND == "numpy" else _chroma_db_path,
+    collection_name=COLLECTION_NAME,
+    quantize=VECTOR_STORE_QUANTIZE,
 )
+MANIFEST_PATH = vector_store.path / "ingest_manifest.json"
+BM25_PATH = vector_store.path / "bm25.json"
 
+# Retrieval mode: "hybrid" (default), "vector" or "bm25"
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+# Optional reranker: "lexical" or "cross-encoder"
+RETRIEVAL_RERANK = os.environ.get("RETRIEVAL_RERANK") or None
 
-def add_pdf_to_collection(
-    file_path: Path, chunk_size: int = 500, chunk_overlap: int = 50
-):
-    """Add a PDF file to the embeddings collection"""
-    # Load PDF
-    loader = PyPDFLoader(str(file_path))
-    pages = list(loader.lazy_load())
-    all_text = "\n".join(page.page_content for page in pages)
+embedding_model = llm_backend.embedding_model(EMBEDDING_MODEL)
+
+
+
+# Concurrent retrievals for the same question share one embedding call
+_embed_flight = SingleFlight("embed_query", share=list)
+
+
+def _embed_query(text: str):
+    return _embed_flight.do(text, _embed_query_uncoalesced, text)
+
+
+def _embed_query_uncoalesced(text: str):
+    start = time.perf_counter()
+    try:
+        vector = llm_dispatch.call(EMBEDDING_MODEL, embedding_model.embed_query, text)
+    except Exception:
+        observe_llm_response("embed_query", EMBEDDING_MODEL, time.perf_counter() - start,
+                             status="error")
+        raise
+    observe_llm_response("embed_query", EMBEDDING_MODEL, time.perf_counter() - start)
+    return vector
+
+
+bm25_index = BM25Index.load(BM25_PATH)
+retriever = HybridRetriever(vector_store, bm25_index, _embed_query)
+
+
+def _file_sha256(file_path: Path) -> str:
+    """Hash a file in 1 MB blocks so large PDFs are never fully loaded."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    # Split text into chunks
+
+def _chunk_id(source: str, text: str) -> str:
+    """Content-addressed chunk ID: same source and text always map to the same ID."""
+    return hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def load_manifest() -> dict:
+    """Load the ingestion manifest (source -> file fingerprint and chunk IDs)."""
+    if not MANIFEST_PATH.exists():
+        return {}
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict):
+    """Atomically write the ingestion manifest."""
+    tmp_path = MANIFEST_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def split_pdf(file_path: Path, chunk_size: int = 500, chunk_overlap: int = 50):
+    """
+    Split a PDF into chunks, one page at a time so every chunk keeps its page.
+
+    Returns:
+        List of (chunk_id, text, metadata) tuples in document order
+    """
+    source = Path(file_path).name
+    loader = PyPDFLoader(str(file_path))
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size, chunk_overlap=chunk_overlap
     )
-    texts = text_splitter.split_text(all_text)
-
-    collection = chroma_client.get_or_create_collection(name=COLLECTION_NAME)
-    embeddings = embedding_model.embed_documents(texts)
-
-    # Add to ChromaDB in batches
-    batch_size = 100
-    doc_count = collection.count()
-
-    for batch_idx in range(0, len(texts), batch_size):
-        batch_texts = texts[batch_idx : batch_idx + batch_size]
-        batch_embeddings = embeddings[batch_idx : batch_idx + batch_size]
-        batch_ids = [
-            f"doc_{doc_count + batch_idx + doc_idx}"
-            for doc_idx in range(len(batch_texts))
-        ]
-        collection.add(
-            ids=batch_ids, documents=batch_texts, embeddings=batch_embeddings
+
+    chunks = []
+    seen = set()
+    for page_idx, page in enumerate(loader.lazy_load()):
+        page_number = page.metadata.get("page", page_idx) + 1
+        for text in text_splitter.split_text(page.page_content):
+            chunk_id = _chunk_id(source, text)
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            chunks.append(
+                (
+                    chunk_id,
+                    text,
+                    {"source": source, "page": page_number, "chunk": len(chunks)},
+                )
+            )
+    return chunks
+
+
+def _embed_batch(texts):
+    """
+    Embed one batch through the LLM dispatcher at batch priority.
+
+    The dispatcher applies the shared concurrency slots and RPM/TPM limits and
+    retries 429s, pausing every caller; other errors propagate.
+    """
+    start = time.perf_counter()
+    try:
+        with llm_dispatch.request("batch"):
+            vectors = llm_dispatch.call(EMBEDDING_MODEL, embedding_model.embed_documents, texts)
+    except Exception:
+        observe_llm_response("embed_documents", EMBEDDING_MODEL, time.perf_counter() - start,
+                             status="error")
+        raise
+    observe_llm_response("embed_documents", EMBEDDING_MODEL, time.perf_counter() - start)
+    return vectors
+
+
+def embed_texts(texts, batch_size: int = 64, max_workers: int = 4):
+    """Embed texts in batches, sending up to max_workers batches concurrently."""
+    if not texts:
+        return []
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        results = list(executor.map(_embed_batch, batches))
+    return [embedding for batch in results for embedding in batch]
+
+
+def add_pdf_to_collection(
+    file_path: Path, chunk_size: int = 500, chunk_overlap: int = 50, force: bool = False
+):
+    """
+    Incrementally sync a PDF into the embeddings collection.
+
+    Chunks are keyed by a content hash, so only new or changed chunks are
+    embedded and upserted, and chunks no longer in the PDF are deleted.
+    Unchanged files are skipped using the manifest without parsing the PDF.
+
+    Returns:
+        Dict with counts of added, deleted and unchanged chunks
+    """
+    file_path = Path(file_path)
+    source = file_path.name
+    stat = file_path.stat()
+    manifest = load_manifest()
+    entry = manifest.get(source, {})
+    settings = {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "embedding_model": EMBEDDING_MODEL,
+        "vector_store": vector_store.name,
+        "quantize": VECTOR_STORE_QUANTIZE,
+    }
+    # The store can be emptied under the manifest (e.g. an index written with another
+    # quantization is discarded on load), so also check the recorded chunks are still there
+    same_settings = all(entry.get(key) == value for key, value in settings.items()) and \
+        set(entry.get("chunk_ids", [])) <= set(vector_store.get_ids(source=source))
+
+    # Fast path: same size and mtime as the last ingestion -> nothing to do
+    if (
+        not force
+        and same_settings
+        and entry.get("size") == stat.st_size
+        and entry.get("mtime_ns") == stat.st_mtime_ns
+    ):
+        logger.info("'%s' unchanged, skipping ingestion", source)
+        return {"added": 0, "deleted": 0, "unchanged": len(entry.get("chunk_ids", []))}
+
+    file_hash = _file_sha256(file_path)
+    if not force and same_settings and entry.get("sha256") == file_hash:
+        # Touched but identical content: refresh the fingerprint only
+        entry.update({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        manifest[source] = entry
+        save_manifest(manifest)
+        logger.info("'%s' content unchanged, skipping ingestion", source)
+        return {"added": 0, "deleted": 0, "unchanged": len(entry.get("chunk_ids", []))}
+
+    chunks = split_pdf(file_path, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    existing_ids = set(vector_store.get_ids(source=source))
+    wanted_ids = [chunk_id for chunk_id, _, _ in chunks]
+    new_chunks = [chunk for chunk in chunks if chunk[0] not in existing_ids]
+    stale_ids = sorted(existing_ids - set(wanted_ids))
+
+    # Chunk positions can shift even when the text is unchanged
+    kept = [chunk for chunk in chunks if chunk[0] in existing_ids]
+    if kept:
+        vector_store.update_metadata(
+            [chunk_id for chunk_id, _, _ in kept],
+            [metadata for _, _, metadata in kept],
         )
 
-    print(
-        f"Successfully added {len(texts)} documents to collection '{COLLECTION_NAME}'"
+    embeddings = embed_texts([text for _, text, _ in new_chunks])
+    vector_store.upsert(
+        [chunk_id for chunk_id, _, _ in new_chunks],
+        [text for _, text, _ in new_chunks],
+        [metadata for _, _, metadata in new_chunks],
+        embeddings,
     )
-    return len(texts)
+    vector_store.delete(stale_ids)
+    rebuild_bm25_index()
 
+    manifest[source] = {
+        **settings,
+        "sha256": file_hash,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "chunk_ids": wanted_ids,
+    }
+    save_manifest(manifest)
 
-if __name__ == "__main__":
-    # Add both PDFs to the same collection
-    add_pdf_to_collection(RETURN_POLICY_PDF)
-    add_pdf_to_collection(SHIPPING_POLICY_PDF)
+    stats = {
+        "added": len(new_chunks),
+        "deleted": len(stale_ids),
+        "unchanged": len(kept),
+    }
+    logger.info(
+        "Synced '%s' into '%s' (%s): %d added, %d deleted, %d unchanged",
+        source, COLLECTION_NAME, vector_store.name,
+        stats["added"], stats["deleted"], stats["unchanged"],
+        extra={"source": source},
+    )
+    return stats
+
+
+def rebuild_bm25_index():
+    """Rebuild the BM25 index from every chunk currently in the vector store."""
+    chunks = vector_store.get(vector_store.get_ids())
+    bm25_index.build(
+        [chunk["id"] for chunk in chunks], [chunk["document"] for chunk in chunks]
+    )
+    bm25_index.save(BM25_PATH)
+    return len(chunks)
+
+
+def remove_legacy_chunks():
+    """Delete chunks stored under the old positional 'doc_N' IDs."""
+    legacy_ids = [
+        doc_id for doc_id in vector_store.get_ids() if doc_id.startswith("doc_")
+    ]
+    if legacy_ids:
+        vector_store.delete(legacy_ids)
+        rebuild_bm25_index()
+        logger.info("Removed %d legacy chunks from '%s'", len(legacy_ids), COLLECTION_NAME)
+    return len(legacy_ids)
 
 
 # Query function to retrieve similar chunks from the collection
@@ -83,7 +300,15 @@ def query_policies_docs(
     query_text: str,
     n_results: int = 3,
     limit: int = None,
+    mode: str = None,
+    rerank: str = None,
 ):
+    """
+    Retrieve policy chunks relevant to a question.
+
+    Returns:
+        List of {"id", "text", "score", "source", "page", "chunk"} dicts, best first
+    """
     if not query_text or not query_text.strip():
         return []
 
@@ -91,30 +316,28 @@ def query_policies_docs(
     if limit is not None:
         n_results = limit
 
-    # Get the collection
-    try:
-        collection = chroma_client.get_collection(name=COLLECTION_NAME)
-    except Exception:
-        print(
-            f"Collection '{COLLECTION_NAME}' does not exist. Please add documents first."
-        )
+    if vector_store.count() == 0:
+        logger.warning("Collection '%s' is empty. Please add documents first.", COLLECTION_NAME)
         return []
 
-    count = collection.count()
-    if count == 0:
-        return []
+    mode = mode or RETRIEVAL_MODE
+    with RETRIEVAL_DURATION.time(mode=mode), tracing.span("retrieval.policies", mode=mode):
+        return retriever.retrieve(
+            query_text,
+            n_results=n_results,
+            mode=mode,
+            rerank=rerank or RETRIEVAL_RERANK,
+        )
 
-    # Generate query embedding and query
-    query_embedding = embedding_model.embed_query(query_text)
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=min(n_results, count),
-        include=["documents", "distances", "metadatas"],
-    )
 
-    documents = results.get("documents", [])
-    return (
-        documents[0]
-        if documents and len(documents) > 0 and len(documents[0]) > 0
-        else []
-    )
+if __name__ == "__main__":
+    from logging_config import setup_logging
+
+    setup_logging()
+    # Sync both PDFs into the same collection
+    remove_legacy_chunks()
+    add_pdf_to_collection(RETURN_POLICY_PDF)
+    add_pdf_to_collection(SHIPPING_POLICY_PDF)
+    # Collections ingested before the BM25 index existed need a one-off build
+    if len(bm25_index.ids) != vector_store.count():
+        print(f"Rebuilt BM25 index over {rebuild_bm25_index()} chunks")
@@ -0,0 +1,127 @@
+"""
+Recall@k and latency evaluation for policy document retrieval.
+
+Each labeled question lists phrases that appear in the chunks that answer it,
+so labels survive re-chunking. A question counts as a hit at k when any of
+the top-k chunks contains one of its phrases. Every retrieval mode and
+reranker is run over the same question set.
+
+Usage:
+    python rag/eval_retrieval.py --k 1 3 5
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from rag.embedding import query_policies_docs, embedding_model
+
+QUESTIONS_PATH = Path(__file__).parent / "eval_questions.json"
+
+CONFIGS = [
+    ("vector", None),
+    ("bm25", None),
+    ("hybrid", None),
+    ("hybrid", "lexical"),
+    ("hybrid", "cross-encoder"),
+]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def first_relevant_rank(results: list, phrases: list):
+    """1-based rank of the first chunk containing a labeled phrase, or None."""
+    phrases = [_normalize(phrase) for phrase in phrases]
+    for rank, result in enumerate(results, start=1):
+        text = _normalize(result["text"])
+        if any(phrase in text for phrase in phrases):
+            return rank
+    return None
+
+
+def evaluate(questions: list, ks: list, configs=CONFIGS) -> list:
+    max_k = max(ks)
+
+    # Embed every question once so vector-based modes are timed on retrieval only
+    cache = {}
+    original_embed = embedding_model.embed_query
+
+    def cached_embed(text):
+        if text not in cache:
+            cache[text] = original_embed(text)
+        return cache[text]
+
+    for item in questions:
+        cached_embed(item["question"])
+
+    import rag.embedding as embedding
+
+    embedding.retriever.embed_query = cached_embed
+
+    report = []
+    for mode, rerank in configs:
+        ranks, latencies = [], []
+        try:
+            for item in questions:
+                t0 = time.perf_counter()
+                results = query_policies_docs(
+                    item["question"], n_results=max_k, mode=mode, rerank=rerank
+                )
+                latencies.append((time.perf_counter() - t0) * 1000)
+                ranks.append(first_relevant_rank(results, item["relevant"]))
+        except Exception as e:
+            print(f"Skipping {mode}/{rerank}: {e}")
+            continue
+
+        latencies.sort()
+        hits = [rank for rank in ranks if rank is not None]
+        row = {
+            "mode": mode,
+            "rerank": rerank or "none",
+            "mrr": round(sum(1 / rank for rank in hits) / len(questions), 3),
+            "latency_p50_ms": round(latencies[len(latencies) // 2], 2),
+            "latency_p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 2),
+        }
+        for k in ks:
+            row[f"recall@{k}"] = round(
+                sum(1 for rank in hits if rank <= k) / len(questions), 3
+            )
+        report.append(row)
+    return report
+
+
+def print_report(report: list, ks: list):
+    columns = ["mode", "rerank"] + [f"recall@{k}" for k in ks] + [
+        "mrr",
+        "latency_p50_ms",
+        "latency_p95_ms",
+    ]
+    print("  ".join(f"{column:>14}" for column in columns))
+    for row in report:
+        print("  ".join(f"{str(row[column]):>14}" for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate policy retrieval")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--questions", default=str(QUESTIONS_PATH))
+    parser.add_argument("--output", help="Optional path to write the report as JSON")
+    args = parser.parse_args()
+
+    with open(args.questions, "r") as f:
+        questions = json.load(f)
+
+    report = evaluate(questions, args.k)
+    print_report(report, args.k)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
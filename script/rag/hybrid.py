@@ -0,0 +1,281 @@
+"""
+Hybrid lexical + vector retrieval for the policy documents.
+
+A BM25 index is built at ingestion time next to the vector index. Queries
+run both retrievers, merge the rankings with reciprocal-rank fusion (RRF)
+and optionally rerank the fused candidates with a local cross-encoder or a
+cheap lexical reranker that rewards exact terms like "30 days".
+"""
+
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*%?|\$[0-9]+(?:\.[0-9]+)?")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "if", "in", "is", "it", "my", "of", "on", "or", "the",
+    "to", "what", "when", "which", "will", "with", "you", "your",
+}
+
+RRF_K = 60
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word/number tokens; keeps prices ($7.99) and percentages (15%)."""
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """Okapi BM25 over a small chunk corpus, persisted as JSON."""
+
+    def __init__(self, ids=None, documents=None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.postings = {}
+        self.idf = {}
+        if ids:
+            self.build(ids, documents)
+
+    def build(self, ids, documents):
+        self.ids = list(ids)
+        postings = defaultdict(list)
+        lengths = []
+        for doc_idx, document in enumerate(documents):
+            tokens = tokenize(document)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_idx, tf))
+        self.doc_lengths = np.asarray(lengths, dtype=np.float32)
+        self.postings = dict(postings)
+        n_docs = len(self.ids)
+        self.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        return self
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        if not self.ids:
+            return scores
+        avg_length = float(self.doc_lengths.mean()) or 1.0
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / avg_length)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            doc_idx = np.fromiter((d for d, _ in docs), dtype=np.int64, count=len(docs))
+            tf = np.fromiter((t for _, t in docs), dtype=np.float32, count=len(docs))
+            scores[doc_idx] += (
+                self.idf[term] * tf * (self.k1 + 1) / (tf + norm[doc_idx])
+            )
+        return scores
+
+    def query(self, query: str, n_results: int) -> list:
+        """Return [(id, score)] for the best matching chunks with a nonzero score."""
+        scores = self.scores(query)
+        k = min(n_results, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def save(self, path: Path):
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "doc_lengths": self.doc_lengths.tolist(),
+            "postings": self.postings,
+        }
+        tmp_path = Path(path).with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path):
+        index = cls()
+        if not Path(path).exists():
+            return index
+        with open(path, "r") as f:
+            payload = json.load(f)
+        index.k1 = payload["k1"]
+        index.b = payload["b"]
+        index.ids = payload["ids"]
+        index.doc_lengths = np.asarray(payload["doc_lengths"], dtype=np.float32)
+        index.postings = {
+            term: [tuple(doc) for doc in docs]
+            for term, docs in payload["postings"].items()
+        }
+        n_docs = len(index.ids)
+        index.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in index.postings.items()
+        }
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k: int = RRF_K) -> dict:
+    """Fuse several ranked ID lists: score(id) = sum(1 / (k + rank))."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] += 1.0 / (k + rank)
+    return dict(fused)
+
+
+def lexical_rerank_scores(query: str, documents: list) -> np.ndarray:
+    """Query term coverage plus a bonus for exact adjacent-term matches."""
+    query_tokens = tokenize(query)
+    if not query_tokens:
+        return np.zeros(len(documents), dtype=np.float32)
+    query_terms = set(query_tokens)
+    query_bigrams = set(zip(query_tokens, query_tokens[1:]))
+
+    scores = []
+    for document in documents:
+        doc_tokens = tokenize(document)
+        doc_terms = set(doc_tokens)
+        coverage = len(query_terms & doc_terms) / len(query_terms)
+        phrase = 0.0
+        if query_bigrams:
+            doc_bigrams = set(zip(doc_tokens, doc_tokens[1:]))
+            phrase = len(query_bigrams & doc_bigrams) / len(query_bigrams)
+        scores.append(coverage + 0.5 * phrase)
+    return np.asarray(scores, dtype=np.float32)
+
+
+_cross_encoder = None
+
+
+def cross_encoder_scores(query: str, documents: list) -> np.ndarray:
+    """Score (query, chunk) pairs with a local sentence-transformers cross-encoder."""
+    global _cross_encoder
+    if _cross_encoder is False:
+        raise ImportError("sentence-transformers is not installed")
+    if _cross_encoder is None:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            _cross_encoder = False
+            logger.warning("sentence-transformers not installed, falling back to lexical rerank")
+            raise
+
+        _cross_encoder = CrossEncoder(
+            os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        )
+    return np.asarray(
+        _cross_encoder.predict([(query, document) for document in documents]),
+        dtype=np.float32,
+    )
+
+
+class HybridRetriever:
+    """Combine a VectorStore and a BM25Index with RRF and optional reranking."""
+
+    def __init__(self, vector_store, bm25_index: BM25Index, embed_query):
+        self.vector_store = vector_store
+        self.bm25 = bm25_index
+        self.embed_query = embed_query
+
+    def retrieve(
+        self,
+        query_text: str,
+        n_results: int = 3,
+        mode: str = "hybrid",
+        rerank: str = None,
+        candidates: int = None,
+    ) -> list:
+        """
+        Retrieve scored chunks.
+
+        Args:
+            mode: "vector", "bm25" or "hybrid"
+            rerank: None, "lexical" or "cross-encoder"
+            candidates: Pool size per retriever before fusion (default 4 * n_results, min 20)
+
+        Returns:
+            List of {"id", "text", "score", "source", "page", "chunk"} dicts, best first
+        """
+        if mode not in ("vector", "bm25", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if rerank not in (None, "", "lexical", "cross-encoder"):
+            raise ValueError(f"Unknown reranker: {rerank}")
+        candidates = candidates or max(20, 4 * n_results)
+        rankings = []
+        vector_hits = {}
+        bm25_hits = []
+
+        if mode in ("vector", "hybrid"):
+            hits = self.vector_store.query(
+                self.embed_query(query_text), n_results=candidates
+            )
+            vector_hits = {hit["id"]: hit for hit in hits}
+            rankings.append([hit["id"] for hit in hits])
+        if mode in ("bm25", "hybrid"):
+            bm25_hits = self.bm25.query(query_text, candidates)
+            rankings.append([doc_id for doc_id, _ in bm25_hits])
+
+        if mode == "hybrid":
+            scores = reciprocal_rank_fusion(rankings)
+        elif mode == "vector":
+            scores = {doc_id: hit["score"] for doc_id, hit in vector_hits.items()}
+        else:
+            scores = dict(bm25_hits)
+
+        ranked_ids = sorted(scores, key=scores.get, reverse=True)
+        if not rerank:
+            ranked_ids = ranked_ids[:n_results]
+
+        missing = [doc_id for doc_id in ranked_ids if doc_id not in vector_hits]
+        chunks = {hit["id"]: hit for hit in self.vector_store.get(missing)}
+        chunks.update(vector_hits)
+        ranked_ids = [doc_id for doc_id in ranked_ids if doc_id in chunks]
+
+        if rerank and ranked_ids:
+            documents = [chunks[doc_id]["document"] for doc_id in ranked_ids]
+            if rerank == "cross-encoder":
+                try:
+                    rerank_scores = cross_encoder_scores(query_text, documents)
+                except ImportError:
+                    rerank_scores = lexical_rerank_scores(query_text, documents)
+            else:
+                rerank_scores = lexical_rerank_scores(query_text, documents)
+                # Keep the fused order as a tie-breaker between equal lexical scores
+                fused = np.asarray([scores[doc_id] for doc_id in ranked_ids])
+                rerank_scores = rerank_scores + fused / (fused.max() or 1.0) * 0.1
+            order = np.argsort(-rerank_scores)[:n_results]
+            scores = {ranked_ids[i]: float(rerank_scores[i]) for i in order}
+            ranked_ids = [ranked_ids[i] for i in order]
+
+        results = []
+        for doc_id in ranked_ids:
+            metadata = chunks[doc_id].get("metadata") or {}
+            results.append(
+                {
+                    "id": doc_id,
+                    "text": chunks[doc_id]["document"],
+                    "score": round(float(scores[doc_id]), 6),
+                    "source": metadata.get("source"),
+                    "page": metadata.get("page"),
+                    "chunk": metadata.get("chunk"),
+                }
+            )
+        return results
@@ -0,0 +1,394 @@
+"""
+Vector store backends for the policy document collection.
+
+ChromaVectorStore wraps a chromadb PersistentClient collection.
+NumpyVectorStore keeps normalized embeddings in a memory-mapped float32
+(or int8) matrix file with ids, documents and metadata stored beside it,
+which starts fast and needs no extra services for small-to-medium corpora.
+"""
+
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStore(ABC):
+    """Interface shared by all vector store backends."""
+
+    name = "base"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def get_ids(self, source: str = None) -> list:
+        """Return stored IDs, optionally only those whose metadata source matches."""
+
+    @abstractmethod
+    def get(self, ids: list) -> list:
+        """Return {"id", "document", "metadata"} dicts for the given IDs."""
+
+    @abstractmethod
+    def upsert(self, ids, documents, metadatas, embeddings):
+        ...
+
+    @abstractmethod
+    def update_metadata(self, ids, metadatas):
+        ...
+
+    @abstractmethod
+    def delete(self, ids):
+        ...
+
+    @abstractmethod
+    def query(self, embedding, n_results: int = 3) -> list:
+        """
+        Return the n_results most similar chunks.
+
+        Returns:
+            List of {"id", "document", "metadata", "score"} dicts, best first,
+            where score is the cosine similarity
+        """
+
+
+class ChromaVectorStore(VectorStore):
+    """Vector store backed by a persistent Chroma collection."""
+
+    name = "chroma"
+
+    def __init__(self, path, collection_name: str):
+        super().__init__(path)
+        import chromadb
+
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=str(self.path))
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name, metadata={"hnsw:space": "cosine"}
+        )
+        # Collections created before this backend existed use the default L2 space
+        self.space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+
+    def _similarity(self, distance: float) -> float:
+        """Convert a Chroma distance to cosine similarity (embeddings are unit length)."""
+        if self.space == "l2":
+            return 1.0 - distance / 2.0
+        return 1.0 - distance
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get_ids(self, source: str = None) -> list:
+        where = {"source": source} if source else None
+        return self.collection.get(where=where, include=[])["ids"]
+
+    def get(self, ids: list) -> list:
+        if not ids:
+            return []
+        result = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return [
+            {"id": doc_id, "document": document, "metadata": metadata or {}}
+            for doc_id, document, metadata in zip(
+                result["ids"], result["documents"], result["metadatas"]
+            )
+        ]
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        batch_size = 100
+        for batch_idx in range(0, len(ids), batch_size):
+            batch = slice(batch_idx, batch_idx + batch_size)
+            self.collection.upsert(
+                ids=ids[batch],
+                documents=documents[batch],
+                metadatas=metadatas[batch],
+                embeddings=embeddings[batch],
+            )
+
+    def update_metadata(self, ids, metadatas):
+        if ids:
+            self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def query(self, embedding, n_results: int = 3) -> list:
+        count = self.count()
+        if count == 0:
+            return []
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=min(n_results, count),
+            include=["documents", "distances", "metadatas"],
+        )
+        return [
+            {
+                "id": doc_id,
+                "document": document,
+                "metadata": metadata or {},
+                "score": self._similarity(distance),
+            }
+            for doc_id, document, metadata, distance in zip(
+                results["ids"][0],
+                results["documents"][0],
+                results["metadatas"][0],
+                results["distances"][0],
+            )
+        ]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Embedded vector index on a memory-mapped matrix.
+
+    Files under path:
+        vectors.f32 / vectors.i8   row-major embedding matrix (L2-normalized)
+        scales.f32                 per-row dequantization scale (int8 only)
+        index.json                 dim, dtype, ids, documents and metadatas
+    """
+
+    name = "numpy"
+
+    def __init__(self, path, quantize: str = None):
+        super().__init__(path)
+        if quantize not in (None, "int8"):
+            raise ValueError(f"Unsupported quantization: {quantize}")
+        self.quantize = quantize
+        self.dtype = np.int8 if quantize == "int8" else np.float32
+        self.vectors_path = self.path / (
+            "vectors.i8" if quantize == "int8" else "vectors.f32"
+        )
+        self.scales_path = self.path / "scales.f32"
+        self.index_path = self.path / "index.json"
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        self.dim = 0
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self.matrix = None
+        self.scales = None
+        self._positions = {}
+
+        if self.index_path.exists():
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            if index.get("dtype") != np.dtype(self.dtype).name:
+                # Written with a different quantization: rebuild from scratch
+                logger.warning(
+                    "Vector index at %s uses %s, expected %s; starting empty",
+                    self.path, index.get("dtype"), np.dtype(self.dtype).name,
+                )
+                return
+            self.dim = index["dim"]
+            self.ids = index["ids"]
+            self.documents = index["documents"]
+            self.metadatas = index["metadatas"]
+
+        if self.ids:
+            self.matrix = np.memmap(
+                self.vectors_path,
+                dtype=self.dtype,
+                mode="r",
+                shape=(len(self.ids), self.dim),
+            )
+            if self.quantize == "int8":
+                self.scales = np.memmap(
+                    self.scales_path, dtype=np.float32, mode="r", shape=(len(self.ids),)
+                )
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def _write(self, ids, documents, metadatas, vectors):
+        """Atomically replace the matrix and index files, then remap them."""
+        # Drop the memmaps before replacing the files underneath them
+        self.matrix = None
+        self.scales = None
+
+        if self.quantize == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0)
+            scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+            stored = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._atomic_write(self.scales_path, scales.tobytes())
+        else:
+            stored = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._atomic_write(self.vectors_path, stored.tobytes())
+
+        index = {
+            "dim": int(vectors.shape[1]) if len(vectors) else self.dim,
+            "dtype": np.dtype(self.dtype).name,
+            "ids": list(ids),
+            "documents": list(documents),
+            "metadatas": list(metadatas),
+        }
+        self._atomic_write(self.index_path, json.dumps(index).encode("utf-8"))
+        self._load()
+
+    @staticmethod
+    def _atomic_write(path: Path, payload: bytes):
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def _dense(self) -> np.ndarray:
+        """Current matrix as float32 (dequantized for int8)."""
+        if self.matrix is None:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self.quantize == "int8":
+            return self.matrix.astype(np.float32) * self.scales[:, None]
+        return np.array(self.matrix, dtype=np.float32)
+
+    # ------------------------------------------------------------------
+    # VectorStore API
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def get_ids(self, source: str = None) -> list:
+        if source is None:
+            return list(self.ids)
+        return [
+            doc_id
+            for doc_id, metadata in zip(self.ids, self.metadatas)
+            if metadata.get("source") == source
+        ]
+
+    def get(self, ids: list) -> list:
+        results = []
+        for doc_id in ids:
+            pos = self._positions.get(doc_id)
+            if pos is not None:
+                results.append(
+                    {
+                        "id": doc_id,
+                        "document": self.documents[pos],
+                        "metadata": self.metadatas[pos],
+                    }
+                )
+        return results
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        if not ids:
+            return
+        new_vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(new_vectors, axis=1, keepdims=True)
+        new_vectors = new_vectors / np.where(norms == 0, 1.0, norms)
+        if self.dim and new_vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dimension {new_vectors.shape[1]} does not match index dimension {self.dim}"
+            )
+
+        all_ids = list(self.ids)
+        all_documents = list(self.documents)
+        all_metadatas = list(self.metadatas)
+        vectors = (
+            self._dense()
+            if self.ids
+            else np.zeros((0, new_vectors.shape[1]), dtype=np.float32)
+        )
+
+        replace_rows, replace_src, append_src = [], [], []
+        for i, doc_id in enumerate(ids):
+            pos = self._positions.get(doc_id)
+            if pos is None:
+                append_src.append(i)
+            else:
+                replace_rows.append(pos)
+                replace_src.append(i)
+                all_documents[pos] = documents[i]
+                all_metadatas[pos] = metadatas[i]
+
+        if replace_rows:
+            vectors[replace_rows] = new_vectors[replace_src]
+        if append_src:
+            vectors = np.vstack([vectors, new_vectors[append_src]])
+            all_ids.extend(ids[i] for i in append_src)
+            all_documents.extend(documents[i] for i in append_src)
+            all_metadatas.extend(metadatas[i] for i in append_src)
+
+        self._write(all_ids, all_documents, all_metadatas, vectors)
+
+    def update_metadata(self, ids, metadatas):
+        if not ids:
+            return
+        for doc_id, metadata in zip(ids, metadatas):
+            pos = self._positions.get(doc_id)
+            if pos is not None:
+                self.metadatas[pos] = metadata
+        index = {
+            "dim": self.dim,
+            "dtype": np.dtype(self.dtype).name,
+            "ids": self.ids,
+            "documents": self.documents,
+            "metadatas": self.metadatas,
+        }
+        self._atomic_write(self.index_path, json.dumps(index).encode("utf-8"))
+
+    def delete(self, ids):
+        drop = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+        if not drop:
+            return
+        keep = np.array([i for i in range(len(self.ids)) if i not in drop], dtype=np.int64)
+        vectors = self._dense()[keep] if len(keep) else np.zeros((0, self.dim), np.float32)
+        self._write(
+            [self.ids[i] for i in keep],
+            [self.documents[i] for i in keep],
+            [self.metadatas[i] for i in keep],
+            vectors,
+        )
+
+    def scores(self, embedding) -> np.ndarray:
+        """Cosine similarity of the query against every stored row."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        if self.quantize == "int8":
+            return (self.matrix @ query) * self.scales
+        return self.matrix @ query
+
+    def query(self, embedding, n_results: int = 3) -> list:
+        count = self.count()
+        if count == 0:
+            return []
+        k = min(n_results, count)
+        scores = self.scores(embedding)
+        # O(n) selection of the top k, then sort just those k
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "id": self.ids[i],
+                "document": self.documents[i],
+                "metadata": self.metadatas[i],
+                "score": float(scores[i]),
+            }
+            for i in top
+        ]
+
+
+def create_vector_store(
+    backend: str, path, collection_name: str = None, quantize: str = None
+) -> VectorStore:
+    """Create a vector store by backend name ("chroma" or "numpy")."""
+    if backend == "chroma":
+        return ChromaVectorStore(path, collection_name)
+    if backend == "numpy":
+        return NumpyVectorStore(path, quantize=quantize)
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -0,0 +1,154 @@
+"""
+Lightweight parser for sql/0.tables.sql.
+
+Extracts tables, columns, primary keys, unique columns, foreign keys and
+CHECK constraints so tooling (index advisor, loaders, validators) can derive
+dependencies from the schema file instead of hardcoding them.
+"""
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+SCHEMA_PATH = Path(__file__).parent.parent / "sql" / "0.tables.sql"
+
+_CREATE_TABLE = re.compile(
+    r"CREATE\s+TABLE\s+(\w+)\s*\((.*?)\);", re.IGNORECASE | re.DOTALL
+)
+_FOREIGN_KEY = re.compile(
+    r"FOREIGN\s+KEY\s*\((\w+)\)\s*REFERENCES\s+(\w+)\s*\((\w+)\)", re.IGNORECASE
+)
+_CHECK = re.compile(r"CHECK\s*\((.*)\)", re.IGNORECASE | re.DOTALL)
+
+
+@dataclass
+class ForeignKey:
+    column: str
+    ref_table: str
+    ref_column: str
+
+
+@dataclass
+class Table:
+    name: str
+    columns: dict = field(default_factory=dict)  # column -> SQL type
+    not_null: set = field(default_factory=set)
+    primary_key: list = field(default_factory=list)
+    unique: set = field(default_factory=set)
+    foreign_keys: list = field(default_factory=list)
+    checks: list = field(default_factory=list)  # raw CHECK expressions
+
+    @property
+    def dependencies(self) -> set:
+        """Tables this table references (self-references excluded)."""
+        return {fk.ref_table for fk in self.foreign_keys if fk.ref_table != self.name}
+
+
+def _split_definitions(body: str) -> list:
+    """Split a CREATE TABLE body on top-level commas (ignores commas inside parens)."""
+    parts, depth, current = [], 0, []
+    for char in body:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return parts
+
+
+def _strip_comments(sql: str) -> str:
+    return "\n".join(line.split("--", 1)[0] for line in sql.splitlines())
+
+
+def parse_schema(path=SCHEMA_PATH) -> dict:
+    """Parse the schema file into an ordered {table_name: Table} dict."""
+    with open(path, "r") as f:
+        sql = _strip_comments(f.read())
+
+    tables = {}
+    for match in _CREATE_TABLE.finditer(sql):
+        table = Table(name=match.group(1).lower())
+        for definition in _split_definitions(match.group(2)):
+            definition = " ".join(definition.split())
+            if not definition:
+                continue
+            upper = definition.upper()
+
+            fk = _FOREIGN_KEY.search(definition)
+            if fk:
+                table.foreign_keys.append(
+                    ForeignKey(fk.group(1).lower(), fk.group(2).lower(), fk.group(3).lower())
+                )
+                continue
+            if upper.startswith("CONSTRAINT") or upper.startswith("CHECK"):
+                check = _CHECK.search(definition)
+                if check:
+                    table.checks.append(check.group(1).strip())
+                continue
+            if upper.startswith("PRIMARY KEY"):
+                cols = re.search(r"\((.*?)\)", definition).group(1)
+                table.primary_key = [c.strip().lower() for c in cols.split(",")]
+                continue
+
+            name, col_type = definition.split(" ", 1)
+            name = name.lower()
+            type_match = re.match(r"\w+(\s*\([\d,\s]+\))?", col_type)
+            table.columns[name] = type_match.group(0).replace(" ", "") if type_match else col_type
+            if "PRIMARY KEY" in upper:
+                table.primary_key = [name]
+            if "UNIQUE" in upper:
+                table.unique.add(name)
+            if "NOT NULL" in upper or "PRIMARY KEY" in upper:
+                table.not_null.add(name)
+            check = _CHECK.search(definition)
+            if check:
+                table.checks.append(check.group(1).strip())
+
+        tables[table.name] = table
+    return tables
+
+
+def dependency_waves(tables: dict) -> list:
+    """
+    Group tables into waves in foreign-key topological order.
+
+    Every table's referenced tables appear in an earlier wave, so the tables
+    within one wave can be loaded in parallel.
+    """
+    remaining = {name: set(table.dependencies) & set(tables) for name, table in tables.items()}
+    waves = []
+    while remaining:
+        ready = sorted(name for name, deps in remaining.items() if not deps)
+        if not ready:
+            raise ValueError(f"Foreign key cycle between tables: {sorted(remaining)}")
+        waves.append(ready)
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return waves
+
+
+def dependents(tables: dict, names) -> set:
+    """Tables outside names that reference them, directly or through other tables."""
+    found = set()
+    targets = set(names)
+    while True:
+        new = {
+            name for name, table in tables.items()
+            if name not in targets and table.dependencies & targets
+        }
+        if not new:
+            return found
+        found |= new
+        targets |= new
+
+
+def normalize_column_name(name: str) -> str:
+    """Normalize a CSV header to its schema column name (e.g. 'Bid_id' -> 'bid_id')."""
+    return name.strip().strip('"').lower()
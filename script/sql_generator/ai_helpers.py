@@ -4,26 +4,30 @@ Contains shared functions for classification, SQL formatting, and result validat
 """
 
 import os
+import json
+import logging
+import threading
+from datetime import datetime
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 import pandas as pd
 import sys
 from pathlib import Path
 
-# Import LangSmith configuration to enable tracing
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from langsmith_config import setup_langsmith
+import llm_backend
+import tracing
+from cache import TTLCache
+from metrics import invoke_llm
+from sql_generator.embedded_backend import is_embedded
+from sql_generator.sql_via_python import run_readonly
 
 load_dotenv()
-setup_langsmith()
 
-# Use LangChain ChatOpenAI for tracing
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.3,
-    openai_api_key=os.environ.get("OPENAI_API_KEY"),
-)
+logger = logging.getLogger(__name__)
+
+# ChatOpenAI, or the in-process fake with LLM_BACKEND=fake
+llm = llm_backend.chat_model("gpt-4o-mini", temperature=0.3)
 
 
 # ============================================================================
@@ -58,11 +62,11 @@ def classify_question_type(prompt: str) -> str:
 
     try:
         # Use LangChain for tracing
-        response = llm.invoke([HumanMessage(content=classification_prompt)])
+        response = invoke_llm(llm, [HumanMessage(content=classification_prompt)], "classify")
         result = response.content.strip().upper()
         return "SQL" if "SQL" in result else "CONVERSATIONAL"
     except Exception as e:
-        print(f"Classification error: {e}")
+        logger.warning("Classification error: %s", e)
         return "SQL"  # Default to SQL for safety
 
 
@@ -71,6 +75,41 @@ def classify_question_type(prompt: str) -> str:
 # ============================================================================
 
 
+# Summary tables are offered to the model only when they exist and every watermark
+# was refreshed within SUMMARY_MAX_AGE_SECONDS; the check is cached for a minute
+SUMMARY_TABLES = ("summary_monthly_revenue", "summary_customer_ltv", "summary_product_sales", "summary_watermark")
+SUMMARY_MAX_AGE_SECONDS = float(os.getenv("SUMMARY_MAX_AGE_SECONDS", 3600))
+_summary_status = TTLCache(ttl=60, maxsize=1, name="summary_tables")
+
+
+def _check_summary_tables() -> bool:
+    try:
+        exists = " AND ".join(f"to_regclass('{table}') IS NOT NULL" for table in SUMMARY_TABLES)
+        _, rows = run_readonly(f"SELECT {exists}", operation="summary_check")
+        if not rows[0][0]:
+            return False
+        _, rows = run_readonly(
+            "SELECT COUNT(*), COUNT(*) FILTER (WHERE refreshed_at >= NOW() - "
+            f"make_interval(secs => {SUMMARY_MAX_AGE_SECONDS:f})) FROM summary_watermark",
+            operation="summary_check",
+        )
+        total, fresh = rows[0]
+        if fresh < total or not total:
+            logger.info("Summary tables are stale (%d of %d watermarks fresh); not offering them", fresh, total)
+        return bool(total) and fresh == total
+    except Exception as e:
+        logger.warning("Summary table check failed: %s", e)
+        return False
+
+
+def summary_tables_available() -> bool:
+    """Whether the SQL prompt may point the model at the precomputed summary tables."""
+    if is_embedded():
+        # The embedded DuckDB database only has the base tables
+        return False
+    return _summary_status.get_or_set("available", _check_summary_tables)
+
+
 def generate_sql_query(prompt: str) -> str:
     """
     Generate SQL query from natural language prompt.
@@ -87,11 +126,28 @@ def generate_sql_query(prompt: str) -> str:
         with open(schema_path, "r") as f:
             schema_info = f.read()
 
+    # Precomputed summary tables (sql/migrations/002_summary_tables.sql)
+    summary_path = os.path.join(
+        os.path.dirname(schema_path), "migrations", "002_summary_tables.sql"
+    )
+    summary_info = ""
+    if os.path.exists(summary_path) and summary_tables_available():
+        with open(summary_path, "r") as f:
+            summary_info = f"""
+PRECOMPUTED SUMMARY TABLES:
+These are refreshed incrementally from payment and customer_review. Prefer them
+for monthly revenue, customer lifetime value/spending and product sales/rating
+totals instead of re-aggregating payment + order_header. Join back to the base
+tables only for columns they do not store (names, categories, single orders).
+{f.read()}
+"""
+
     sql_generation_prompt = f"""
 You are a PostgreSQL query optimization expert. Generate a correct, efficient SQL query.
 
 DATABASE SCHEMA:
 {schema_info}
+{summary_info}
 
 USER QUESTION: "{prompt}"
 
@@ -188,12 +244,8 @@ Generate the PostgreSQL query now:
 """
 
     try:
-        sql_llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.1,
-            openai_api_key=os.environ.get("OPENAI_API_KEY")
-        )
-        response = sql_llm.invoke([HumanMessage(content=sql_generation_prompt)])
+        sql_llm = llm_backend.chat_model("gpt-4o-mini", temperature=0.1)
+        response = invoke_llm(sql_llm, [HumanMessage(content=sql_generation_prompt)], "generate_sql")
         sql_query = response.content.strip()
 
         # Clean up the query - remove markdown code blocks if present
@@ -206,10 +258,39 @@ Generate the PostgreSQL query now:
 
         return sql_query.strip()
     except Exception as e:
-        print(f"SQL generation error: {e}")
+        logger.error("SQL generation error: %s", e)
         raise
 
 
+SQL_HISTORY_PATH = os.environ.get(
+    "SQL_HISTORY_PATH",
+    os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "..", "result", "sql_history.jsonl"
+    ),
+)
+_history_lock = threading.Lock()
+
+
+def record_generated_sql(prompt: str, sql_query: str):
+    """
+    Append a generated query to the SQL history log (JSONL).
+
+    The history is the workload the index advisor mines for candidate indexes.
+    """
+    entry = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "prompt": prompt,
+        "sql": sql_query,
+    }
+    try:
+        with _history_lock:
+            os.makedirs(os.path.dirname(SQL_HISTORY_PATH), exist_ok=True)
+            with open(SQL_HISTORY_PATH, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        logger.warning("Could not record SQL history: %s", e)
+
+
 # ============================================================================
 # VALIDATION
 # ============================================================================
@@ -256,6 +337,7 @@ def validate_sql_results(sql_results: list) -> tuple[bool, bool, str]:
 # ============================================================================
 
 
+@tracing.traced("format.display")
 def format_results_for_display(sql_results) -> str:
     """
     Format SQL results for console/display output.
@@ -284,6 +366,7 @@ def format_results_for_display(sql_results) -> str:
     return formatted
 
 
+@tracing.traced("format.api")
 def format_results_for_api(sql_results) -> list[dict]:
     """
     Format SQL results for JSON API response.
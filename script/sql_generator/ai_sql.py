@@ -5,7 +5,6 @@ Handles conversational queries, SQL generation, execution, and result analysis.
 
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 import sys
 from pathlib import Path
@@ -17,14 +16,15 @@ from .ai_helpers import (
     validate_sql_results,
     format_results_for_display,
     format_results_for_api,
+    record_generated_sql,
 )
 
-# Import LangSmith configuration to enable tracing
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from langsmith_config import setup_langsmith
+import llm_backend
+import tracing
+from metrics import invoke_llm
 
 load_dotenv()
-setup_langsmith()
 
 
 class AISQLRunner:
@@ -37,23 +37,15 @@ class AISQLRunner:
         """Initialize the AI SQL runner."""
         # Check for required environment variables
         openai_key = os.environ.get("OPENAI_API_KEY")
-        if not openai_key:
+        if not openai_key and not llm_backend.is_fake():
             raise ValueError("OPENAI_API_KEY environment variable is not set. Please set it in your environment or Render dashboard.")
         
         self.sql_runner = SQLAnalysisRunner()
         self.sql_results = None
-        # Use LangChain ChatOpenAI for tracing
+        # ChatOpenAI, or the in-process fake with LLM_BACKEND=fake
         try:
-            self.llm = ChatOpenAI(
-                model="gpt-4o-mini",
-                temperature=0.7,
-                openai_api_key=openai_key
-            )
-            self.analysis_llm = ChatOpenAI(
-                model="gpt-4o-mini",
-                temperature=0.7,
-                openai_api_key=openai_key
-            )
+            self.llm = llm_backend.chat_model("gpt-4o-mini", temperature=0.7)
+            self.analysis_llm = llm_backend.chat_model("gpt-4o-mini", temperature=0.7)
         except Exception as e:
             raise ValueError(f"Failed to initialize OpenAI client: {str(e)}. Please check your OPENAI_API_KEY.")
         # Use LangChain messages instead of dict format
@@ -80,7 +72,7 @@ class AISQLRunner:
         Get conversational AI response. Used by graph.py.
         """
         self.chat_history.append(HumanMessage(content=prompt))
-        response = self.llm.invoke(self.chat_history)
+        response = invoke_llm(self.llm, self.chat_history, "conversational")
         content = response.content
         self.chat_history.append(AIMessage(content=content))
         return content
@@ -89,7 +81,9 @@ class AISQLRunner:
         """
         Generate SQL query from natural language. Used by graph.py.
         """
-        return generate_sql_query(prompt)
+        sql_query = generate_sql_query(prompt)
+        record_generated_sql(prompt, sql_query)
+        return sql_query
 
     def judge_sql_result(self, prompt: str, sql_results: list) -> str:
         """
@@ -100,13 +94,14 @@ class AISQLRunner:
             return "no"
 
         results_summary = ""
-        for result in sql_results:
-            # Check if data is a DataFrame before calling .empty
-            if "data" in result and isinstance(result["data"], pd.DataFrame) and not result["data"].empty:
-                results_summary += (
-                    f"{result['description']}: {len(result['data'])} rows\n"
-                )
-                results_summary += result["data"].head(10).to_string() + "\n\n"
+        with tracing.span("format.judge"):
+            for result in sql_results:
+                # Check if data is a DataFrame before calling .empty
+                if "data" in result and isinstance(result["data"], pd.DataFrame) and not result["data"].empty:
+                    results_summary += (
+                        f"{result['description']}: {len(result['data'])} rows\n"
+                    )
+                    results_summary += result["data"].head(10).to_string() + "\n\n"
 
         judge_prompt = f"""
         Evaluate if the SQL query results properly answer the user's question.
@@ -121,7 +116,7 @@ class AISQLRunner:
         """
 
         # Use LangChain for tracing
-        response = self.llm.invoke([HumanMessage(content=judge_prompt)])
+        response = invoke_llm(self.llm, [HumanMessage(content=judge_prompt)], "judge")
         return response.content.strip().upper()
 
     def analyze_sql_results(self, prompt: str, sql_results: list, sql_query: str = None) -> str:
@@ -153,7 +148,7 @@ Please analyze these results and provide comprehensive insights, trends, and bus
         self.chat_history.append(HumanMessage(content=analysis_prompt))
         
         # Use LangChain for tracing
-        response = self.analysis_llm.invoke(self.chat_history)
+        response = invoke_llm(self.analysis_llm, self.chat_history, "analyze")
         content = response.content
         self.chat_history.append(AIMessage(content=content))
         return content
@@ -175,7 +170,7 @@ Please analyze these results and provide comprehensive insights, trends, and bus
         """
         self.chat_history.append(HumanMessage(content=error_prompt))
         # Use LangChain for tracing
-        response = self.llm.invoke(self.chat_history)
+        response = invoke_llm(self.llm, self.chat_history, "error_suggestion")
         content = response.content
         self.chat_history.append(AIMessage(content=content))
         return content
@@ -580,6 +575,9 @@ Please analyze these results and provide comprehensive insights, trends, and bus
 # ============================================================================
 
 if __name__ == "__main__":
+    from logging_config import setup_logging
+
+    setup_logging()
     ai = AISQLRunner()
 
     while True:
@@ -0,0 +1,466 @@
+"""
+Batch question answering over a JSONL workload.
+
+Reads one question per line ({"id": ..., "prompt": ...} or plain text) and
+answers each with generated SQL and its result:
+
+- Deduplication: questions that normalize to the same text (case,
+  punctuation, whitespace) are answered once and share the record.
+- Grouping: similar questions (token Jaccard >= --group-threshold) get a
+  group id and are scheduled back to back.
+- Generation runs on --workers threads. LLM calls go through the shared
+  dispatcher (llm_dispatch) at batch priority; --rpm/--tpm set its requests
+  and tokens per minute limits, and it retries rate-limit errors (HTTP 429)
+  with jittered exponential backoff that pauses all workers.
+- Generated SQL runs read-only on pooled connections. Identical SQL is
+  executed once and its result shared. A failing query is regenerated up to
+  --max-retries times.
+- Results stream to --output as JSONL or Parquet as they finish.
+  - A JSONL output is its own checkpoint.
+  - Parquet output also writes <output>.partial.jsonl, which is removed
+    when the run completes.
+- --resume skips questions already in the checkpoint.
+- Progress is logged every --progress-interval seconds.
+
+Usage:
+    python sql_generator/batch_runner.py questions.jsonl --output ../result/answers.jsonl
+    python sql_generator/batch_runner.py questions.jsonl --output ../result/answers.parquet --workers 8 --rpm 300
+    python sql_generator/batch_runner.py questions.jsonl --output ../result/answers.jsonl --resume
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import llm_dispatch
+import tracing
+from sql_generator.sql_via_python import run_readonly
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "by", "in", "on", "to", "and", "or", "is", "are", "was", "were",
+    "what", "which", "who", "how", "many", "much", "show", "me", "list", "give", "each", "per", "all",
+    "do", "does", "did", "with", "from", "our", "we", "i",
+}
+
+
+# ============================================================================
+# INPUT
+# ============================================================================
+
+
+def normalize_question(prompt: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", prompt.lower()).split())
+
+
+def _tokens(normalized: str) -> set:
+    return {token for token in normalized.split() if token not in STOPWORDS}
+
+
+def load_questions(path: str) -> list:
+    """[{"id", "prompt", ...}] from JSONL or plain text; ids default to the line number."""
+    questions = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line) if line.startswith("{") else {"prompt": line}
+            item["id"] = str(item.get("id", f"line-{number}"))
+            questions.append(item)
+    return questions
+
+
+def plan(questions: list, group_threshold: float = 0.6) -> tuple:
+    """
+    (unique, duplicates): unique questions in scheduling order, each with a
+    group id, and {question id: id of the unique question answering it}.
+
+    Grouping is greedy: a question joins the first group whose first
+    member's token set has Jaccard similarity >= group_threshold.
+    """
+    unique, duplicates, by_text, groups = [], {}, {}, []
+    for question in questions:
+        normalized = normalize_question(question["prompt"])
+        if normalized in by_text:
+            duplicates[question["id"]] = by_text[normalized]["id"]
+            continue
+        by_text[normalized] = question
+        tokens = _tokens(normalized)
+        for group_id, seed_tokens, members in groups:
+            union = tokens | seed_tokens
+            if union and len(tokens & seed_tokens) / len(union) >= group_threshold:
+                members.append(question)
+                question["group"] = group_id
+                break
+        else:
+            question["group"] = question["id"]
+            groups.append((question["id"], tokens, [question]))
+    for _, _, members in groups:
+        unique.extend(members)
+    return unique, duplicates
+
+
+# ============================================================================
+# LLM USAGE
+# ============================================================================
+
+
+class LLMUsage:
+    """Tokens and dispatcher queue time of the run's LLM calls, summed across workers."""
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, spans: list):
+        spans = [span for span in spans if span.name.startswith("llm.")]
+        tokens = sum(
+            (span.attributes.get("prompt_tokens") or 0) + (span.attributes.get("completion_tokens") or 0)
+            for span in spans
+        )
+        waited = sum(span.attributes.get("queued_ms") or 0 for span in spans) / 1000
+        with self._lock:
+            self.calls += len(spans)
+            self.tokens += tokens
+            self.waited += waited
+
+
+def call_llm(usage: LLMUsage, func, *args, **kwargs):
+    """
+    Call an LLM-backed function and add its tokens and queue time to usage.
+
+    Rate limits and 429 retries are the shared dispatcher's job; see
+    BatchRunner, which sets its limits from --rpm/--tpm.
+    """
+    try:
+        with tracing.capture("llm_call") as spans:
+            return func(*args, **kwargs)
+    finally:
+        usage.add(spans)
+
+
+# ============================================================================
+# SHARED EXECUTION
+# ============================================================================
+
+
+def _jsonable(value):
+    return json.loads(json.dumps(value, default=str))
+
+
+class SharedResults:
+    """Execute each distinct SQL text once; concurrent and later callers share the outcome."""
+
+    def __init__(self, max_rows: int = 1000):
+        self.max_rows = max_rows
+        self.executed = 0
+        self.shared = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sql: str) -> str:
+        return " ".join(sql.strip().rstrip(";").split()).lower()
+
+    def get(self, sql: str) -> tuple:
+        """(result dict, shared); re-raises the execution error for failing SQL."""
+        key = self.key(sql)
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+                self.executed += 1
+            else:
+                self.shared += 1
+        if owner:
+            try:
+                columns, rows = run_readonly(sql, operation="batch")
+                future.set_result({
+                    "columns": columns,
+                    "rows": _jsonable([list(row) for row in rows[:self.max_rows]]),
+                    "row_count": len(rows),
+                    "truncated": len(rows) > self.max_rows,
+                })
+            except Exception as e:
+                future.set_exception(e)
+        return future.result(), not owner
+
+
+# ============================================================================
+# OUTPUT
+# ============================================================================
+
+
+class ResultWriter:
+    """Appends finished records to JSONL, or to Parquet row groups plus a JSONL checkpoint."""
+
+    PARQUET_FIELDS = ["id", "prompt", "group", "duplicate_of", "status", "sql", "columns", "rows",
+                      "row_count", "truncated", "shared_result", "retries", "analysis", "error",
+                      "latency_ms", "prompt_tokens", "completion_tokens"]
+
+    def __init__(self, output: str, resume: bool = False, row_group_size: int = 100):
+        self.output = Path(output)
+        self.parquet = self.output.suffix == ".parquet"
+        self.checkpoint = self.output.with_suffix(".partial.jsonl") if self.parquet else self.output
+        self.row_group_size = row_group_size
+        self.done = {}
+        if resume and self.checkpoint.exists():
+            with open(self.checkpoint) as f:
+                for line in f:
+                    # A crash can leave a torn last line
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.done[record["id"]] = record
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._parquet_writer = None
+        if self.done:
+            # Drop a line torn by the crash so the output stays valid JSONL
+            content = self.checkpoint.read_bytes()
+            with open(self.checkpoint, "r+b") as f:
+                f.truncate(content.rfind(b"\n") + 1)
+            self._checkpoint = open(self.checkpoint, "a")
+            # Parquet files cannot be appended to, so earlier records are written again
+            for record in self.done.values():
+                if self.parquet:
+                    self._pending.append(record)
+                    if len(self._pending) >= self.row_group_size:
+                        self._flush_parquet()
+        else:
+            self._checkpoint = open(self.checkpoint, "w")
+
+    def _write(self, record: dict):
+        self._checkpoint.write(json.dumps(record, default=str) + "\n")
+        self._checkpoint.flush()
+        if self.parquet:
+            self._pending.append(record)
+            if len(self._pending) >= self.row_group_size:
+                self._flush_parquet()
+
+    def write(self, record: dict):
+        with self._lock:
+            self._write(record)
+
+    def _flush_parquet(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+        if not self._pending:
+            return
+        frame = pd.DataFrame([
+            {
+                **{field: record.get(field) for field in self.PARQUET_FIELDS},
+                "columns": json.dumps(record.get("columns")),
+                "rows": json.dumps(record.get("rows"), default=str),
+            }
+            for record in self._pending
+        ], columns=self.PARQUET_FIELDS)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.output, table.schema)
+        self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+        self._pending = []
+
+    def close(self, completed: bool):
+        with self._lock:
+            self._checkpoint.close()
+            if self.parquet:
+                self._flush_parquet()
+                if self._parquet_writer is not None:
+                    self._parquet_writer.close()
+                if completed:
+                    self.checkpoint.unlink(missing_ok=True)
+
+
+class Progress:
+    def __init__(self, total: int, interval: float = 10.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.errors = 0
+        self.start = time.monotonic()
+        self._last = self.start
+        self._lock = threading.Lock()
+
+    def advance(self, count: int = 1, errors: int = 0, extra: str = ""):
+        with self._lock:
+            self.done += count
+            self.errors += errors
+            now = time.monotonic()
+            if now - self._last < self.interval and self.done < self.total:
+                return
+            self._last = now
+            rate = self.done / max(now - self.start, 1e-9)
+            eta = (self.total - self.done) / rate if rate else float("inf")
+            logger.info("%d/%d questions (%.0f%%), %.2f q/s, ETA %.0fs, %d errors%s",
+                        self.done, self.total, 100 * self.done / max(self.total, 1), rate, eta,
+                        self.errors, extra)
+
+
+# ============================================================================
+# BATCH RUNNER
+# ============================================================================
+
+
+class BatchRunner:
+    def __init__(self, workers: int = 4, rpm: float = 0, tpm: float = 0, max_retries: int = 2,
+                 analyze: bool = False, max_rows: int = 1000, group_threshold: float = 0.6,
+                 progress_interval: float = 10.0):
+        self.workers = workers
+        self.dispatcher = llm_dispatch.get_dispatcher()
+        if rpm or tpm:
+            self.dispatcher.set_rate_limits(rpm, tpm)
+        self.usage = LLMUsage()
+        self.results = SharedResults(max_rows)
+        self.max_retries = max_retries
+        self.analyze = analyze
+        self.group_threshold = group_threshold
+        self.progress_interval = progress_interval
+
+    def answer(self, question: dict) -> dict:
+        from sql_generator.ai_helpers import generate_sql_query, record_generated_sql
+
+        record = {"id": question["id"], "prompt": question["prompt"], "group": question.get("group"),
+                  "duplicate_of": None, "status": "error", "sql": None, "retries": 0,
+                  "shared_result": False, "analysis": None, "error": None}
+        start = time.perf_counter()
+        with tracing.capture("batch") as spans:
+            try:
+                for attempt in range(self.max_retries + 1):
+                    record["retries"] = attempt
+                    record["sql"] = call_llm(self.usage, generate_sql_query, question["prompt"])
+                    try:
+                        result, record["shared_result"] = self.results.get(record["sql"])
+                    except Exception as e:
+                        record["error"] = str(e)[:500]
+                        continue
+                    record.update(result, status="success", error=None)
+                    record_generated_sql(question["prompt"], record["sql"])
+                    break
+                if self.analyze and record["status"] == "success":
+                    record["analysis"] = self._analyze(question["prompt"], record)
+            except Exception as e:
+                record["error"] = str(e)[:500]
+        llm_spans = [span for span in spans if span.name.startswith("llm.")]
+        record["prompt_tokens"] = sum(span.attributes.get("prompt_tokens") or 0 for span in llm_spans)
+        record["completion_tokens"] = sum(span.attributes.get("completion_tokens") or 0 for span in llm_spans)
+        record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return record
+
+    def _analyze(self, prompt: str, record: dict) -> str:
+        from sql_generator.ai_sql import AISQLRunner
+
+        data = pd.DataFrame(record["rows"], columns=record["columns"])
+        return call_llm(
+            self.usage,
+            AISQLRunner().analyze_sql_results,
+            prompt,
+            [{"description": "Batch query", "data": data}],
+            sql_query=record["sql"],
+        )
+
+    def run(self, questions: list, writer: ResultWriter) -> dict:
+        unique, duplicates = plan(questions, self.group_threshold)
+        rate_limited = self.dispatcher.limiter.rate_limited
+        prompts = {question["id"]: question["prompt"] for question in questions}
+        waiting = {}
+        for question_id, canonical_id in duplicates.items():
+            waiting.setdefault(canonical_id, []).append(question_id)
+
+        todo = [question for question in unique if question["id"] not in writer.done]
+        pending_duplicates = sum(question_id not in writer.done for question_id in duplicates)
+        progress = Progress(len(todo) + pending_duplicates, self.progress_interval)
+        logger.info("%d questions: %d unique, %d duplicates, %d groups, %d already done",
+                    len(questions), len(unique), len(duplicates),
+                    len({question["group"] for question in unique}), len(writer.done))
+
+        def emit_duplicates(record: dict) -> int:
+            count = 0
+            for question_id in waiting.get(record["id"], []):
+                if question_id not in writer.done:
+                    writer.write({**record, "id": question_id, "prompt": prompts[question_id],
+                                  "duplicate_of": record["id"]})
+                    count += 1
+            return count
+
+        # Duplicates of questions finished before a crash may not have been written yet
+        for question_id, record in list(writer.done.items()):
+            progress.advance(emit_duplicates(record))
+
+        def work(question: dict):
+            with llm_dispatch.request("batch"):
+                record = self.answer(question)
+            writer.write(record)
+            copies = emit_duplicates(record)
+            failed = record["status"] != "success"
+            progress.advance(1 + copies, errors=failed * (1 + copies),
+                             extra=f", {self.results.shared} shared results")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(work, todo))
+
+        return {
+            "questions": len(questions),
+            "unique": len(unique),
+            "duplicates": len(duplicates),
+            "answered": len(todo),
+            "errors": progress.errors,
+            "queries_executed": self.results.executed,
+            "shared_results": self.results.shared,
+            "llm_calls": self.usage.calls,
+            "llm_tokens": self.usage.tokens,
+            "rate_limited": self.dispatcher.limiter.rate_limited - rate_limited,
+            "llm_wait_s": round(self.usage.waited, 1),
+            "wall_s": round(time.monotonic() - progress.start, 1),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a JSONL workload of questions with generated SQL")
+    parser.add_argument("input", help="JSONL ({id, prompt}) or text file, one question per line")
+    parser.add_argument("--output", required=True, help="Output .jsonl or .parquet")
+    parser.add_argument("--resume", action="store_true", help="Skip questions already in the checkpoint")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent questions (default 4)")
+    parser.add_argument("--rpm", type=float, default=0, help="LLM requests per minute (0: unlimited)")
+    parser.add_argument("--tpm", type=float, default=0, help="LLM tokens per minute (0: unlimited)")
+    parser.add_argument("--max-retries", type=int, default=2, help="Regenerations after a failing query")
+    parser.add_argument("--analyze", action="store_true", help="Also write an AI analysis of each result")
+    parser.add_argument("--max-rows", type=int, default=1000, help="Rows kept per result")
+    parser.add_argument("--group-threshold", type=float, default=0.6,
+                        help="Token Jaccard similarity for grouping questions (default 0.6)")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress logs")
+    args = parser.parse_args()
+
+    from logging_config import setup_logging
+
+    setup_logging()
+    runner = BatchRunner(args.workers, args.rpm, args.tpm, args.max_retries, args.analyze,
+                         args.max_rows, args.group_threshold, args.progress_interval)
+    writer = ResultWriter(args.output, resume=args.resume)
+    completed = False
+    try:
+        summary = runner.run(load_questions(args.input), writer)
+        completed = True
+    finally:
+        writer.close(completed)
+    print(json.dumps(summary, indent=2))
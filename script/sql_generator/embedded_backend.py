@@ -0,0 +1,490 @@
+"""
+Embedded DuckDB backend for running the stack without PostgreSQL.
+
+With DB_BACKEND=duckdb, query_executor and pooled_connection hand out
+connections to an in-process DuckDB database instead of a server. Tables are
+created from sql/0.tables.sql and loaded from data/*.csv (or .csv.gz), while
+Parquet snapshots (<table>.parquet or a <table>/ directory of parquet files)
+are queried in place through views. Every statement goes through
+translate_sql() first, so the PostgreSQL that the analysis files and the SQL
+agent emit runs unchanged.
+
+Environment:
+    DB_BACKEND       postgres (default) or duckdb
+    DUCKDB_PATH      Database file to create or reuse (default: in memory)
+    DUCKDB_DATA_DIR  Directory of CSV/Parquet files (default: data/)
+
+Usage:
+    python sql_generator/embedded_backend.py --check
+    python sql_generator/embedded_backend.py --path ../result/ecommerce.duckdb
+    python sql_generator/embedded_backend.py --query "SELECT COUNT(*) FROM order_header"
+"""
+
+import argparse
+import csv
+import gzip
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from schema import normalize_column_name, parse_schema
+
+logger = logging.getLogger(__name__)
+
+try:
+    import duckdb
+except ImportError:  # optional: only needed for DB_BACKEND=duckdb
+    duckdb = None
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+SQL_DIR = Path(__file__).parent.parent.parent / "sql"
+
+# Transaction/session statements with no DuckDB equivalent; the embedded
+# database is read by one process, so they can be skipped safely
+_IGNORED_STATEMENT = re.compile(
+    r"^\s*(SAVEPOINT|RELEASE\s+SAVEPOINT|ROLLBACK\s+TO|SET\s+TRANSACTION|SET\s+SESSION\s+CHARACTERISTICS)\b",
+    re.IGNORECASE,
+)
+_BARE_NUMERIC_CAST = re.compile(r"::\s*(numeric|decimal)\b(?!\s*\()", re.IGNORECASE)
+_TO_CHAR = re.compile(r"\bto_char\s*\(", re.IGNORECASE)
+_GROUP_BY_ERROR = re.compile(r'column "(\w+)" must appear in the GROUP BY clause')
+_TABLE_ALIAS = re.compile(r"\b(?:from|join)\s+(\w+)(?:\s+(?:as\s+)?(\w+))?", re.IGNORECASE)
+_GROUP_BY = re.compile(r"\bgroup\s+by\s+", re.IGNORECASE)
+_GROUP_BY_END = re.compile(
+    r"\b(having|order|limit|offset|window|qualify|union|except|intersect)\b", re.IGNORECASE
+)
+_ALIAS_KEYWORDS = {
+    "on", "using", "where", "join", "left", "right", "inner", "outer", "full", "cross",
+    "natural", "group", "order", "limit", "having", "union", "lateral", "window",
+}
+
+# PostgreSQL TO_CHAR patterns -> strftime, longest first
+_TO_CHAR_FORMATS = [
+    ("YYYY", "%Y"), ("Month", "%B"), ("Mon", "%b"), ("MM", "%m"), ("DD", "%d"),
+    ("HH24", "%H"), ("HH12", "%I"), ("MI", "%M"), ("SS", "%S"), ("Day", "%A"),
+    ("Dy", "%a"), ("YY", "%y"), ("AM", "%p"), ("PM", "%p"),
+]
+
+
+def backend_name() -> str:
+    return os.getenv("DB_BACKEND", "postgres").strip().lower()
+
+
+def is_embedded() -> bool:
+    return backend_name() == "duckdb"
+
+
+# ----------------------------------------------------------------------
+# PostgreSQL compatibility
+# ----------------------------------------------------------------------
+
+
+def _call_arguments(sql: str, open_paren: int) -> tuple:
+    """Split the arguments of the call whose '(' is at open_paren; returns (args, close index)."""
+    depth, quote, start, args = 0, None, open_paren + 1, []
+    for i in range(open_paren, len(sql)):
+        char = sql[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                args.append(sql[start:i].strip())
+                return args, i
+        elif char == "," and depth == 1:
+            args.append(sql[start:i].strip())
+            start = i + 1
+    raise ValueError("Unbalanced parentheses")
+
+
+def _to_char_format(fmt: str) -> str:
+    out, i = [], 0
+    while i < len(fmt):
+        for pattern, replacement in _TO_CHAR_FORMATS:
+            if fmt.startswith(pattern, i):
+                out.append(replacement)
+                i += len(pattern)
+                break
+        else:
+            out.append(fmt[i])
+            i += 1
+    return "".join(out)
+
+
+def _rewrite_to_char(sql: str) -> str:
+    """TO_CHAR(expr, 'YYYY-MM') -> strftime(expr, '%Y-%m')."""
+    match = _TO_CHAR.search(sql)
+    while match:
+        args, close = _call_arguments(sql, match.end() - 1)
+        if len(args) == 2 and args[1].startswith("'"):
+            replacement = f"strftime({args[0]}, '{_to_char_format(args[1].strip(chr(39)))}')"
+            sql = sql[: match.start()] + replacement + sql[close + 1:]
+            match = _TO_CHAR.search(sql, match.start() + len(replacement))
+        else:
+            match = _TO_CHAR.search(sql, close)
+    return sql
+
+
+def _translate_params(sql: str, params):
+    """psycopg2 placeholders (%s, %(name)s, %%) -> DuckDB (?, $name, %)."""
+    if params is None:
+        return sql, None
+    if isinstance(params, dict):
+        sql = re.sub(r"%\((\w+)\)s", r"$\1", sql)
+    else:
+        sql = sql.replace("%s", "?")
+        params = list(params)
+    return sql.replace("%%", "%"), params
+
+
+def translate_sql(sql: str, params=None) -> tuple:
+    """
+    Rewrite PostgreSQL-only constructs for DuckDB.
+
+    DuckDB already understands EXTRACT, AGE, DATE_TRUNC, INTERVAL literals
+    and :: casts; this covers the rest the agent emits:
+    - TO_CHAR(x, fmt) becomes strftime with the format translated
+    - bare ::numeric/::decimal casts become ::DOUBLE (DuckDB's default
+      DECIMAL(18,3) would truncate averages to three places)
+    - pg_export_snapshot() returns a constant (the data is static)
+    - psycopg2 %s / %(name)s placeholders become ? / $name
+
+    Returns:
+        (sql, params) ready for duckdb
+    """
+    sql = _rewrite_to_char(sql)
+    sql = _BARE_NUMERIC_CAST.sub("::DOUBLE", sql)
+    sql = re.sub(r"\bpg_export_snapshot\s*\(\s*\)", "'embedded'", sql, flags=re.IGNORECASE)
+    return _translate_params(sql, params)
+
+
+def _group_by_clauses(sql: str) -> list:
+    """(start, end) spans of every GROUP BY item list."""
+    spans = []
+    for match in _GROUP_BY.finditer(sql):
+        depth, end = 0, len(sql)
+        for i in range(match.end(), len(sql)):
+            char = sql[i]
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                if depth == 0:
+                    end = i
+                    break
+                depth -= 1
+            elif char == ";" and depth == 0:
+                end = i
+                break
+            elif depth == 0 and _GROUP_BY_END.match(sql, i) and (i == 0 or not sql[i - 1].isalnum()):
+                end = i
+                break
+        spans.append((match.end(), end))
+    return spans
+
+
+def add_functional_dependency(sql: str, column: str, tables: dict):
+    """
+    Emulate PostgreSQL's GROUP BY primary-key rule for DuckDB.
+
+    PostgreSQL lets "GROUP BY p.product_id" select p.product_name because
+    product_id is the primary key; DuckDB requires the column to be listed.
+    Appends alias.column to every GROUP BY that groups by the primary key of
+    a table having that column (grouping by a dependent column does not
+    change the groups).
+
+    Returns:
+        Rewritten SQL, or None if no GROUP BY qualifies
+    """
+    aliases = {}
+    for table, alias in _TABLE_ALIAS.findall(sql):
+        table = table.lower()
+        if table not in tables:
+            continue
+        alias = alias.lower() if alias and alias.lower() not in _ALIAS_KEYWORDS else table
+        aliases[alias] = tables[table]
+
+    rewritten = sql
+    for start, end in reversed(_group_by_clauses(sql)):
+        items = {item.strip().lower() for item in sql[start:end].split(",")}
+        for alias, table in aliases.items():
+            key = {f"{alias}.{pk}" for pk in table.primary_key}
+            if column in table.columns and key and key <= items and f"{alias}.{column}" not in items:
+                clause = rewritten[start:end].rstrip()
+                rewritten = rewritten[:start] + f"{clause}, {alias}.{column} " + rewritten[end:]
+                break
+    return rewritten if rewritten != sql else None
+
+
+# ----------------------------------------------------------------------
+# DB-API wrappers
+# ----------------------------------------------------------------------
+
+
+class EmbeddedCursor:
+    """psycopg2-style cursor over a DuckDB connection."""
+
+    max_rewrites = 8
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._con = connection._con
+        self.description = None
+        self.rowcount = -1
+        self.query = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql: str, params=None):
+        if _IGNORED_STATEMENT.match(sql):
+            self.description, self.rowcount = None, -1
+            return self
+        sql, params = translate_sql(sql, params)
+        for _ in range(self.max_rewrites):
+            try:
+                self._con.execute(sql, params) if params is not None else self._con.execute(sql)
+                break
+            except duckdb.BinderException as e:
+                missing = _GROUP_BY_ERROR.search(str(e))
+                rewritten = (
+                    add_functional_dependency(sql, missing.group(1), self.connection.tables)
+                    if missing
+                    else None
+                )
+                if rewritten is None:
+                    raise
+                sql = rewritten
+        self.query = sql
+        self.description = self._con.description
+        self.rowcount = -1
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        for params in seq_of_params:
+            self.execute(sql, params)
+        return self
+
+    def fetchall(self):
+        return self._con.fetchall()
+
+    def fetchone(self):
+        return self._con.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self._con.fetchmany(size)
+
+    def close(self):
+        pass
+
+
+class EmbeddedConnection:
+    """psycopg2-style connection to the shared embedded database."""
+
+    def __init__(self, database):
+        # Each DuckDB cursor() is an independent connection, safe to use from one thread
+        self._con = database.con.cursor()
+        self.tables = database.tables
+        self.autocommit = True
+        self.closed = 0
+
+    def cursor(self):
+        return EmbeddedCursor(self)
+
+    def set_session(self, **kwargs):
+        """Isolation/read-only settings are no-ops: the embedded data does not change."""
+
+    def commit(self):
+        self._end_transaction(self._con.commit)
+
+    def rollback(self):
+        self._end_transaction(self._con.rollback)
+
+    @staticmethod
+    def _end_transaction(end):
+        try:
+            end()
+        except duckdb.TransactionException:
+            pass  # no transaction open
+
+    def close(self):
+        if not self.closed:
+            self._con.close()
+            self.closed = 1
+
+
+class EmbeddedDatabase:
+    """One DuckDB database per process, loaded from CSV/Parquet on first use."""
+
+    def __init__(self, path: str = None, data_dir=None):
+        if duckdb is None:
+            raise ImportError('DB_BACKEND=duckdb requires the duckdb package (pip install -e ".[embedded]" or pip install duckdb)')
+        self.path = path or os.getenv("DUCKDB_PATH") or ":memory:"
+        self.data_dir = Path(data_dir or os.getenv("DUCKDB_DATA_DIR") or DATA_DIR)
+        self.tables = parse_schema()
+        self.con = duckdb.connect(self.path)
+        self.load_report = self.load()
+
+    def _existing_tables(self) -> set:
+        rows = self.con.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main'"
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def _source(self, name: str):
+        """(kind, path or glob) for a table's data, or None."""
+        for kind, path in (
+            ("parquet", self.data_dir / f"{name}.parquet"),
+            ("csv", self.data_dir / f"{name}.csv"),
+            ("csv", self.data_dir / f"{name}.csv.gz"),
+        ):
+            if path.exists():
+                return kind, str(path)
+        directory = self.data_dir / name
+        if directory.is_dir() and any(directory.glob("*.parquet")):
+            return "parquet", str(directory / "*.parquet")
+        return None
+
+    def _create_table(self, table):
+        columns = ", ".join(f"{column} {sql_type}" for column, sql_type in table.columns.items())
+        key = f", PRIMARY KEY ({', '.join(table.primary_key)})" if table.primary_key else ""
+        self.con.execute(f"CREATE TABLE {table.name} ({columns}{key})")
+
+    def _load_csv(self, table, path: str):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8-sig") as f:
+            header = [normalize_column_name(column) for column in next(csv.reader(f))]
+        unknown = [column for column in header if column not in table.columns]
+        if unknown:
+            raise ValueError(f"{Path(path).name}: columns not in table {table.name}: {unknown}")
+        self._create_table(table)
+        self.con.execute(
+            f"INSERT INTO {table.name} ({', '.join(header)}) "
+            "SELECT * FROM read_csv(?, header = true, all_varchar = true, names = ?)",
+            [path, header],
+        )
+
+    def _create_parquet_view(self, table, pattern: str):
+        literal = pattern.replace("'", "''")
+        described = self.con.execute(f"DESCRIBE SELECT * FROM read_parquet('{literal}')").fetchall()
+        select = []
+        for row in described:
+            column = normalize_column_name(row[0])
+            if column in table.columns:
+                select.append(f'CAST("{row[0]}" AS {table.columns[column]}) AS {column}')
+        self.con.execute(
+            f"CREATE VIEW {table.name} AS SELECT {', '.join(select)} FROM read_parquet('{literal}')"
+        )
+
+    def load(self) -> list:
+        """Create every schema table that does not exist yet and load its data."""
+        existing = self._existing_tables()
+        report = []
+        for name, table in self.tables.items():
+            if name in existing:
+                continue
+            start = time.perf_counter()
+            source = self._source(name)
+            if source is None:
+                self._create_table(table)
+                kind = "empty"
+            elif source[0] == "parquet":
+                self._create_parquet_view(table, source[1])
+                kind = "parquet"
+            else:
+                self._load_csv(table, source[1])
+                kind = "csv"
+            rows = self.con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+            report.append({
+                "table": name,
+                "source": kind,
+                "rows": rows,
+                "seconds": round(time.perf_counter() - start, 3),
+            })
+        if report:
+            total = sum(entry["rows"] for entry in report)
+            logger.info("Embedded database (%s): loaded %d tables, %s rows from %s",
+                        self.path, len(report), f"{total:,}", self.data_dir)
+        return report
+
+    def connect(self) -> EmbeddedConnection:
+        return EmbeddedConnection(self)
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_embedded_database() -> EmbeddedDatabase:
+    """Get or create the process-wide embedded database."""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = EmbeddedDatabase()
+    return _database
+
+
+def check_compatibility(database: EmbeddedDatabase) -> list:
+    """Run every analysis and validation query; returns the ones that fail."""
+    from sql_generator.query_runner import SQLAnalysisRunner
+
+    runner = SQLAnalysisRunner(str(SQL_DIR))
+    queries = [
+        (path.name, query["index"], query["sql"])
+        for path in sorted(SQL_DIR.glob("[1-9]*.sql"))
+        for query in runner.parse_queries(path.name)
+    ]
+    queries += [
+        (f"validation/{path.name}", 1, path.read_text())
+        for path in sorted((SQL_DIR / "validation").glob("*.sql"))
+    ]
+    failures = []
+    cur = database.connect().cursor()
+    for filename, index, sql in queries:
+        # Incremental validation checks take a (low, high] id range
+        params = {"low": 0, "high": 2**31 - 1} if "%(low)s" in sql else None
+        try:
+            cur.execute(sql, params)
+            cur.fetchall()
+        except Exception as e:
+            failures.append({"file": filename, "index": index, "error": str(e).splitlines()[0]})
+    print(f"{len(queries) - len(failures)}/{len(queries)} queries ran on the embedded backend")
+    for failure in failures:
+        print(f"  {failure['file']} query {failure['index']}: {failure['error']}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedded DuckDB backend")
+    parser.add_argument("--path", help="Database file (default: DUCKDB_PATH or in memory)")
+    parser.add_argument("--data-dir", help="CSV/Parquet directory (default: DUCKDB_DATA_DIR or data/)")
+    parser.add_argument("--query", help="Run one query and print the result")
+    parser.add_argument("--check", action="store_true", help="Run the sql/ analysis and validation files")
+    args = parser.parse_args()
+
+    database = EmbeddedDatabase(args.path, args.data_dir)
+    for entry in database.load_report:
+        print(f"  {entry['table']:<22} {entry['source']:<8} {entry['rows']:>10,} rows  {entry['seconds']:.2f}s")
+    if args.query:
+        cur = database.connect().cursor()
+        cur.execute(args.query)
+        columns = [desc[0] for desc in cur.description] if cur.description else []
+        print(pd.DataFrame(cur.fetchall(), columns=columns or None).to_string(index=False))
+    if args.check:
+        sys.exit(1 if check_compatibility(database) else 0)
@@ -1,43 +1,309 @@
+"""
+Execution-accuracy evaluation for the SQL generator.
+
+Each example in the dataset (sql_generator_sample.json) has a prompt and a
+gold query. Prompts run concurrently (--workers) through either:
+
+- agent     the full LangGraph pipeline (classify, generate, execute, judge,
+            retry); retries are the graph's retry_count
+- generate  generate_sql_query() alone, regenerating on execution errors
+
+Generated and gold SQL execute on pooled connections inside read-only
+transactions (run_readonly). A prediction is correct when its result set
+equals the gold one, ignoring row order, column order and column names,
+with numeric tolerance (--rtol/--atol). Gold results are cached under
+result/eval_cache/ keyed by query and database, so reruns only pay for
+generation; --refresh-gold rebuilds them after the data changes.
+
+The report has execution accuracy, retries, LLM tokens and latency per
+prompt and in total; --baseline prints the change against an earlier report.
+
+Usage:
+    python sql_generator/eval/sql_generator_eval.py --workers 8
+    python sql_generator/eval/sql_generator_eval.py --pipeline generate --output ../result/sql_eval.json
+    LLM_BACKEND=fake DB_BACKEND=duckdb python sql_generator/eval/sql_generator_eval.py
+"""
+
+import argparse
+import hashlib
+import json
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import json
 
-from numpy import result_type
-
-project_root = (
-    Path().resolve().parent.parent.parent
-)  # Adjust based on notebook location
-sys.path.insert(0, str(project_root / "script"))
-
-from sql_generator.ai_helpers import generate_sql_query
-from sql_generator.query_runner import SQLAnalysisRunner
-
-
-json_path = (
-    project_root / "script" / "sql_generator" / "eval" / "sql_generator_sample.json"
-)
-with open(json_path) as f:
-    data = json.load(f)
-
-results = []
-for row in data:
-    prompt = row["prompt"]
-
-    sql_query = generate_sql_query(prompt)
-    ai_runner = SQLAnalysisRunner()
-
-    sql_data = ai_runner.run_single_query(sql_query)
-    
-    print("================")
-    print(f"query: {prompt}")
-    print(f"generated query: {sql_query}")
-    print(f"sql result: \n {sql_data}")
-    print("================")
-
-    results.append(
-        {
-            "prompt": prompt,
-            "generated query": sql_query,
-            "sql result": sql_data,
-        }
-    )
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import tracing
+from sql_generator.embedded_backend import is_embedded
+from sql_generator.sql_via_python import run_readonly
+
+EVAL_DIR = Path(__file__).parent
+DEFAULT_DATASET = EVAL_DIR / "sql_generator_sample.json"
+RESULT_DIR = Path(__file__).resolve().parents[3] / "result"
+GOLD_CACHE_DIR = RESULT_DIR / "eval_cache" / "gold"
+PIPELINES = ("agent", "generate")
+
+
+# ============================================================================
+# EXECUTION
+# ============================================================================
+
+
+def execute_sql(sql: str) -> pd.DataFrame:
+    columns, rows = run_readonly(sql, operation="eval")
+    return pd.DataFrame(rows, columns=columns) if columns else pd.DataFrame(rows)
+
+
+def _database_key() -> str:
+    if is_embedded():
+        return f"duckdb:{os.getenv('DUCKDB_PATH', ':memory:')}"
+    return f"postgres:{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+
+
+def gold_result(sql: str, refresh: bool = False) -> pd.DataFrame:
+    """Normalized gold result, cached on disk per (query, database)."""
+    digest = hashlib.sha256(f"{_database_key()}\n{sql.strip()}".encode()).hexdigest()[:24]
+    path = GOLD_CACHE_DIR / f"{digest}.pkl"
+    if path.exists() and not refresh:
+        return pd.read_pickle(path)
+    frame = normalize(execute_sql(sql))
+    GOLD_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    frame.to_pickle(path)
+    return frame
+
+
+# ============================================================================
+# COMPARISON
+# ============================================================================
+
+
+def normalize(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Positional column names; numeric columns (including Decimal) as float64,
+    datetimes as ISO strings and everything else as strings, NULLs as NaN/"<null>".
+    """
+    columns = {}
+    for i in range(frame.shape[1]):
+        column = frame.iloc[:, i]
+        numeric = pd.to_numeric(column, errors="coerce")
+        if column.notna().sum() == numeric.notna().sum() and not pd.api.types.is_bool_dtype(column):
+            columns[f"c{i}"] = numeric.astype("float64")
+        elif pd.api.types.is_datetime64_any_dtype(column):
+            columns[f"c{i}"] = column.dt.strftime("%Y-%m-%dT%H:%M:%S").fillna("<null>")
+        else:
+            columns[f"c{i}"] = column.map(lambda v: "<null>" if v is None or v != v else str(v))
+    return pd.DataFrame(columns, index=range(len(frame)))
+
+
+def _column_equal(left: pd.Series, right: pd.Series, rtol: float, atol: float) -> bool:
+    if left.dtype == "float64" and right.dtype == "float64":
+        return bool(np.allclose(left.to_numpy(), right.to_numpy(), rtol=rtol, atol=atol, equal_nan=True))
+    if left.dtype == "float64" or right.dtype == "float64":
+        return False
+    return bool((left.to_numpy() == right.to_numpy()).all())
+
+
+def _sorted_column(column: pd.Series, decimals: int) -> pd.Series:
+    if column.dtype == "float64":
+        return column.round(decimals).sort_values(ignore_index=True)
+    return column.sort_values(ignore_index=True)
+
+
+def results_match(predicted: pd.DataFrame, gold: pd.DataFrame, rtol: float = 1e-4, atol: float = 1e-6,
+                  decimals: int = 6) -> bool:
+    """
+    Set-equality of two normalized results, ignoring row and column order.
+
+    Each gold column is paired with an unused predicted column holding the
+    same multiset of values. The predicted frame is then reordered to gold's
+    column order, and both frames are sorted by every column. Finally the
+    frames are compared column by column, with numeric tolerance.
+    """
+    if predicted.shape != gold.shape:
+        return False
+    if gold.shape[1] == 0:
+        return True
+
+    unused = list(predicted.columns)
+    order = []
+    for name in gold.columns:
+        target = _sorted_column(gold[name], decimals)
+        match = next(
+            (candidate for candidate in unused
+             if _column_equal(_sorted_column(predicted[candidate], decimals), target, rtol, atol)),
+            None,
+        )
+        if match is None:
+            return False
+        unused.remove(match)
+        order.append(match)
+
+    aligned = predicted[order].set_axis(gold.columns, axis=1)
+
+    def row_sorted(frame):
+        keys = frame.apply(lambda c: c.round(decimals) if c.dtype == "float64" else c)
+        return frame.loc[keys.sort_values(list(frame.columns)).index].reset_index(drop=True)
+
+    aligned, gold = row_sorted(aligned), row_sorted(gold)
+    return all(_column_equal(aligned[name], gold[name], rtol, atol) for name in gold.columns)
+
+
+# ============================================================================
+# PIPELINES
+# ============================================================================
+
+
+def run_agent(prompt: str, max_retries: int) -> dict:
+    from sql_generator.ai_sql import AISQLRunner
+    from sql_generator.graph import run_sql_agent
+
+    state = run_sql_agent(prompt, AISQLRunner(), max_retries=max_retries)
+    return {
+        "sql": state.get("sql_query"),
+        "retries": state.get("retry_count", 0),
+        "pipeline_error": state.get("error_message") if not state.get("sql_query") else None,
+    }
+
+
+def run_generate(prompt: str, max_retries: int) -> dict:
+    from sql_generator.ai_helpers import generate_sql_query
+
+    error = None
+    for attempt in range(max_retries + 1):
+        sql = generate_sql_query(prompt)
+        try:
+            execute_sql(sql)
+            return {"sql": sql, "retries": attempt, "pipeline_error": None}
+        except Exception as e:
+            error = str(e)
+    return {"sql": sql, "retries": max_retries, "pipeline_error": error}
+
+
+PIPELINE_RUNNERS = {"agent": run_agent, "generate": run_generate}
+
+
+def evaluate_example(example: dict, pipeline: str, max_retries: int, rtol: float, atol: float,
+                     refresh_gold: bool) -> dict:
+    row = {"id": example.get("id"), "prompt": example["prompt"], "correct": False, "error": None}
+    start = time.perf_counter()
+    with tracing.capture("eval") as spans:
+        try:
+            outcome = PIPELINE_RUNNERS[pipeline](example["prompt"], max_retries)
+            row.update(sql=outcome["sql"], retries=outcome["retries"])
+            row["generation_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            if not outcome["sql"]:
+                raise RuntimeError(outcome["pipeline_error"] or "No SQL generated")
+            exec_start = time.perf_counter()
+            predicted = normalize(execute_sql(outcome["sql"]))
+            gold = gold_result(example["gold_sql"], refresh_gold)
+            row["execution_ms"] = round((time.perf_counter() - exec_start) * 1000, 1)
+            row["rows"] = {"predicted": len(predicted), "gold": len(gold)}
+            row["correct"] = results_match(predicted, gold, rtol, atol)
+        except Exception as e:
+            row["error"] = str(e)[:500]
+    row["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    llm_spans = [span for span in spans if span.name.startswith("llm.")]
+    row["llm_calls"] = len(llm_spans)
+    row["prompt_tokens"] = sum(span.attributes.get("prompt_tokens") or 0 for span in llm_spans)
+    row["completion_tokens"] = sum(span.attributes.get("completion_tokens") or 0 for span in llm_spans)
+    row.setdefault("retries", 0)
+    return row
+
+
+def run_eval(examples: list, pipeline: str = "agent", workers: int = 8, max_retries: int = 2,
+             rtol: float = 1e-4, atol: float = 1e-6, refresh_gold: bool = False) -> dict:
+    # Warm the gold cache first so predictions are not compared against a cold cache run
+    for example in examples:
+        try:
+            gold_result(example["gold_sql"], refresh_gold)
+        except Exception as e:
+            raise RuntimeError(f"Gold query for {example.get('id') or example['prompt']!r} failed: {e}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        rows = list(executor.map(
+            lambda example: evaluate_example(example, pipeline, max_retries, rtol, atol, False),
+            examples,
+        ))
+    wall = time.perf_counter() - start
+
+    latencies = [row["latency_ms"] for row in rows]
+    return {
+        "pipeline": pipeline,
+        "workers": workers,
+        "max_retries": max_retries,
+        "examples": len(rows),
+        "execution_accuracy": round(sum(row["correct"] for row in rows) / len(rows), 4) if rows else 0.0,
+        "errors": sum(row["error"] is not None for row in rows),
+        "retries": sum(row["retries"] for row in rows),
+        "llm_calls": sum(row["llm_calls"] for row in rows),
+        "prompt_tokens": sum(row["prompt_tokens"] for row in rows),
+        "completion_tokens": sum(row["completion_tokens"] for row in rows),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 1) if rows else None,
+            "p95": round(float(np.percentile(latencies, 95)), 1) if rows else None,
+        },
+        "wall_s": round(wall, 2),
+        "results": rows,
+    }
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"\n{'id':<28} {'ok':>3} {'retries':>7} {'tokens':>7} {'ms':>9}  error")
+    for row in report["results"]:
+        tokens = row["prompt_tokens"] + row["completion_tokens"]
+        print(f"{(row['id'] or row['prompt'])[:28]:<28} {'✓' if row['correct'] else '✗':>3} "
+              f"{row['retries']:>7} {tokens:>7} {row['latency_ms']:>9.1f}  {(row['error'] or '')[:60]}")
+    print(f"\nExecution accuracy: {report['execution_accuracy']:.1%} of {report['examples']} "
+          f"({report['pipeline']}, {report['workers']} workers)")
+    print(f"Retries: {report['retries']}  LLM calls: {report['llm_calls']}  "
+          f"Tokens: {report['prompt_tokens']} prompt / {report['completion_tokens']} completion")
+    print(f"Latency p50 {report['latency_ms']['p50']} ms, p95 {report['latency_ms']['p95']} ms; "
+          f"wall {report['wall_s']} s")
+    if baseline:
+        tokens = report["prompt_tokens"] + report["completion_tokens"]
+        base_tokens = baseline["prompt_tokens"] + baseline["completion_tokens"]
+        print(f"\nVs baseline: accuracy {report['execution_accuracy'] - baseline['execution_accuracy']:+.1%}, "
+              f"p50 {report['latency_ms']['p50'] - baseline['latency_ms']['p50']:+.1f} ms, "
+              f"tokens {tokens - base_tokens:+d}, retries {report['retries'] - baseline['retries']:+d}")
+        changed = {row["id"]: row["correct"] for row in baseline.get("results", [])}
+        for row in report["results"]:
+            if row["id"] in changed and changed[row["id"]] != row["correct"]:
+                print(f"  {row['id']}: {'fixed' if row['correct'] else 'regressed'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Execution accuracy of generated SQL")
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET), help="JSON list of {id, prompt, gold_sql}")
+    parser.add_argument("--pipeline", choices=PIPELINES, default="agent")
+    parser.add_argument("--workers", type=int, default=8, help="Prompts evaluated concurrently")
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--limit", type=int, help="Only the first N examples")
+    parser.add_argument("--rtol", type=float, default=1e-4, help="Relative tolerance for numbers")
+    parser.add_argument("--atol", type=float, default=1e-6, help="Absolute tolerance for numbers")
+    parser.add_argument("--refresh-gold", action="store_true", help="Re-run gold queries instead of using the cache")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    with open(args.dataset) as f:
+        examples = json.load(f)[:args.limit]
+
+    report = run_eval(examples, args.pipeline, args.workers, args.max_retries,
+                      args.rtol, args.atol, args.refresh_gold)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.output}")
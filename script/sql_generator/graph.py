@@ -1,9 +1,20 @@
+import logging
 import os
+import sys
+import time
+from functools import wraps
+from pathlib import Path
 from typing import TypedDict, Optional, Literal, List, Dict, Any
 from langgraph.graph import StateGraph, END
 from langchain_core.runnables import RunnableConfig
 from .ai_sql import AISQLRunner
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import tracing
+from metrics import GRAPH_NODE_DURATION, GRAPH_OUTCOMES, GRAPH_RETRIES
+
+logger = logging.getLogger(__name__)
+
 
 class GraphState(TypedDict, total=False):
     """State that flows through the graph"""
@@ -20,13 +31,44 @@ class GraphState(TypedDict, total=False):
     max_retries: int
 
 
+def instrumented(node: str):
+    """Time a graph node into sql_agent_node_duration_seconds{node, status}."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(state, config):
+            start = time.perf_counter()
+            status = "error"
+            progress = config["configurable"].get("progress")
+            if progress is not None:
+                progress(node=node, retry=state.get("retry_count", 0))
+            try:
+                with tracing.span(f"node.{node}", retry=state.get("retry_count", 0)) as span:
+                    result = func(state, config)
+                    if span is not None and result.get("error_type"):
+                        # Failed executions and rejected results keep the trace
+                        span.set(error_type=result["error_type"])
+                        span.fail(result.get("error_message") or result["error_type"])
+                status = "ok"
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                GRAPH_NODE_DURATION.observe(seconds, node=node, status=status)
+                logger.debug("Node %s finished", node,
+                             extra={"node": node, "status": status, "ms": round(seconds * 1000, 2)})
+
+        return wrapper
+
+    return decorator
+
+
+@instrumented("classify")
 def classify_node(state: GraphState, config: RunnableConfig) -> dict:
     """Classify if question needs SQL or is conversational"""
-    print("\n[NODE: CLASSIFY]")
     ai_runner = config["configurable"]["ai_runner"]
 
     question_type = ai_runner.classification_prompt(state["user_question"])
-    print(f"Classification: {question_type}")
+    logger.info("Classification: %s", question_type)
 
     return {
         "question_type": question_type.lower(),
@@ -35,9 +77,9 @@ def classify_node(state: GraphState, config: RunnableConfig) -> dict:
     }
 
 
+@instrumented("conversational")
 def conversational_node(state: GraphState, config: RunnableConfig) -> dict:
     """Handle conversational questions"""
-    print("\n[NODE: CONVERSATIONAL]")
     ai_runner = config["configurable"]["ai_runner"]
 
     response = ai_runner.get_conversational_response(state["user_question"])
@@ -45,9 +87,10 @@ def conversational_node(state: GraphState, config: RunnableConfig) -> dict:
     return {"final_response": response}
 
 
+@instrumented("generate_sql")
 def generate_sql_node(state: GraphState, config: RunnableConfig) -> dict:
     """Generate SQL query"""
-    print(f"\n[NODE: GENERATE_SQL] (Attempt {state.get('retry_count', 0) + 1})")
+    logger.info("Generating SQL (attempt %d)", state.get("retry_count", 0) + 1)
     ai_runner = config["configurable"]["ai_runner"]
 
     sql_query = ai_runner.generate_sql(state["user_question"])
@@ -55,16 +98,16 @@ def generate_sql_node(state: GraphState, config: RunnableConfig) -> dict:
     return {"sql_query": sql_query}
 
 
+@instrumented("execute_sql")
 def execute_sql_node(state: GraphState, config: RunnableConfig) -> dict:
     """Execute the SQL query"""
-    print("\n[NODE: EXECUTE_SQL]")
     ai_runner = config["configurable"]["ai_runner"]
 
     try:
         results = ai_runner.sql_runner.run_single_query(
             state["sql_query"], state["user_question"]
         )
-        print("Execution successful")
+        logger.debug("Execution successful")
 
         if not results or len(results) == 0:
             return {
@@ -86,7 +129,7 @@ def execute_sql_node(state: GraphState, config: RunnableConfig) -> dict:
 
         if has_error:
             error_msg = "; ".join(error_messages)
-            print(f"  Execution returned errors: {error_msg}")
+            logger.warning("Execution returned errors: %s", error_msg)
             return {
                 "sql_results": results,
                 "error_type": "execution_error",
@@ -97,7 +140,7 @@ def execute_sql_node(state: GraphState, config: RunnableConfig) -> dict:
 
     except ConnectionError as e:
         error_msg = f"Database connection failed: {str(e)}"
-        print(f"  {error_msg}")
+        logger.warning(error_msg)
         return {
             "sql_results": None,
             "error_type": "execution_error",
@@ -105,7 +148,7 @@ def execute_sql_node(state: GraphState, config: RunnableConfig) -> dict:
         }
     except Exception as e:
         error_msg = f"SQL execution failed: {str(e)}"
-        print(f"  {error_msg}")
+        logger.warning(error_msg)
         return {
             "sql_results": None,
             "error_type": "execution_error",
@@ -113,15 +156,15 @@ def execute_sql_node(state: GraphState, config: RunnableConfig) -> dict:
         }
 
 
+@instrumented("judge")
 def judge_results_node(state: GraphState, config: RunnableConfig) -> dict:
     """Judge if results answer the question"""
-    print("\n[NODE: JUDGE_RESULTS]")
     ai_runner = config["configurable"]["ai_runner"]
 
     judge_result = ai_runner.judge_sql_result(
         state["user_question"], state["sql_results"]
     )
-    print(f"  Judge says: {judge_result}")
+    logger.info("Judge says: %s", judge_result)
 
     # If judge says NO, mark it as an error type
     if judge_result.lower() == "no":
@@ -134,9 +177,9 @@ def judge_results_node(state: GraphState, config: RunnableConfig) -> dict:
     return {"judge_result": judge_result.lower(), "error_type": None}
 
 
+@instrumented("analyze")
 def analyze_data_node(state: GraphState, config: RunnableConfig) -> dict:
     """Generate analysis from SQL results"""
-    print("\n[NODE: ANALYZE_DATA]")
     ai_runner = config["configurable"]["ai_runner"]
 
     try:
@@ -148,7 +191,7 @@ def analyze_data_node(state: GraphState, config: RunnableConfig) -> dict:
 
         # Ensure we always return a final_response
         if not analysis or not analysis.strip():
-            print("  Warning: Analysis was empty, generating fallback response")
+            logger.warning("Analysis was empty, generating fallback response")
             # Fallback: create a simple analysis from the data
             results_str = ""
             for result in state.get("sql_results", []):
@@ -169,10 +212,10 @@ def analyze_data_node(state: GraphState, config: RunnableConfig) -> dict:
             """
             analysis = ai_runner.get_conversational_response(fallback_prompt)
 
-        print(f"  Analysis generated: {len(analysis)} characters")
+        logger.info("Analysis generated: %d characters", len(analysis))
         return {"final_response": analysis}
     except Exception as e:
-        print(f"  Error in analyze_data_node: {e}")
+        logger.warning("Error in analyze_data_node: %s", e)
         # Fallback: generate a basic response from the data
         try:
             results_summary = ""
@@ -195,17 +238,16 @@ def analyze_data_node(state: GraphState, config: RunnableConfig) -> dict:
             fallback_response = ai_runner.get_conversational_response(fallback_prompt)
             return {"final_response": fallback_response}
         except Exception as fallback_error:
-            print(f"  Fallback also failed: {fallback_error}")
+            logger.error("Fallback also failed: %s", fallback_error)
             # Last resort: return a basic message with the data
             return {
                 "final_response": f"I've retrieved the data for your question: '{state['user_question']}'. The query executed successfully and returned results. Please review the data provided."
             }
 
 
+@instrumented("handle_error")
 def handle_error_node(state: GraphState, config: RunnableConfig) -> dict:
     """Decides whether to retry or give up"""
-
-    print("\n[NODE: HANDLE_ERROR]")
     ai_runner = config["configurable"]["ai_runner"]
 
     retry_count = state.get("retry_count", 0)
@@ -213,19 +255,21 @@ def handle_error_node(state: GraphState, config: RunnableConfig) -> dict:
     error_type = state.get("error_type", "unknown")
     error_msg = state.get("error_message", "Unknown error")
 
-    print(f"  Error type: {error_type}")
-    print(f"  Retry: {retry_count}/{max_retries}")
-
     # Check if we should retry
     if retry_count < max_retries:
-        print("  → Will retry")
+        GRAPH_RETRIES.inc(error_type=error_type)
+        GRAPH_OUTCOMES.inc(error_type=error_type, decision="retry")
+        logger.info("Retrying after %s (%d/%d)", error_type, retry_count + 1, max_retries,
+                    extra={"error_type": error_type, "retry": retry_count + 1})
         return {
             "retry_count": retry_count + 1,
             "final_response": None,  # Clear any previous response
         }
 
     # Max retries reached - generate final error response
-    print("  → Max retries reached, generating final response")
+    GRAPH_OUTCOMES.inc(error_type=error_type, decision="give_up")
+    logger.warning("Max retries reached after %s, generating final response", error_type,
+                   extra={"error_type": error_type, "retry": retry_count})
 
     # Generate appropriate error message based on error type
     if error_type == "execution_error":
@@ -283,9 +327,9 @@ def handle_error_node(state: GraphState, config: RunnableConfig) -> dict:
                                 "sql_results": better_results,
                             }
                 except Exception as e:
-                    print(f"  Better query execution failed: {e}")
+                    logger.warning("Better query execution failed: %s", e)
             except Exception as e:
-                print(f"  Failed to generate better query: {e}")
+                logger.warning("Failed to generate better query: %s", e)
 
         # Fallback to conversational response
         prompt = (
@@ -381,7 +425,6 @@ def build_sql_agent_graph():
     workflow.add_edge("conversational", END)
     workflow.add_edge("analyze", END)
 
-    print("[SIMPLIFIED GRAPH BUILT]")
     return workflow.compile()
 
 
@@ -390,7 +433,7 @@ def build_sql_agent_graph():
 # ============================================================================
 
 
-def run_sql_agent(user_question: str, ai_runner: AISQLRunner, max_retries: int = 2):
+def run_sql_agent(user_question: str, ai_runner: AISQLRunner, max_retries: int = 2, progress=None):
     """
     Run the SQL agent with a user question
 
@@ -398,6 +441,7 @@ def run_sql_agent(user_question: str, ai_runner: AISQLRunner, max_retries: int =
         user_question: The user's natural language question
         ai_runner: Instance of AISQLRunner
         max_retries: Maximum retry attempts (default: 2)
+        progress: Optional callback, called as progress(node=..., retry=...) when each node starts
 
     Returns:
         Final state with response
@@ -410,7 +454,7 @@ def run_sql_agent(user_question: str, ai_runner: AISQLRunner, max_retries: int =
         "max_retries": max_retries,
     }
 
-    config = {"configurable": {"ai_runner": ai_runner, "max_retries": max_retries}}
+    config = {"configurable": {"ai_runner": ai_runner, "max_retries": max_retries, "progress": progress}}
 
     result = app.invoke(initial_state, config)
 
@@ -0,0 +1,495 @@
+"""
+Index advisor for the marketplace schema.
+
+Mines the workload (generated-SQL history, the sql/ analysis library and
+pg_stat_statements when the extension is installed), proposes indexes for
+filter, join and sort columns that no existing index covers, and tests each
+proposal by running EXPLAIN ANALYZE before and after creating the index
+inside a transaction that is rolled back.
+
+The test uses a plain CREATE INDEX, which takes a SHARE lock on the table.
+Writes to the table block until rollback: for the index build plus up to
+--queries-per-index EXPLAIN ANALYZE runs of at most 60s each (statement
+timeout). Run the advisor against a staging copy or a quiet primary.
+
+Usage:
+    python sql_generator/index_advisor.py --top 10 [--apply]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from schema import parse_schema
+from sql_generator.ai_helpers import SQL_HISTORY_PATH
+from sql_generator.sql_via_python import query_executor
+
+_project_root = Path(__file__).parent.parent.parent
+ANALYSIS_FILES = sorted((_project_root / "sql").glob("[0-9]*.sql"))
+REPORT_PATH = _project_root / "result" / "index_advisor_report.md"
+
+_RESERVED = {
+    "on", "where", "join", "left", "right", "inner", "outer", "full", "cross",
+    "natural", "group", "order", "limit", "using", "having", "union", "select",
+    "lateral", "window", "offset", "fetch",
+}
+_TABLE_REF = re.compile(
+    r"\b(?:from|join)\s+([a-z_][a-z0-9_]*)(?:\s+(?:as\s+)?([a-z_][a-z0-9_]*))?"
+)
+_COLUMN_REF = r"(?:([a-z_][a-z0-9_]*)\.)?([a-z_][a-z0-9_]*)"
+_PREDICATE = re.compile(
+    _COLUMN_REF + r"\s*(=|<=|>=|<|>|\bin\b|\bbetween\b)\s*" + r"(" + _COLUMN_REF + r")?"
+)
+_ORDER_BY = re.compile(r"\border\s+by\s+(.+?)(?:\blimit\b|\boffset\b|\)|;|$)", re.DOTALL)
+_GROUP_BY = re.compile(r"\bgroup\s+by\s+(.+?)(?:\bhaving\b|\border\b|\blimit\b|\)|;|$)", re.DOTALL)
+
+
+# ============================================================================
+# WORKLOAD
+# ============================================================================
+
+
+def _clean_sql(sql: str) -> str:
+    lines = [line.split("--", 1)[0] for line in sql.splitlines()]
+    return " ".join(" ".join(lines).split()).strip().rstrip(";")
+
+
+def load_workload(history_path=SQL_HISTORY_PATH, include_analysis=True, cur=None):
+    """
+    Collect workload statements as {"sql", "weight", "source"} dicts.
+
+    Identical statements are merged and their weights summed.
+    """
+    statements = defaultdict(lambda: {"weight": 0.0, "sources": set()})
+
+    if history_path and os.path.exists(history_path):
+        with open(history_path, "r") as f:
+            for line in f:
+                try:
+                    sql = _clean_sql(json.loads(line)["sql"])
+                except (ValueError, KeyError):
+                    continue
+                if sql:
+                    statements[sql]["weight"] += 1
+                    statements[sql]["sources"].add("history")
+
+    if include_analysis:
+        for path in ANALYSIS_FILES:
+            if path.name.startswith("0."):
+                continue
+            with open(path, "r") as f:
+                for statement in f.read().split(";"):
+                    sql = _clean_sql(statement)
+                    if sql:
+                        statements[sql]["weight"] += 1
+                        statements[sql]["sources"].add(path.name)
+
+    if cur is not None:
+        for sql, total_ms in _stat_statements(cur):
+            sql = _clean_sql(sql)
+            # Weight by total execution time, in seconds
+            statements[sql]["weight"] += 1 + total_ms / 1000.0
+            statements[sql]["sources"].add("pg_stat_statements")
+
+    return [
+        {"sql": sql, "weight": info["weight"], "source": ", ".join(sorted(info["sources"]))}
+        for sql, info in statements.items()
+        if sql.lower().startswith(("select", "with"))
+    ]
+
+
+def _stat_statements(cur, limit: int = 200):
+    """Top statements by total execution time, or [] without pg_stat_statements."""
+    try:
+        cur.execute("SAVEPOINT advisor_stat")
+        cur.execute(
+            """
+            SELECT query, total_exec_time
+            FROM pg_stat_statements
+            WHERE query ~* '^\\s*(select|with)'
+            ORDER BY total_exec_time DESC
+            LIMIT %s
+            """,
+            (limit,),
+        )
+        rows = cur.fetchall()
+        cur.execute("RELEASE SAVEPOINT advisor_stat")
+        return rows
+    except Exception as e:
+        cur.execute("ROLLBACK TO SAVEPOINT advisor_stat")
+        print(f"pg_stat_statements unavailable, skipping: {str(e).splitlines()[0]}")
+        return []
+
+
+# ============================================================================
+# CANDIDATE EXTRACTION
+# ============================================================================
+
+
+def _aliases(sql: str, tables: dict) -> dict:
+    """Map aliases (and bare table names) used in the query to schema tables."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table not in tables:
+            continue  # CTE or subquery name
+        aliases[table] = table
+        if alias and alias not in _RESERVED:
+            aliases[alias] = table
+    return aliases
+
+
+def _resolve(qualifier, column, aliases, tables):
+    """Resolve an (optionally qualified) column reference to (table, column)."""
+    if qualifier:
+        table = aliases.get(qualifier)
+        if table and column in tables[table].columns:
+            return table, column
+        return None
+    owners = {t for t in set(aliases.values()) if column in tables[t].columns}
+    return (owners.pop(), column) if len(owners) == 1 else None
+
+
+def _column_list(clause: str, aliases, tables) -> list:
+    refs = []
+    for item in clause.split(","):
+        match = re.match(r"\s*" + _COLUMN_REF + r"\s*(asc|desc)?\s*$", item.strip())
+        if match:
+            resolved = _resolve(match.group(1), match.group(2), aliases, tables)
+            if resolved:
+                refs.append(resolved)
+    return refs
+
+
+def extract_candidates(sql: str, tables: dict) -> set:
+    """
+    Derive candidate (table, columns) indexes from one statement.
+
+    Equality filters lead, then range filters, then ORDER BY columns of the
+    same table; each join key becomes a single-column candidate.
+    """
+    sql = sql.lower()
+    aliases = _aliases(sql, tables)
+    if not aliases:
+        return set()
+
+    equality = defaultdict(list)
+    ranges = defaultdict(list)
+    candidates = set()
+
+    for match in _PREDICATE.finditer(sql):
+        left = _resolve(match.group(1), match.group(2), aliases, tables)
+        if not left:
+            continue
+        op = match.group(3)
+        right = (
+            _resolve(match.group(5), match.group(6), aliases, tables)
+            if match.group(4)
+            else None
+        )
+        if right and op == "=":
+            # Join between two tables: index both join keys
+            if right[0] != left[0]:
+                candidates.add((left[0], (left[1],)))
+                candidates.add((right[0], (right[1],)))
+            continue
+        target = equality if op in ("=", "in") else ranges
+        if left[1] not in target[left[0]]:
+            target[left[0]].append(left[1])
+
+    order_by = defaultdict(list)
+    for clause in _ORDER_BY.findall(sql):
+        for table, column in _column_list(clause, aliases, tables):
+            order_by[table].append(column)
+    for clause in _GROUP_BY.findall(sql):
+        refs = _column_list(clause, aliases, tables)
+        by_table = defaultdict(list)
+        for table, column in refs:
+            by_table[table].append(column)
+        for table, columns in by_table.items():
+            candidates.add((table, tuple(columns)))
+
+    for table in set(equality) | set(ranges) | set(order_by):
+        columns = list(equality.get(table, []))
+        columns += [c for c in ranges.get(table, [])[:1] if c not in columns]
+        columns += [c for c in order_by.get(table, []) if c not in columns]
+        if columns:
+            candidates.add((table, tuple(columns)))
+
+    # Primary keys are already indexed
+    return {
+        (table, columns)
+        for table, columns in candidates
+        if list(columns[: len(tables[table].primary_key)]) != tables[table].primary_key
+    }
+
+
+# ============================================================================
+# EXISTING INDEXES & EXPLAIN
+# ============================================================================
+
+
+def existing_indexes(cur) -> dict:
+    """{table: [[leading columns...], ...]} for every index in the public schema."""
+    cur.execute(
+        """
+        SELECT t.relname, i.relname,
+               array_agg(a.attname ORDER BY k.ordinality) AS columns
+        FROM pg_index ix
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ordinality)
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE n.nspname = 'public'
+          AND k.ordinality <= ix.indnkeyatts
+        GROUP BY t.relname, i.relname
+        """
+    )
+    indexes = defaultdict(list)
+    for table, _, columns in cur.fetchall():
+        indexes[table].append(list(columns))
+    return indexes
+
+
+def is_covered(table: str, columns: tuple, indexes: dict) -> bool:
+    """True if an existing index starts with the candidate's columns."""
+    return any(
+        index[: len(columns)] == list(columns) for index in indexes.get(table, [])
+    )
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def explain(cur, sql: str) -> dict:
+    """EXPLAIN ANALYZE a literal query (or a generic plan for $n-parameterized SQL)."""
+    parameterized = re.search(r"\$\d+", sql) is not None
+    options = "GENERIC_PLAN, FORMAT JSON" if parameterized else "ANALYZE, BUFFERS, FORMAT JSON"
+    cur.execute(f"EXPLAIN ({options}) {sql}")
+    result = cur.fetchone()[0]
+    result = result[0] if isinstance(result, list) else json.loads(result)[0]
+    plan = result["Plan"]
+    return {
+        "analyzed": not parameterized,
+        "execution_ms": result.get("Execution Time"),
+        "total_cost": plan.get("Total Cost"),
+        "root": plan.get("Node Type"),
+        "indexes_used": sorted(
+            {node["Index Name"] for node in _plan_nodes(plan) if "Index Name" in node}
+        ),
+        "seq_scans": sorted(
+            {node["Relation Name"] for node in _plan_nodes(plan) if node.get("Node Type") == "Seq Scan"}
+        ),
+    }
+
+
+def index_name(table: str, columns: tuple) -> str:
+    return f"idx_adv_{table}_{'_'.join(columns)}"[:63]
+
+
+def index_ddl(table: str, columns: tuple, concurrently: bool = False) -> str:
+    keyword = "CONCURRENTLY " if concurrently else ""
+    return (
+        f"CREATE INDEX {keyword}IF NOT EXISTS {index_name(table, columns)} "
+        f"ON {table} ({', '.join(columns)})"
+    )
+
+
+def test_candidate(conn, table: str, columns: tuple, queries: list) -> list:
+    """Measure each query before/after creating the index, then roll it back."""
+    results = []
+    cur = conn.cursor()
+    try:
+        cur.execute("SET LOCAL statement_timeout = '60s'")
+        before = {}
+        for sql in queries:
+            try:
+                cur.execute("SAVEPOINT advisor_query")
+                before[sql] = explain(cur, sql)
+                cur.execute("RELEASE SAVEPOINT advisor_query")
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT advisor_query")
+                print(f"  Skipping query that failed to EXPLAIN: {str(e).splitlines()[0]}")
+
+        try:
+            cur.execute(index_ddl(table, columns))
+            cur.execute(f"ANALYZE {table}")
+        except Exception as e:
+            print(f"  Could not build the index: {str(e).splitlines()[0]}")
+            return results
+        for sql, plan_before in before.items():
+            # A changed plan can hit the timeout; keep the transaction (and the other tests) alive
+            try:
+                cur.execute("SAVEPOINT advisor_query")
+                plan_after = explain(cur, sql)
+                cur.execute("RELEASE SAVEPOINT advisor_query")
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT advisor_query")
+                error = str(e).splitlines()[0]
+                print(f"  Query failed to EXPLAIN with the index: {error}")
+                results.append({"sql": sql, "before": plan_before, "after": None, "error": error})
+                continue
+            results.append({"sql": sql, "before": plan_before, "after": plan_after})
+    finally:
+        conn.rollback()
+        cur.close()
+    return results
+
+
+def _improvement(test: dict) -> float:
+    """Fractional speedup of one query (execution time, or cost for generic plans)."""
+    if test["after"] is None:
+        return 0.0
+    key = "execution_ms" if test["before"]["analyzed"] else "total_cost"
+    before, after = test["before"][key], test["after"][key]
+    if not before:
+        return 0.0
+    return (before - after) / before
+
+
+# ============================================================================
+# ADVISOR
+# ============================================================================
+
+
+def advise(top: int = 10, queries_per_index: int = 3, min_improvement: float = 0.1,
+           history_path=SQL_HISTORY_PATH, include_analysis: bool = True):
+    """Run the full advisor and return a list of tested recommendations."""
+    tables = parse_schema()
+
+    db = query_executor("")
+    db.connect_to_db()
+    conn = db.conn
+    try:
+        workload = load_workload(history_path, include_analysis, cur=db.cur)
+        conn.rollback()
+        indexes = existing_indexes(db.cur)
+        conn.rollback()
+        print(f"Workload: {len(workload)} distinct statements")
+
+        weights = defaultdict(float)
+        queries = defaultdict(list)
+        for statement in workload:
+            for candidate in extract_candidates(statement["sql"], tables):
+                if is_covered(*candidate, indexes):
+                    continue
+                weights[candidate] += statement["weight"]
+                queries[candidate].append(statement)
+
+        ranked = sorted(weights, key=weights.get, reverse=True)[:top]
+        print(f"Testing {len(ranked)} of {len(weights)} uncovered candidates")
+
+        recommendations = []
+        for table, columns in ranked:
+            sample = sorted(queries[(table, columns)], key=lambda s: -s["weight"])
+            sample = [s["sql"] for s in sample[:queries_per_index]]
+            print(f"- {index_ddl(table, columns)}")
+            tests = test_candidate(conn, table, columns, sample)
+            improvements = [_improvement(test) for test in tests]
+            used = any(
+                index_name(table, columns) in test["after"]["indexes_used"]
+                for test in tests if test["after"] is not None
+            )
+            best = max(improvements) if improvements else 0.0
+            recommendations.append(
+                {
+                    "table": table,
+                    "columns": list(columns),
+                    "ddl": index_ddl(table, columns, concurrently=True),
+                    "weight": round(weights[(table, columns)], 2),
+                    "used_by_planner": used,
+                    "best_improvement": round(best, 3),
+                    "recommended": used and best >= min_improvement,
+                    "tests": tests,
+                }
+            )
+        return recommendations
+    finally:
+        db.close()
+
+
+def write_report(recommendations: list, path: Path = REPORT_PATH) -> Path:
+    """Write a markdown report with before/after EXPLAIN ANALYZE numbers."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [
+        "# Index Advisor Report",
+        "",
+        f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        "",
+        "| Recommended | Index | Weight | Used by planner | Best improvement |",
+        "|---|---|---|---|---|",
+    ]
+    for rec in recommendations:
+        lines.append(
+            f"| {'yes' if rec['recommended'] else 'no'} | `{rec['table']} ({', '.join(rec['columns'])})` "
+            f"| {rec['weight']} | {rec['used_by_planner']} | {rec['best_improvement']:.0%} |"
+        )
+
+    for rec in recommendations:
+        lines += ["", f"## {rec['table']} ({', '.join(rec['columns'])})", "", "```sql", rec["ddl"] + ";", "```"]
+        for test in rec["tests"]:
+            before, after = test["before"], test["after"]
+            metric = "execution_ms" if before["analyzed"] else "total_cost"
+            lines += ["", "```sql", test["sql"][:500], "```"]
+            if after is None:
+                lines.append(f"- {metric}: {before[metric]} -> failed with the index: {test['error']}")
+                continue
+            lines += [
+                f"- {metric}: {before[metric]} -> {after[metric]}",
+                f"- plan root: {before['root']} -> {after['root']}",
+                f"- seq scans: {', '.join(before['seq_scans']) or 'none'} -> {', '.join(after['seq_scans']) or 'none'}",
+                f"- indexes used after: {', '.join(after['indexes_used']) or 'none'}",
+            ]
+
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    with open(path.with_suffix(".json"), "w") as f:
+        json.dump(recommendations, f, indent=2, default=str)
+    print(f"Report exported: {path}")
+    return path
+
+
+def apply_recommendations(recommendations: list):
+    """Create the recommended indexes with CREATE INDEX CONCURRENTLY."""
+    db = query_executor("")
+    db.connect_to_db()
+    db.conn.autocommit = True
+    try:
+        for rec in recommendations:
+            if rec["recommended"]:
+                print(f"Applying: {rec['ddl']}")
+                db.cur.execute(rec["ddl"])
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propose and test indexes")
+    parser.add_argument("--top", type=int, default=10, help="Candidates to test")
+    parser.add_argument("--queries-per-index", type=int, default=3)
+    parser.add_argument("--min-improvement", type=float, default=0.1)
+    parser.add_argument("--history", default=SQL_HISTORY_PATH)
+    parser.add_argument("--no-analysis", action="store_true", help="Skip sql/*.sql files")
+    parser.add_argument("--apply", action="store_true", help="Create recommended indexes")
+    args = parser.parse_args()
+
+    recs = advise(
+        top=args.top,
+        queries_per_index=args.queries_per_index,
+        min_improvement=args.min_improvement,
+        history_path=args.history,
+        include_analysis=not args.no_analysis,
+    )
+    write_report(recs)
+    if args.apply:
+        apply_recommendations(recs)
@@ -1,6 +1,13 @@
+import logging
 import os
 import pandas as pd
-from .sql_via_python import query_executor
+from .sql_via_python import query_executor  # also puts script/ on sys.path
+from cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Identical generated SQL running at the same time executes once; each caller gets its own result list
+_query_flight = SingleFlight("generated_sql", share=lambda results: [dict(result) for result in results])
 
 
 class SQLAnalysisRunner:
@@ -25,9 +32,9 @@ class SQLAnalysisRunner:
             if not sql_directory:
                 # Fallback to first path if none found (will error later if file doesn't exist)
                 sql_directory = possible_sql_paths[0]
-                print(f"Warning: SQL directory not found. Using: {sql_directory}")
+                logger.warning("SQL directory not found. Using: %s", sql_directory)
             else:
-                print(f"SQL directory found at: {sql_directory}")
+                logger.debug("SQL directory found at: %s", sql_directory)
         
         self.sql_dir = sql_directory
 
@@ -42,11 +49,10 @@ class SQLAnalysisRunner:
         queries = [q.strip() for q in content.split(";") if q.strip()]
         return queries
 
-    def run_analysis_file(self, filename, csv_export=None, file_name=None):
-        queries = self.read_sql_file(filename)
-        all_results = []
-
-        for i, query in enumerate(queries, 1):
+    def parse_queries(self, filename):
+        """Split a SQL file into [{"index", "description", "title", "sql"}] with comment lines removed."""
+        parsed = []
+        for i, query in enumerate(self.read_sql_file(filename), 1):
             # Remove comment lines from the query block
             lines = query.split("\n")
             sql_lines = [line for line in lines if not line.strip().startswith("--")]
@@ -56,53 +62,74 @@ class SQLAnalysisRunner:
             if not clean_query:
                 continue
 
-            # Execute query
-            db = query_executor(clean_query)
-            db.connect_to_db()
-            results = db.execute()
-
-            query_description = f"Query {i}: {lines[0].replace('--', '').strip() if lines and lines[0].strip().startswith('--') else f'Query {i}'}"
+            first_line = lines[0].strip()
+            title = first_line.replace("--", "").strip() if first_line.startswith("--") else None
+            description = f"Query {i}: {title or f'Query {i}'}"
+            parsed.append({"index": i, "description": description, "title": title, "sql": clean_query})
+        return parsed
 
-            if results is None:
-                # Actual execution error
-                all_results.append(
-                    {"description": query_description, "data": "Execution error"}
-                )
-                print(f"Query {i}: Execution error\n")
-            else:
-                # Valid result (empty or with data)
-                columns = (
-                    [desc[0] for desc in db.cur.description]
-                    if db.cur.description
-                    else []
-                )
-
-                # Convert to DataFrame with column names (handles empty results)
-                df = (
-                    pd.DataFrame(results, columns=columns)
-                    if columns
-                    else pd.DataFrame(results)
-                )
-
-                all_results.append({"description": query_description, "data": df})
-
-                if csv_export:
-                    df.to_csv(f"../result/{file_name}_query_{i}.csv")
-                    print(f"Query {i} results exported to CSV")
+    def run_analysis_file(self, filename, csv_export=None, file_name=None):
+        all_results = []
 
-                if len(results) == 0:
-                    print(f"Query {i}: No results returned (empty result set)\n")
+        # One connection and one read-only snapshot for the whole file
+        db = query_executor("", operation="analysis_file")
+        db.connect_to_db()
+        db.conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
 
+        try:
+            for query in self.parse_queries(filename):
+                i = query["index"]
+                query_description = query["description"]
+
+                # Execute query
+                db.query = query["sql"]
+                results = db.execute()
+
+                if results is None:
+                    # Actual execution error
+                    all_results.append(
+                        {"description": query_description, "data": "Execution error"}
+                    )
+                    logger.warning("Query %d: Execution error", i, extra={"file": filename})
+                else:
+                    # Valid result (empty or with data)
+                    columns = (
+                        [desc[0] for desc in db.cur.description]
+                        if db.cur.description
+                        else []
+                    )
+
+                    # Convert to DataFrame with column names (handles empty results)
+                    df = (
+                        pd.DataFrame(results, columns=columns)
+                        if columns
+                        else pd.DataFrame(results)
+                    )
+
+                    all_results.append({"description": query_description, "data": df})
+
+                    if csv_export:
+                        df.to_csv(f"../result/{file_name}_query_{i}.csv")
+                        logger.info("Query %d results exported to CSV", i, extra={"file": filename})
+
+                    if len(results) == 0:
+                        logger.info("Query %d: No results returned (empty result set)", i,
+                                    extra={"file": filename})
+        finally:
             db.close()
 
         return all_results
 
     def run_single_query(self, query, description="Generated Query"):
-        """Run a single SQL query and return results."""
+        """Run a single SQL query and return results; concurrent identical queries share one execution."""
+        key = (" ".join(query.strip().rstrip(";").split()), description)
+        return _query_flight.do(key, self._run_single_query, query, description)
+
+    def _run_single_query(self, query, description):
         db = None
         try:
             # Execute query
-            db = query_executor(query)
+            db = query_executor(query, operation="generated_sql")
             db.connect_to_db()
             results = db.execute()
 
@@ -111,7 +138,7 @@ class SQLAnalysisRunner:
             if results is None:
                 # Actual execution error
                 all_results.append({"description": description, "data": "Execution error"})
-                print("Query: Execution error\n")
+                logger.warning("Query: Execution error")
             else:
                 # Valid result (empty or with data)
                 columns = (
@@ -128,20 +155,20 @@ class SQLAnalysisRunner:
                 all_results.append({"description": description, "data": df})
 
                 if len(results) == 0:
-                    print("Query: No results returned (empty result set)\n")
+                    logger.info("Query: No results returned (empty result set)")
 
             return all_results
         except ConnectionError as e:
             error_msg = f"Database connection failed: {str(e)}"
-            print(f"Query: {error_msg}\n")
+            logger.warning("Query: %s", error_msg)
             return [{"description": description, "data": error_msg}]
         except RuntimeError as e:
             error_msg = f"SQL execution failed: {str(e)}"
-            print(f"Query: {error_msg}\n")
+            logger.warning("Query: %s", error_msg)
             return [{"description": description, "data": error_msg}]
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
-            print(f"Query: {error_msg}\n")
+            logger.warning("Query: %s", error_msg)
             return [{"description": description, "data": error_msg}]
         finally:
             if db:
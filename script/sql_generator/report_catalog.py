@@ -0,0 +1,162 @@
+"""
+Named report queries built from the sql/ analysis library.
+
+Each analysis file is parsed once into named queries keyed by the file
+(without its numeric prefix) and a slug of the query's leading comment, e.g.
+
+    1.revenue_analysis.sql  "-- Monthly revenue trend"
+        -> /reports/revenue_analysis/monthly_revenue_trend
+
+Results are served from a stale-while-revalidate cache that a background
+thread refreshes before entries go stale, so dashboard reads are answered
+from memory instead of hitting the database.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from cache import StaleWhileRevalidateCache
+from metrics import observe_query
+from .query_runner import SQLAnalysisRunner
+from .report_runner import REPORT_FILES
+from .sql_via_python import pooled_connection
+
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "300"))
+REPORT_STALE_TTL = float(os.getenv("REPORT_STALE_TTL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+def file_slug(filename: str) -> str:
+    """'1.revenue_analysis.sql' -> 'revenue_analysis'."""
+    return Path(filename).stem.split(".", 1)[-1]
+
+
+def query_slug(title: str, max_words: int = 8) -> str:
+    """Slug of a query's leading comment, without parentheticals or trailing detail."""
+    title = re.sub(r"^\s*\d+[.)]\s*", "", title.lower())  # leading "1." numbering
+    title = re.sub(r"\(.*?\)", " ", title)
+    title = re.split(r"[:.;]", title, maxsplit=1)[0]
+    words = re.findall(r"[a-z0-9]+", title)[:max_words]
+    return "_".join(words)
+
+
+class ReportCatalog:
+    """Parsed analysis queries plus a background-refreshed result cache."""
+
+    def __init__(self, sql_directory=None, files=REPORT_FILES,
+                 ttl: float = REPORT_CACHE_TTL, stale_ttl: float = REPORT_STALE_TTL):
+        runner = SQLAnalysisRunner(sql_directory)
+        self.queries = {}
+        for filename in files:
+            names = set()
+            for query in runner.parse_queries(filename):
+                name = query_slug(query["title"] or "") or f"query_{query['index']}"
+                if name in names:
+                    name = f"{name}_{query['index']}"
+                names.add(name)
+                self.queries[(file_slug(filename), name)] = {
+                    "file": file_slug(filename),
+                    "name": name,
+                    "title": query["title"] or query["description"],
+                    "source": filename,
+                    "index": query["index"],
+                    "sql": query["sql"],
+                }
+
+        self.cache = StaleWhileRevalidateCache(ttl=ttl, stale_ttl=stale_ttl, name="reports")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def list(self) -> list:
+        return [
+            {
+                "file": q["file"],
+                "name": q["name"],
+                "title": q["title"],
+                "source": q["source"],
+                "path": f"/reports/{q['file']}/{q['name']}",
+            }
+            for q in self.queries.values()
+        ]
+
+    def get(self, file: str, name: str) -> dict:
+        """Look up a query; accepts the file with or without its numeric prefix."""
+        key = (file_slug(file + ".sql"), name)
+        if key not in self.queries:
+            raise KeyError(f"Unknown report: {file}/{name}")
+        return self.queries[key]
+
+    def _execute(self, query: dict) -> dict:
+        start = time.perf_counter()
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("SET TRANSACTION READ ONLY")
+                with observe_query("report") as outcome:
+                    cur.execute(query["sql"])
+                    columns = [desc[0] for desc in cur.description] if cur.description else []
+                    rows = [dict(zip(columns, row)) for row in cur.fetchall()] if columns else []
+                    outcome["rows"] = len(rows)
+            finally:
+                cur.close()
+        return {
+            "columns": columns,
+            "data": rows,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def fetch(self, file: str, name: str) -> dict:
+        """Cached result of a named report (stale results trigger a background refresh)."""
+        query = self.get(file, name)
+        key = (query["file"], query["name"])
+        result, meta = self.cache.get(key, lambda: self._execute(query))
+        return {
+            "file": query["file"],
+            "name": query["name"],
+            "title": query["title"],
+            **result,
+            "total_results": len(result["data"]),
+            "refreshed_at": meta["loaded_at"],
+            "age_seconds": meta["age"],
+            "stale": meta["stale"],
+        }
+
+    def refresh_all(self, wait: bool = True) -> dict:
+        """Reload every report in the background pool; optionally wait for completion."""
+        futures = {
+            key: self.cache.refresh(key, lambda q=query: self._execute(q))
+            for key, query in self.queries.items()
+        }
+        if not wait:
+            return {}
+        failed = 0
+        for future in futures.values():
+            if future.exception() is not None:
+                failed += 1
+        return {"refreshed": len(futures) - failed, "failed": failed}
+
+    def start_background_refresh(self, interval: float = None):
+        """Refresh every report now and then every interval seconds (default 0.8 * ttl)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        interval = interval or float(
+            os.getenv("REPORT_REFRESH_INTERVAL", self.cache.ttl * 0.8)
+        )
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                counts = self.refresh_all(wait=True)
+                logger.info("Reports refreshed: %s", counts, extra=counts)
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="report-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,243 @@
+"""
+Daily report runner for the sql/1-5 analysis files.
+
+Two execution modes, both reading one consistent snapshot of the database:
+
+- sequential: every statement runs on a single connection inside one
+  REPEATABLE READ READ ONLY transaction.
+- parallel: a coordinator transaction exports its snapshot with
+  pg_export_snapshot(); each worker opens one connection, imports it with
+  SET TRANSACTION SNAPSHOT and runs its share of the statements, longest
+  first based on the previous run's timings.
+
+Each statement runs under a savepoint so one failing query does not abort
+the rest. Results are exported to CSV on a separate thread pool while
+queries are still running, and per-query timings are written to
+result/reports/timings.json.
+
+Usage:
+    python sql_generator/report_runner.py --mode parallel --workers 4
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sql_generator.query_runner import SQLAnalysisRunner
+from sql_generator.sql_via_python import query_executor
+
+REPORT_FILES = [
+    "1.revenue_analysis.sql",
+    "2.customer_analysis.sql",
+    "3.product_analysis.sql",
+    "4.operation_analysis.sql",
+    "5.data_quality.sql",
+]
+OUTPUT_DIR = Path(__file__).parent.parent.parent / "result" / "reports"
+
+logger = logging.getLogger(__name__)
+
+
+def _snapshot_session(snapshot_id: str = None):
+    """Open a connection in a REPEATABLE READ READ ONLY transaction, optionally importing a snapshot."""
+    db = query_executor("")
+    db.connect_to_db()
+    db.conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    if snapshot_id:
+        # Must be the first statement of the transaction
+        db.cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+    return db
+
+
+def _run_statement(db, query: dict) -> dict:
+    """Run one statement under a savepoint and time it."""
+    start = time.perf_counter()
+    try:
+        db.cur.execute("SAVEPOINT report_query")
+        db.cur.execute(query["sql"])
+        rows = db.cur.fetchall() if db.cur.description else []
+        columns = [desc[0] for desc in db.cur.description] if db.cur.description else []
+        db.cur.execute("RELEASE SAVEPOINT report_query")
+        data, error = pd.DataFrame(rows, columns=columns or None), None
+    except Exception as e:
+        db.cur.execute("ROLLBACK TO SAVEPOINT report_query")
+        data, error = "Execution error", str(e).strip()
+        logger.warning("%s %s: %s", query["file"], query["description"], error)
+    return {
+        **query,
+        "data": data,
+        "error": error,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        "rows": len(data) if error is None else 0,
+    }
+
+
+class ReportRunner(SQLAnalysisRunner):
+    """Run several analysis files against one consistent snapshot."""
+
+    def __init__(self, sql_directory=None, output_dir=OUTPUT_DIR):
+        super().__init__(sql_directory)
+        self.output_dir = Path(output_dir)
+        self.timings_path = self.output_dir / "timings.json"
+
+    def collect_queries(self, files=REPORT_FILES) -> list:
+        queries = []
+        for filename in files:
+            for query in self.parse_queries(filename):
+                queries.append({**query, "file": filename})
+        return queries
+
+    def _previous_timings(self) -> dict:
+        if not self.timings_path.exists():
+            return {}
+        with open(self.timings_path, "r") as f:
+            previous = json.load(f)
+        return {
+            (q["file"], q["index"]): q["duration_ms"] for q in previous.get("queries", [])
+        }
+
+    def _export(self, result: dict):
+        if result["error"] is not None:
+            return
+        stem = Path(result["file"]).stem
+        result["data"].to_csv(self.output_dir / f"{stem}_query_{result['index']}.csv", index=False)
+
+    def run(self, files=REPORT_FILES, mode: str = "parallel", workers: int = 4,
+            export: bool = True) -> list:
+        """
+        Run every statement in files and return results in file order.
+
+        Args:
+            files: Analysis files relative to the sql directory
+            mode: "sequential" (one connection) or "parallel" (worker pool)
+            workers: Worker connections in parallel mode
+            export: Write each result to output_dir as CSV
+
+        Returns:
+            List of {"file", "index", "description", "sql", "data", "error", "duration_ms", "rows"}
+        """
+        queries = self.collect_queries(files)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        exporter = ThreadPoolExecutor(max_workers=2) if export else None
+        start = time.perf_counter()
+
+        try:
+            if mode == "sequential":
+                results = self._run_sequential(queries, exporter)
+            elif mode == "parallel":
+                results = self._run_parallel(queries, workers, exporter)
+            else:
+                raise ValueError(f"Unknown mode: {mode}")
+        finally:
+            if exporter:
+                exporter.shutdown(wait=True)
+
+        wall_ms = round((time.perf_counter() - start) * 1000, 2)
+        self._write_timings(results, mode, workers, wall_ms)
+        return results
+
+    def _run_sequential(self, queries, exporter) -> list:
+        db = _snapshot_session()
+        results = []
+        try:
+            for query in queries:
+                result = _run_statement(db, query)
+                results.append(result)
+                if exporter:
+                    exporter.submit(self._export, result)
+        finally:
+            db.conn.rollback()
+            db.close()
+        return results
+
+    def _run_parallel(self, queries, workers, exporter) -> list:
+        # Coordinator transaction stays open so the exported snapshot remains importable
+        coordinator = _snapshot_session()
+        local = threading.local()
+        sessions = []
+        sessions_lock = threading.Lock()
+
+        try:
+            coordinator.cur.execute("SELECT pg_export_snapshot()")
+            snapshot_id = coordinator.cur.fetchone()[0]
+
+            def worker(query):
+                if not hasattr(local, "db"):
+                    local.db = _snapshot_session(snapshot_id)
+                    with sessions_lock:
+                        sessions.append(local.db)
+                result = _run_statement(local.db, query)
+                if exporter:
+                    exporter.submit(self._export, result)
+                return result
+
+            # Longest statements first so the slowest one does not start last
+            previous = self._previous_timings()
+            schedule = sorted(
+                queries, key=lambda q: -previous.get((q["file"], q["index"]), 0.0)
+            )
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {id(q): pool.submit(worker, q) for q in schedule}
+                results = [futures[id(q)].result() for q in queries]
+        finally:
+            for db in sessions:
+                db.conn.rollback()
+                db.close()
+            coordinator.conn.rollback()
+            coordinator.close()
+        return results
+
+    def _write_timings(self, results, mode, workers, wall_ms):
+        total_query_ms = round(sum(r["duration_ms"] for r in results), 2)
+        payload = {
+            "generated_at": datetime.now().isoformat(),
+            "mode": mode,
+            "workers": workers if mode == "parallel" else 1,
+            "wall_ms": wall_ms,
+            "sum_query_ms": total_query_ms,
+            "errors": sum(1 for r in results if r["error"]),
+            "queries": [
+                {
+                    "file": r["file"],
+                    "index": r["index"],
+                    "description": r["description"],
+                    "duration_ms": r["duration_ms"],
+                    "rows": r["rows"],
+                    "error": r["error"],
+                }
+                for r in results
+            ],
+        }
+        with open(self.timings_path, "w") as f:
+            json.dump(payload, f, indent=2)
+        logger.info(
+            "%d queries in %.0f ms wall (%.0f ms summed, mode=%s); timings: %s",
+            len(results), wall_ms, total_query_ms, mode, self.timings_path,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the analysis report")
+    parser.add_argument("--mode", choices=["sequential", "parallel"], default="parallel")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--files", nargs="+", default=REPORT_FILES)
+    parser.add_argument("--no-export", action="store_true", help="Skip CSV export")
+    args = parser.parse_args()
+
+    from logging_config import setup_logging
+
+    setup_logging()
+    runner = ReportRunner()
+    results = runner.run(args.files, mode=args.mode, workers=args.workers, export=not args.no_export)
+    for r in sorted(results, key=lambda r: -r["duration_ms"])[:5]:
+        print(f"  {r['duration_ms']:>9.1f} ms  {r['file']}  {r['description']}")
@@ -1,13 +1,28 @@
+import logging
 import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
 import pandas as pd
 from dotenv import load_dotenv
 import psycopg2
+from psycopg2 import extensions, pool
+
+from .embedded_backend import get_embedded_database, is_embedded
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from metrics import DB_POOL_WAIT, REGISTRY, observe_query
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class query_executor:
-    def __init__(self, query):
+    def __init__(self, query, operation: str = "query"):
         self.conn = None
         self.cur = None
         self.host = os.getenv("DB_HOST")
@@ -16,8 +31,12 @@ class query_executor:
         self.user = os.getenv("DB_USER")
         self.password = os.getenv("DB_PASSWORD")
         self.query = query
+        # Label for the db_query_* metrics
+        self.operation = operation
 
     def connect_to_db(self):
+        if is_embedded():
+            return self._connect_embedded()
         try:
             # Validate environment variables
             if not all([self.host, self.port, self.database, self.user, self.password]):
@@ -35,9 +54,10 @@ class query_executor:
                 error_msg = (
                     f"Missing database environment variables: {', '.join(missing)}"
                 )
-                print(f"-- Connection error: {error_msg} --")
-                print(
-                    f"-- Debug: host={self.host}, port={self.port}, database={self.database}, user={self.user}, password={'***' if self.password else 'None'} --"
+                logger.error(
+                    "Connection error: %s", error_msg,
+                    extra={"db_host": self.host, "db_port": self.port, "db_name": self.database,
+                           "db_user": self.user},
                 )
                 raise ValueError(error_msg)
 
@@ -52,11 +72,22 @@ class query_executor:
             return self.conn
         except psycopg2.Error as e:
             error_msg = f"PostgreSQL connection error: {str(e)}"
-            print(f"-- Connection error: {error_msg} --")
+            logger.error("Connection error: %s", error_msg)
             raise ConnectionError(error_msg) from e
         except Exception as e:
             error_msg = f"Database connection error: {str(e)}"
-            print(f"-- Connection error: {error_msg} --")
+            logger.error("Connection error: %s", error_msg)
+            raise ConnectionError(error_msg) from e
+
+    def _connect_embedded(self):
+        """Connect to the in-process DuckDB database (DB_BACKEND=duckdb)."""
+        try:
+            self.conn = get_embedded_database().connect()
+            self.cur = self.conn.cursor()
+            return self.conn
+        except Exception as e:
+            error_msg = f"Embedded database error: {str(e)}"
+            logger.error("Connection error: %s", error_msg)
             raise ConnectionError(error_msg) from e
 
     def execute(self):
@@ -65,16 +96,19 @@ class query_executor:
                 "Database cursor not initialized. Call connect_to_db() first."
             )
         try:
-            self.cur.execute(self.query)
-            return self.cur.fetchall()
+            with observe_query(self.operation) as outcome:
+                self.cur.execute(self.query)
+                rows = self.cur.fetchall()
+                outcome["rows"] = len(rows)
+            return rows
 
         except psycopg2.Error as e:
             error_msg = f"SQL execution error: {str(e)}"
-            print(f"-- Error executing query: {error_msg} --")
+            logger.warning("Error executing query: %s", error_msg)
             raise RuntimeError(error_msg) from e
         except Exception as e:
             error_msg = f"Query execution error: {str(e)}"
-            print(f"-- Error executing query: {error_msg} --")
+            logger.warning("Error executing query: %s", error_msg)
             raise RuntimeError(error_msg) from e
 
     def close(self):
@@ -84,6 +118,136 @@ class query_executor:
             self.conn.close()
 
 
+class PreparedConnection(extensions.connection):
+    """psycopg2 connection that remembers which statements it has PREPAREd."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """Get or create the process-wide connection pool (sized by DB_POOL_MIN/DB_POOL_MAX)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Reuse query_executor's environment validation and error messages
+                probe = query_executor("")
+                probe.connect_to_db()
+                probe.close()
+                _pool = pool.ThreadedConnectionPool(
+                    int(os.getenv("DB_POOL_MIN", 1)),
+                    int(os.getenv("DB_POOL_MAX", 10)),
+                    database=probe.database,
+                    user=probe.user,
+                    password=probe.password,
+                    host=probe.host,
+                    port=probe.port,
+                    connection_factory=PreparedConnection,
+                )
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """Borrow a connection from the pool; rolls back and returns it afterwards."""
+    if is_embedded():
+        conn = get_embedded_database().connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+    conn_pool = get_connection_pool()
+    start = time.perf_counter()
+    conn = conn_pool.getconn()
+    DB_POOL_WAIT.observe(time.perf_counter() - start)
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        if not broken and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        conn_pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def run_readonly(sql: str, operation: str = "readonly", statement_timeout_ms: int = 30000) -> tuple:
+    """
+    (columns, rows) for a query run on a pooled connection in a read-only transaction.
+
+    For untrusted (generated) SQL: on PostgreSQL writes are rejected and the
+    statement is cancelled after statement_timeout_ms.
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        try:
+            if not is_embedded():
+                cur.execute("SET TRANSACTION READ ONLY")
+                cur.execute("SET LOCAL statement_timeout = %s", (statement_timeout_ms,))
+            with observe_query(operation) as outcome:
+                cur.execute(sql)
+                rows = cur.fetchall()
+                outcome["rows"] = len(rows)
+            columns = [desc[0] for desc in cur.description] if cur.description else []
+        finally:
+            cur.close()
+    return columns, rows
+
+
+def _pool_metrics():
+    """Scrape-time pool occupancy (db_pool_connections{state})."""
+    if _pool is None:
+        return []
+    in_use = len(_pool._used)
+    idle = len(_pool._pool)
+    return [
+        ("db_pool_connections", "gauge", "Connections in the pool by state.",
+         [({"state": "in_use"}, in_use), ({"state": "idle"}, idle)]),
+        ("db_pool_max_connections", "gauge", "Configured pool size (DB_POOL_MAX).",
+         [({}, _pool.maxconn)]),
+    ]
+
+
+REGISTRY.register_collector(_pool_metrics)
+
+
+def execute_prepared(cur, name: str, sql: str, params: tuple):
+    """
+    Execute a named server-side prepared statement, preparing it on first use.
+
+    sql uses $1, $2, ... placeholders; the plan is cached per connection, so
+    repeated tool calls on pooled connections skip parsing and planning.
+    """
+    conn = cur.connection
+    prepared = getattr(conn, "prepared_statements", None)
+    if prepared is None:
+        # Plain connection without tracking: fall back to an unnamed statement
+        cur.execute(_positional(sql), params)
+        return cur
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
+    return cur
+
+
+def _positional(sql: str) -> str:
+    """Rewrite $1, $2, ... placeholders (each used once, in order) to psycopg2's %s."""
+    return re.sub(r"\$\d+", "%s", sql)
+
+
 if __name__ == "__main__":
     query = "SELECT * FROM product LIMIT 5;"
 
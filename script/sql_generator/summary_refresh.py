@@ -0,0 +1,237 @@
+"""
+Incremental refresh job for the summary tables in
+sql/migrations/002_summary_tables.sql.
+
+Each summary stores the highest source id it has already aggregated in
+summary_watermark. A refresh locks that row, aggregates only source rows in
+(last_id, current max id], upserts the deltas into the summary and advances
+the watermark in the same transaction, so a crash never double-counts.
+
+Rows that commit with an id below the watermark (a slow transaction that drew
+its id from the sequence earlier) or rows deleted after aggregation are not
+seen by the delta. Every run compares rows_processed with the source row count
+up to the watermark and rebuilds from scratch when they differ; run --loop so
+the reconcile happens on a schedule.
+
+Usage:
+    python sql_generator/summary_refresh.py            # incremental
+    python sql_generator/summary_refresh.py --full     # rebuild from scratch
+    python sql_generator/summary_refresh.py --loop 300 # refresh every 5 minutes
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sql_generator.sql_via_python import query_executor
+
+MIGRATION_PATH = (
+    Path(__file__).parent.parent.parent / "sql" / "migrations" / "002_summary_tables.sql"
+)
+
+MONTHLY_REVENUE_SQL = """
+INSERT INTO summary_monthly_revenue (year, month, total_revenue, order_count)
+SELECT
+    EXTRACT(YEAR FROM h.order_date)::INTEGER,
+    EXTRACT(MONTH FROM h.order_date)::INTEGER,
+    SUM(p.amount),
+    COUNT(*)
+FROM payment AS p
+JOIN order_header AS h ON p.order_id = h.order_id
+WHERE p.payment_id > %(low)s AND p.payment_id <= %(high)s
+GROUP BY 1, 2
+ON CONFLICT (year, month) DO UPDATE SET
+    total_revenue = summary_monthly_revenue.total_revenue + EXCLUDED.total_revenue,
+    order_count = summary_monthly_revenue.order_count + EXCLUDED.order_count
+"""
+
+CUSTOMER_LTV_SQL = """
+INSERT INTO summary_customer_ltv
+    (customer_id, order_count, total_spending, first_order_date, last_order_date)
+SELECT
+    h.customer_id,
+    COUNT(*),
+    SUM(p.amount),
+    MIN(h.order_date),
+    MAX(h.order_date)
+FROM payment AS p
+JOIN order_header AS h ON p.order_id = h.order_id
+WHERE p.payment_id > %(low)s AND p.payment_id <= %(high)s
+GROUP BY h.customer_id
+ON CONFLICT (customer_id) DO UPDATE SET
+    order_count = summary_customer_ltv.order_count + EXCLUDED.order_count,
+    total_spending = summary_customer_ltv.total_spending + EXCLUDED.total_spending,
+    first_order_date = LEAST(summary_customer_ltv.first_order_date, EXCLUDED.first_order_date),
+    last_order_date = GREATEST(summary_customer_ltv.last_order_date, EXCLUDED.last_order_date)
+"""
+
+PRODUCT_SALES_SQL = """
+INSERT INTO summary_product_sales
+    (product_id, units_sold, order_count, revenue, last_order_date)
+SELECT
+    h.product_id,
+    SUM(h.quantity),
+    COUNT(*),
+    SUM(p.amount),
+    MAX(h.order_date)
+FROM payment AS p
+JOIN order_header AS h ON p.order_id = h.order_id
+WHERE p.payment_id > %(low)s AND p.payment_id <= %(high)s
+GROUP BY h.product_id
+ON CONFLICT (product_id) DO UPDATE SET
+    units_sold = summary_product_sales.units_sold + EXCLUDED.units_sold,
+    order_count = summary_product_sales.order_count + EXCLUDED.order_count,
+    revenue = summary_product_sales.revenue + EXCLUDED.revenue,
+    last_order_date = GREATEST(summary_product_sales.last_order_date, EXCLUDED.last_order_date)
+"""
+
+PRODUCT_RATINGS_SQL = """
+INSERT INTO summary_product_sales (product_id, review_count, rating_sum)
+SELECT
+    cr.product_id,
+    COUNT(cr.rating),
+    COALESCE(SUM(cr.rating), 0)
+FROM customer_review AS cr
+WHERE cr.review_id > %(low)s AND cr.review_id <= %(high)s
+GROUP BY cr.product_id
+ON CONFLICT (product_id) DO UPDATE SET
+    review_count = summary_product_sales.review_count + EXCLUDED.review_count,
+    rating_sum = summary_product_sales.rating_sum + EXCLUDED.rating_sum
+"""
+
+# watermark name -> (source table, source id column, delta upsert)
+SUMMARIES = {
+    "summary_monthly_revenue": ("payment", "payment_id", MONTHLY_REVENUE_SQL),
+    "summary_customer_ltv": ("payment", "payment_id", CUSTOMER_LTV_SQL),
+    "summary_product_sales": ("payment", "payment_id", PRODUCT_SALES_SQL),
+    "summary_product_ratings": ("customer_review", "review_id", PRODUCT_RATINGS_SQL),
+}
+SUMMARY_TABLES = ["summary_monthly_revenue", "summary_customer_ltv", "summary_product_sales"]
+
+
+def refresh_summary(conn, name: str) -> dict:
+    """Fold source rows newer than the watermark into one summary; commits."""
+    source, id_column, upsert_sql = SUMMARIES[name]
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT last_id FROM summary_watermark WHERE summary_name = %s FOR UPDATE",
+            (name,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise RuntimeError(
+                f"No watermark for {name}; apply {MIGRATION_PATH.name} first"
+            )
+        low = row[0]
+
+        cur.execute(f"SELECT COALESCE(MAX({id_column}), 0) FROM {source}")
+        high = cur.fetchone()[0]
+        if high <= low:
+            cur.execute(
+                "UPDATE summary_watermark SET refreshed_at = NOW() WHERE summary_name = %s",
+                (name,),
+            )
+            conn.commit()
+            return {"summary": name, "source_rows": 0, "groups": 0, "last_id": low}
+
+        bounds = {"low": low, "high": high}
+        cur.execute(
+            f"SELECT COUNT(*) FROM {source} WHERE {id_column} > %(low)s AND {id_column} <= %(high)s",
+            bounds,
+        )
+        source_rows = cur.fetchone()[0]
+        cur.execute(upsert_sql, bounds)
+        groups = cur.rowcount
+        cur.execute(
+            """
+            UPDATE summary_watermark
+            SET last_id = %s, rows_processed = rows_processed + %s, refreshed_at = NOW()
+            WHERE summary_name = %s
+            """,
+            (high, source_rows, name),
+        )
+        conn.commit()
+        return {"summary": name, "source_rows": source_rows, "groups": groups, "last_id": high}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def find_drift(conn) -> list:
+    """Summaries whose rows_processed no longer matches the source rows up to their watermark."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT summary_name, last_id, rows_processed FROM summary_watermark")
+        drifted = []
+        for name, last_id, rows_processed in cur.fetchall():
+            if name not in SUMMARIES:
+                continue
+            source, id_column, _ = SUMMARIES[name]
+            cur.execute(f"SELECT COUNT(*) FROM {source} WHERE {id_column} <= %s", (last_id,))
+            actual = cur.fetchone()[0]
+            if actual != rows_processed:
+                drifted.append({"summary": name, "rows_processed": rows_processed, "source_rows": actual})
+        conn.commit()
+        return drifted
+    finally:
+        cur.close()
+
+
+def reset_summaries(conn):
+    """Empty every summary table and rewind the watermarks to zero."""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"TRUNCATE {', '.join(SUMMARY_TABLES)}")
+        cur.execute(
+            "UPDATE summary_watermark SET last_id = 0, rows_processed = 0, refreshed_at = NULL"
+        )
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def refresh_all(full: bool = False) -> list:
+    """Refresh every summary (optionally rebuilding from scratch) and return per-summary stats."""
+    db = query_executor("")
+    db.connect_to_db()
+    try:
+        if not full:
+            for drift in find_drift(db.conn):
+                print(
+                    f"  {drift['summary']} aggregated {drift['rows_processed']:,} rows but the source now has "
+                    f"{drift['source_rows']:,} below its watermark; rebuilding"
+                )
+                full = True
+        if full:
+            reset_summaries(db.conn)
+        results = []
+        for name in SUMMARIES:
+            start = time.perf_counter()
+            result = refresh_summary(db.conn, name)
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            results.append(result)
+            print(
+                f"  {name:<26} +{result['source_rows']:>8,} {SUMMARIES[name][0]} rows "
+                f"-> {result['groups']:>6,} groups  (watermark {result['last_id']})  {result['seconds']:.2f}s"
+            )
+        return results
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh summary tables incrementally")
+    parser.add_argument("--full", action="store_true", help="Rebuild from scratch")
+    parser.add_argument("--loop", type=float, help="Refresh every N seconds")
+    args = parser.parse_args()
+
+    refresh_all(full=args.full)
+    while args.loop:
+        time.sleep(args.loop)
+        refresh_all()
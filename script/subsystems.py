@@ -0,0 +1,116 @@
+"""
+Lazy registry for the API's heavy subsystems.
+
+The SQL agent (LangGraph + langchain_openai), the chatbot, the RAG stack
+(chromadb) and the report/KPI modules take seconds to import, so api.py
+registers a loader for each instead of importing them at module level. A
+subsystem loads on first get(), or earlier from warm_up() in a background
+thread once the server is accepting connections.
+
+    subsystems.register("sql_agent", load_sql_agent)
+    runner = subsystems.get("sql_agent").AISQLRunner()
+"""
+
+import logging
+import threading
+import time
+
+from metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+SUBSYSTEM_LOAD_SECONDS = Gauge(
+    "subsystem_load_seconds", "Time taken to import and initialize each lazy subsystem.", ["subsystem"]
+)
+
+
+class Subsystem:
+    """One lazily loaded component; a failed load is retried on the next get()."""
+
+    def __init__(self, name: str, loader, description: str = ""):
+        self.name = name
+        self.loader = loader
+        self.description = description
+        self.value = None
+        self.loaded = False
+        self.load_seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.loaded:
+            return self.value
+        with self._lock:
+            if not self.loaded:
+                start = time.perf_counter()
+                try:
+                    self.value = self.loader()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - start, 3)
+                self.error = None
+                self.loaded = True
+                SUBSYSTEM_LOAD_SECONDS.set(self.load_seconds, subsystem=self.name)
+                logger.info("Loaded subsystem %s in %.2fs", self.name, self.load_seconds,
+                            extra={"subsystem": self.name, "seconds": self.load_seconds})
+        return self.value
+
+    def status(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+            "description": self.description,
+        }
+
+
+class SubsystemRegistry:
+    def __init__(self):
+        self._subsystems = {}
+
+    def register(self, name: str, loader, description: str = "") -> Subsystem:
+        subsystem = Subsystem(name, loader, description)
+        self._subsystems[name] = subsystem
+        return subsystem
+
+    def get(self, name: str):
+        """Load (once) and return the named subsystem."""
+        if name not in self._subsystems:
+            raise KeyError(f"Unknown subsystem: {name}")
+        return self._subsystems[name].get()
+
+    def names(self) -> list:
+        return list(self._subsystems)
+
+    def warm_up(self, names=None, delay: float = 0.0) -> threading.Thread:
+        """
+        Load the given subsystems (default: all) one after another in a daemon thread.
+
+        delay lets the server finish binding before imports compete for the GIL.
+        Failures are logged and left for the first request to retry.
+        """
+        names = [name for name in (names or self.names()) if name in self._subsystems]
+
+        def run():
+            if delay:
+                time.sleep(delay)
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.warning("Warm-up of subsystem %s failed: %s", name, e)
+
+        thread = threading.Thread(target=run, name="subsystem-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> dict:
+        return {name: subsystem.status() for name, subsystem in self._subsystems.items()}
+
+
+REGISTRY = SubsystemRegistry()
+register = REGISTRY.register
+get = REGISTRY.get
+warm_up = REGISTRY.warm_up
+status = REGISTRY.status
@@ -0,0 +1,506 @@
+"""
+Sampled request tracing with pluggable span exporters.
+
+A trace is opened per request (or per CLI run) with start_trace(); nested
+span() blocks record graph nodes, LLM calls and database statements under
+it. Spans are buffered in memory until the trace ends, then the whole trace
+is kept if any of these hold:
+
+- it was head-sampled (TRACE_SAMPLE_RATE, default 0.1)
+- a span failed
+- the root took longer than TRACE_SLOW_MS (default 5000)
+
+Kept traces are handed to a background thread that writes them to every
+configured exporter (TRACE_EXPORTERS, comma separated):
+
+- jsonl      one span per line in TRACE_JSONL_PATH (default result/traces.jsonl)
+- sqlite     a spans table in TRACE_SQLITE_PATH (default result/traces.db)
+- langsmith  LangSmith runs, if LANGCHAIN_API_KEY is set
+- none       disable tracing
+
+Call setup_tracing() once at startup. Until then, span() is a no-op.
+
+Usage:
+    python tracing.py --summary              # span latency by name from the SQLite sink
+    python tracing.py --slowest 10
+"""
+
+import argparse
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RESULT_DIR = Path(__file__).parent.parent / "result"
+DEFAULT_JSONL_PATH = RESULT_DIR / "traces.jsonl"
+DEFAULT_SQLITE_PATH = RESULT_DIR / "traces.db"
+MAX_SPANS_PER_TRACE = 500
+QUEUE_SIZE = 1000
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_tracer = None
+_setup_lock = threading.Lock()
+
+
+class Span:
+    """One timed operation; the root span of a trace also holds its span buffer."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start_time",
+                 "_start", "duration_ms", "status", "error")
+
+    def __init__(self, trace, name: str, parent_id: str = None, attributes: dict = None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        """Attach attributes (token counts, row counts, status codes...)."""
+        self.attributes.update(attributes)
+
+    def rename(self, name: str):
+        self.name = name
+
+    def fail(self, error):
+        self.status = "error"
+        self.error = str(error)[:2000]
+        self.trace.failed = True
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _Trace:
+    __slots__ = ("trace_id", "sampled", "failed", "spans", "dropped")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = uuid.uuid4().hex
+        self.sampled = sampled
+        self.failed = False
+        self.spans = []
+        self.dropped = 0
+
+
+class JsonlExporter:
+    """Append spans to a JSON Lines file."""
+
+    name = "jsonl"
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("TRACE_JSONL_PATH", DEFAULT_JSONL_PATH))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, spans: list):
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span, default=str) + "\n")
+
+    def close(self):
+        pass
+
+
+class SQLiteExporter:
+    """Insert spans into a SQLite table, indexed for per-trace and per-name queries."""
+
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("TRACE_SQLITE_PATH", DEFAULT_SQLITE_PATH))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Only the exporter thread writes after setup
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS spans (
+                trace_id TEXT NOT NULL,
+                span_id TEXT PRIMARY KEY,
+                parent_id TEXT,
+                name TEXT NOT NULL,
+                start_time REAL NOT NULL,
+                duration_ms REAL,
+                status TEXT NOT NULL,
+                error TEXT,
+                attributes TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans (trace_id);
+            CREATE INDEX IF NOT EXISTS idx_spans_name ON spans (name, duration_ms);
+        """)
+
+    def export(self, spans: list):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (s["trace_id"], s["span_id"], s["parent_id"], s["name"], s["start_time"],
+                 s["duration_ms"], s["status"], s["error"], json.dumps(s["attributes"], default=str))
+                for s in spans
+            ],
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class LangSmithExporter:
+    """Send kept traces to LangSmith as runs (requires LANGCHAIN_API_KEY)."""
+
+    name = "langsmith"
+
+    RUN_TYPES = {"llm": "llm", "db": "tool", "tool": "tool", "retrieval": "retriever"}
+
+    def __init__(self):
+        from langsmith import Client
+
+        from langsmith_config import setup_langsmith
+
+        if not setup_langsmith():
+            raise RuntimeError("LANGCHAIN_API_KEY is not set")
+        self.client = Client()
+        self.project = os.environ.get("LANGCHAIN_PROJECT", "rdms")
+
+    def export(self, spans: list):
+        by_id = {span["span_id"]: span for span in spans}
+        # LangSmith identifies a trace by its root run id
+        root_id = next(span["span_id"] for span in spans if span["parent_id"] is None)
+        for span in sorted(spans, key=lambda s: s["start_time"]):
+            start = datetime.fromtimestamp(span["start_time"], tz=timezone.utc)
+            end = datetime.fromtimestamp(span["start_time"] + (span["duration_ms"] or 0) / 1000,
+                                         tz=timezone.utc)
+            self.client.create_run(
+                name=span["name"],
+                inputs={},
+                run_type=self.RUN_TYPES.get(span["name"].split(".")[0], "chain"),
+                project_name=self.project,
+                id=uuid.UUID(span["span_id"]),
+                trace_id=uuid.UUID(root_id),
+                parent_run_id=uuid.UUID(span["parent_id"]) if span["parent_id"] else None,
+                dotted_order=self._dotted_order(span, by_id),
+                start_time=start,
+                end_time=end,
+                outputs={},
+                error=span["error"],
+                extra={"metadata": span["attributes"]},
+            )
+
+    @staticmethod
+    def _dotted_order(span: dict, by_id: dict) -> str:
+        parts = []
+        while span is not None:
+            stamp = datetime.fromtimestamp(span["start_time"], tz=timezone.utc)
+            parts.append(f"{stamp:%Y%m%dT%H%M%S%fZ}{uuid.UUID(span['span_id'])}")
+            span = by_id.get(span["parent_id"])
+        return ".".join(reversed(parts))
+
+    def close(self):
+        if hasattr(self.client, "flush"):
+            self.client.flush()
+
+
+EXPORTERS = {
+    "jsonl": JsonlExporter,
+    "sqlite": SQLiteExporter,
+    "langsmith": LangSmithExporter,
+}
+
+
+class Tracer:
+    """Sampling policy plus the background export queue."""
+
+    def __init__(self, exporters: list, sample_rate: float = 0.1, slow_ms: float = 5000):
+        self.exporters = exporters
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.exported = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+
+    def keep(self, trace: _Trace, root: Span) -> bool:
+        return trace.sampled or trace.failed or root.duration_ms >= self.slow_ms
+
+    def submit(self, trace: _Trace, root: Span):
+        root.set(sampled=trace.sampled, spans=len(trace.spans), spans_dropped=trace.dropped)
+        if not self.keep(trace, root):
+            return
+        spans = [span.to_dict() for span in trace.spans]
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                if spans is None:
+                    return
+                for exporter in self.exporters:
+                    try:
+                        exporter.export(spans)
+                    except Exception as e:
+                        logger.warning("Trace export to %s failed: %s", exporter.name, e)
+                self.exported += 1
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0):
+        """Wait up to timeout seconds for queued traces to be written."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def shutdown(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        for exporter in self.exporters:
+            exporter.close()
+
+    def stats(self) -> dict:
+        return {
+            "exporters": [exporter.name for exporter in self.exporters],
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "exported_traces": self.exported,
+            "dropped_traces": self.dropped,
+            "queued": self._queue.qsize(),
+        }
+
+
+def setup_tracing(exporters: str = None, sample_rate: float = None, slow_ms: float = None):
+    """
+    Configure tracing once from TRACE_EXPORTERS / TRACE_SAMPLE_RATE / TRACE_SLOW_MS.
+
+    Returns the Tracer, or None when tracing is disabled. Exporters that fail
+    to initialize (e.g. LangSmith without an API key) are skipped with a warning.
+    """
+    global _tracer
+    with _setup_lock:
+        if _tracer is not None:
+            return _tracer
+        names = exporters if exporters is not None else os.getenv("TRACE_EXPORTERS", "jsonl")
+        names = [name.strip().lower() for name in names.split(",") if name.strip()]
+        if not names or "none" in names:
+            logger.info("Tracing disabled")
+            return None
+
+        active = []
+        for name in names:
+            if name not in EXPORTERS:
+                logger.warning("Unknown trace exporter %r (choose from %s)", name, ", ".join(EXPORTERS))
+                continue
+            try:
+                active.append(EXPORTERS[name]())
+            except Exception as e:
+                logger.warning("Trace exporter %s unavailable: %s", name, e)
+        if not active:
+            return None
+
+        _tracer = Tracer(
+            active,
+            sample_rate=float(sample_rate if sample_rate is not None else os.getenv("TRACE_SAMPLE_RATE", 0.1)),
+            slow_ms=float(slow_ms if slow_ms is not None else os.getenv("TRACE_SLOW_MS", 5000)),
+        )
+        logger.info("Tracing enabled", extra=_tracer.stats())
+        return _tracer
+
+
+def shutdown_tracing():
+    global _tracer
+    with _setup_lock:
+        if _tracer is not None:
+            _tracer.shutdown()
+            _tracer = None
+
+
+def get_tracer():
+    return _tracer
+
+
+@contextmanager
+def start_trace(name: str, force: bool = False, **attributes):
+    """
+    Open a root span; nested span() calls attach to it.
+
+    force=True keeps the trace regardless of the sample rate. Yields the
+    root Span, or None when tracing is off.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield None
+        return
+    trace = _Trace(sampled=force or random.random() < tracer.sample_rate)
+    root = Span(trace, name, attributes=attributes)
+    trace.spans.append(root)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        root.finish()
+        tracer.submit(trace, root)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Record a child span of the current trace.
+
+    Outside a trace this yields None and costs one context variable lookup.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    trace = parent.trace
+    if len(trace.spans) >= MAX_SPANS_PER_TRACE:
+        trace.dropped += 1
+        yield None
+        return
+    child = Span(trace, name, parent_id=parent.span_id, attributes=attributes)
+    trace.spans.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+
+def current_span():
+    return _current_span.get()
+
+
+def traced(name: str):
+    """Decorator form of span() for helpers that are worth a line in the breakdown."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def capture(name: str = "capture"):
+    """
+    Collect the spans opened inside the block, whether or not tracing is on.
+
+    Inside a trace the spans still go to the exporters as usual; outside one
+    they are recorded under a private root that is never exported and not
+    included in the result. Yields a list filled in when the block exits.
+    """
+    spans = []
+    parent = _current_span.get()
+    if parent is not None:
+        start = len(parent.trace.spans)
+        try:
+            yield spans
+        finally:
+            spans.extend(parent.trace.spans[start:])
+        return
+    trace = _Trace(sampled=False)
+    root = Span(trace, name)
+    trace.spans.append(root)
+    token = _current_span.set(root)
+    try:
+        yield spans
+    finally:
+        _current_span.reset(token)
+        root.finish()
+        spans.extend(trace.spans[1:])
+
+
+def summarize(path=None, slowest: int = 0) -> list:
+    """Per-name span count, error count, p50/p95/max from the SQLite sink (or the slowest roots)."""
+    conn = sqlite3.connect(path or os.getenv("TRACE_SQLITE_PATH", DEFAULT_SQLITE_PATH))
+    try:
+        if slowest:
+            cur = conn.execute(
+                "SELECT trace_id, name, duration_ms, status, error FROM spans "
+                "WHERE parent_id IS NULL ORDER BY duration_ms DESC LIMIT ?",
+                (slowest,),
+            )
+            columns = [desc[0] for desc in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+        durations = {}
+        errors = {}
+        for name, duration, status in conn.execute("SELECT name, duration_ms, status FROM spans"):
+            durations.setdefault(name, []).append(duration or 0.0)
+            errors[name] = errors.get(name, 0) + (status == "error")
+    finally:
+        conn.close()
+
+    rows = []
+    for name, values in durations.items():
+        values.sort()
+        rows.append({
+            "name": name,
+            "count": len(values),
+            "errors": errors[name],
+            "p50_ms": round(values[int(0.50 * (len(values) - 1))], 2),
+            "p95_ms": round(values[int(0.95 * (len(values) - 1))], 2),
+            "max_ms": round(values[-1], 2),
+        })
+    return sorted(rows, key=lambda row: -row["p95_ms"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize spans stored by the SQLite trace exporter")
+    parser.add_argument("--path", help="SQLite trace file (default: TRACE_SQLITE_PATH or result/traces.db)")
+    parser.add_argument("--summary", action="store_true", help="Latency per span name")
+    parser.add_argument("--slowest", type=int, default=0, help="List the N slowest traces")
+    args = parser.parse_args()
+
+    if args.slowest:
+        for row in summarize(args.path, slowest=args.slowest):
+            print(f"{row['duration_ms']:>10.1f} ms  {row['status']:<5}  {row['trace_id']}  {row['name']}")
+    else:
+        print(f"{'span':<40} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for row in summarize(args.path):
+            print(f"{row['name']:<40} {row['count']:>7} {row['errors']:>7} "
+                  f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['max_ms']:>9.1f}")
@@ -24,7 +24,7 @@ select
 	count(*) as total_ticket,
 	round(avg(cs.duration_hours),2) as avg_service_hour
 from customer_service as cs 
-join staff as s on cs.staff_id = s.staff_id 
+join staff as s on cs.staff_id = s.staff_id;
 
 
 -- Orders with shipping delays (not shipped within 3 days). Correlate with customer review scores.
@@ -91,4 +91,4 @@ from customer_service as cs
 join staff as s on cs.staff_id = s.staff_id 
 group by s.first_name, s.last_name 
 having count(*) > 3
-order by avg_service_hour desc
\ No newline at end of file
+order by avg_service_hour desc;
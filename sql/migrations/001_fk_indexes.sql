@@ -0,0 +1,104 @@
+-- =============================================
+-- Migration 001: Foreign-key and hot-path indexes
+-- Database: PostgreSQL
+-- Purpose: PostgreSQL does not index foreign key columns automatically, so
+--          every join and customer/product lookup was a sequential scan.
+-- Run with autocommit (psql default): CREATE INDEX CONCURRENTLY cannot run
+-- inside a transaction block, but it does not block writes while building.
+-- payment.order_id is already indexed by its UNIQUE constraint.
+-- =============================================
+
+-- =============================================
+-- HOT ACCESS PATHS (covering indexes)
+-- =============================================
+
+-- Chatbot get_my_orders: WHERE customer_id = ? ORDER BY order_date DESC, order_id DESC
+-- with a keyset cursor; INCLUDE lets the join keys come from the index alone
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_header_customer_date
+    ON order_header (customer_id, order_date DESC, order_id DESC)
+    INCLUDE (product_id, shipping_id, quantity);
+
+-- Chatbot get_product_reviews: WHERE product_id = ? ORDER BY review_id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_customer_review_product
+    ON customer_review (product_id, review_id DESC)
+    INCLUDE (rating);
+
+-- Monthly revenue, MoM growth and cohort queries group and filter by order date
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_header_order_date
+    ON order_header (order_date)
+    INCLUDE (order_id, customer_id, product_id, quantity);
+
+-- Product performance / best sellers join order_header on product_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_header_product
+    ON order_header (product_id)
+    INCLUDE (order_id, quantity);
+
+-- Bid activity per product and bidder analysis per customer
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bid_product
+    ON bid (product_id)
+    INCLUDE (customer_id, bid_amount);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bid_customer
+    ON bid (customer_id)
+    INCLUDE (product_id, bid_amount, bid_date);
+
+-- Seller revenue rankings join product on seller_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_product_seller
+    ON product (seller_id);
+
+-- =============================================
+-- REMAINING FOREIGN KEYS
+-- =============================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_header_shipping
+    ON order_header (shipping_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_header_bid
+    ON order_header (bid_id)
+    WHERE bid_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_staff_department
+    ON staff (department_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_app_user_customer
+    ON app_user (customer_id)
+    WHERE customer_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_app_user_seller
+    ON app_user (seller_id)
+    WHERE seller_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_history_customer
+    ON order_history (customer_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_history_order
+    ON order_history (order_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_import_distribution_shipping
+    ON import_distribution (shipping_id)
+    INCLUDE (received_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_export_distribution_shipping
+    ON export_distribution (shipping_id)
+    INCLUDE (delivered_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_customer_service_staff
+    ON customer_service (staff_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_customer_service_customer
+    ON customer_service (customer_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_seller_service_seller
+    ON seller_service (seller_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_seller_service_staff
+    ON seller_service (staff_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_customer_review_customer
+    ON customer_review (customer_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_seller_review_seller
+    ON seller_review (seller_id);
+
+-- Refresh planner statistics so the new indexes are considered immediately
+ANALYZE;
@@ -0,0 +1,65 @@
+-- =============================================
+-- 002: Precomputed summary tables
+-- =============================================
+-- Incrementally maintained aggregates for the revenue, customer and product
+-- analysis queries in sql/1-3. Refresh with:
+--   python script/sql_generator/summary_refresh.py
+-- Revenue-based aggregates advance on payment_id (a paid order is counted
+-- once, when its payment lands); ratings advance on review_id.
+
+-- Monthly revenue: one row per calendar month of order_date
+CREATE TABLE IF NOT EXISTS summary_monthly_revenue (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    avg_order_value DECIMAL(12,2) GENERATED ALWAYS AS (
+        ROUND(total_revenue / NULLIF(order_count, 0), 2)
+    ) STORED,
+    PRIMARY KEY (year, month)
+);
+
+-- Customer lifetime value: paid orders and spend per customer
+CREATE TABLE IF NOT EXISTS summary_customer_ltv (
+    customer_id INTEGER PRIMARY KEY,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    total_spending DECIMAL(14,2) NOT NULL DEFAULT 0,
+    first_order_date TIMESTAMP,
+    last_order_date TIMESTAMP,
+    CONSTRAINT fk_summary_ltv_customer FOREIGN KEY (customer_id)
+        REFERENCES customer(customer_id)
+        ON DELETE CASCADE
+);
+
+-- Product sales and ratings: paid units/revenue plus review statistics
+CREATE TABLE IF NOT EXISTS summary_product_sales (
+    product_id INTEGER PRIMARY KEY,
+    units_sold INTEGER NOT NULL DEFAULT 0,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    last_order_date TIMESTAMP,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    avg_rating DECIMAL(3,2) GENERATED ALWAYS AS (
+        ROUND(rating_sum::DECIMAL / NULLIF(review_count, 0), 2)
+    ) STORED,
+    CONSTRAINT fk_summary_product FOREIGN KEY (product_id)
+        REFERENCES product(product_id)
+        ON DELETE CASCADE
+);
+
+-- Refresh watermarks: highest source id already folded into each summary
+CREATE TABLE IF NOT EXISTS summary_watermark (
+    summary_name VARCHAR(50) PRIMARY KEY,
+    source_table VARCHAR(50) NOT NULL,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    rows_processed BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO summary_watermark (summary_name, source_table) VALUES
+    ('summary_monthly_revenue', 'payment'),
+    ('summary_customer_ltv', 'payment'),
+    ('summary_product_sales', 'payment'),
+    ('summary_product_ratings', 'customer_review')
+ON CONFLICT (summary_name) DO NOTHING;
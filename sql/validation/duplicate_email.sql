@@ -0,0 +1,8 @@
+-- duplicate emails (emails used by more than one app user)
+select count(*) as duplicate_emails
+from (
+    select lower(email)
+    from app_user
+    group by lower(email)
+    having count(*) > 1
+) as duplicates;
@@ -1,4 +1,6 @@
 -- missing email
+-- incremental: app_user.user_id
 select count(*)
 from app_user 
-where email is null;
\ No newline at end of file
+where email is null
+  and user_id > %(low)s and user_id <= %(high)s;
@@ -1,5 +1,7 @@
 -- orders wo payment 
+-- incremental: order_header.order_id
 select count(*) as orders_without_payment
 from order_header as oh 
 left join  payment as p on oh.order_id = p.order_id 
-where p.payment_id is null;
\ No newline at end of file
+where p.payment_id is null
+  and oh.order_id > %(low)s and oh.order_id <= %(high)s;
@@ -1,9 +1,8 @@
-select 
-    oh.quantity, 
-    p.product_price,
-    oh.quantity * p.product_price as calculated_total, 
-    pay.amount as actual_payment,
-    pay.amount - (oh.quantity * p.product_price) as difference
+-- payments that do not match quantity * product_price
+-- incremental: payment.payment_id
+select count(*) as price_mismatches
 from order_header as oh 
 join product as p on oh.product_id = p.product_id 
-join payment as pay on pay.order_id = oh.order_id
\ No newline at end of file
+join payment as pay on pay.order_id = oh.order_id
+where pay.amount <> oh.quantity * p.product_price
+  and pay.payment_id > %(low)s and pay.payment_id <= %(high)s;
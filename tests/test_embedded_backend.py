@@ -0,0 +1,120 @@
+"""PostgreSQL -> DuckDB rewrites in sql_generator/embedded_backend.py."""
+
+import pytest
+
+from schema import parse_schema
+from sql_generator.embedded_backend import _rewrite_to_char, add_functional_dependency, translate_sql
+
+
+@pytest.fixture(scope="module")
+def tables():
+    return parse_schema()
+
+
+# ----------------------------------------------------------------------
+# TO_CHAR
+# ----------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT TO_CHAR(order_date, 'YYYY-MM') FROM order_header",
+     "SELECT strftime(order_date, '%Y-%m') FROM order_header"),
+    ("SELECT to_char(x, 'HH24:MI:SS')", "SELECT strftime(x, '%H:%M:%S')"),
+    ("SELECT TO_CHAR(d, 'Month DD, YYYY')", "SELECT strftime(d, '%B %d, %Y')"),
+    # Nested calls and commas inside the first argument
+    ("SELECT TO_CHAR(DATE_TRUNC('month', h.order_date), 'Mon YYYY') AS m FROM t",
+     "SELECT strftime(DATE_TRUNC('month', h.order_date), '%b %Y') AS m FROM t"),
+])
+def test_rewrite_to_char(sql, expected):
+    assert _rewrite_to_char(sql) == expected
+
+
+def test_rewrite_to_char_rewrites_every_call():
+    sql = "SELECT TO_CHAR(a, 'YYYY'), TO_CHAR(b, 'MM') FROM t"
+    assert _rewrite_to_char(sql) == "SELECT strftime(a, '%Y'), strftime(b, '%m') FROM t"
+
+
+def test_rewrite_to_char_keeps_calls_without_literal_format():
+    sql = "SELECT TO_CHAR(amount, fmt), TO_CHAR(amount) FROM t"
+    assert _rewrite_to_char(sql) == sql
+
+
+def test_rewrite_to_char_unbalanced():
+    with pytest.raises(ValueError):
+        _rewrite_to_char("SELECT TO_CHAR(order_date, 'YYYY'")
+
+
+# ----------------------------------------------------------------------
+# translate_sql
+# ----------------------------------------------------------------------
+
+
+def test_translate_bare_numeric_cast():
+    sql, _ = translate_sql("SELECT AVG(amount)::numeric, x::NUMERIC(10,2), y::decimal FROM t")
+    assert sql == "SELECT AVG(amount)::DOUBLE, x::NUMERIC(10,2), y::DOUBLE FROM t"
+
+
+def test_translate_pg_export_snapshot():
+    sql, _ = translate_sql("SELECT pg_export_snapshot()")
+    assert sql == "SELECT 'embedded'"
+
+
+def test_translate_positional_params():
+    sql, params = translate_sql("SELECT * FROM t WHERE a = %s AND b LIKE 'x%%'", (1,))
+    assert sql == "SELECT * FROM t WHERE a = ? AND b LIKE 'x%'"
+    assert params == [1]
+
+
+def test_translate_named_params():
+    sql, params = translate_sql("SELECT * FROM t WHERE id > %(low)s AND id <= %(high)s", {"low": 1, "high": 2})
+    assert sql == "SELECT * FROM t WHERE id > $low AND id <= $high"
+    assert params == {"low": 1, "high": 2}
+
+
+def test_translate_without_params_leaves_percent_signs():
+    # Like psycopg2: without parameters the statement is sent as written
+    sql, params = translate_sql("SELECT 'a%%b'")
+    assert sql == "SELECT 'a%%b'"
+    assert params is None
+
+
+# ----------------------------------------------------------------------
+# GROUP BY primary key
+# ----------------------------------------------------------------------
+
+
+def test_functional_dependency_alias(tables):
+    sql = (
+        "SELECT p.product_id, p.description, SUM(h.quantity) FROM order_header h "
+        "JOIN product p ON h.product_id = p.product_id GROUP BY p.product_id ORDER BY 3 DESC"
+    )
+    assert add_functional_dependency(sql, "description", tables) == (
+        "SELECT p.product_id, p.description, SUM(h.quantity) FROM order_header h "
+        "JOIN product p ON h.product_id = p.product_id GROUP BY p.product_id, p.description ORDER BY 3 DESC"
+    )
+
+
+def test_functional_dependency_table_name(tables):
+    sql = "SELECT product.product_id, product.category, COUNT(*) FROM product GROUP BY product.product_id"
+    rewritten = add_functional_dependency(sql, "category", tables)
+    assert rewritten.rstrip().endswith("GROUP BY product.product_id, product.category")
+
+
+def test_functional_dependency_subquery(tables):
+    sql = "SELECT * FROM (SELECT p.product_id, p.category FROM product AS p GROUP BY p.product_id) s"
+    rewritten = add_functional_dependency(sql, "category", tables)
+    assert "GROUP BY p.product_id, p.category )" in rewritten
+
+
+@pytest.mark.parametrize("sql, column", [
+    # Not grouped by the primary key
+    ("SELECT p.category, p.description FROM product p GROUP BY p.category", "description"),
+    # Already listed
+    ("SELECT p.product_id, p.category FROM product p GROUP BY p.product_id, p.category", "category"),
+    # Column not in the grouped table
+    ("SELECT p.product_id, p.state FROM product p GROUP BY p.product_id", "state"),
+    # No GROUP BY at all
+    ("SELECT p.description FROM product p", "description"),
+])
+def test_functional_dependency_not_applicable(tables, sql, column):
+    assert add_functional_dependency(sql, column, tables) is None
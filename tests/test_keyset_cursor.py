@@ -0,0 +1,42 @@
+"""Keyset pagination cursors of the chatbot tools (chatbot/tools.py)."""
+
+import os
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+# The tools module builds an OpenAI client at import time
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from chatbot.tools import MAX_PAGE_SIZE, _page_size, decode_cursor, encode_cursor  # noqa: E402
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor("2024-03-01T10:00:00", 42)) == ["2024-03-01T10:00:00", 42]
+
+
+def test_values_are_made_json_serializable():
+    cursor = encode_cursor(datetime(2024, 3, 1, 10, 0), Decimal("19.90"), 7)
+    assert decode_cursor(cursor) == ["2024-03-01T10:00:00", 19.9, 7]
+
+
+def test_cursor_is_url_safe():
+    # Enough bytes that standard base64 would produce '+' or '/'
+    cursor = encode_cursor("\xff\xfe\xfd" * 20, 2**40)
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+    assert decode_cursor(cursor) == ["\xff\xfe\xfd" * 20, 2**40]
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "bm90IGpzb24=", "é"])
+def test_malformed_cursor_raises_value_error(cursor):
+    # The tools catch ValueError and report an invalid cursor parameter
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("limit, expected", [
+    (10, 10), ("5", 5), (0, 10), (-3, 10), (MAX_PAGE_SIZE + 1, MAX_PAGE_SIZE),
+])
+def test_page_size(limit, expected):
+    assert _page_size(limit) == expected
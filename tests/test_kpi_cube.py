@@ -0,0 +1,158 @@
+"""KPICube aggregation checked against a pandas groupby over the same fact rows."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import kpi_cube
+from kpi_cube import DIMENSIONS, KPICube
+
+
+def make_facts(n: int = 2000, seed: int = 7, first_order_id: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    carriers = np.array(["UPS", "FedEx", "DHL", None], dtype=object)
+    return pd.DataFrame({
+        "order_id": np.arange(first_order_id, first_order_id + n),
+        "year": rng.choice([2023, 2024], n),
+        "month": rng.integers(1, 13, n),
+        "category": rng.choice(["Laptops", "Smartphones", "Tablets"], n),
+        "state": rng.choice(["CA", "NY", "TX", "WA"], n),
+        "seller": rng.integers(1, 30, n),
+        "carrier": carriers[rng.integers(0, len(carriers), n)],
+        "quantity": rng.integers(1, 5, n),
+        # Some orders are not paid yet
+        "revenue": np.where(rng.random(n) < 0.1, 0.0, rng.uniform(5, 500, n).round(2)),
+    })
+
+
+def expected(facts: pd.DataFrame, group_by: list) -> list:
+    """The cube's rows computed with pandas."""
+    frame = facts.assign(orders=1)
+    if not group_by:
+        sums = frame[["revenue", "orders", "quantity"]].sum()
+        return [{"revenue": round(sums["revenue"], 2), "orders": int(sums["orders"]),
+                 "quantity": int(sums["quantity"])}]
+    grouped = frame.groupby(group_by, dropna=False)[["revenue", "orders", "quantity"]].sum().reset_index()
+    return [
+        {**{dim: (None if pd.isna(row[dim]) else row[dim]) for dim in group_by},
+         "revenue": round(row["revenue"], 2), "orders": int(row["orders"]), "quantity": int(row["quantity"])}
+        for row in grouped.to_dict("records")
+    ]
+
+
+def as_set(rows: list) -> dict:
+    """Rows keyed by their dimension values, so order does not matter."""
+    return {
+        tuple((k, v) for k, v in sorted(row.items()) if k not in ("revenue", "orders", "quantity")):
+            (pytest.approx(row["revenue"], abs=0.01), row["orders"], row["quantity"])
+        for row in rows
+    }
+
+
+@pytest.fixture(scope="module")
+def facts():
+    return make_facts()
+
+
+@pytest.fixture(scope="module")
+def cube(facts):
+    return KPICube.from_frame(facts)
+
+
+@pytest.mark.parametrize("group_by", [
+    [], ["year"], ["year", "month"], ["category", "state"], ["carrier"], ["seller", "carrier"],
+    list(DIMENSIONS),
+])
+def test_query_matches_groupby(cube, facts, group_by):
+    assert as_set(cube.query(group_by)) == as_set(expected(facts, group_by))
+
+
+def test_query_filters(cube, facts):
+    rows = cube.query(["state"], filters={"category": ["Laptops", "Tablets"], "year": 2024})
+    subset = facts[facts["category"].isin(["Laptops", "Tablets"]) & (facts["year"] == 2024)]
+    assert as_set(rows) == as_set(expected(subset, ["state"]))
+
+
+def test_query_filter_on_missing_value(cube):
+    assert cube.query(["state"], filters={"category": "Printers"}) == []
+
+
+def test_query_top_n(cube, facts):
+    rows = cube.query(["seller"], order_by="revenue", limit=5)
+    top = facts.groupby("seller")["revenue"].sum().nlargest(5)
+    assert [row["seller"] for row in rows] == top.index.tolist()
+    assert [row["revenue"] for row in rows] == pytest.approx(top.round(2).tolist(), abs=0.01)
+
+
+def test_query_sorted_by_dimensions_without_order_by(cube):
+    rows = cube.query(["year", "month"])
+    keys = [(row["year"], row["month"]) for row in rows]
+    assert keys == sorted(keys)
+
+
+def test_query_sparse_path_matches_dense(cube, monkeypatch):
+    dense = cube.query(["seller", "state", "month"])
+    monkeypatch.setattr(kpi_cube, "_DENSE_GROUP_LIMIT", 0)
+    sparse = KPICube.from_frame(make_facts()).query(["seller", "state", "month"])
+    assert as_set(sparse) == as_set(dense)
+
+
+def test_rollup(cube, facts):
+    rows = cube.rollup(["year", "category"])
+    assert len(rows) == (
+        len(expected(facts, ["year", "category"])) + len(expected(facts, ["year"])) + 1
+    )
+    subtotals = [row for row in rows if row["year"] is not None and row["category"] is None]
+    assert as_set([{k: v for k, v in row.items() if k != "category"} for row in subtotals]) == \
+        as_set(expected(facts, ["year"]))
+    grand_total = rows[-1]
+    assert grand_total["year"] is None and grand_total["category"] is None
+    assert grand_total["orders"] == len(facts)
+    assert grand_total["revenue"] == pytest.approx(facts["revenue"].sum(), abs=0.01)
+
+
+def test_incremental_append_matches_full_build(facts):
+    cube = KPICube.from_frame(facts.iloc[:1200])
+    cube.query(["year"])  # cached cuboids must be dropped by the next append
+    cube.append(facts.iloc[1200:])
+    assert cube.watermark == int(facts["order_id"].max())
+    assert as_set(cube.query(["year", "category"])) == as_set(expected(facts, ["year", "category"]))
+
+
+def test_late_payment_adds_revenue_only(facts):
+    cube = KPICube.from_frame(facts)
+    paid_late = facts.iloc[[0]].assign(revenue=100.0, quantity=0, orders=0).drop(columns="order_id")
+    cube.append(paid_late)
+    total = cube.query()[0]
+    assert total["orders"] == len(facts)
+    assert total["quantity"] == facts["quantity"].sum()
+    assert total["revenue"] == pytest.approx(facts["revenue"].sum() + 100.0, abs=0.01)
+
+
+def test_unknown_dimension_and_measure(cube):
+    with pytest.raises(ValueError):
+        cube.query(["country"])
+    with pytest.raises(ValueError):
+        cube.query(["year"], filters={"country": "US"})
+    with pytest.raises(ValueError):
+        cube.query(["year"], order_by="profit")
+
+
+def test_coerce(cube):
+    assert cube.coerce("year", ["2024"]) == [2024]
+    assert cube.coerce("state", ["CA"]) == ["CA"]
+
+
+def test_top_n_breaks_ties_by_dimension_values():
+    facts = pd.DataFrame({
+        "order_id": np.arange(1, 7),
+        "year": 2024, "month": 1, "category": "Laptops", "seller": 1, "carrier": "UPS",
+        # TX, CA and NY tie on orders; WA has more
+        "state": ["TX", "CA", "NY", "WA", "WA", None],
+        "quantity": 1, "revenue": 10.0,
+    })
+    cube = KPICube.from_frame(facts)
+    rows = cube.query(["state"], order_by="orders", limit=3)
+    assert [row["state"] for row in rows] == ["WA", "CA", "NY"]
+    rows = cube.query(["state"], order_by="orders", ascending=True)
+    assert [row["state"] for row in rows] == ["CA", "NY", "TX", None, "WA"]
@@ -0,0 +1,208 @@
+"""Admission order, 429 retries and load shedding of llm_dispatch.Dispatcher."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_dispatch
+from llm_dispatch import Dispatcher, Overloaded, RateLimiter
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: str = "0.01"):
+        super().__init__("429 Too Many Requests")
+        self.response = SimpleNamespace(headers={"retry-after": retry_after})
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+class Holder:
+    """Occupies one dispatcher slot until released."""
+
+    def __init__(self, dispatcher: Dispatcher, model: str = "m"):
+        self.release = threading.Event()
+        self.thread = threading.Thread(target=dispatcher.call, args=(model, self.release.wait))
+        self.thread.start()
+        wait_until(lambda: dispatcher.stats()["active"] == 1)
+
+    def done(self):
+        self.release.set()
+        self.thread.join()
+
+
+def call_at(dispatcher: Dispatcher, priority: str, func, errors: list = None):
+    def run():
+        try:
+            with llm_dispatch.request(priority):
+                dispatcher.call("m", func)
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+# ----------------------------------------------------------------------
+# Admission
+# ----------------------------------------------------------------------
+
+
+def test_waiters_are_served_in_priority_order():
+    dispatcher = Dispatcher(max_concurrency=1)
+    holder = Holder(dispatcher)
+    served = []
+    threads = []
+    for priority in ("batch", "analysis", "batch", "interactive"):
+        threads.append(call_at(dispatcher, priority, lambda p=priority: served.append(p)))
+        wait_until(lambda n=len(threads): sum(dispatcher.stats()["waiting"].values()) == n)
+    holder.done()
+    for thread in threads:
+        thread.join()
+    assert served == ["interactive", "analysis", "batch", "batch"]
+
+
+def test_model_concurrency_limit_does_not_block_other_models():
+    dispatcher = Dispatcher(max_concurrency=4, model_concurrency={"m": 1})
+    holder = Holder(dispatcher, model="m")
+    assert dispatcher.call("other", lambda: "ok") == "ok"
+    done = []
+    thread = threading.Thread(target=lambda: done.append(dispatcher.call("m", lambda: "m")))
+    thread.start()
+    wait_until(lambda: dispatcher.stats()["waiting"]["analysis"] == 1)
+    assert not done
+    holder.done()
+    thread.join()
+    assert done == ["m"]
+
+
+def test_fake_models_share_the_real_model_limit():
+    dispatcher = Dispatcher(model_concurrency={"gpt-4o": 2})
+    assert dispatcher._model_limit("fake-gpt-4o") == 2
+
+
+# ----------------------------------------------------------------------
+# Rate limits and 429s
+# ----------------------------------------------------------------------
+
+
+def test_429_is_retried_after_retry_after():
+    dispatcher = Dispatcher(max_retries=3)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RateLimitError()
+        return "ok"
+
+    assert dispatcher.call("m", flaky) == "ok"
+    assert len(attempts) == 3
+    assert dispatcher.limiter.rate_limited == 2
+    assert dispatcher.stats()["active"] == 0
+
+
+def test_429_gives_up_after_max_retries():
+    dispatcher = Dispatcher(max_retries=1)
+    calls = []
+
+    def always_limited():
+        calls.append(1)
+        raise RateLimitError()
+
+    with pytest.raises(RateLimitError):
+        dispatcher.call("m", always_limited)
+    assert len(calls) == 2
+    assert dispatcher.stats()["active"] == 0
+
+
+def test_other_errors_are_not_retried():
+    dispatcher = Dispatcher()
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise KeyError("boom")
+
+    with pytest.raises(KeyError):
+        dispatcher.call("m", broken)
+    assert len(calls) == 1
+
+
+def test_rate_limiter_buckets():
+    limiter = RateLimiter(rpm=2)
+    assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() > 1
+
+
+def test_set_rate_limits_replaces_the_limiter():
+    dispatcher = Dispatcher()
+    dispatcher.set_rate_limits(rpm=120, tpm=50_000)
+    assert (dispatcher.limiter.rpm, dispatcher.limiter.tpm) == (120, 50_000)
+
+
+def test_tokens_refine_the_estimate():
+    dispatcher = Dispatcher()
+    dispatcher.call("m", lambda: 100, tokens=lambda result: result)
+    assert dispatcher.limiter.tokens_per_call == 100
+
+
+# ----------------------------------------------------------------------
+# Load shedding
+# ----------------------------------------------------------------------
+
+
+def test_call_waiting_past_max_wait_is_overloaded():
+    dispatcher = Dispatcher(max_concurrency=1, max_wait={"analysis": 0.05})
+    holder = Holder(dispatcher)
+    try:
+        with pytest.raises(Overloaded) as raised:
+            dispatcher.call("m", lambda: "never")
+        assert raised.value.retry_after >= 1
+    finally:
+        holder.done()
+
+
+def test_request_sheds_later_calls_once_overloaded():
+    dispatcher = Dispatcher(max_concurrency=1, max_wait={"interactive": 0.05})
+    holder = Holder(dispatcher)
+    calls = []
+    try:
+        with pytest.raises(Overloaded):
+            with llm_dispatch.request("interactive"):
+                with pytest.raises(Overloaded):
+                    dispatcher.call("m", lambda: calls.append(1))
+                holder.done()
+                # Capacity is back, but the request already failed: no more load
+                with pytest.raises(Overloaded):
+                    dispatcher.call("m", lambda: calls.append(1))
+    finally:
+        holder.done()
+    assert calls == []
+
+
+def test_admit_refuses_when_queue_is_full():
+    dispatcher = Dispatcher(max_queued=0)
+    with pytest.raises(Overloaded):
+        dispatcher.admit("interactive")
+    # Batch work waits indefinitely, so it is never refused at the door
+    dispatcher.admit("batch")
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        with llm_dispatch.request("urgent"):
+            pass
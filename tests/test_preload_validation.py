@@ -0,0 +1,161 @@
+"""Type conversion, CHECK translation and the data quality rules of preload_validation.py."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preload_validation import PreloadValidator, check_expression, check_violations, convert
+
+
+def write_csv(directory, table: str, text: str):
+    (directory / f"{table}.csv").write_text(text.strip() + "\n")
+
+
+def result(report: dict, check: str, table: str, column) -> dict:
+    return next(c for c in report["checks"] if (c["check"], c["table"], c["column"]) == (check, table, column))
+
+
+# ----------------------------------------------------------------------
+# convert
+# ----------------------------------------------------------------------
+
+
+def test_convert_integer():
+    values, bad = convert(pd.Series(["1", "2.0", "1.5", "x", np.nan]), "INTEGER")
+    assert values.tolist()[:2] == [1, 2]
+    # NULL is not a type error; NOT NULL is checked separately
+    assert bad.tolist() == [False, False, True, True, False]
+
+
+def test_convert_decimal_precision():
+    values, bad = convert(pd.Series(["12345678.99", "123456789.00", "-5", "abc"]), "DECIMAL(10,2)")
+    assert values[0] == pytest.approx(12345678.99)
+    assert bad.tolist() == [False, True, False, True]
+
+
+def test_convert_timestamp():
+    values, bad = convert(pd.Series(["2024-01-31", "2024-01-31 10:15:00", "2024-02-30", None]), "TIMESTAMP")
+    assert values[1] == pd.Timestamp("2024-01-31 10:15:00")
+    assert bad.tolist() == [False, False, True, False]
+
+
+def test_convert_varchar_passthrough():
+    raw = pd.Series(["a", None])
+    values, bad = convert(raw, "varchar(50)")
+    assert values is raw
+    assert not bad.any()
+
+
+# ----------------------------------------------------------------------
+# check_expression
+# ----------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("expression, predicate, compared", [
+    ("quantity > 0", ("compare", "quantity", ">", 0), {"quantity"}),
+    ("product_price >= 0.5", ("compare", "product_price", ">=", 0.5), {"product_price"}),
+    (
+        "rating BETWEEN 1 AND 5",
+        ("and", ("compare", "rating", ">=", 1), ("compare", "rating", "<=", 5)),
+        {"rating"},
+    ),
+    ("status <> 'it''s'", ("compare", "status", "<>", "it's"), {"status"}),
+    ("status IN ('a', 'b')", ("in", "status", ("a", "b")), {"status"}),
+    ("a = 1 OR NOT b = 2", ("or", ("compare", "a", "=", 1), ("not", ("compare", "b", "=", 2))), {"a", "b"}),
+    (
+        "(customer_id IS NOT NULL AND seller_id IS NULL) OR (customer_id IS NULL AND seller_id IS NOT NULL)",
+        ("or",
+         ("and", ("not", ("is_null", "customer_id")), ("is_null", "seller_id")),
+         ("and", ("is_null", "customer_id"), ("not", ("is_null", "seller_id")))),
+        set(),
+    ),
+])
+def test_check_expression(expression, predicate, compared):
+    assert check_expression(expression) == (predicate, compared)
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('id')",
+    "quantity > other_column",
+    "quantity > 0 AND",
+    "len(name) > 3",
+])
+def test_check_expression_rejects_anything_else(expression):
+    with pytest.raises(ValueError):
+        check_expression(expression)
+
+
+def test_check_violations_use_three_valued_logic():
+    predicate, _ = check_expression("rating BETWEEN 1 AND 5")
+    rating = pd.Series([0, 1, 5, 6, np.nan])
+    assert check_violations(predicate, {"rating": rating}).tolist() == [True, False, False, True, False]
+    # NOT of an unknown comparison is still unknown
+    predicate, _ = check_expression("NOT status = 'x'")
+    status = pd.Series(["x", "y", None])
+    assert check_violations(predicate, {"status": status}).tolist() == [True, False, False]
+
+
+# ----------------------------------------------------------------------
+# CHECK constraints end to end, including NULLs
+# ----------------------------------------------------------------------
+
+
+def test_check_passes_on_null(tmp_path):
+    # Like SQL, a CHECK on a NULL value is unknown, not false
+    write_csv(tmp_path, "customer_review", """
+review_ID,customer_ID,product_id,description,rating
+1,1,1,ok,5
+2,1,1,no rating,
+3,1,1,too high,6
+4,1,1,too low,0
+""")
+    report = PreloadValidator(tmp_path).run(["customer_review"])
+    check = result(report, "check", "customer_review", "rating BETWEEN 1 AND 5")
+    assert check["violations"] == 2
+    assert [s["row"] for s in check["samples"]] == [3, 4]
+    assert check["status"] == "fail"
+
+
+def test_check_with_is_null(tmp_path):
+    write_csv(tmp_path, "app_user", """
+user_id,customer_id,seller_id,first_name,last_name,password,email,registed_date
+1,1,,A,B,x,a@example.com,2020-01-01
+2,,3,A,B,x,b@example.com,2020-01-01
+3,4,5,A,B,x,c@example.com,2020-01-01
+4,,,A,B,x,d@example.com,2020-01-01
+""")
+    report = PreloadValidator(tmp_path).run(["app_user"])
+    check = next(c for c in report["checks"] if (c["check"], c["table"]) == ("check", "app_user"))
+    assert [s["row"] for s in check["samples"]] == [3, 4]
+
+
+# ----------------------------------------------------------------------
+# UNIQUE vs. the duplicate-email rule
+# ----------------------------------------------------------------------
+
+
+def test_unique_is_case_sensitive_and_duplicate_email_is_a_warning(tmp_path):
+    write_csv(tmp_path, "customer", """
+customer_id,first_name,last_name,email,address,state
+1,A,B,Alice@example.com,1 Main St,CA
+2,A,B,alice@example.com,1 Main St,CA
+3,A,B,bob@example.com,1 Main St,CA
+4,A,B,bob@example.com,1 Main St,CA
+""")
+    write_csv(tmp_path, "app_user", """
+user_id,customer_id,seller_id,first_name,last_name,password,email,registed_date
+1,1,,A,B,x,Carol@example.com,2020-01-01
+2,2,,A,B,x,carol@example.com,2020-01-01
+""")
+    report = PreloadValidator(tmp_path).run(["customer", "app_user"])
+
+    # Postgres UNIQUE compares exactly: only the second bob@ is rejected
+    unique = result(report, "unique", "customer", "email")
+    assert unique["violations"] == 1
+    assert unique["samples"] == [{"row": 4}]
+
+    duplicate = result(report, "duplicate_email", "app_user", "email")
+    assert duplicate["violations"] == 1
+    assert duplicate["status"] == "warn"
+    assert report["summary"]["checks_warned"] == 1
+    assert report["summary"]["checks_failed"] == 1
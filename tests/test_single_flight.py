@@ -0,0 +1,101 @@
+"""Request coalescing in cache.SingleFlight."""
+
+import threading
+import time
+
+import pytest
+
+from cache import SingleFlight, single_flight_stats
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def run_concurrently(flight: SingleFlight, key, func, callers: int) -> tuple:
+    """Start callers on the same key while the leader is blocked; returns (results, errors)."""
+    release = threading.Event()
+    results, errors = [], []
+
+    def leader_func():
+        release.wait()
+        return func()
+
+    def call():
+        try:
+            results.append(flight.do(key, leader_func))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    threads[0].start()
+    wait_until(lambda: flight.stats()["in_flight"] == 1)
+    for thread in threads[1:]:
+        thread.start()
+    wait_until(lambda: flight.shared == callers - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test_share")
+    executions = []
+    results, errors = run_concurrently(flight, "k", lambda: executions.append(1) or 42, callers=8)
+    assert results == [42] * 8
+    assert errors == []
+    assert executions == [1]
+    stats = flight.stats()
+    assert (stats["calls"], stats["executed"], stats["shared"], stats["in_flight"]) == (8, 1, 7, 0)
+    assert stats["suppression_rate"] == pytest.approx(7 / 8)
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight("test_error")
+
+    def fail():
+        raise RuntimeError("backend down")
+
+    results, errors = run_concurrently(flight, "k", fail, callers=4)
+    assert results == []
+    assert [str(e) for e in errors] == ["backend down"] * 4
+
+
+def test_share_copies_the_result_for_followers():
+    flight = SingleFlight("test_copy", share=list)
+    results, _ = run_concurrently(flight, "k", lambda: [1, 2], callers=3)
+    assert results == [[1, 2]] * 3
+    # Followers may mutate their result without touching the leader's
+    assert len({id(r) for r in results}) == 3
+
+
+def test_nothing_is_kept_after_the_call():
+    flight = SingleFlight("test_again")
+    calls = []
+    assert flight.do("k", lambda: calls.append(1) or len(calls)) == 1
+    assert flight.do("k", lambda: calls.append(1) or len(calls)) == 2
+    assert flight.stats()["shared"] == 0
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test_keys")
+    assert [flight.do(key, lambda k=key: k * 2) for key in (1, 2, 3)] == [2, 4, 6]
+    assert flight.stats()["executed"] == 3
+
+
+def test_failed_call_does_not_stick():
+    flight = SingleFlight("test_retry")
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: int("x"))
+    assert flight.do("k", lambda: 5) == 5
+
+
+def test_stats_are_listed():
+    flight = SingleFlight("test_listed")
+    flight.do("k", lambda: None)
+    assert any(stats["name"] == "test_listed" for stats in single_flight_stats())
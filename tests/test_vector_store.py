@@ -0,0 +1,18 @@
+"""Vector store backend contract (rag/vector_store.py)."""
+
+import pytest
+
+from rag.vector_store import NumpyVectorStore, VectorStore
+
+
+def test_incomplete_backend_fails_at_construction(tmp_path):
+    class CountOnly(VectorStore):
+        def count(self) -> int:
+            return 0
+
+    with pytest.raises(TypeError, match="abstract"):
+        CountOnly(tmp_path)
+
+
+def test_numpy_backend_implements_the_interface():
+    assert not NumpyVectorStore.__abstractmethods__